@@ -0,0 +1,342 @@
+#!/usr/bin/env python3
+"""
+Aggregation Query Engine
+Whitelist metric per sensor yang bisa di-aggregate per bucket waktu
+(/api/aggregate?sensor=&metric=&bucket=15m&agg=avg,max,p95&start=&end=).
+
+- Setiap request dikompilasi menjadi satu query SQL GROUP BY bucket di atas
+  index (device_type, ts_ms) / (ts_ms), tidak ada pagination row mentah
+- Rollup per jam (metric_rollup_hourly) di-maintain oleh MQTT worker dalam
+  transaksi batch yang sama; dipakai otomatis jika bucket kelipatan 1 jam,
+  range rata per jam dan agg hanya count/sum/avg/min/max
+- Percentile (p50, p95, ...) memakai aggregate PERCENTILE yang didaftarkan ke koneksi
+- Row run deadband (repeat_count) diberi bobot 1 + repeat_count, sehingga count/sum/
+  avg/percentile sama seperti tanpa deadband; run tidak melewati batas jam, jadi
+  bucket >= 1 jam exact, bucket lebih kecil menghitung run di bucket awal run
+"""
+
+import re
+import bisect
+import sqlite3
+import itertools
+from typing import Dict, Any, List, Optional, Tuple
+
+from epoch_time import to_epoch_ms, from_epoch_ms, date_range_ms, MS_PER_SECOND, MS_PER_HOUR, MS_PER_DAY
+
+# Metric yang boleh di-query; 'json_column' berarti nilai ada di dalam JSON parsed_data
+SENSOR_METRICS = {
+    'pzem016': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-016_AC'",
+        'json_column': 'parsed_data',
+        'metrics': ['voltage_v', 'current_a', 'power_w', 'energy_kwh', 'frequency_hz', 'power_factor'],
+    },
+    'pzem017': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-017_DC'",
+        'json_column': 'parsed_data',
+        'metrics': ['voltage_v', 'current_a', 'power_w', 'energy_kwh'],
+    },
+    'dht22': {
+        'table': 'dht22_data',
+        'where': '1 = 1',
+        'json_column': None,
+        'metrics': ['temperature', 'humidity'],
+    },
+    'system': {
+        'table': 'system_data',
+        'where': '1 = 1',
+        'json_column': None,
+        'metrics': ['ram_usage_percent', 'storage_usage_percent', 'cpu_usage_percent',
+                    'cpu_temperature', 'storage_used_gb', 'storage_free_gb'],
+    },
+}
+
+# Metric default untuk chart (downsampling max_points)
+DEFAULT_METRICS = {
+    'pzem016': 'power_w',
+    'pzem017': 'power_w',
+    'dht22': 'temperature',
+    'system': 'cpu_usage_percent',
+}
+
+DEVICE_SENSORS = {
+    'PZEM-016_AC': 'pzem016',
+    'PZEM-017_DC': 'pzem017',
+}
+
+# Identitas device fisik per sensor (kolom yang sama dengan key series deadband):
+# device_id() dari payload dan device_id_sql() dari row menghasilkan string yang sama
+DEVICE_ID_COLUMNS = {
+    'pzem016': ('device_path', 'slave_id'),
+    'pzem017': ('device_path', 'slave_id'),
+    'dht22': ('gpio_pin',),
+    'system': (),
+}
+
+def device_id(sensor: str, data: Dict[str, Any]) -> str:
+    """'/dev/ttyUSB0#1' (PZEM), '4' (DHT22 gpio_pin), '' (system / tanpa kolom)"""
+    return '#'.join('' if data.get(column) is None else str(data.get(column))
+                    for column in DEVICE_ID_COLUMNS.get(sensor, ()))
+
+def device_id_sql(sensor: str) -> str:
+    """Ekspresi SQL device_id() untuk tabel sensor"""
+    columns = DEVICE_ID_COLUMNS.get(sensor, ())
+    if not columns:
+        return "''"
+    return " || '#' || ".join(f"COALESCE(CAST({column} AS TEXT), '')" for column in columns)
+
+BUCKET_UNITS = {
+    's': MS_PER_SECOND,
+    'm': 60 * MS_PER_SECOND,
+    'h': MS_PER_HOUR,
+    'd': MS_PER_DAY,
+}
+
+MIN_BUCKET_MS = 60 * MS_PER_SECOND
+MAX_BUCKETS = 10000
+
+# Ekspresi SQL per agg untuk row mentah (weight = pembacaan per row) dan untuk rollup per jam
+RAW_AGGREGATES = {
+    'count': 'SUM(CASE WHEN value IS NOT NULL THEN weight ELSE 0 END)',
+    'sum': 'SUM(value * weight)',
+    'avg': 'SUM(value * weight) * 1.0 / SUM(CASE WHEN value IS NOT NULL THEN weight END)',
+    'min': 'MIN(value)',
+    'max': 'MAX(value)',
+    'first': 'BUCKET_FIRST(value, ts_ms)',
+    'last': 'BUCKET_LAST(value, ts_ms)',
+}
+
+ROLLUP_AGGREGATES = {
+    'count': 'SUM(count)',
+    'sum': 'SUM(sum)',
+    'avg': 'SUM(sum) / SUM(count)',
+    'min': 'MIN(min)',
+    'max': 'MAX(max)',
+}
+
+PERCENTILE_PATTERN = re.compile(r'^p(\d{1,2}(?:\.\d+)?)$')
+BUCKET_PATTERN = re.compile(r'^(\d+)([smhd])$')
+
+class Percentile:
+    """
+    Aggregate SQLite PERCENTILE(value, p, weight) dengan interpolasi linear,
+    setara dengan value diulang weight kali
+    """
+
+    def __init__(self):
+        self.values = []
+        self.p = None
+
+    def step(self, value, p, weight):
+        if value is not None:
+            self.values.append((value, weight or 1))
+        self.p = p
+
+    def _value_at(self, index, cumulative):
+        return self.values[bisect.bisect_right(cumulative, index)][0]
+
+    def finalize(self):
+        if not self.values:
+            return None
+        self.values.sort()
+        cumulative = list(itertools.accumulate(weight for _, weight in self.values))
+        total = cumulative[-1]
+        rank = (total - 1) * self.p / 100.0
+        lower = int(rank)
+        upper = min(lower + 1, total - 1)
+        lower_value = self._value_at(lower, cumulative)
+        upper_value = self._value_at(upper, cumulative)
+        return lower_value + (upper_value - lower_value) * (rank - lower)
+
+class BucketFirst:
+    """Aggregate BUCKET_FIRST(value, ts_ms): nilai dengan ts_ms terkecil di bucket"""
+
+    def __init__(self):
+        self.value = None
+        self.ts_ms = None
+
+    def _better(self, ts_ms):
+        return self.ts_ms is None or ts_ms < self.ts_ms
+
+    def step(self, value, ts_ms):
+        if value is not None and self._better(ts_ms):
+            self.value = value
+            self.ts_ms = ts_ms
+
+    def finalize(self):
+        return self.value
+
+class BucketLast(BucketFirst):
+    """Aggregate BUCKET_LAST(value, ts_ms): nilai dengan ts_ms terbesar di bucket"""
+
+    def _better(self, ts_ms):
+        return self.ts_ms is None or ts_ms >= self.ts_ms
+
+def register_functions(conn: sqlite3.Connection):
+    """Daftarkan aggregate Python yang dipakai query aggregation"""
+    conn.create_aggregate('PERCENTILE', 3, Percentile)
+    conn.create_aggregate('BUCKET_FIRST', 2, BucketFirst)
+    conn.create_aggregate('BUCKET_LAST', 2, BucketLast)
+
+# ---------- Parsing & validasi ----------
+
+def parse_bucket(bucket: str) -> int:
+    """'15m' / '1h' / '1d' -> milliseconds"""
+    match = BUCKET_PATTERN.match(bucket or '')
+    if not match:
+        raise ValueError(f'Invalid bucket: {bucket} (contoh: 1m, 15m, 1h, 1d)')
+    bucket_ms = int(match.group(1)) * BUCKET_UNITS[match.group(2)]
+    if bucket_ms < MIN_BUCKET_MS:
+        raise ValueError(f'Bucket must be at least {MIN_BUCKET_MS // MS_PER_SECOND}s')
+    return bucket_ms
+
+def parse_aggs(agg: str) -> List[str]:
+    """'avg,max,p95' -> ['avg', 'max', 'p95'] (divalidasi terhadap whitelist)"""
+    aggs = [name.strip().lower() for name in (agg or 'avg').split(',') if name.strip()]
+    for name in aggs:
+        if name in RAW_AGGREGATES:
+            continue
+        match = PERCENTILE_PATTERN.match(name)
+        if not match or not 0 <= float(match.group(1)) <= 100:
+            raise ValueError(f'Invalid aggregate: {name}')
+    return list(dict.fromkeys(aggs))
+
+def parse_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    start/end sebagai tanggal (YYYY-MM-DD, end termasuk satu hari penuh)
+    atau timestamp ISO (end exclusive)
+    """
+    start_ms = to_epoch_ms(start) if start else None
+    if end and len(end) == 10:
+        _, end_ms = date_range_ms(None, end)
+    else:
+        end_ms = to_epoch_ms(end) if end else None
+
+    if (start and start_ms is None) or (end and end_ms is None):
+        raise ValueError('Invalid start/end timestamp')
+    return start_ms, end_ms
+
+def metric_expression(sensor: str, metric: str) -> str:
+    """Ekspresi SQL untuk nilai metric (hanya dari whitelist)"""
+    config = SENSOR_METRICS.get(sensor)
+    if config is None:
+        raise ValueError(f'Invalid sensor type: {sensor}')
+    if metric not in config['metrics']:
+        raise ValueError(f'Invalid metric for {sensor}: {metric}')
+    if config['json_column']:
+        return f"JSON_EXTRACT({config['json_column']}, '$.{metric}')"
+    return metric
+
+def _can_use_rollup(bucket_ms: int, aggs: List[str], start_ms: Optional[int],
+                    end_ms: Optional[int]) -> bool:
+    return (bucket_ms % MS_PER_HOUR == 0 and
+            all(name in ROLLUP_AGGREGATES for name in aggs) and
+            (start_ms is None or start_ms % MS_PER_HOUR == 0) and
+            (end_ms is None or end_ms % MS_PER_HOUR == 0))
+
+def _agg_sql(name: str, source: Dict[str, str]) -> str:
+    match = PERCENTILE_PATTERN.match(name)
+    if match:
+        return f'PERCENTILE(value, {float(match.group(1))}, weight)'
+    return source[name]
+
+# ---------- Query ----------
+
+def aggregate(conn: sqlite3.Connection, sensor: str, metric: str, bucket_ms: int,
+              aggs: List[str], start_ms: Optional[int] = None,
+              end_ms: Optional[int] = None, columnar: bool = False) -> Dict[str, Any]:
+    """
+    Aggregate satu metric per bucket dengan satu query SQL. columnar=True mengganti
+    'buckets' dengan 'columns' ({'bucket_ms': [...], agg: [...]}) untuk wire format binary.
+    """
+    value_sql = metric_expression(sensor, metric)
+    config = SENSOR_METRICS[sensor]
+
+    if start_ms is not None and end_ms is not None:
+        if end_ms <= start_ms:
+            raise ValueError('end must be after start')
+        if (end_ms - start_ms) // bucket_ms > MAX_BUCKETS:
+            raise ValueError(f'Too many buckets (max {MAX_BUCKETS}), use a larger bucket')
+
+    use_rollup = _can_use_rollup(bucket_ms, aggs, start_ms, end_ms)
+    time_column = 'hour_ms' if use_rollup else 'ts_ms'
+
+    conditions = []
+    params = [bucket_ms, bucket_ms]
+    if use_rollup:
+        conditions += ['sensor = ?', 'metric = ?']
+        params += [sensor, metric]
+    if start_ms is not None:
+        conditions.append(f'{time_column} >= ?')
+        params.append(start_ms)
+    if end_ms is not None:
+        conditions.append(f'{time_column} < ?')
+        params.append(end_ms)
+
+    if use_rollup:
+        source = 'rollup'
+        select_aggs = ', '.join(_agg_sql(name, ROLLUP_AGGREGATES) for name in aggs)
+        from_clause = 'metric_rollup_hourly'
+    else:
+        source = 'raw'
+        register_functions(conn)
+        select_aggs = ', '.join(_agg_sql(name, RAW_AGGREGATES) for name in aggs)
+        from_clause = f'''(
+            SELECT ts_ms, {value_sql} AS value, 1 + repeat_count AS weight
+            FROM {config['table']}
+            WHERE {config['where']} AND status = 'success'
+        )'''
+
+    where_clause = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+    cursor = conn.execute(f'''
+        SELECT ({time_column} / ?) * ? AS bucket_ms, {select_aggs}
+        FROM {from_clause}
+        {where_clause}
+        GROUP BY bucket_ms
+        ORDER BY bucket_ms ASC
+    ''', params)
+
+    result = {
+        'sensor': sensor,
+        'metric': metric,
+        'bucket_ms': bucket_ms,
+        'aggs': aggs,
+        'source': source,
+    }
+    if columnar:
+        columns = list(zip(*cursor.fetchall())) or [()] * (len(aggs) + 1)
+        result['columns'] = dict(zip(['bucket_ms'] + aggs, columns))
+        return result
+
+    buckets = []
+    for row in cursor:
+        bucket = {'bucket_start': from_epoch_ms(row[0])}
+        for name, value in zip(aggs, row[1:]):
+            bucket[name] = value
+        buckets.append(bucket)
+
+    result['buckets'] = buckets
+    return result
+
+# ---------- Rollup maintenance (MQTT worker) ----------
+
+def update_rollups(cursor: sqlite3.Cursor, sensor: str, ts_ms: int, values: Dict[str, Any]):
+    """Upsert rollup per jam untuk semua metric whitelist (dalam transaksi caller)"""
+    hour_ms = ts_ms - (ts_ms % MS_PER_HOUR)
+    rows = []
+    for metric in SENSOR_METRICS[sensor]['metrics']:
+        value = values.get(metric)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            rows.append((sensor, metric, hour_ms, value, value, value))
+
+    if rows:
+        cursor.executemany('''
+            INSERT INTO metric_rollup_hourly (sensor, metric, hour_ms, count, sum, min, max)
+            VALUES (?, ?, ?, 1, ?, ?, ?)
+            ON CONFLICT(sensor, metric, hour_ms) DO UPDATE SET
+                count = count + 1,
+                sum = sum + excluded.sum,
+                min = MIN(min, excluded.min),
+                max = MAX(max, excluded.max)
+        ''', rows)
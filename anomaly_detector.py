@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Streaming Anomaly Detection
+Detector di MQTT worker untuk metric system (suhu CPU Pi, RAM, storage) dan
+DHT22. Setiap pembacaan diperiksa terhadap state O(1) per (sensor, series, metric):
+
+- spike   |value - EWMA mean| > z * EWMA std (setelah warmup)
+- rate    perubahan per menit > max_rate (pembacaan berurutan, jarak <= RATE_MAX_GAP)
+- stuck   nilai identik selama >= stuck_minutes (DHT22 yang hang mengirim nilai sama)
+- limit   di luar batas fisik/operasional [min, max] (mis. throttling Pi di 80°C)
+
+Event ditulis ke anomaly_events saat kondisi mulai (end_ms NULL = masih aktif)
+dan ditutup saat pembacaan normal pertama. State di-checkpoint ke anomaly_state
+dalam transaksi batch yang sama, sehingga restart worker melanjutkan baseline
+EWMA tanpa rescan history; reset() setelah rollback membuang state yang belum
+di-commit.
+
+Pembacaan yang datang terlambat (ts_ms <= pembacaan terakhir, mis. dari spill
+queue) dilewati supaya state tetap streaming satu arah.
+"""
+
+import os
+import json
+import math
+import logging
+import sqlite3
+from typing import Dict, Any, List, Optional, Tuple
+
+from epoch_time import MS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+ANOMALY_ENABLED = os.environ.get('ANOMALY_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+ANOMALY_ALPHA = float(os.environ.get('ANOMALY_ALPHA', '0.05'))
+ANOMALY_WARMUP = int(os.environ.get('ANOMALY_WARMUP', '30'))
+RATE_MAX_GAP = float(os.environ.get('ANOMALY_RATE_MAX_GAP', '600'))
+
+ANOMALY_KINDS = ('spike', 'rate', 'stuck', 'limit')
+
+MS_PER_MINUTE = 60 * MS_PER_SECOND
+
+# Rule per metric; key yang tidak disebut berarti check tersebut nonaktif.
+# min_std mencegah z-score meledak saat metric sangat stabil (resolusi sensor).
+DEFAULT_RULES = {
+    'dht22': {
+        'temperature': {'z': 4.0, 'min_std': 0.2, 'max_rate': 2.0, 'stuck_minutes': 60, 'min': -40, 'max': 80},
+        'humidity': {'z': 4.0, 'min_std': 1.0, 'max_rate': 10.0, 'stuck_minutes': 60, 'min': 0, 'max': 100},
+    },
+    'system': {
+        'cpu_temperature': {'z': 4.0, 'min_std': 0.5, 'max_rate': 5.0, 'max': 80},
+        'ram_usage_percent': {'z': 5.0, 'min_std': 1.0, 'max': 95},
+        'storage_usage_percent': {'max_rate': 1.0, 'max': 90},
+    },
+}
+
+def load_rules() -> Dict[str, Dict[str, Dict[str, float]]]:
+    """DEFAULT_RULES + override JSON dari ANOMALY_RULES ({sensor: {metric: {check: value}}})"""
+    rules = {sensor: {metric: dict(rule) for metric, rule in metrics.items()}
+             for sensor, metrics in DEFAULT_RULES.items()}
+    override = os.environ.get('ANOMALY_RULES')
+    if override:
+        try:
+            for sensor, metrics in json.loads(override).items():
+                for metric, rule in metrics.items():
+                    rules.setdefault(sensor, {}).setdefault(metric, {}).update(rule)
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid ANOMALY_RULES, using defaults: {e}")
+    return rules
+
+def _new_state() -> Dict[str, Any]:
+    return {
+        'n': 0,
+        'mean': 0.0,
+        'var': 0.0,
+        'last_value': None,
+        'last_ts_ms': None,
+        'stuck_since_ms': None,
+        'active': {}          # kind -> id event yang masih terbuka
+    }
+
+class AnomalyDetector:
+    """
+    State detector per (sensor, series, metric). Dipakai oleh DatabaseManager di
+    dalam transaksi batch: observe() per pembacaan, checkpoint() sebelum commit,
+    reset() jika transaksi di-rollback.
+    """
+
+    def __init__(self, enabled: bool = ANOMALY_ENABLED, alpha: float = ANOMALY_ALPHA,
+                 warmup: int = ANOMALY_WARMUP, rules: Optional[Dict[str, Any]] = None):
+        self.enabled = enabled
+        self.alpha = alpha
+        self.warmup = warmup
+        self.rules = rules if rules is not None else load_rules()
+        self._states: Optional[Dict[Tuple[str, str, str], Dict[str, Any]]] = None
+        self._dirty = set()
+        self.observed = 0
+        self.opened = 0
+        self.closed = 0
+
+    # ---------- State ----------
+
+    def _load(self, conn: sqlite3.Connection):
+        """State checkpoint terakhir (sekali per proses / setelah reset)"""
+        self._states = {}
+        for sensor, series, metric, state in conn.execute(
+                'SELECT sensor, series, metric, state FROM anomaly_state'):
+            self._states[(sensor, series, metric)] = json.loads(state)
+
+    def checkpoint(self, cursor: sqlite3.Cursor):
+        """Upsert state yang berubah (dalam transaksi caller)"""
+        if not self._dirty:
+            return
+        cursor.executemany('''
+            INSERT INTO anomaly_state (sensor, series, metric, state, updated_ms)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(sensor, series, metric) DO UPDATE SET
+                state = excluded.state,
+                updated_ms = excluded.updated_ms
+        ''', [key + (json.dumps(self._states[key]), self._states[key]['last_ts_ms'])
+              for key in self._dirty])
+        self._dirty.clear()
+
+    def reset(self):
+        """Buang state in-memory (dimuat ulang dari checkpoint yang ter-commit)"""
+        self._states = None
+        self._dirty.clear()
+
+    # ---------- Detection ----------
+
+    def _checks(self, rule: Dict[str, float], state: Dict[str, Any], value: float,
+                ts_ms: int) -> Dict[str, Tuple[Optional[float], float]]:
+        """Kondisi anomali yang terpenuhi pembacaan ini: kind -> (expected, score)"""
+        found = {}
+
+        if 'min' in rule and value < rule['min']:
+            found['limit'] = (rule['min'], value)
+        elif 'max' in rule and value > rule['max']:
+            found['limit'] = (rule['max'], value)
+
+        if 'z' in rule and state['n'] >= self.warmup:
+            std = max(math.sqrt(state['var']), rule.get('min_std', 0.0))
+            score = abs(value - state['mean']) / std if std else 0.0
+            if score > rule['z']:
+                found['spike'] = (state['mean'], score)
+
+        last_ts_ms = state['last_ts_ms']
+        if 'max_rate' in rule and last_ts_ms is not None and 0 < ts_ms - last_ts_ms <= RATE_MAX_GAP * MS_PER_SECOND:
+            rate = abs(value - state['last_value']) / ((ts_ms - last_ts_ms) / MS_PER_MINUTE)
+            if rate > rule['max_rate']:
+                found['rate'] = (state['last_value'], rate)
+
+        if 'stuck_minutes' in rule and state['stuck_since_ms'] is not None:
+            stuck_minutes = (ts_ms - state['stuck_since_ms']) / MS_PER_MINUTE
+            if stuck_minutes >= rule['stuck_minutes']:
+                found['stuck'] = (None, stuck_minutes)
+
+        return found
+
+    def _update(self, state: Dict[str, Any], value: float, ts_ms: int, trusted: bool):
+        if value != state['last_value'] or state['stuck_since_ms'] is None:
+            state['stuck_since_ms'] = ts_ms
+        state['last_value'] = value
+        state['last_ts_ms'] = ts_ms
+
+        # Nilai di luar batas fisik atau sensor yang hang tidak ikut baseline
+        if not trusted:
+            return
+        if state['n'] == 0:
+            state['mean'], state['var'] = value, 0.0
+        else:
+            diff = value - state['mean']
+            increment = self.alpha * diff
+            state['mean'] += increment
+            state['var'] = (1 - self.alpha) * (state['var'] + diff * increment)
+        state['n'] += 1
+
+    def observe(self, cursor: sqlite3.Cursor, sensor: str, series: str, ts_ms: int,
+                values: Dict[str, Any]) -> List[str]:
+        """Periksa satu pembacaan sukses, return kind anomali yang baru dibuka"""
+        rules = self.rules.get(sensor)
+        if not self.enabled or not rules:
+            return []
+        if self._states is None:
+            self._load(cursor.connection)
+
+        self.observed += 1
+        opened = []
+        for metric, rule in rules.items():
+            value = values.get(metric)
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                continue
+
+            key = (sensor, series, metric)
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _new_state()
+            if state['last_ts_ms'] is not None and ts_ms <= state['last_ts_ms']:
+                continue
+
+            found = self._checks(rule, state, value, ts_ms)
+            for kind, event_id in list(state['active'].items()):
+                if kind not in found:
+                    cursor.execute('UPDATE anomaly_events SET end_ms = ? WHERE id = ?', (ts_ms, event_id))
+                    del state['active'][kind]
+                    self.closed += 1
+            for kind, (expected, score) in found.items():
+                if kind in state['active']:
+                    continue
+                start_ms = state['stuck_since_ms'] if kind == 'stuck' else ts_ms
+                cursor.execute('''
+                    INSERT INTO anomaly_events (sensor, series, metric, kind, start_ms, value, expected, score)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (sensor, series, metric, kind, start_ms, value, expected, round(score, 3)))
+                state['active'][kind] = cursor.lastrowid
+                opened.append(kind)
+                self.opened += 1
+                logger.warning(f"Anomaly {kind} on {sensor}{'/' + series if series else ''} "
+                               f"{metric}={value} (expected {expected}, score {score:.2f})")
+
+            self._update(state, value, ts_ms, 'limit' not in found and 'stuck' not in found)
+            self._dirty.add(key)
+        return opened
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'observed': self.observed,
+            'opened': self.opened,
+            'closed': self.closed,
+            'active': sum(len(state['active']) for state in (self._states or {}).values())
+        }
+
+# ---------- Reader (web API) ----------
+
+def read_baselines(conn: sqlite3.Connection) -> List[Dict[str, Any]]:
+    """Baseline EWMA per metric dari checkpoint terakhir"""
+    baselines = []
+    for sensor, series, metric, state, updated_ms in conn.execute('''
+        SELECT sensor, series, metric, state, updated_ms FROM anomaly_state
+        ORDER BY sensor, series, metric
+    '''):
+        state = json.loads(state)
+        baselines.append({
+            'sensor': sensor,
+            'series': series,
+            'metric': metric,
+            'samples': state['n'],
+            'mean': state['mean'],
+            'std': math.sqrt(state['var']),
+            'last_value': state['last_value'],
+            'last_ts_ms': updated_ms,
+            'active': sorted(state['active'])
+        })
+    return baselines
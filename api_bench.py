@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+API Latency / Throughput Benchmark
+Request GET paralel ke endpoint utama web API selama durasi tertentu per level
+concurrency; melaporkan req/s dan latency p50/p95/p99 per endpoint. Dipakai
+untuk memilih WEB_WORKERS / WEB_THREADS di gunicorn.conf.py.
+
+Usage:
+    python api_bench.py --url http://localhost:5000 --concurrency 1,4,16 --duration 10
+"""
+
+import sys
+import json
+import time
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from typing import Dict, Any, List
+
+DEFAULT_ENDPOINTS = [
+    '/api/health',
+    '/api/data/pzem016?limit=100',
+    '/api/data/pzem016?max_points=500',
+    '/api/aggregate?sensor=pzem016&metric=power_w&bucket=1h&agg=avg,max',
+    '/api/roi/summary',
+    '/api/ingest/status',
+]
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * percentile / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def run_level(base_url: str, endpoints: List[str], concurrency: int,
+              duration: float, timeout: float = 30) -> Dict[str, Any]:
+    """concurrency thread, masing-masing berputar di semua endpoint sampai durasi habis"""
+    latencies = {endpoint: [] for endpoint in endpoints}
+    errors = {endpoint: 0 for endpoint in endpoints}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def client(offset):
+        position = offset
+        while time.perf_counter() < deadline:
+            endpoint = endpoints[position % len(endpoints)]
+            position += 1
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(base_url + endpoint, timeout=timeout) as response:
+                    response.read()
+                    ok = response.status == 200
+            except (urllib.error.URLError, OSError):
+                ok = False
+            elapsed = time.perf_counter() - started
+            with lock:
+                if ok:
+                    latencies[endpoint].append(elapsed)
+                else:
+                    errors[endpoint] += 1
+
+    started = time.perf_counter()
+    clients = [threading.Thread(target=client, args=(index,)) for index in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    results = {}
+    for endpoint in endpoints:
+        values = sorted(latencies[endpoint])
+        results[endpoint] = {
+            'requests': len(values),
+            'errors': errors[endpoint],
+            'rps': round(len(values) / wall, 1),
+            'p50_ms': round(_percentile(values, 50) * 1000, 1),
+            'p95_ms': round(_percentile(values, 95) * 1000, 1),
+            'p99_ms': round(_percentile(values, 99) * 1000, 1),
+        }
+    total = sum(result['requests'] for result in results.values())
+    return {
+        'concurrency': concurrency,
+        'total_rps': round(total / wall, 1),
+        'errors': sum(errors.values()),
+        'endpoints': results,
+    }
+
+def print_report(levels: List[Dict[str, Any]]):
+    for level in levels:
+        print(f"\nconcurrency={level['concurrency']}  total={level['total_rps']} req/s  errors={level['errors']}")
+        print(f"  {'endpoint':<70} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8}")
+        for endpoint, result in level['endpoints'].items():
+            print(f"  {endpoint:<70} {result['rps']:>7} {result['p50_ms']:>7}ms "
+                  f"{result['p95_ms']:>7}ms {result['p99_ms']:>7}ms")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Web API latency/throughput benchmark')
+    parser.add_argument('--url', default='http://localhost:5000', help='Base URL web API')
+    parser.add_argument('--concurrency', default='1,4,16', help='Level concurrency, dipisah koma')
+    parser.add_argument('--duration', type=float, default=10, help='Durasi per level (detik)')
+    parser.add_argument('--endpoint', action='append', help='Endpoint (bisa berulang, default endpoint utama)')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args()
+
+    endpoints = args.endpoint or DEFAULT_ENDPOINTS
+    levels = [run_level(args.url.rstrip('/'), endpoints, int(level), args.duration)
+              for level in args.concurrency.split(',')]
+
+    if args.json:
+        print(json.dumps(levels, indent=2))
+    else:
+        print_report(levels)
+    sys.exit(1 if any(level['errors'] for level in levels) else 0)
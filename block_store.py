@@ -0,0 +1,786 @@
+#!/usr/bin/env python3
+"""
+Block Store (Time-series Padat)
+Sample PZEM dan DHT22 per device fisik dipadatkan menjadi satu chunk per jam di
+tabel series_blocks (BLOB, primary key (sensor, device, hour_ms)); device adalah
+aggregation.device_id() ('/dev/ttyUSB0#1' untuk PZEM, gpio_pin untuk DHT22):
+
+- Timestamp: delta-of-delta (Gorilla), interval tetap = 1 bit per sample
+- Metric float: XOR dengan nilai sebelumnya (Gorilla), nilai sama = 1 bit
+- Status sukses dan alarm: bit-packed (np.packbits), 1 bit per sample per flag
+
+Jam yang sudah tertutup dipadatkan oleh MQTT worker (compact); watermark per
+(sensor, device) di series_block_state: jam < watermark dibaca dari block, sisanya
+dari row pzem_data / dht22_data, lalu semua device digabung urut ts_ms. Run deadband di-expand saat dipadatkan, sehingga
+block berisi satu sample per pembacaan. Block tidak ikut dihapus retention,
+jadi history jangka panjang tetap tersedia setelah row di-tier ke cold storage.
+
+Decoder menghasilkan NumPy array; dipakai web API dengan ?backend=blocks.
+"""
+
+import os
+import time
+import struct
+import sqlite3
+import logging
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Any, List, Optional, Tuple
+
+from epoch_time import from_epoch_ms, site_now_ms, MS_PER_SECOND, MS_PER_HOUR
+from deadband import expand_run
+from aggregation import device_id_sql
+
+# Import untuk decoder (optional)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Jam dipadatkan setelah tertutup + delay (toleransi data terlambat)
+BLOCK_COMPACT_DELAY = int(os.environ.get('BLOCK_COMPACT_DELAY', '600'))
+# Jam di bawah watermark yang dicek ulang (data terlambat -> block di-encode ulang)
+BLOCK_RECHECK_HOURS = int(os.environ.get('BLOCK_RECHECK_HOURS', '24'))
+BLOCK_CACHE_SIZE = int(os.environ.get('BLOCK_CACHE_SIZE', '512'))
+
+BLOCK_FORMAT_VERSION = 1
+
+BLOCK_SERIES = {
+    'pzem016': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-016_AC'",
+        'device_type': 'PZEM-016_AC',
+        'json_column': 'parsed_data',
+        'metrics': ['voltage_v', 'current_a', 'power_w', 'energy_kwh', 'frequency_hz', 'power_factor'],
+        'flags': ['alarm_status'],
+    },
+    'pzem017': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-017_DC'",
+        'device_type': 'PZEM-017_DC',
+        'json_column': 'parsed_data',
+        'metrics': ['voltage_v', 'current_a', 'power_w', 'energy_kwh'],
+        'flags': ['over_voltage_alarm', 'under_voltage_alarm'],
+    },
+    'dht22': {
+        'table': 'dht22_data',
+        'where': '1 = 1',
+        'device_type': None,
+        'json_column': None,
+        'metrics': ['temperature', 'humidity'],
+        'flags': [],
+    },
+}
+
+# version, count, jumlah metric, jumlah flag (termasuk flag sukses)
+_HEADER = struct.Struct('<BIBB')
+_SECTION = struct.Struct('<I')
+
+# Prefix delta-of-delta: (prefix, panjang prefix, bit nilai); selain itu '1111' + 32 bit
+_DOD_BUCKETS = ((0b10, 2, 7), (0b110, 3, 9), (0b1110, 4, 12))
+
+# ---------- Bit I/O ----------
+
+class BitWriter:
+    """MSB-first; bit dikumpulkan di accumulator int, di-flush ke bytearray per 64 bit"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.acc = 0
+        self.pending = 0
+
+    def bit(self, flag: bool):
+        self.acc = (self.acc << 1) | flag
+        self.pending += 1
+        if self.pending == 64:
+            self._flush()
+
+    def write(self, value: int, bits: int):
+        """value harus < 2**bits (caller sudah masking)"""
+        self.acc = (self.acc << bits) | value
+        self.pending += bits
+        if self.pending >= 64:
+            self._flush()
+
+    def _flush(self):
+        whole = self.pending >> 3
+        self.pending &= 7
+        self.buffer += (self.acc >> self.pending).to_bytes(whole, 'big')
+        self.acc &= (1 << self.pending) - 1
+
+    def to_bytes(self) -> bytes:
+        self._flush()
+        if self.pending:
+            self.buffer.append((self.acc << (8 - self.pending)) & 0xFF)
+            self.acc = self.pending = 0
+        return bytes(self.buffer)
+
+class BitReader:
+    """MSB-first; data dibaca per 32 byte ke window int"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+        self.acc = 0
+        self.avail = 0
+
+    def _fill(self, bits: int):
+        while self.avail < bits:
+            chunk = self.data[self.offset:self.offset + 32]
+            if not chunk:
+                raise ValueError('Block terpotong')
+            self.offset += len(chunk)
+            self.acc = ((self.acc & ((1 << self.avail) - 1)) << (len(chunk) << 3)) | int.from_bytes(chunk, 'big')
+            self.avail += len(chunk) << 3
+
+    def bit(self) -> int:
+        if not self.avail:
+            self._fill(1)
+        self.avail -= 1
+        return (self.acc >> self.avail) & 1
+
+    def read(self, bits: int) -> int:
+        if self.avail < bits:
+            self._fill(bits)
+        self.avail -= bits
+        return (self.acc >> self.avail) & ((1 << bits) - 1)
+
+def _to_signed(value: int, bits: int) -> int:
+    return value - (1 << bits) if value >= 1 << (bits - 1) else value
+
+# ---------- Codec ----------
+
+def encode_timestamps(ts_ms: List[int]) -> bytes:
+    """Delta-of-delta; timestamp harus urut naik"""
+    writer = BitWriter()
+    if not ts_ms:
+        return b''
+    writer.write(ts_ms[0], 64)
+    if len(ts_ms) == 1:
+        return writer.to_bytes()
+
+    previous_delta = ts_ms[1] - ts_ms[0]
+    writer.write(previous_delta, 32)
+    for index in range(2, len(ts_ms)):
+        delta = ts_ms[index] - ts_ms[index - 1]
+        dod = delta - previous_delta
+        previous_delta = delta
+        if dod == 0:
+            writer.bit(False)
+            continue
+        for prefix, prefix_bits, bits in _DOD_BUCKETS:
+            if -(1 << (bits - 1)) <= dod < 1 << (bits - 1):
+                writer.write(prefix, prefix_bits)
+                writer.write(dod & ((1 << bits) - 1), bits)
+                break
+        else:
+            writer.write(0b1111, 4)
+            writer.write(dod & 0xFFFFFFFF, 32)
+    return writer.to_bytes()
+
+def decode_timestamps(data: bytes, count: int) -> List[int]:
+    if not count:
+        return []
+    reader = BitReader(data)
+    ts_ms = [reader.read(64)]
+    if count == 1:
+        return ts_ms
+
+    delta = reader.read(32)
+    ts_ms.append(ts_ms[0] + delta)
+    for _ in range(count - 2):
+        if reader.bit():
+            if not reader.bit():
+                bits = 7
+            elif not reader.bit():
+                bits = 9
+            elif not reader.bit():
+                bits = 12
+            else:
+                bits = 32
+            delta += _to_signed(reader.read(bits), bits)
+        ts_ms.append(ts_ms[-1] + delta)
+    return ts_ms
+
+def encode_floats(bits_list: List[int]) -> bytes:
+    """XOR Gorilla atas representasi IEEE-754 (uint64) nilai float"""
+    writer = BitWriter()
+    if not bits_list:
+        return b''
+    previous = bits_list[0]
+    writer.write(previous, 64)
+    leading = trailing = None
+
+    for value in bits_list[1:]:
+        xor = value ^ previous
+        previous = value
+        if xor == 0:
+            writer.bit(False)
+            continue
+
+        writer.bit(True)
+        value_leading = min(64 - xor.bit_length(), 31)
+        value_trailing = (xor & -xor).bit_length() - 1
+        if leading is not None and value_leading >= leading and value_trailing >= trailing:
+            writer.bit(False)
+            writer.write(xor >> trailing, 64 - leading - trailing)
+        else:
+            length = 64 - value_leading - value_trailing
+            writer.bit(True)
+            writer.write(value_leading, 5)
+            writer.write(length - 1, 6)
+            writer.write(xor >> value_trailing, length)
+            leading, trailing = value_leading, value_trailing
+    return writer.to_bytes()
+
+def decode_floats(data: bytes, count: int) -> List[int]:
+    if not count:
+        return []
+    reader = BitReader(data)
+    previous = reader.read(64)
+    values = [previous]
+    leading = trailing = 0
+
+    for _ in range(count - 1):
+        if reader.bit():
+            if reader.bit():
+                leading = reader.read(5)
+                length = reader.read(6) + 1
+                trailing = 64 - leading - length
+            else:
+                length = 64 - leading - trailing
+            previous ^= reader.read(length) << trailing
+        values.append(previous)
+    return values
+
+def encode_block(ts_ms, values, flags) -> bytes:
+    """
+    ts_ms: int64[count] urut naik, values: float64[n_metrics, count] (NaN = kosong),
+    flags: bool[n_flags, count] (baris 0 = status sukses)
+    """
+    count = len(ts_ms)
+    sections = [encode_timestamps(ts_ms.tolist())]
+    for metric_values in values:
+        sections.append(encode_floats(np.ascontiguousarray(metric_values, dtype=np.float64).view(np.uint64).tolist()))
+    sections.append(np.packbits(np.asarray(flags, dtype=bool), axis=1).tobytes() if count else b'')
+
+    parts = [_HEADER.pack(BLOCK_FORMAT_VERSION, count, len(values), len(flags))]
+    for section in sections:
+        parts.append(_SECTION.pack(len(section)))
+        parts.append(section)
+    return b''.join(parts)
+
+@lru_cache(maxsize=BLOCK_CACHE_SIZE)
+def decode_block(data: bytes):
+    """BLOB -> (ts_ms int64, values float64[n_metrics, count], flags bool[n_flags, count]), read-only"""
+    version, count, n_metrics, n_flags = _HEADER.unpack_from(data, 0)
+    if version != BLOCK_FORMAT_VERSION:
+        raise ValueError(f'Unsupported block format version: {version}')
+
+    offset = _HEADER.size
+    sections = []
+    for _ in range(n_metrics + 2):
+        (length,) = _SECTION.unpack_from(data, offset)
+        offset += _SECTION.size
+        sections.append(data[offset:offset + length])
+        offset += length
+
+    ts_ms = np.array(decode_timestamps(sections[0], count), dtype=np.int64)
+    values = np.empty((n_metrics, count), dtype=np.float64)
+    for index in range(n_metrics):
+        values[index] = np.array(decode_floats(sections[1 + index], count), dtype=np.uint64).view(np.float64)
+    packed = np.frombuffer(sections[-1], dtype=np.uint8).reshape(n_flags, -1) if count else np.zeros((n_flags, 0), np.uint8)
+    flags = np.unpackbits(packed, axis=1)[:, :count].astype(bool)
+
+    for array in (ts_ms, values, flags):
+        array.flags.writeable = False
+    return ts_ms, values, flags
+
+# ---------- Store ----------
+
+def _hour(ts_ms: int) -> int:
+    return ts_ms - (ts_ms % MS_PER_HOUR)
+
+class BlockStore:
+    """Compaction dan reader block untuk satu koneksi shard"""
+
+    def __init__(self, conn: sqlite3.Connection):
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError('numpy tidak tersedia, block store tidak bisa dipakai')
+        self.conn = conn
+        # False jika compaction terakhir berhenti di deadline (dilanjutkan panggilan berikutnya)
+        self.finished = True
+        self._hours = 0
+
+    def _expired(self, deadline: Optional[float]) -> bool:
+        """Deadline lewat; minimal satu jam dipadatkan per panggilan supaya selalu ada progres"""
+        if deadline is not None and self._hours and time.monotonic() >= deadline:
+            self.finished = False
+        return not self.finished
+
+    def watermarks(self, sensor: str) -> Dict[str, int]:
+        """device -> watermark_ms untuk sensor"""
+        try:
+            return dict(self.conn.execute(
+                'SELECT device, watermark_ms FROM series_block_state WHERE sensor = ?', (sensor,)
+            ).fetchall())
+        except sqlite3.OperationalError:
+            return {}
+
+    def watermark(self, sensor: str, device: str) -> Optional[int]:
+        return self.watermarks(sensor).get(device)
+
+    def _select_rows(self, sensor: str, start_ms: Optional[int], end_ms: Optional[int],
+                     device: Optional[str] = None, exclude: Tuple[str, ...] = ()):
+        """
+        Row mentah -> (ts_ms, values, flags) per pembacaan, run deadband di-expand.
+        device: hanya satu device; exclude: semua device kecuali yang disebut.
+        """
+        config = BLOCK_SERIES[sensor]
+        if config['json_column']:
+            value_sql = [f"JSON_EXTRACT({config['json_column']}, '$.{name}')" for name in config['metrics']]
+            flag_sql = [f"JSON_EXTRACT({config['json_column']}, '$.{name}') = 'ON'" for name in config['flags']]
+        else:
+            value_sql, flag_sql = list(config['metrics']), []
+
+        conditions = [config['where']]
+        params = []
+        if device is not None:
+            conditions.append(f'{device_id_sql(sensor)} = ?')
+            params.append(device)
+        if exclude:
+            conditions.append(f"{device_id_sql(sensor)} NOT IN ({', '.join('?' * len(exclude))})")
+            params.extend(exclude)
+        if start_ms is not None:
+            conditions.append('ts_ms >= ?')
+            params.append(start_ms)
+        if end_ms is not None:
+            conditions.append('ts_ms < ?')
+            params.append(end_ms)
+
+        cursor = self.conn.execute(f'''
+            SELECT ts_ms, status = 'success', {', '.join(value_sql + flag_sql)},
+                   valid_until_ms, repeat_count
+            FROM {config['table']}
+            WHERE {' AND '.join(conditions)}
+            ORDER BY ts_ms ASC
+        ''', params)
+
+        n_metrics = len(config['metrics'])
+        ts_ms, rows = [], []
+        for row in cursor:
+            sample = row[1:-2]
+            for reading_ms in expand_run(row[0], row[-2], row[-1]):
+                ts_ms.append(reading_ms)
+                rows.append(sample)
+
+        ts_array = np.array(ts_ms, dtype=np.int64)
+        if rows:
+            # None (metric kosong / row error) menjadi NaN
+            table = np.array(rows, dtype=np.float64).T
+            values = table[1:1 + n_metrics]
+            flags = np.nan_to_num(np.vstack([table[:1], table[1 + n_metrics:]])) != 0
+        else:
+            values = np.empty((n_metrics, 0), dtype=np.float64)
+            flags = np.empty((1 + len(config['flags']), 0), dtype=bool)
+
+        # Run deadband dengan device_path / slave_id sama bisa saling mengapit
+        order = np.argsort(ts_array, kind='stable')
+        return ts_array[order], values[:, order], flags[:, order]
+
+    def devices(self, sensor: str, since_ms: Optional[int] = None) -> List[str]:
+        """Device dengan row sejak since_ms, ditambah device yang sudah punya watermark"""
+        config = BLOCK_SERIES[sensor]
+        params = []
+        since_sql = ''
+        if since_ms is not None:
+            since_sql = 'AND ts_ms >= ?'
+            params.append(since_ms)
+        found = {device for (device,) in self.conn.execute(f'''
+            SELECT DISTINCT {device_id_sql(sensor)} FROM {config['table']}
+            WHERE {config['where']} {since_sql}
+        ''', params)}
+        found.update(self.watermarks(sensor))
+        return sorted(found)
+
+    # ---------- Compaction (MQTT worker) ----------
+
+    def compact_hour(self, sensor: str, device: str, hour_ms: int) -> int:
+        """Encode ulang satu jam satu device dari row (commit oleh caller); return jumlah sample"""
+        ts_ms, values, flags = self._select_rows(sensor, hour_ms, hour_ms + MS_PER_HOUR, device=device)
+        if not len(ts_ms):
+            self.conn.execute(
+                'DELETE FROM series_blocks WHERE sensor = ? AND device = ? AND hour_ms = ?',
+                (sensor, device, hour_ms)
+            )
+            return 0
+
+        self.conn.execute('''
+            INSERT OR REPLACE INTO series_blocks (sensor, device, hour_ms, count, first_ms, last_ms, data)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (sensor, device, hour_ms, len(ts_ms), int(ts_ms[0]), int(ts_ms[-1]),
+              encode_block(ts_ms, values, flags)))
+        return len(ts_ms)
+
+    def _hour_counts(self, sensor: str, device: str, start_ms: Optional[int],
+                     end_ms: int) -> Dict[int, int]:
+        """hour_ms -> jumlah pembacaan satu device di row"""
+        config = BLOCK_SERIES[sensor]
+        params = [end_ms, device]
+        extra_sql = f' AND {device_id_sql(sensor)} = ?'
+        if start_ms is not None:
+            extra_sql += ' AND ts_ms >= ?'
+            params.append(start_ms)
+        cursor = self.conn.execute(f'''
+            SELECT (ts_ms / {MS_PER_HOUR}) * {MS_PER_HOUR} AS hour_ms, SUM(1 + repeat_count)
+            FROM {config['table']}
+            WHERE {config['where']} AND ts_ms < ?{extra_sql}
+            GROUP BY hour_ms
+        ''', params)
+        return dict(cursor.fetchall())
+
+    def _set_watermark(self, sensor: str, device: str, watermark_ms: int):
+        self.conn.execute('''
+            INSERT INTO series_block_state (sensor, device, watermark_ms, updated_at)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(sensor, device) DO UPDATE SET
+                watermark_ms = MAX(watermark_ms, excluded.watermark_ms),
+                updated_at = excluded.updated_at
+        ''', (sensor, device, watermark_ms, datetime.now().isoformat()))
+
+    def compact(self, sensor: str, device: str, now_ms: Optional[int] = None,
+                deadline: Optional[float] = None) -> int:
+        """
+        Padatkan jam yang sudah tertutup untuk satu device (per jam: block +
+        watermark dalam satu transaksi). Jam terakhir di bawah watermark dicek
+        ulang: jika jumlah pembacaan di row berbeda dari block (data terlambat),
+        block di-encode ulang.
+        deadline (time.monotonic()): berhenti di antara jam, progres tersimpan di watermark.
+        """
+        now_ms = now_ms if now_ms is not None else site_now_ms()
+        closed_ms = _hour(now_ms - BLOCK_COMPACT_DELAY * MS_PER_SECOND)
+        watermark = self.watermark(sensor, device)
+        compacted = 0
+
+        if watermark is not None:
+            recheck_start = watermark - BLOCK_RECHECK_HOURS * MS_PER_HOUR
+            row_counts = self._hour_counts(sensor, device, recheck_start, watermark)
+            block_counts = dict(self.conn.execute('''
+                SELECT hour_ms, count FROM series_blocks
+                WHERE sensor = ? AND device = ? AND hour_ms >= ? AND hour_ms < ?
+            ''', (sensor, device, recheck_start, watermark)).fetchall())
+            for hour_ms, count in sorted(row_counts.items()):
+                if block_counts.get(hour_ms) != count:
+                    if self._expired(deadline):
+                        return compacted
+                    self.compact_hour(sensor, device, hour_ms)
+                    self.conn.commit()
+                    compacted += 1
+                    self._hours += 1
+
+        if watermark is None or watermark < closed_ms:
+            for hour_ms in sorted(self._hour_counts(sensor, device, watermark, closed_ms)):
+                if self._expired(deadline):
+                    return compacted
+                self.compact_hour(sensor, device, hour_ms)
+                self._set_watermark(sensor, device, hour_ms + MS_PER_HOUR)
+                self.conn.commit()
+                compacted += 1
+                self._hours += 1
+            self._set_watermark(sensor, device, closed_ms)
+            self.conn.commit()
+        return compacted
+
+    def compact_all(self, now_ms: Optional[int] = None,
+                    deadline: Optional[float] = None) -> Dict[str, Dict[str, int]]:
+        """sensor -> device -> jumlah jam yang dipadatkan (finished=False jika deadline lewat)"""
+        self.finished = True
+        self._hours = 0
+        compacted = {}
+        for sensor in BLOCK_SERIES:
+            if self._expired(deadline):
+                break
+            watermarks = self.watermarks(sensor)
+            # Device baru cukup dicari di row sekitar watermark terlama
+            since_ms = None
+            if watermarks:
+                since_ms = min(watermarks.values()) - BLOCK_RECHECK_HOURS * MS_PER_HOUR
+            compacted[sensor] = {}
+            for device in self.devices(sensor, since_ms):
+                compacted[sensor][device] = self.compact(sensor, device, now_ms, deadline)
+                if not self.finished:
+                    break
+        return compacted
+
+    # ---------- Reader ----------
+
+    def _read_blocks(self, sensor: str, device: str, start_ms: Optional[int],
+                     block_end: int, parts: List[Tuple]):
+        params = [sensor, device, block_end]
+        start_sql = ''
+        if start_ms is not None:
+            start_sql = 'AND hour_ms >= ?'
+            params.append(_hour(start_ms))
+        cursor = self.conn.execute(f'''
+            SELECT data FROM series_blocks
+            WHERE sensor = ? AND device = ? AND hour_ms < ? {start_sql}
+            ORDER BY hour_ms ASC
+        ''', params)
+        for (data,) in cursor:
+            ts_ms, values, flags = decode_block(data)
+            mask = ts_ms < block_end
+            if start_ms is not None:
+                mask &= ts_ms >= start_ms
+            parts.append((ts_ms[mask], values[:, mask], flags[:, mask]))
+
+    def read(self, sensor: str, start_ms: Optional[int] = None,
+             end_ms: Optional[int] = None, device: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Series [start_ms, end_ms) sebagai NumPy array: ts_ms, success, satu array per
+        metric dan flag. Per device: block untuk jam < watermark device, row untuk
+        sisanya; hasil semua device digabung urut ts_ms. device: hanya satu device.
+        """
+        config = BLOCK_SERIES[sensor]
+        watermarks = self.watermarks(sensor)
+        parts = []
+
+        if device is None:
+            targets = sorted(watermarks.items())
+        else:
+            targets = [(device, watermarks.get(device))]
+
+        for target, watermark in targets:
+            if watermark is not None and (start_ms is None or start_ms < watermark):
+                self._read_blocks(sensor, target, start_ms,
+                                  watermark if end_ms is None else min(end_ms, watermark), parts)
+                rows_start = watermark if start_ms is None else max(start_ms, watermark)
+            else:
+                rows_start = start_ms
+            if end_ms is None or rows_start is None or rows_start < end_ms:
+                parts.append(self._select_rows(sensor, rows_start, end_ms, device=target))
+
+        if device is None:
+            # Device yang belum pernah dipadatkan: seluruhnya dari row
+            parts.append(self._select_rows(sensor, start_ms, end_ms, exclude=tuple(watermarks)))
+
+        if not parts:
+            parts.append((np.empty(0, dtype=np.int64),
+                          np.empty((len(config['metrics']), 0), dtype=np.float64),
+                          np.empty((1 + len(config['flags']), 0), dtype=bool)))
+        ts_ms = np.concatenate([part[0] for part in parts])
+        values = np.concatenate([part[1] for part in parts], axis=1)
+        flags = np.concatenate([part[2] for part in parts], axis=1)
+        if len(parts) > 1:
+            order = np.argsort(ts_ms, kind='stable')
+            ts_ms, values, flags = ts_ms[order], values[:, order], flags[:, order]
+
+        series = {'ts_ms': ts_ms, 'success': flags[0]}
+        for index, name in enumerate(config['metrics']):
+            series[name] = values[index]
+        for index, name in enumerate(config['flags'], 1):
+            series[name] = flags[index]
+        return series
+
+    def size(self, sensor: Optional[str] = None) -> Tuple[int, int]:
+        """(jumlah sample, bytes BLOB) untuk sensor (semua sensor jika None)"""
+        sql = 'SELECT COALESCE(SUM(count), 0), COALESCE(SUM(LENGTH(data)), 0) FROM series_blocks'
+        if sensor:
+            return self.conn.execute(sql + ' WHERE sensor = ?', (sensor,)).fetchone()
+        return self.conn.execute(sql).fetchone()
+
+# ---------- Aggregation (NumPy) ----------
+
+def aggregate_blocks(conn: sqlite3.Connection, sensor: str, metric: str, bucket_ms: int,
+                     aggs: List[str], start_ms: Optional[int] = None,
+                     end_ms: Optional[int] = None, columnar: bool = False) -> Dict[str, Any]:
+    """Setara aggregation.aggregate(), dihitung vectorized dari block (columnar: array NumPy)"""
+    from aggregation import PERCENTILE_PATTERN, MAX_BUCKETS
+
+    config = BLOCK_SERIES.get(sensor)
+    if config is None:
+        raise ValueError(f'Sensor not available in block store: {sensor}')
+    if metric not in config['metrics']:
+        raise ValueError(f'Invalid metric for {sensor}: {metric}')
+    if start_ms is not None and end_ms is not None:
+        if end_ms <= start_ms:
+            raise ValueError('end must be after start')
+        if (end_ms - start_ms) // bucket_ms > MAX_BUCKETS:
+            raise ValueError(f'Too many buckets (max {MAX_BUCKETS}), use a larger bucket')
+
+    series = BlockStore(conn).read(sensor, start_ms, end_ms)
+    values = series[metric]
+    mask = series['success'] & ~np.isnan(values)
+    ts_ms, values = series['ts_ms'][mask], values[mask]
+
+    results = {'bucket_ms': np.array([], dtype=np.int64)}
+    results.update((name, np.array([])) for name in aggs)
+    if len(ts_ms):
+        bucket_keys = (ts_ms // bucket_ms) * bucket_ms
+        starts = np.flatnonzero(np.r_[True, bucket_keys[1:] != bucket_keys[:-1]])
+        ends = np.r_[starts[1:], len(ts_ms)]
+        results['bucket_ms'] = bucket_keys[starts]
+        for name in aggs:
+            if name == 'count':
+                results[name] = ends - starts
+            elif name == 'sum':
+                results[name] = np.add.reduceat(values, starts)
+            elif name == 'avg':
+                results[name] = np.add.reduceat(values, starts) / (ends - starts)
+            elif name == 'min':
+                results[name] = np.minimum.reduceat(values, starts)
+            elif name == 'max':
+                results[name] = np.maximum.reduceat(values, starts)
+            elif name == 'first':
+                results[name] = values[starts]
+            elif name == 'last':
+                results[name] = values[ends - 1]
+            else:
+                p = float(PERCENTILE_PATTERN.match(name).group(1))
+                results[name] = np.array([np.percentile(values[start:end], p)
+                                          for start, end in zip(starts, ends)])
+
+    result = {
+        'sensor': sensor,
+        'metric': metric,
+        'bucket_ms': bucket_ms,
+        'aggs': aggs,
+        'source': 'blocks',
+    }
+    if columnar:
+        result['columns'] = results
+        return result
+
+    columns = {name: results[name].tolist() for name in aggs}
+    buckets = []
+    for position, key in enumerate(results['bucket_ms'].tolist()):
+        bucket = {'bucket_start': from_epoch_ms(key)}
+        for name in aggs:
+            bucket[name] = columns[name][position]
+        buckets.append(bucket)
+
+    result['buckets'] = buckets
+    return result
+
+# ---------- Benchmark ----------
+
+def _table_bytes(source_path: str, sensor: str, blocks: bool) -> int:
+    """Ukuran file database (VACUUM) yang hanya berisi row atau block sensor"""
+    import tempfile
+    config = BLOCK_SERIES[sensor]
+    table = 'series_blocks' if blocks else config['table']
+    where = 'sensor = ?' if blocks else config['where']
+    params = (sensor,) if blocks else ()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'bench.db')
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute('ATTACH DATABASE ? AS source', (source_path,))
+            schema = conn.execute(
+                "SELECT sql FROM source.sqlite_master WHERE tbl_name = ? AND type IN ('table', 'index') AND sql IS NOT NULL",
+                (table,)
+            ).fetchall()
+            for (sql,) in schema:
+                conn.execute(sql)
+            conn.execute(f'INSERT INTO main.{table} SELECT * FROM source.{table} WHERE {where}', params)
+            conn.commit()
+            conn.execute('DETACH DATABASE source')
+            conn.execute('VACUUM')
+            page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+            page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        finally:
+            conn.close()
+    return page_count * page_size
+
+def benchmark(db_path: str, sensors: Optional[List[str]] = None, repeat: int = 3) -> List[Dict[str, Any]]:
+    """
+    Bandingkan row vs block per sensor (semua device): bytes per sample (file database hasil
+    VACUUM, termasuk index) dan waktu scan seluruh series (SELECT JSON_EXTRACT
+    semua metric vs decode block, cache dingin dan hangat).
+    """
+    import time
+
+    conn = sqlite3.connect(db_path)
+    try:
+        store = BlockStore(conn)
+        results = []
+        for sensor in sensors or list(BLOCK_SERIES):
+            watermarks = store.watermarks(sensor)
+            if not watermarks:
+                logger.warning(f"No blocks for {sensor}, run --compact first")
+                continue
+            # Range yang sudah dipadatkan untuk semua device
+            watermark = min(watermarks.values())
+            samples, blob_bytes = store.size(sensor)
+            if not samples:
+                continue
+
+            timings = {'rows': [], 'blocks_cold': [], 'blocks_warm': []}
+            for _ in range(repeat):
+                started = time.perf_counter()
+                ts_ms, _, _ = store._select_rows(sensor, None, watermark)
+                timings['rows'].append(time.perf_counter() - started)
+
+                decode_block.cache_clear()
+                started = time.perf_counter()
+                store.read(sensor, None, watermark)
+                timings['blocks_cold'].append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                store.read(sensor, None, watermark)
+                timings['blocks_warm'].append(time.perf_counter() - started)
+
+            rows_bytes = _table_bytes(db_path, sensor, blocks=False)
+            block_file_bytes = _table_bytes(db_path, sensor, blocks=True)
+            results.append({
+                'sensor': sensor,
+                'devices': len(watermarks),
+                'samples': samples,
+                'row_samples': len(ts_ms),
+                'rows_bytes_per_sample': round(rows_bytes / samples, 2),
+                'blocks_bytes_per_sample': round(block_file_bytes / samples, 2),
+                'blob_bytes_per_sample': round(blob_bytes / samples, 3),
+                'rows_scan_ms': round(min(timings['rows']) * 1000, 1),
+                'blocks_cold_scan_ms': round(min(timings['blocks_cold']) * 1000, 1),
+                'blocks_warm_scan_ms': round(min(timings['blocks_warm']) * 1000, 1),
+            })
+        return results
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    import sys
+    import json
+    import argparse
+    from shards import shard_path
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+
+    parser = argparse.ArgumentParser(description='Block store compaction dan benchmark')
+    parser.add_argument('--site', help='Site (default site jika kosong)')
+    parser.add_argument('--db', help='Path database (default: shard untuk --site)')
+    parser.add_argument('--compact', action='store_true', help='Padatkan semua jam yang sudah tertutup')
+    parser.add_argument('--benchmark', action='store_true', help='Bandingkan ukuran dan scan row vs block')
+    parser.add_argument('--repeat', type=int, default=3, help='Pengulangan scan benchmark (ambil tercepat)')
+    args = parser.parse_args()
+
+    db_path = args.db or shard_path(args.site)
+    if args.compact:
+        conn = sqlite3.connect(db_path)
+        try:
+            compacted = BlockStore(conn).compact_all()
+            conn.commit()
+        finally:
+            conn.close()
+        print(f"✅ Compacted hours: {compacted}")
+    if args.benchmark:
+        print(json.dumps(benchmark(db_path, repeat=args.repeat), indent=2))
+    if not (args.compact or args.benchmark):
+        parser.print_help()
+        sys.exit(1)
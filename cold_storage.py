@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Cold Storage Tier
+Hari yang sudah lewat masa retensi dipindahkan dari SQLite ke Parquet
+(kompresi zstd, satu partisi per sensor per hari) sebelum dihapus dari tabel hot.
+
+Layout: <COLD_STORAGE_DIR>/<site>/<sensor>/date=YYYY-MM-DD/part.parquet
+
+Tabel cold_storage_state menyimpan watermark per sensor: row dengan ts_ms di bawah
+watermark hanya ada di cold tier, row di atasnya hanya di SQLite. Archive + delete
++ update watermark dilakukan per hari sehingga reader selalu melihat data lengkap
+tanpa duplikasi.
+
+Kolom run deadband (repeat_count, valid_until_ms) ikut di-archive; partisi lama
+tanpa kolom tersebut dibaca sebagai run satu pembacaan.
+"""
+
+import os
+import glob
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Iterator, Tuple
+
+from epoch_time import to_epoch_ms, from_epoch_ms, day_start_ms, site_now_ms, MS_PER_DAY
+from shards import validate_site
+
+# Import untuk Parquet (optional)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COLD_STORAGE_DIR = os.environ.get('COLD_STORAGE_DIR', '/app/data/cold')
+COLD_COMPRESSION = os.environ.get('COLD_COMPRESSION', 'zstd')
+
+_PZEM_COLUMNS = [
+    ('id', 'int64'), ('timestamp', 'string'), ('ts_ms', 'int64'), ('device_type', 'string'),
+    ('device_path', 'string'), ('slave_id', 'int64'), ('raw_registers', 'string'),
+    ('register_count', 'int64'), ('status', 'string'), ('error_message', 'string'),
+    ('parsed_data', 'string'), ('received_at', 'string'),
+    ('repeat_count', 'int64'), ('valid_until_ms', 'int64'),
+]
+
+# Nilai parsed_data juga disimpan sebagai kolom typed supaya reader tidak perlu json.loads
+_PZEM_METRICS = [
+    ('voltage_v', 'float64'), ('current_a', 'float64'),
+    ('power_w', 'float64'), ('energy_kwh', 'float64'),
+]
+
+COLD_SENSORS = {
+    'pzem016': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-016_AC'",
+        'columns': _PZEM_COLUMNS,
+        'metrics': _PZEM_METRICS,
+    },
+    'pzem017': {
+        'table': 'pzem_data',
+        'where': "device_type = 'PZEM-017_DC'",
+        'columns': _PZEM_COLUMNS,
+        'metrics': _PZEM_METRICS,
+    },
+    'dht22': {
+        'table': 'dht22_data',
+        'where': '1 = 1',
+        'columns': [
+            ('id', 'int64'), ('timestamp', 'string'), ('ts_ms', 'int64'), ('temperature', 'float64'),
+            ('humidity', 'float64'), ('gpio_pin', 'int64'), ('library', 'string'),
+            ('status', 'string'), ('error_message', 'string'), ('received_at', 'string'),
+            ('repeat_count', 'int64'), ('valid_until_ms', 'int64'),
+        ],
+        'metrics': [],
+    },
+    'system': {
+        'table': 'system_data',
+        'where': '1 = 1',
+        'columns': [
+            ('id', 'int64'), ('timestamp', 'string'), ('ts_ms', 'int64'), ('ram_usage_percent', 'float64'),
+            ('storage_usage_percent', 'float64'), ('cpu_usage_percent', 'float64'),
+            ('cpu_temperature', 'float64'), ('storage_total_gb', 'float64'),
+            ('storage_used_gb', 'float64'), ('storage_free_gb', 'float64'),
+            ('status', 'string'), ('error_message', 'string'), ('received_at', 'string'),
+            ('repeat_count', 'int64'), ('valid_until_ms', 'int64'),
+        ],
+        'metrics': [],
+    },
+}
+
+# Kolom yang belum ada di partisi lama (semua int64, dibaca sebagai null)
+RUN_COLUMNS = ('repeat_count', 'valid_until_ms')
+
+def get_watermark(conn: sqlite3.Connection, sensor: str) -> Optional[int]:
+    """Batas cold/hot untuk sensor (None jika belum pernah di-archive)"""
+    row = conn.execute(
+        'SELECT watermark_ms FROM cold_storage_state WHERE sensor = ?', (sensor,)
+    ).fetchone()
+    return row[0] if row else None
+
+class ColdStorage:
+    """Writer & reader Parquet per site"""
+
+    def __init__(self, site: Optional[str] = None, base_dir: str = COLD_STORAGE_DIR):
+        self.site = validate_site(site)
+        self.base_dir = os.path.join(base_dir, self.site)
+
+    # ---------- Layout ----------
+
+    def partition_path(self, sensor: str, day_ms: int) -> str:
+        day = from_epoch_ms(day_ms)[:10]
+        return os.path.join(self.base_dir, sensor, f'date={day}', 'part.parquet')
+
+    def list_partitions(self, sensor: str, start_ms: Optional[int] = None,
+                        end_ms: Optional[int] = None, descending: bool = False) -> List[Tuple[int, str]]:
+        """Partisi (day_ms, path) yang overlap dengan [start_ms, end_ms), dipangkas dari nama direktori"""
+        partitions = []
+        for path in glob.glob(os.path.join(self.base_dir, sensor, 'date=*', 'part.parquet')):
+            day = os.path.basename(os.path.dirname(path))[len('date='):]
+            day_ms = to_epoch_ms(day)
+            if day_ms is None:
+                continue
+            if start_ms is not None and day_ms + MS_PER_DAY <= start_ms:
+                continue
+            if end_ms is not None and day_ms >= end_ms:
+                continue
+            partitions.append((day_ms, path))
+        partitions.sort(reverse=descending)
+        return partitions
+
+    # ---------- Writer ----------
+
+    def _schema(self, sensor: str):
+        config = COLD_SENSORS[sensor]
+        return pa.schema([
+            (name, getattr(pa, arrow_type)())
+            for name, arrow_type in config['columns'] + config['metrics']
+        ])
+
+    def archive_day(self, conn: sqlite3.Connection, sensor: str, day_ms: int) -> int:
+        """
+        Tulis satu hari sensor ke Parquet (replace atomic), return jumlah row baru.
+        Jika partisi sudah ada (data terlambat di bawah watermark), row lama digabung
+        dan di-dedupe berdasarkan id.
+        """
+        config = COLD_SENSORS[sensor]
+        select_columns = [name for name, _ in config['columns']]
+        select_columns += [f"JSON_EXTRACT(parsed_data, '$.{name}')" for name, _ in config['metrics']]
+
+        cursor = conn.execute(f'''
+            SELECT {', '.join(select_columns)}
+            FROM {config['table']}
+            WHERE {config['where']} AND ts_ms >= ? AND ts_ms < ?
+            ORDER BY ts_ms ASC
+        ''', (day_ms, day_ms + MS_PER_DAY))
+        rows = cursor.fetchall()
+        if not rows:
+            return 0
+
+        schema = self._schema(sensor)
+        columns = list(zip(*rows))
+        table = pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(columns, schema)],
+            schema=schema
+        )
+
+        path = self.partition_path(sensor, day_ms)
+        if os.path.exists(path):
+            import pyarrow.compute as pc
+            existing = self._read_partition(path, schema.names, None, None).cast(schema)
+            keep = pc.invert(pc.is_in(existing['id'], value_set=table['id']))
+            table = pa.concat_tables([existing.filter(keep), table]).sort_by('ts_ms')
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        pq.write_table(table, tmp_path, compression=COLD_COMPRESSION)
+        os.replace(tmp_path, path)
+        return len(rows)
+
+    def tier_closed_days(self, conn: sqlite3.Connection, days_to_keep: int = 30,
+                         now_ms: Optional[int] = None) -> Dict[str, int]:
+        """
+        Pindahkan hari yang sudah tertutup dan lebih tua dari days_to_keep ke Parquet,
+        lalu hapus dari SQLite. Diproses per hari: archive -> delete + watermark dalam
+        satu transaksi, sehingga aman diulang jika proses terhenti di tengah.
+        now_ms menggantikan jam sekarang (soak test dengan waktu dipercepat).
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError('pyarrow tidak tersedia, cold storage tidak bisa dipakai')
+
+        now_ms = now_ms if now_ms is not None else site_now_ms()
+        cutoff_ms = day_start_ms(now_ms - days_to_keep * MS_PER_DAY)
+        archived = {}
+
+        for sensor, config in COLD_SENSORS.items():
+            row = conn.execute(f'''
+                SELECT MIN(ts_ms) FROM {config['table']}
+                WHERE {config['where']} AND ts_ms < ?
+            ''', (cutoff_ms,)).fetchone()
+            if row[0] is None:
+                continue
+
+            total = 0
+            for day_ms in range(day_start_ms(row[0]), cutoff_ms, MS_PER_DAY):
+                count = self.archive_day(conn, sensor, day_ms)
+
+                conn.execute(f'''
+                    DELETE FROM {config['table']}
+                    WHERE {config['where']} AND ts_ms >= ? AND ts_ms < ?
+                ''', (day_ms, day_ms + MS_PER_DAY))
+                conn.execute('''
+                    INSERT INTO cold_storage_state (sensor, watermark_ms, archived_rows, updated_at)
+                    VALUES (?, ?, ?, ?)
+                    ON CONFLICT(sensor) DO UPDATE SET
+                        watermark_ms = MAX(watermark_ms, excluded.watermark_ms),
+                        archived_rows = archived_rows + excluded.archived_rows,
+                        updated_at = excluded.updated_at
+                ''', (sensor, day_ms + MS_PER_DAY, count, datetime.now().isoformat()))
+                conn.commit()
+                total += count
+
+            archived[sensor] = total
+            logger.info(f"Archived {total} {sensor} rows to cold storage ({self.base_dir})")
+
+        return archived
+
+    # ---------- Reader ----------
+
+    def _read_partition(self, path: str, columns: List[str], start_ms: Optional[int],
+                        end_ms: Optional[int], filters: Optional[List[tuple]] = None):
+        predicates = list(filters or [])
+        if start_ms is not None:
+            predicates.append(('ts_ms', '>=', start_ms))
+        if end_ms is not None:
+            predicates.append(('ts_ms', '<', end_ms))
+
+        available = set(pq.ParquetFile(path).schema_arrow.names)
+        missing = [name for name in columns if name not in available and name in RUN_COLUMNS]
+        table = pq.read_table(path, columns=[name for name in columns if name not in missing],
+                              filters=predicates or None)
+        for name in missing:
+            table = table.append_column(name, pa.nulls(table.num_rows, pa.int64()))
+        return table.select(columns)
+
+    @staticmethod
+    def _weights(table):
+        """Jumlah pembacaan per row (1 + repeat_count)"""
+        import pyarrow.compute as pc
+        return pc.add(pc.fill_null(table['repeat_count'], 0), 1)
+
+    def count(self, sensor: str, start_ms: Optional[int] = None, end_ms: Optional[int] = None,
+              filters: Optional[List[tuple]] = None) -> int:
+        """Jumlah pembacaan (row run deadband dihitung 1 + repeat_count)"""
+        if not PYARROW_AVAILABLE:
+            return 0
+
+        import pyarrow.compute as pc
+        total = 0
+        for day_ms, path in self.list_partitions(sensor, start_ms, end_ms):
+            table = self._read_partition(path, ['repeat_count'], start_ms, end_ms, filters)
+            if table.num_rows:
+                total += pc.sum(self._weights(table)).as_py()
+        return total
+
+    def iter_rows(self, sensor: str, columns: List[str], start_ms: Optional[int] = None,
+                  end_ms: Optional[int] = None, descending: bool = False, offset: int = 0,
+                  limit: Optional[int] = None, filters: Optional[List[tuple]] = None) -> Iterator[tuple]:
+        """Row tuple (urut ts_ms) dari partisi yang relevan saja"""
+        if not PYARROW_AVAILABLE or (limit is not None and limit <= 0):
+            return
+
+        read_columns = list(dict.fromkeys(columns + ['ts_ms']))
+        emitted = 0
+        for day_ms, path in self.list_partitions(sensor, start_ms, end_ms, descending):
+            table = self._read_partition(path, read_columns, start_ms, end_ms, filters)
+            if offset >= table.num_rows:
+                offset -= table.num_rows
+                continue
+
+            table = table.sort_by([('ts_ms', 'descending' if descending else 'ascending')])
+            table = table.slice(offset)
+            offset = 0
+            if limit is not None:
+                table = table.slice(0, limit - emitted)
+
+            data = table.select(columns).to_pydict()
+            for row in zip(*(data[name] for name in columns)):
+                yield row
+            emitted += table.num_rows
+            if limit is not None and emitted >= limit:
+                return
+
+    def daily_sums(self, sensor: str, metric: str, start_ms: Optional[int] = None,
+                   end_ms: Optional[int] = None,
+                   filters: Optional[List[tuple]] = None) -> List[Tuple[int, float]]:
+        """SUM metric per hari (satu partisi = satu hari), diberi bobot run deadband"""
+        if not PYARROW_AVAILABLE:
+            return []
+
+        import pyarrow.compute as pc
+        result = []
+        for day_ms, path in self.list_partitions(sensor, start_ms, end_ms):
+            table = self._read_partition(path, [metric, 'repeat_count'], start_ms, end_ms, filters)
+            total = pc.sum(pc.multiply(table[metric], self._weights(table))).as_py() if table.num_rows else None
+            result.append((day_ms, total or 0))
+        return result
+
+def cold_range(conn: sqlite3.Connection, sensor: str, start_ms: Optional[int],
+               end_ms: Optional[int]) -> Optional[Tuple[Optional[int], int]]:
+    """Bagian [start_ms, end_ms) yang ada di cold tier, None jika tidak ada"""
+    try:
+        watermark = get_watermark(conn, sensor)
+    except sqlite3.OperationalError:
+        return None
+    if watermark is None or (start_ms is not None and start_ms >= watermark):
+        return None
+    cold_end = watermark if end_ms is None else min(end_ms, watermark)
+    return start_ms, cold_end
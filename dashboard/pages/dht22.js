@@ -86,11 +86,10 @@ class DHT22Page {
         console.log('Initializing DHT22 page...');
         
         try {
-            // Load current conditions
-            await this.loadCurrentConditions();
-            
-            // Load key metrics
-            await this.loadKeyMetrics();
+            // Kondisi terkini & statistik hari ini dari satu request batch
+            const panels = this.fetchPanels();
+            await this.loadCurrentConditions(panels);
+            await this.loadKeyMetrics(panels);
             
             // Initialize data table
             await this.initializeDataTable();
@@ -106,17 +105,57 @@ class DHT22Page {
         }
     }
     
-    async loadCurrentConditions() {
+    // Pembacaan terakhir (dashboard_summary) dan statistik hari ini (aggregate dari rollup per jam)
+    // dalam satu request /api/batch, tanpa download row mentah
+    async fetchPanels() {
+        const aggregatePanel = metric => ({
+            id: metric,
+            path: '/api/aggregate',
+            params: {
+                sensor: this.sensorType,
+                metric: metric,
+                bucket: '1d',
+                agg: 'avg,min,max,count',
+                start: this.getTodayDate()
+            }
+        });
+        
+        const result = await window.sensorApp.components.api.getBatch([
+            { id: 'summary', path: '/api/dashboard/summary' },
+            aggregatePanel('temperature'),
+            aggregatePanel('humidity')
+        ]);
+        if (!result.success) {
+            throw new Error(result.error || 'Failed to load DHT22 data');
+        }
+        
+        const response = id => {
+            const panel = result.data.panels[id];
+            return panel && panel.response && panel.response.success ? panel.response.data : null;
+        };
+        const todayBucket = id => {
+            const data = response(id);
+            return data && data.buckets.length > 0 ? data.buckets[data.buckets.length - 1] : null;
+        };
+        const summary = response('summary');
+        
+        return {
+            latest: summary ? summary.latest.dht22 : null,
+            temperature: todayBucket('temperature'),
+            humidity: todayBucket('humidity')
+        };
+    }
+    
+    async loadCurrentConditions(panels = null) {
         try {
             const conditionsContainer = document.getElementById('currentConditions');
             if (!conditionsContainer) return;
             
             if (window.sensorApp && window.sensorApp.components.api) {
-                const latestResult = await window.sensorApp.components.api.getLatestData(1);
+                const { latest } = await (panels || this.fetchPanels());
                 
-                if (latestResult.success && latestResult.data.dht22 && latestResult.data.dht22.length > 0) {
-                    const latestData = latestResult.data.dht22[0];
-                    this.renderCurrentConditions(conditionsContainer, latestData);
+                if (latest) {
+                    this.renderCurrentConditions(conditionsContainer, latest);
                 } else {
                     this.renderNoConditions(conditionsContainer);
                 }
@@ -266,19 +305,17 @@ class DHT22Page {
         `;
     }
     
-    async loadKeyMetrics() {
+    async loadKeyMetrics(panels = null) {
         try {
             const metricsContainer = document.getElementById('keyMetrics');
             if (!metricsContainer) return;
             
             if (window.sensorApp && window.sensorApp.components.api) {
-                // Get recent data for statistics
-                const recentResult = await window.sensorApp.components.api.getSensorData(this.sensorType, {
-                    limit: 100 // Last 100 readings for statistics
-                });
+                // Statistik dihitung server dari rollup per jam
+                const { latest, temperature, humidity } = await (panels || this.fetchPanels());
                 
-                if (recentResult.success && recentResult.data.records && recentResult.data.records.length > 0) {
-                    this.renderKeyMetrics(metricsContainer, recentResult.data.records);
+                if (latest && temperature && humidity) {
+                    this.renderKeyMetrics(metricsContainer, latest, temperature, humidity);
                 } else {
                     this.renderNoMetrics(metricsContainer);
                 }
@@ -289,22 +326,7 @@ class DHT22Page {
         }
     }
     
-    renderKeyMetrics(container, records) {
-        const validRecords = records.filter(r => r.status === 'success');
-        
-        if (validRecords.length === 0) {
-            this.renderNoMetrics(container);
-            return;
-        }
-        
-        const temperatures = validRecords.map(r => r.temperature).filter(t => t != null);
-        const humidities = validRecords.map(r => r.humidity).filter(h => h != null);
-        
-        const tempStats = this.calculateStats(temperatures);
-        const humidityStats = this.calculateStats(humidities);
-        
-        const latest = validRecords[0];
-        
+    renderKeyMetrics(container, latest, tempStats, humidityStats) {
         container.innerHTML = `
             <div class="metrics-grid">
                 <div class="metric-card environment online">
@@ -331,7 +353,7 @@ class DHT22Page {
                         <span>Avg Temperature</span>
                     </div>
                     <div class="metric-value">${this.formatNumber(tempStats.avg, 1)}°C</div>
-                    <div class="metric-subtitle">Recent Average</div>
+                    <div class="metric-subtitle">Today Average</div>
                 </div>
                 
                 <div class="metric-card environment online">
@@ -340,7 +362,7 @@ class DHT22Page {
                         <span>Avg Humidity</span>
                     </div>
                     <div class="metric-value">${this.formatNumber(humidityStats.avg, 1)}%</div>
-                    <div class="metric-subtitle">Recent Average</div>
+                    <div class="metric-subtitle">Today Average</div>
                 </div>
                 
                 <div class="metric-card environment online">
@@ -349,7 +371,7 @@ class DHT22Page {
                         <span>Max Temperature</span>
                     </div>
                     <div class="metric-value">${this.formatNumber(tempStats.max, 1)}°C</div>
-                    <div class="metric-subtitle">Recent Peak</div>
+                    <div class="metric-subtitle">Today Peak</div>
                 </div>
                 
                 <div class="metric-card environment online">
@@ -358,28 +380,18 @@ class DHT22Page {
                         <span>Min Temperature</span>
                     </div>
                     <div class="metric-value">${this.formatNumber(tempStats.min, 1)}°C</div>
-                    <div class="metric-subtitle">Recent Low</div>
+                    <div class="metric-subtitle">Today Low</div>
                 </div>
             </div>
             
             <div class="last-updated">
                 <i class="fas fa-clock"></i>
-                Statistics based on last ${validRecords.length} readings
-                <span class="data-range">(${this.getTimeAgo(validRecords[validRecords.length - 1].timestamp)} - now)</span>
+                Statistics based on ${tempStats.count} readings today
+                <span class="data-range">(last reading ${this.getTimeAgo(latest.timestamp)})</span>
             </div>
         `;
     }
     
-    calculateStats(values) {
-        if (values.length === 0) return { min: 0, max: 0, avg: 0 };
-        
-        const min = Math.min(...values);
-        const max = Math.max(...values);
-        const avg = values.reduce((a, b) => a + b, 0) / values.length;
-        
-        return { min, max, avg };
-    }
-    
     renderNoMetrics(container) {
         container.innerHTML = `
             <div class="no-metrics">
@@ -461,6 +473,13 @@ class DHT22Page {
         return 'fa-tint';
     }
     
+    // Tanggal lokal browser (jam dinding site); toISOString() memberi tanggal UTC
+    getTodayDate() {
+        const now = new Date();
+        const pad = value => String(value).padStart(2, '0');
+        return `${now.getFullYear()}-${pad(now.getMonth() + 1)}-${pad(now.getDate())}`;
+    }
+    
     getTimeAgo(timestamp) {
         const now = new Date();
         const time = new Date(timestamp);
@@ -81,6 +81,14 @@ class APIUtils {
         if (options.endDate) params.append('end_date', options.endDate);
         if (options.page) params.append('page', options.page);
         if (options.limit) params.append('limit', options.limit || 50);
+        if (options.maxPoints) params.append('max_points', options.maxPoints);
+        if (options.metric) params.append('metric', options.metric);
+        // Server-side filter: status ('failed' / daftar status), alarm ('any' / flag),
+        // filters (['power_w>100', ...]) dan q (cari di error_message)
+        if (options.status) params.append('status', options.status);
+        if (options.alarm) params.append('alarm', options.alarm);
+        (options.filters || []).forEach(filter => params.append('filter', filter));
+        if (options.q) params.append('q', options.q);
         
         const endpoint = `/data/${sensorType}?${params.toString()}`;
         return await this.apiCall(endpoint);
@@ -91,6 +99,7 @@ class APIUtils {
         
         if (options.startDate) params.append('start_date', options.startDate);
         if (options.endDate) params.append('end_date', options.endDate);
+        if (options.source) params.append('source', options.source); // 'snapshot' untuk export berat
         params.append('format', 'excel');
         
         const endpoint = `/export/${sensorType}?${params.toString()}`;
@@ -115,6 +124,109 @@ class APIUtils {
         }
     }
     
+    // Satu workbook berisi semua sensor + ROI, dibaca dari satu snapshot
+    async exportSiteReport(options = {}) {
+        const params = new URLSearchParams();
+        
+        if (options.startDate) params.append('start_date', options.startDate);
+        if (options.endDate) params.append('end_date', options.endDate);
+        if (options.source) params.append('source', options.source); // 'snapshot' untuk export berat
+        if (options.site) params.append('site', options.site);
+        
+        const endpoint = `/export/report?${params.toString()}`;
+        
+        try {
+            const response = await fetch(`${this.baseURL}${endpoint}`, {
+                method: 'GET',
+                headers: {
+                    'Accept': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+                }
+            });
+            
+            if (!response.ok) {
+                throw new Error(`Export failed: ${response.statusText}`);
+            }
+            
+            return response.blob();
+            
+        } catch (error) {
+            console.error('Export Error for site report:', error);
+            throw error;
+        }
+    }
+    
+    // Aggregate per bucket dihitung di server (tanpa download row mentah)
+    async getAggregate(sensorType, metric, options = {}) {
+        const params = new URLSearchParams();
+        
+        params.append('sensor', sensorType);
+        params.append('metric', metric);
+        params.append('bucket', options.bucket || '15m');
+        params.append('agg', (options.aggs || ['avg']).join(','));
+        if (options.start) params.append('start', options.start);
+        if (options.end) params.append('end', options.end);
+        
+        const endpoint = `/aggregate?${params.toString()}`;
+        return await this.apiCall(endpoint);
+    }
+    
+    // Beberapa panel dalam satu request & satu read snapshot
+    // panels: [{ id: 'roi', path: '/api/roi/summary', params: {} }, ...]
+    async getBatch(panels, options = {}) {
+        const body = { panels, parallel: options.parallel || false };
+        if (options.site) body.site = options.site;
+        
+        return await this.apiCall('/batch', {
+            method: 'POST',
+            body: JSON.stringify(body)
+        });
+    }
+    
+    // Savings, statistik hari ini/bulan ini & nilai terakhir (materialized oleh worker)
+    async getDashboardSummary() {
+        return await this.apiCall('/dashboard/summary');
+    }
+    
+    // Event anomali dari streaming detector worker (options: sensor, metric, kind, active, limit)
+    async getAnomalies(options = {}) {
+        const params = new URLSearchParams();
+        
+        if (options.sensor) params.append('sensor', options.sensor);
+        if (options.metric) params.append('metric', options.metric);
+        if (options.kind) params.append('kind', options.kind);
+        if (options.active) params.append('active', 'true');
+        if (options.limit) params.append('limit', options.limit);
+        
+        return await this.apiCall(`/anomalies?${params.toString()}`);
+    }
+    
+    // Freshness, uptime/completeness, gap & lag ingest per device fisik (options: sensor, device, days, lagHours)
+    async getDeviceHealth(options = {}) {
+        const params = new URLSearchParams();
+        
+        if (options.sensor) params.append('sensor', options.sensor);
+        if (options.device) params.append('device', options.device);
+        if (options.days) params.append('days', options.days);
+        if (options.startDate) params.append('start_date', options.startDate);
+        if (options.endDate) params.append('end_date', options.endDate);
+        if (options.lagHours) params.append('lag_hours', options.lagHours);
+        
+        return await this.apiCall(`/health/devices?${params.toString()}`);
+    }
+    
+    // Matrix hari x jam dari rollup per jam (options: metric, agg, startDate, endDate)
+    // mis. getHeatmap('pzem017', { metric: 'energy_kwh', agg: 'delta' }) untuk generation per jam
+    async getHeatmap(sensorType, options = {}) {
+        const params = new URLSearchParams();
+        
+        if (options.metric) params.append('metric', options.metric);
+        if (options.agg) params.append('agg', options.agg);
+        if (options.startDate) params.append('start_date', options.startDate);
+        if (options.endDate) params.append('end_date', options.endDate);
+        
+        return await this.apiCall(`/heatmap/${sensorType}?${params.toString()}`);
+    }
+    
     // ============ ROI API METHODS ============
     
     async getROISummary() {
@@ -148,6 +260,7 @@ class APIUtils {
         
         if (options.startDate) params.append('start_date', options.startDate);
         if (options.endDate) params.append('end_date', options.endDate);
+        if (options.source) params.append('source', options.source); // 'snapshot' untuk export berat
         params.append('format', 'excel');
         
         const endpoint = `/roi/export?${params.toString()}`;
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Dashboard Summary (Materialized)
+Angka ringkasan dashboard (savings hari ini / bulan ini, nilai PZEM & DHT22
+terakhir, min/max suhu harian) di-maintain oleh MQTT worker di tabel
+dashboard_summary, dalam transaksi batch yang sama dengan row sensor.
+
+- Key: (period, period_start_ms, sensor, metric) dengan period 'day' (awal hari
+  UTC), 'month' (awal bulan UTC) atau 'all' (period_start_ms = 0)
+- Nilai: running count/sum/min/max + last_ts_ms/last_value (nilai terakhir
+  menurut timestamp pembacaan, bukan urutan datang)
+- Pergantian hari/bulan otomatis karena key diambil dari timestamp pembacaan;
+  pembacaan terlambat masuk ke hari/bulannya sendiri dan tidak menimpa
+  last_value yang lebih baru
+- Metric 'success' (1/0) dihitung untuk setiap pembacaan termasuk error:
+  count = jumlah pembacaan, sum = jumlah sukses, last_value = status terakhir
+
+Web API membaca summary dengan satu lookup primary key; history yang sudah di
+cold tier sebelum tabel ini ada tetap dibaca dari Parquet (covered_from_ms).
+"""
+
+import sqlite3
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Tuple
+
+from epoch_time import to_epoch_ms, MS_PER_SECOND, MS_PER_DAY
+
+# Metric per sensor yang di-maintain (selain 'success')
+SUMMARY_METRICS = {
+    'pzem016': ['energy_kwh', 'power_w', 'voltage_v', 'current_a'],
+    'pzem017': ['energy_kwh', 'power_w', 'voltage_v', 'current_a'],
+    'dht22': ['temperature', 'humidity'],
+}
+
+SUCCESS_METRIC = 'success'
+ALL_TIME_KEY = 0
+
+def month_start_ms(ts_ms: int) -> int:
+    """Epoch ms awal bulan (UTC) dari timestamp"""
+    moment = datetime.fromtimestamp(ts_ms / MS_PER_SECOND, timezone.utc)
+    return to_epoch_ms(datetime(moment.year, moment.month, 1))
+
+def period_keys(ts_ms: int) -> List[Tuple[str, int]]:
+    return [
+        ('day', ts_ms - (ts_ms % MS_PER_DAY)),
+        ('month', month_start_ms(ts_ms)),
+        ('all', ALL_TIME_KEY),
+    ]
+
+def summary_samples(sensor: str, values: Optional[Dict[str, Any]], success: bool) -> List[Tuple[str, float]]:
+    """(metric, value) yang dicatat untuk satu pembacaan"""
+    samples = [(SUCCESS_METRIC, 1.0 if success else 0.0)]
+    if success and values:
+        for metric in SUMMARY_METRICS[sensor]:
+            value = values.get(metric)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                samples.append((metric, value))
+    return samples
+
+# ---------- Maintenance (MQTT worker) ----------
+
+def update_summary(cursor: sqlite3.Cursor, sensor: str, ts_ms: int,
+                   values: Optional[Dict[str, Any]], success: bool):
+    """Upsert summary hari/bulan/all-time untuk satu pembacaan (dalam transaksi caller)"""
+    rows = []
+    samples = summary_samples(sensor, values, success)
+    for period, period_start_ms in period_keys(ts_ms):
+        for metric, value in samples:
+            rows.append((period, period_start_ms, sensor, metric, value, value, value, ts_ms, value))
+
+    # Ekspresi di SET membaca nilai lama row, jadi last_value dibandingkan dengan last_ts_ms lama
+    cursor.executemany('''
+        INSERT INTO dashboard_summary (
+            period, period_start_ms, sensor, metric, count, sum, min, max, last_ts_ms, last_value
+        ) VALUES (?, ?, ?, ?, 1, ?, ?, ?, ?, ?)
+        ON CONFLICT(period, period_start_ms, sensor, metric) DO UPDATE SET
+            count = count + 1,
+            sum = sum + excluded.sum,
+            min = MIN(min, excluded.min),
+            max = MAX(max, excluded.max),
+            last_value = CASE WHEN excluded.last_ts_ms >= last_ts_ms THEN excluded.last_value ELSE last_value END,
+            last_ts_ms = MAX(last_ts_ms, excluded.last_ts_ms)
+    ''', rows)
+
+# ---------- Reader (web API) ----------
+
+def _entry(row) -> Dict[str, Any]:
+    count, total, minimum, maximum, last_ts_ms, last_value = row
+    return {
+        'count': count,
+        'sum': total,
+        'avg': total / count if count else None,
+        'min': minimum,
+        'max': maximum,
+        'last_ts_ms': last_ts_ms,
+        'last_value': last_value,
+    }
+
+def read_summary(conn: sqlite3.Connection, now_ms: int) -> Optional[Dict[str, Dict[str, Dict[str, Any]]]]:
+    """
+    Summary hari ini, bulan ini dan all-time:
+    {'day'|'month'|'all': {sensor: {metric: {count, sum, avg, min, max, last_ts_ms, last_value}}}}.
+    None jika tabel belum ada (database/snapshot lama).
+    """
+    keys = period_keys(now_ms)
+    summary = {period: {} for period, _ in keys}
+    try:
+        cursor = conn.execute('''
+            SELECT period, sensor, metric, count, sum, min, max, last_ts_ms, last_value
+            FROM dashboard_summary
+            WHERE (period = ? AND period_start_ms = ?)
+               OR (period = ? AND period_start_ms = ?)
+               OR (period = ? AND period_start_ms = ?)
+        ''', [value for key in keys for value in key])
+    except sqlite3.OperationalError:
+        return None
+
+    for period, sensor, metric, *values in cursor:
+        summary[period].setdefault(sensor, {})[metric] = _entry(values)
+    return summary
+
+def summary_value(summary: Dict[str, Any], period: str, sensor: str, metric: str,
+                  field: str, default: Any = None) -> Any:
+    entry = summary.get(period, {}).get(sensor, {}).get(metric)
+    return entry[field] if entry else default
+
+def daily_sums(conn: sqlite3.Connection, sensor: str, metric: str,
+               start_ms: Optional[int] = None) -> Optional[List[Tuple[int, float]]]:
+    """SUM metric per hari sejak start_ms (None jika tabel belum ada)"""
+    try:
+        return conn.execute('''
+            SELECT period_start_ms, sum FROM dashboard_summary
+            WHERE period = 'day' AND period_start_ms >= ? AND sensor = ? AND metric = ?
+            ORDER BY period_start_ms ASC
+        ''', (start_ms or 0, sensor, metric)).fetchall()
+    except sqlite3.OperationalError:
+        return None
+
+def covered_from(conn: sqlite3.Connection, sensor: str) -> Optional[int]:
+    """
+    Awal history yang ada di summary: hari sebelum ini sudah di cold tier saat
+    summary dibuat (None = seluruh history ada di summary)
+    """
+    row = conn.execute(
+        'SELECT covered_from_ms FROM dashboard_summary_state WHERE sensor = ?', (sensor,)
+    ).fetchone()
+    return row[0] if row else None
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Deadband / Change-based Storage
+Pembacaan yang tidak berubah melebihi toleransi per metric tidak disimpan sebagai
+row baru; row terakhir diperpanjang sebagai run:
+
+- repeat_count   jumlah pembacaan setelah row yang di-suppress
+- valid_until_ms timestamp pembacaan terakhir dalam run
+
+Row baru tetap disimpan jika ada metric yang keluar dari toleransi, heartbeat
+(DEADBAND_MAX_INTERVAL) sudah lewat, jam berganti (rollup per jam & ROI harian
+tetap exact), status/error berubah atau timestamp datang tidak berurutan.
+
+Query side: expand_run() merekonstruksi timestamp setiap pembacaan dalam run,
+sedangkan aggregate memberi bobot (1 + repeat_count) per row, sehingga semantik
+API (jumlah record, sum energi, rata-rata) sama seperti tanpa deadband.
+"""
+
+import os
+import json
+import logging
+from itertools import islice
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from epoch_time import from_epoch_ms, MS_PER_SECOND, MS_PER_HOUR
+
+logger = logging.getLogger(__name__)
+
+DEADBAND_ENABLED = os.environ.get('DEADBAND_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+DEADBAND_MAX_INTERVAL = float(os.environ.get('DEADBAND_MAX_INTERVAL', '300'))
+
+# Toleransi absolut per metric; metric numerik yang tidak disebut harus identik.
+# PZEM dan DHT22 default exact (register identik saat malam), system resource
+# berfluktuasi sehingga diberi toleransi kecil.
+DEFAULT_TOLERANCES = {
+    'pzem016': {},
+    'pzem017': {},
+    'dht22': {},
+    'system': {
+        'ram_usage_percent': 0.5,
+        'storage_usage_percent': 0.1,
+        'cpu_usage_percent': 2.0,
+        'cpu_temperature': 0.5,
+        'storage_used_gb': 0.05,
+        'storage_free_gb': 0.05,
+    },
+}
+
+# Field yang tidak ikut dibandingkan (metadata per pembacaan)
+IGNORED_FIELDS = {'timestamp', 'parsed_at', 'raw_registers', 'register_count'}
+
+def load_tolerances() -> Dict[str, Dict[str, float]]:
+    """DEFAULT_TOLERANCES + override JSON dari DEADBAND_TOLERANCES"""
+    tolerances = {sensor: dict(metrics) for sensor, metrics in DEFAULT_TOLERANCES.items()}
+    override = os.environ.get('DEADBAND_TOLERANCES')
+    if override:
+        try:
+            for sensor, metrics in json.loads(override).items():
+                tolerances.setdefault(sensor, {}).update(metrics)
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid DEADBAND_TOLERANCES, using defaults: {e}")
+    return tolerances
+
+def _within_tolerance(stored: Dict[str, Any], reading: Dict[str, Any],
+                      tolerances: Dict[str, float]) -> bool:
+    keys = (set(stored) | set(reading)) - IGNORED_FIELDS
+    for key in keys:
+        old, new = stored.get(key), reading.get(key)
+        numeric = (isinstance(old, (int, float)) and isinstance(new, (int, float)) and
+                   not isinstance(old, bool) and not isinstance(new, bool))
+        if numeric:
+            if abs(new - old) > tolerances.get(key, 0.0):
+                return False
+        elif old != new:
+            return False
+    return True
+
+class DeadbandFilter:
+    """
+    State per series (row terakhir yang disimpan). Dipakai oleh DatabaseManager
+    di dalam transaksi batch; reset() jika transaksi di-rollback.
+    """
+
+    def __init__(self, enabled: bool = DEADBAND_ENABLED,
+                 max_interval: float = DEADBAND_MAX_INTERVAL,
+                 tolerances: Optional[Dict[str, Dict[str, float]]] = None):
+        self.enabled = enabled
+        self.max_interval_ms = int(max_interval * MS_PER_SECOND)
+        self.tolerances = tolerances if tolerances is not None else load_tolerances()
+        self._runs = {}
+        self.stored = 0
+        self.suppressed = 0
+
+    def match(self, series: Tuple, sensor: str, ts_ms: int,
+              fields: Dict[str, Any]) -> Optional[int]:
+        """Row id run yang bisa diperpanjang oleh pembacaan ini, atau None (simpan row baru)"""
+        if not self.enabled:
+            return None
+
+        run = self._runs.get(series)
+        if run is None:
+            return None
+
+        row_id, start_ms, last_ms, stored_fields = run
+        if (ts_ms < last_ms or
+                ts_ms - start_ms >= self.max_interval_ms or
+                ts_ms // MS_PER_HOUR != start_ms // MS_PER_HOUR or
+                not _within_tolerance(stored_fields, fields, self.tolerances.get(sensor, {}))):
+            return None
+        return row_id
+
+    def extend(self, series: Tuple, ts_ms: int):
+        """Catat pembacaan yang di-suppress (setelah UPDATE run berhasil)"""
+        row_id, start_ms, _, stored_fields = self._runs[series]
+        self._runs[series] = (row_id, start_ms, ts_ms, stored_fields)
+        self.suppressed += 1
+
+    def remember(self, series: Tuple, row_id: int, ts_ms: int, fields: Dict[str, Any]):
+        """Catat row yang baru disimpan sebagai awal run berikutnya"""
+        self.stored += 1
+        if self.enabled:
+            self._runs[series] = (row_id, ts_ms, ts_ms, fields)
+
+    def forget(self, series: Tuple):
+        """Row run sudah tidak ada (misalnya dihapus di luar worker)"""
+        self._runs.pop(series, None)
+
+    def reset(self):
+        """Lupakan semua run (setelah rollback, row id mungkin tidak ada)"""
+        self._runs.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.stored + self.suppressed
+        return {
+            'enabled': self.enabled,
+            'stored': self.stored,
+            'suppressed': self.suppressed,
+            'compression_ratio': round(total / self.stored, 2) if self.stored else None
+        }
+
+# ---------- Query side (gap filling) ----------
+
+# Kolom run yang ditambahkan di akhir SELECT untuk expand_rows()
+RUN_COLUMNS = ['ts_ms', 'valid_until_ms', 'repeat_count']
+
+# SQL bobot row (jumlah pembacaan) untuk COUNT/SUM yang setara tanpa deadband
+RUN_WEIGHT_SQL = '(1 + repeat_count)'
+
+def expand_run(ts_ms: int, valid_until_ms: Optional[int], repeat_count: Optional[int],
+               descending: bool = False) -> Iterator[int]:
+    """
+    Timestamp setiap pembacaan dalam run: row yang disimpan, lalu repeat_count
+    pembacaan yang di-suppress berjarak rata hingga valid_until_ms (exact untuk
+    pembacaan pertama dan terakhir).
+    """
+    repeat_count = repeat_count or 0
+    if not repeat_count or valid_until_ms is None:
+        yield ts_ms
+        return
+
+    step = (valid_until_ms - ts_ms) / repeat_count
+    indexes = range(repeat_count, -1, -1) if descending else range(repeat_count + 1)
+    for index in indexes:
+        yield valid_until_ms if index == repeat_count else ts_ms + round(index * step)
+
+def run_weight(repeat_count: Optional[int]) -> int:
+    """Jumlah pembacaan yang diwakili satu row"""
+    return 1 + (repeat_count or 0)
+
+def expand_rows(rows: Iterable[tuple], descending: bool = True,
+                skip: int = 0) -> Iterator[Tuple[int, tuple]]:
+    """
+    Gap filling: row (*columns, ts_ms, valid_until_ms, repeat_count) -> (ts_ms, columns)
+    per pembacaan. Kolom pertama (timestamp) diganti timestamp rekonstruksi untuk
+    pembacaan yang di-suppress. skip melewati N pembacaan pertama tanpa expand
+    (pagination).
+    """
+    for row in rows:
+        ts_ms, valid_until_ms, repeat_count = row[-3:]
+        weight = run_weight(repeat_count)
+        if skip >= weight:
+            skip -= weight
+            continue
+
+        columns = tuple(row[:-3])
+        for reading_ms in islice(expand_run(ts_ms, valid_until_ms, repeat_count, descending), skip, None):
+            if reading_ms == ts_ms:
+                yield reading_ms, columns
+            else:
+                yield reading_ms, (from_epoch_ms(reading_ms),) + columns[1:]
+        skip = 0
@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+"""
+Device Health (Freshness, Gap Index, Ingestion Lag)
+Di-maintain MQTT worker per pembacaan (termasuk error dan pembacaan yang
+di-suppress deadband), dibaca /api/health/devices tanpa scan tabel sensor:
+
+- device_heartbeat   pembacaan terakhir per device (timestamp, waktu terima, status)
+- device_gaps        interval [start_ms, end_ms) tanpa pembacaan lebih lama dari
+                     interval * DEVICE_GAP_FACTOR; pembacaan terlambat yang jatuh
+                     di dalam gap memecah gap tersebut
+- device_daily       jumlah pembacaan & error per hari (completeness)
+- ingest_lag_hourly  histogram lag received - timestamp per jam terima
+
+Semua tabel di-key per device fisik (sensor, device): sensor adalah nama sensor
+API (pzem016, pzem017, dht22, system), device adalah aggregation.device_id()
+('/dev/ttyUSB0#1' untuk PZEM, gpio_pin untuk DHT22, '' untuk system). Interval
+yang diharapkan tetap per sensor. Uptime setahun = SUM overlap gap dalam range
+(index device_gaps), completeness = SUM device_daily (365 row). History sebelum
+tracked_from_ms (hari yang sudah di cold tier saat migrasi 011) tidak ikut
+dihitung.
+"""
+
+import os
+import json
+import logging
+import sqlite3
+from typing import Dict, Any, List, Optional, Tuple
+
+from epoch_time import from_epoch_ms, MS_PER_SECOND, MS_PER_HOUR, MS_PER_DAY
+
+logger = logging.getLogger(__name__)
+
+DEVICE_EXPECTED_INTERVAL = float(os.environ.get('DEVICE_EXPECTED_INTERVAL', '30'))
+DEVICE_GAP_FACTOR = float(os.environ.get('DEVICE_GAP_FACTOR', '3'))
+LAG_RETENTION_DAYS = int(os.environ.get('LAG_RETENTION_DAYS', '90'))
+
+# Nama sensor (interval dan filter API); device fisik per sensor dari aggregation.device_id()
+DEVICES = ('pzem016', 'pzem017', 'dht22', 'system')
+
+# Batas atas bucket histogram lag (ms); lag di atas bucket terakhir masuk LAG_OVERFLOW
+LAG_BUCKETS = (1000, 2000, 5000, 10000, 30000, 60000, 300000, 900000, 3600000)
+LAG_OVERFLOW = -1
+
+def load_intervals() -> Dict[str, float]:
+    """Interval pembacaan yang diharapkan per sensor (detik), override JSON DEVICE_INTERVALS"""
+    intervals = {device: DEVICE_EXPECTED_INTERVAL for device in DEVICES}
+    override = os.environ.get('DEVICE_INTERVALS')
+    if override:
+        try:
+            intervals.update({device: float(value) for device, value in json.loads(override).items()})
+        except (ValueError, AttributeError) as e:
+            logger.error(f"Invalid DEVICE_INTERVALS, using defaults: {e}")
+    return intervals
+
+def gap_threshold_ms(interval: float) -> int:
+    return int(interval * DEVICE_GAP_FACTOR * MS_PER_SECOND)
+
+def lag_bucket(lag_ms: int) -> int:
+    for upper in LAG_BUCKETS:
+        if lag_ms <= upper:
+            return upper
+    return LAG_OVERFLOW
+
+# ---------- Maintenance (MQTT worker) ----------
+
+class DeviceHealth:
+    """
+    Pembacaan terakhir per device (in-memory, dimuat dari device_heartbeat) untuk
+    deteksi gap. Gap langsung ditulis; counter heartbeat/harian/lag diakumulasi
+    per batch dan di-flush di checkpoint() dalam transaksi yang sama.
+    """
+
+    def __init__(self, intervals: Optional[Dict[str, float]] = None):
+        self.intervals = intervals if intervals is not None else load_intervals()
+        self._last_ts: Optional[Dict[Tuple[str, str], int]] = None
+        self._pending = self._empty_pending()
+        self.gaps_opened = 0
+        self.gaps_split = 0
+
+    @staticmethod
+    def _empty_pending() -> Dict[str, Dict]:
+        return {'heartbeat': {}, 'daily': {}, 'lag': {}}
+
+    def _threshold_ms(self, sensor: str) -> int:
+        return gap_threshold_ms(self.intervals.get(sensor, DEVICE_EXPECTED_INTERVAL))
+
+    def _load(self, conn: sqlite3.Connection):
+        self._last_ts = {(sensor, device): last_ts for sensor, device, last_ts in
+                         conn.execute('SELECT sensor, device, last_ts_ms FROM device_heartbeat')}
+
+    def _split_gap(self, cursor: sqlite3.Cursor, sensor: str, device: str, ts_ms: int):
+        """Pembacaan terlambat di dalam gap: gap dipecah (sisi yang masih > threshold tetap gap)"""
+        gap = cursor.execute('''
+            SELECT start_ms, end_ms FROM device_gaps
+            WHERE sensor = ? AND device = ? AND start_ms < ?
+            ORDER BY start_ms DESC LIMIT 1
+        ''', (sensor, device, ts_ms)).fetchone()
+        if gap is None or gap[1] <= ts_ms:
+            return
+
+        start_ms, end_ms = gap
+        threshold = self._threshold_ms(sensor)
+        cursor.execute('DELETE FROM device_gaps WHERE sensor = ? AND device = ? AND start_ms = ?',
+                       (sensor, device, start_ms))
+        cursor.executemany('''
+            INSERT INTO device_gaps (sensor, device, start_ms, end_ms, duration_ms) VALUES (?, ?, ?, ?, ?)
+        ''', [(sensor, device, left, right, right - left)
+              for left, right in ((start_ms, ts_ms), (ts_ms, end_ms)) if right - left > threshold])
+        self.gaps_split += 1
+
+    def observe(self, cursor: sqlite3.Cursor, sensor: str, device: str, ts_ms: int,
+                received_ms: Optional[int], success: bool):
+        """Catat satu pembacaan device fisik (dalam transaksi caller)"""
+        if self._last_ts is None:
+            self._load(cursor.connection)
+
+        key = (sensor, device)
+        last_ts = self._last_ts.get(key)
+        if last_ts is None or ts_ms > last_ts:
+            if last_ts is not None and ts_ms - last_ts > self._threshold_ms(sensor):
+                cursor.execute('''
+                    INSERT OR IGNORE INTO device_gaps (sensor, device, start_ms, end_ms, duration_ms)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (sensor, device, last_ts, ts_ms, ts_ms - last_ts))
+                self.gaps_opened += 1
+            self._last_ts[key] = ts_ms
+        elif ts_ms < last_ts:
+            self._split_gap(cursor, sensor, device, ts_ms)
+
+        heartbeat = self._pending['heartbeat'].setdefault(key, {
+            'first_ts_ms': ts_ms, 'last_ts_ms': ts_ms, 'last_received_ms': received_ms,
+            'last_status': success, 'readings': 0, 'errors': 0, 'last_lag_ms': None
+        })
+        heartbeat['first_ts_ms'] = min(heartbeat['first_ts_ms'], ts_ms)
+        if ts_ms >= heartbeat['last_ts_ms']:
+            heartbeat['last_ts_ms'] = ts_ms
+            heartbeat['last_status'] = success
+        heartbeat['readings'] += 1
+        heartbeat['errors'] += 0 if success else 1
+
+        daily = self._pending['daily'].setdefault((sensor, device, ts_ms - ts_ms % MS_PER_DAY), [0, 0])
+        daily[0] += 1
+        daily[1] += 0 if success else 1
+
+        if received_ms is not None:
+            lag_ms = max(received_ms - ts_ms, 0)
+            heartbeat['last_received_ms'] = max(heartbeat['last_received_ms'] or 0, received_ms)
+            heartbeat['last_lag_ms'] = lag_ms
+            lag_key = (sensor, device, received_ms - received_ms % MS_PER_HOUR, lag_bucket(lag_ms))
+            self._pending['lag'][lag_key] = self._pending['lag'].get(lag_key, 0) + 1
+
+    def checkpoint(self, cursor: sqlite3.Cursor):
+        """Flush counter batch ini (dalam transaksi caller)"""
+        pending = self._pending
+        if pending['heartbeat']:
+            cursor.executemany('''
+                INSERT INTO device_heartbeat (
+                    sensor, device, first_ts_ms, last_ts_ms, last_received_ms, last_status,
+                    readings, errors, last_lag_ms
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sensor, device) DO UPDATE SET
+                    first_ts_ms = MIN(first_ts_ms, excluded.first_ts_ms),
+                    last_status = CASE WHEN excluded.last_ts_ms >= last_ts_ms
+                                       THEN excluded.last_status ELSE last_status END,
+                    last_ts_ms = MAX(last_ts_ms, excluded.last_ts_ms),
+                    last_received_ms = MAX(COALESCE(last_received_ms, 0), COALESCE(excluded.last_received_ms, 0)),
+                    readings = readings + excluded.readings,
+                    errors = errors + excluded.errors,
+                    last_lag_ms = COALESCE(excluded.last_lag_ms, last_lag_ms)
+            ''', [key + (entry['first_ts_ms'], entry['last_ts_ms'], entry['last_received_ms'],
+                         'success' if entry['last_status'] else 'error', entry['readings'], entry['errors'],
+                         entry['last_lag_ms']) for key, entry in pending['heartbeat'].items()])
+        if pending['daily']:
+            cursor.executemany('''
+                INSERT INTO device_daily (sensor, device, day_ms, readings, errors) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sensor, device, day_ms) DO UPDATE SET
+                    readings = readings + excluded.readings,
+                    errors = errors + excluded.errors
+            ''', [key + tuple(counts) for key, counts in pending['daily'].items()])
+        if pending['lag']:
+            cursor.executemany('''
+                INSERT INTO ingest_lag_hourly (sensor, device, hour_ms, le_ms, count) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(sensor, device, hour_ms, le_ms) DO UPDATE SET count = count + excluded.count
+            ''', [key + (count,) for key, count in pending['lag'].items()])
+        self._pending = self._empty_pending()
+
+    def reset(self):
+        """Buang counter batch & cache pembacaan terakhir (setelah rollback)"""
+        self._last_ts = None
+        self._pending = self._empty_pending()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'devices': len(self._last_ts or {}),
+            'gaps_opened': self.gaps_opened,
+            'gaps_split': self.gaps_split
+        }
+
+def prune_lag_histogram(conn: sqlite3.Connection, now_ms: int,
+                        retention_days: int = LAG_RETENTION_DAYS) -> int:
+    """Hapus histogram lag yang lebih lama dari retention (gap & daily disimpan permanen)"""
+    cursor = conn.execute('DELETE FROM ingest_lag_hourly WHERE hour_ms < ?',
+                          (now_ms - retention_days * MS_PER_DAY,))
+    return cursor.rowcount
+
+# ---------- Reader (web API) ----------
+
+def _percentile(buckets: List[List[int]], total: int, fraction: float) -> Optional[int]:
+    """Batas atas bucket yang memuat persentil (None = di atas bucket terbesar)"""
+    target = fraction * total
+    seen = 0
+    for le_ms, count in buckets:
+        seen += count
+        if seen >= target:
+            return None if le_ms == LAG_OVERFLOW else le_ms
+    return None
+
+def lag_histogram(conn: sqlite3.Connection, sensor: str, device: str, since_ms: int) -> Dict[str, Any]:
+    rows = conn.execute('''
+        SELECT le_ms, SUM(count) FROM ingest_lag_hourly
+        WHERE sensor = ? AND device = ? AND hour_ms >= ?
+        GROUP BY le_ms
+    ''', (sensor, device, since_ms)).fetchall()
+    buckets = sorted(rows, key=lambda row: row[0] if row[0] != LAG_OVERFLOW else float('inf'))
+    total = sum(count for _, count in buckets)
+    return {
+        'count': total,
+        'buckets': [{'le_ms': None if le_ms == LAG_OVERFLOW else le_ms, 'count': count}
+                    for le_ms, count in buckets],
+        'p50_ms': _percentile(buckets, total, 0.50) if total else None,
+        'p95_ms': _percentile(buckets, total, 0.95) if total else None,
+        'p99_ms': _percentile(buckets, total, 0.99) if total else None,
+    }
+
+def device_report(conn: sqlite3.Connection, start_ms: int, end_ms: int, now_ms: int,
+                  sensor: Optional[str] = None, device: Optional[str] = None, gaps_limit: int = 10,
+                  lag_since_ms: Optional[int] = None,
+                  intervals: Optional[Dict[str, float]] = None) -> List[Dict[str, Any]]:
+    """
+    Freshness, uptime & completeness per device fisik untuk range [start_ms, end_ms).
+    Gap yang masih berlangsung (tidak ada pembacaan sejak last_ts_ms) ikut dihitung.
+    """
+    intervals = intervals if intervals is not None else load_intervals()
+    query = '''
+        SELECT sensor, device, first_ts_ms, last_ts_ms, last_received_ms, last_status,
+               readings, errors, last_lag_ms
+        FROM device_heartbeat
+    '''
+    conditions, params = [], []
+    if sensor:
+        conditions.append('sensor = ?')
+        params.append(sensor)
+    if device is not None:
+        conditions.append('device = ?')
+        params.append(device)
+    if conditions:
+        query += ' WHERE ' + ' AND '.join(conditions)
+
+    report = []
+    for sensor_name, name, first_ts, last_ts, last_received, last_status, total, total_errors, last_lag in \
+            conn.execute(query + ' ORDER BY sensor, device', params).fetchall():
+        interval = intervals.get(sensor_name, DEVICE_EXPECTED_INTERVAL)
+        threshold = gap_threshold_ms(interval)
+        age_ms = now_ms - last_ts
+
+        # Range efektif: sejak device mulai dilacak hingga sekarang
+        span_start = max(start_ms, first_ts)
+        span_end = min(end_ms, now_ms)
+        span_ms = max(span_end - span_start, 0)
+
+        gaps = conn.execute('''
+            SELECT start_ms, end_ms FROM device_gaps
+            WHERE sensor = ? AND device = ? AND end_ms > ? AND start_ms < ?
+            ORDER BY start_ms DESC
+        ''', (sensor_name, name, span_start, span_end)).fetchall()
+        if age_ms > threshold and last_ts < span_end:
+            gaps.insert(0, (last_ts, None))
+
+        downtime_ms = 0
+        longest_ms = 0
+        for gap_start, gap_end in gaps:
+            overlap = min(gap_end or span_end, span_end) - max(gap_start, span_start)
+            downtime_ms += max(overlap, 0)
+            longest_ms = max(longest_ms, (gap_end or now_ms) - gap_start)
+
+        readings, errors = conn.execute('''
+            SELECT COALESCE(SUM(readings), 0), COALESCE(SUM(errors), 0) FROM device_daily
+            WHERE sensor = ? AND device = ? AND day_ms >= ? AND day_ms < ?
+        ''', (sensor_name, name, start_ms - start_ms % MS_PER_DAY, end_ms)).fetchone()
+        expected = span_ms / (interval * MS_PER_SECOND) if interval else 0
+
+        entry = {
+            'sensor': sensor_name,
+            'device': name,
+            'status': 'online' if age_ms <= threshold else 'offline',
+            'last_seen': from_epoch_ms(last_ts),
+            'last_received': from_epoch_ms(last_received) if last_received else None,
+            'age_seconds': round(age_ms / MS_PER_SECOND, 1),
+            'last_status': last_status,
+            'last_lag_seconds': last_lag / MS_PER_SECOND if last_lag is not None else None,
+            'expected_interval_seconds': interval,
+            'tracked_from': from_epoch_ms(first_ts),
+            'total_readings': total,
+            'total_errors': total_errors,
+            'range': {
+                'readings': readings,
+                'errors': errors,
+                'error_rate': round(errors / readings * 100, 2) if readings else None,
+                'uptime_percent': round(100 - downtime_ms / span_ms * 100, 3) if span_ms else None,
+                'downtime_seconds': downtime_ms / MS_PER_SECOND,
+                'completeness_percent': round(min(readings / expected, 1) * 100, 2) if expected else None,
+                'gap_count': len(gaps),
+                'longest_gap_seconds': longest_ms / MS_PER_SECOND,
+            },
+            'recent_gaps': [{
+                'start': from_epoch_ms(gap_start),
+                'end': from_epoch_ms(gap_end) if gap_end else None,
+                'ongoing': gap_end is None,
+                'duration_seconds': ((gap_end or now_ms) - gap_start) / MS_PER_SECOND,
+            } for gap_start, gap_end in gaps[:gaps_limit]],
+        }
+        if lag_since_ms is not None:
+            entry['ingestion_lag'] = lag_histogram(conn, sensor_name, name, lag_since_ms)
+        report.append(entry)
+    return report
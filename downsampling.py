@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Time-series Downsampling untuk Chart
+Largest-Triangle-Three-Buckets (LTTB) dan min/max per bucket, streaming di atas
+cursor yang sudah urut waktu (ASC atau DESC) tanpa materialisasi seluruh hasil.
+
+- Jumlah point total (dari COUNT query) menentukan batas bucket di depan, sehingga
+  hanya dua bucket yang di-buffer sekaligus (memori O(N / max_points))
+- Point dengan nilai y bukan angka dilewati; jika jumlah aktual berbeda dari total
+  (insert baru di antara COUNT dan SELECT) sisa point masuk ke bucket terakhir
+- Perhitungan luas segitiga per bucket memakai NumPy jika tersedia dan bucket besar
+"""
+
+import math
+from typing import Any, Iterable, Iterator, List, Optional, Tuple
+
+# Import untuk fast path (optional)
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+METHODS = ('lttb', 'minmax')
+
+# Bucket lebih kecil dari ini lebih cepat di Python murni
+NUMPY_MIN_BUCKET = 32
+
+Point = Tuple[float, float, Any]
+
+def _is_number(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and not math.isnan(value)
+
+def _max_area_index(xs: List[float], ys: List[float], ax: float, ay: float,
+                    cx: float, cy: float) -> int:
+    """Index point di bucket yang membentuk segitiga terbesar dengan a dan c"""
+    if NUMPY_AVAILABLE and len(xs) >= NUMPY_MIN_BUCKET:
+        x = np.asarray(xs, dtype=np.float64)
+        y = np.asarray(ys, dtype=np.float64)
+        areas = np.abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+        return int(np.argmax(areas))
+
+    best_index = 0
+    best_area = -1.0
+    for index, (x, y) in enumerate(zip(xs, ys)):
+        area = abs((ax - cx) * (y - ay) - (ax - x) * (cy - ay))
+        if area > best_area:
+            best_area = area
+            best_index = index
+    return best_index
+
+class _Bucket:
+    __slots__ = ('xs', 'ys', 'items')
+
+    def __init__(self):
+        self.xs = []
+        self.ys = []
+        self.items = []
+
+    def add(self, x, y, item):
+        self.xs.append(x)
+        self.ys.append(y)
+        self.items.append(item)
+
+    def average(self) -> Tuple[float, float]:
+        count = len(self.xs)
+        return sum(self.xs) / count, sum(self.ys) / count
+
+class StreamingLTTB:
+    """
+    LTTB satu pass: feed() point berurutan, yield item terpilih.
+    Point pertama dan terakhir selalu ikut; point tengah dibagi ke
+    max_points - 2 bucket berdasarkan index.
+    """
+
+    def __init__(self, total: int, max_points: int):
+        if max_points < 3:
+            raise ValueError('max_points must be at least 3')
+        self.total = total
+        self.max_points = max_points
+        self.middle = max(total - 2, 1)
+
+        self.index = 0
+        self.first = None
+        self.previous = None     # point terakhir yang di-emit (a)
+        self.pending = None      # bucket yang menunggu bucket berikutnya lengkap
+        self.current = _Bucket()
+        self.current_number = 0
+        self.lagging = None      # ditahan satu langkah; saat finish() ini point terakhir
+
+    def _bucket_number(self, index: int) -> int:
+        # index 1..total-2 -> bucket 0..max_points-3; bucket b mulai di floor(b * every) + 1
+        number = (index * (self.max_points - 2) + self.middle - 1) // self.middle - 1
+        return min(number, self.max_points - 3)
+
+    def _select(self, bucket: _Bucket, cx: float, cy: float) -> Any:
+        ax, ay, _ = self.previous
+        chosen = _max_area_index(bucket.xs, bucket.ys, ax, ay, cx, cy)
+        self.previous = (bucket.xs[chosen], bucket.ys[chosen], bucket.items[chosen])
+        return bucket.items[chosen]
+
+    def _place(self, point: Point) -> Iterator[Any]:
+        """Masukkan point tengah ke bucket; emit pilihan dari bucket pending jika bisa"""
+        number = self._bucket_number(self.index)
+        if number != self.current_number and self.current.xs:
+            if self.pending is not None:
+                yield self._select(self.pending, *self.current.average())
+            self.pending = self.current
+            self.current = _Bucket()
+        self.current_number = number
+        self.current.add(*point)
+
+    def feed(self, x: float, y: float, item: Any) -> Iterator[Any]:
+        if not (_is_number(x) and _is_number(y)):
+            return
+
+        point = (x, y, item)
+        if self.first is None:
+            self.first = self.previous = point
+            self.index = 1
+            yield item
+            return
+
+        if self.lagging is not None:
+            yield from self._place(self.lagging)
+            self.index += 1
+        self.lagging = point
+
+    def finish(self) -> Iterator[Any]:
+        if self.lagging is None:
+            return
+
+        last_x, last_y, last_item = self.lagging
+        if self.pending is not None:
+            if self.current.xs:
+                yield self._select(self.pending, *self.current.average())
+            else:
+                yield self._select(self.pending, last_x, last_y)
+        if self.current.xs:
+            yield self._select(self.current, last_x, last_y)
+        yield last_item
+
+class StreamingMinMax:
+    """Min dan max per bucket (urutan waktu dipertahankan), menjaga spike"""
+
+    def __init__(self, total: int, max_points: int):
+        if max_points < 2:
+            raise ValueError('max_points must be at least 2')
+        self.buckets = max(max_points // 2, 1)
+        self.every = max(total, 1) / self.buckets
+        self.index = 0
+        self.current_number = 0
+        self.low = None
+        self.high = None
+
+    def _flush(self) -> Iterator[Any]:
+        if self.low is None:
+            return
+        low_index, low_item = self.low[0], self.low[2]
+        high_index, high_item = self.high[0], self.high[2]
+        if low_index == high_index:
+            yield low_item
+        elif low_index < high_index:
+            yield low_item
+            yield high_item
+        else:
+            yield high_item
+            yield low_item
+        self.low = self.high = None
+
+    def feed(self, x: float, y: float, item: Any) -> Iterator[Any]:
+        if not (_is_number(x) and _is_number(y)):
+            return
+
+        number = min(int(self.index / self.every), self.buckets - 1)
+        if number != self.current_number:
+            yield from self._flush()
+            self.current_number = number
+
+        if self.low is None or y < self.low[1]:
+            self.low = (self.index, y, item)
+        if self.high is None or y > self.high[1]:
+            self.high = (self.index, y, item)
+        self.index += 1
+
+    def finish(self) -> Iterator[Any]:
+        yield from self._flush()
+
+def downsample(points: Iterable[Point], total: int, max_points: Optional[int],
+               method: str = 'lttb') -> Iterator[Any]:
+    """
+    Downsample stream (x, y, item) menjadi paling banyak max_points item.
+    Jika total <= max_points semua item dengan y numerik diteruskan apa adanya.
+    """
+    if method not in METHODS:
+        raise ValueError(f'Invalid downsample method: {method}')
+
+    if not max_points or total <= max_points:
+        for x, y, item in points:
+            if _is_number(x) and _is_number(y):
+                yield item
+        return
+
+    sampler = StreamingLTTB(total, max_points) if method == 'lttb' else StreamingMinMax(total, max_points)
+    for x, y, item in points:
+        yield from sampler.feed(x, y, item)
+    yield from sampler.finish()
+
+def lttb_indices(x, y, max_points: int):
+    """
+    Fast path NumPy untuk series yang sudah berupa array: index point terpilih.
+    Dipakai untuk series in-memory (misalnya hasil as-of join efisiensi).
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    total = len(x)
+    if total <= max_points or max_points < 3:
+        return np.arange(total)
+
+    edges = np.arange(max_points - 1, dtype=np.int64) * (total - 2) // (max_points - 2) + 1
+    selected = np.empty(max_points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = total - 1
+
+    a = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        if bucket + 2 < len(edges):
+            next_start, next_end = edges[bucket + 1], edges[bucket + 2]
+            cx = x[next_start:next_end].mean()
+            cy = y[next_start:next_end].mean()
+        else:
+            cx, cy = x[-1], y[-1]
+        areas = np.abs((x[a] - cx) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (cy - y[a]))
+        a = start + int(np.argmax(areas))
+        selected[bucket + 1] = a
+    return selected
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Epoch Timestamp Utilities
+Normalisasi timestamp ISO-8601 (dengan/tanpa microseconds atau timezone)
+menjadi INTEGER epoch milliseconds untuk storage dan range scan.
+
+Konvensi storage: jam dinding site (SITE_TIMEZONE) disimpan sebagai epoch
+"UTC naive", sehingga round-trip ISO -> epoch ms -> ISO tidak menggeser jam
+dan batas hari / jam (rollup, heatmap) mengikuti waktu lokal site:
+
+- Timestamp naive (tanpa timezone) = jam dinding site, dipakai apa adanya
+- Timestamp dengan offset (+07:00, Z) dikonversi dulu ke jam dinding site,
+  jadi payload campuran dari device yang sama tetap berurutan
+- Angka epoch: < 1e11 dianggap detik, selain itu milliseconds. Di payload
+  device (payload_epoch_ms) angka epoch adalah instant UTC dan digeser ke jam
+  dinding site seperti ISO dengan offset; di to_epoch_ms (parameter API, nilai
+  internal) angka sudah dalam konvensi storage dan dipakai apa adanya
+- Waktu sekarang: site_now_ms() / site_now(), bukan datetime.now() (jam container)
+"""
+
+import os
+import re
+import time
+from datetime import datetime, date, timedelta, timezone, tzinfo
+from typing import Optional, Tuple, Union
+
+MS_PER_SECOND = 1000
+MS_PER_HOUR = 3600 * MS_PER_SECOND
+MS_PER_DAY = 24 * MS_PER_HOUR
+
+# Offset tetap (+07:00 = WIB) atau nama IANA (Asia/Jakarta, perlu tzdata)
+SITE_TIMEZONE = os.environ.get('SITE_TIMEZONE', '+07:00')
+
+# Epoch di bawah batas ini dianggap detik (1e11 ms = 1973, 1e11 s = tahun 5138)
+EPOCH_SECONDS_LIMIT = 10 ** 11
+
+def parse_timezone(name: str) -> tzinfo:
+    """'+07:00' / 'UTC+7' / 'Z' -> offset tetap, selain itu zoneinfo"""
+    match = re.fullmatch(r'(?:UTC|GMT)?([+-])(\d{1,2})(?::?(\d{2}))?', name.strip())
+    if match:
+        sign, hours, minutes = match.groups()
+        offset = timedelta(hours=int(hours), minutes=int(minutes or 0))
+        return timezone(-offset if sign == '-' else offset)
+    if name.strip().upper() in ('Z', 'UTC', 'GMT'):
+        return timezone.utc
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(name.strip())
+
+SITE_TZ = parse_timezone(SITE_TIMEZONE)
+# Offset tetap dihitung sekali (site_now_ms dipanggil per pesan MQTT); zoneinfo bisa DST
+SITE_OFFSET_MS = (int(SITE_TZ.utcoffset(None).total_seconds()) * MS_PER_SECOND
+                  if isinstance(SITE_TZ, timezone) else None)
+
+def site_now() -> datetime:
+    """Jam dinding site sekarang (naive)"""
+    return datetime.now(SITE_TZ).replace(tzinfo=None)
+
+def site_now_ms() -> int:
+    """Epoch ms sekarang dalam konvensi storage (jam dinding site)"""
+    if SITE_OFFSET_MS is not None:
+        return int(time.time() * MS_PER_SECOND) + SITE_OFFSET_MS
+    return to_epoch_ms(site_now())
+
+def to_epoch_ms(value: Union[str, datetime, date, int, float, None]) -> Optional[int]:
+    """Konversi ISO string / datetime / epoch ke epoch milliseconds"""
+    if value is None or value == '':
+        return None
+
+    if isinstance(value, bool):
+        raise TypeError('Boolean is not a timestamp')
+    if isinstance(value, (int, float)):
+        if abs(value) < EPOCH_SECONDS_LIMIT:
+            return int(value * MS_PER_SECOND)
+        return int(value)
+
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, date):
+        parsed = datetime(value.year, value.month, value.day)
+    else:
+        text = value.strip()
+        if text.endswith('Z'):
+            text = text[:-1] + '+00:00'
+        try:
+            parsed = datetime.fromisoformat(text)
+        except ValueError:
+            return None
+
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(SITE_TZ).replace(tzinfo=None)
+    return int(parsed.replace(tzinfo=timezone.utc).timestamp() * MS_PER_SECOND)
+
+def payload_epoch_ms(value: Union[str, datetime, date, int, float, None]) -> Optional[int]:
+    """Timestamp payload device ke epoch ms storage (angka epoch = UTC -> jam dinding site)"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        ms = to_epoch_ms(value)
+        try:
+            offset = datetime.fromtimestamp(ms / MS_PER_SECOND, timezone.utc).astimezone(SITE_TZ).utcoffset()
+        except (OverflowError, OSError, ValueError):
+            return None
+        return ms + int(offset.total_seconds()) * MS_PER_SECOND
+    return to_epoch_ms(value)
+
+def from_epoch_ms(value: Optional[int]) -> Optional[str]:
+    """Konversi epoch milliseconds kembali ke ISO string naive"""
+    if value is None:
+        return None
+    return datetime.fromtimestamp(value / MS_PER_SECOND, timezone.utc).replace(tzinfo=None).isoformat()
+
+def day_start_ms(value: Union[str, datetime, date, int]) -> Optional[int]:
+    """Epoch ms untuk awal hari (00:00) dari timestamp yang diberikan"""
+    ms = to_epoch_ms(value)
+    if ms is None:
+        return None
+    return ms - (ms % MS_PER_DAY)
+
+def date_range_ms(start_date: Optional[str], end_date: Optional[str]) -> Tuple[Optional[int], Optional[int]]:
+    """
+    Range filter API (start inclusive, end exclusive) dalam epoch ms.
+    end_date ditambah satu hari agar hari terakhir ikut semua.
+    """
+    start_ms = to_epoch_ms(start_date) if start_date else None
+    end_ms = None
+    if end_date:
+        end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
+        end_ms = to_epoch_ms(end_datetime)
+    return start_ms, end_ms
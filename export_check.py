@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Export Consistency Check
+Workbook gabungan /api/export/report dibanding export terpisah per sensor
+(/api/export/<sensor>) dan /api/roi/export dari snapshot yang sama: setiap sheet
+harus berisi cell yang sama (nilai dan tipe). Style tidak dibandingkan karena
+index format berbeda antar workbook, dan file .xlsx tidak dibandingkan per byte
+(docProps berisi waktu pembuatan).
+
+- Snapshot baru dibuat di awal (--reuse-snapshot: snapshot terbaru), semua
+  request memakai ?source=snapshot; header X-Data-Snapshot harus sama
+- Request lewat web_api.app test client (tanpa server)
+- Dilaporkan waktu per request; --memory menjalankan ulang setiap request di
+  bawah tracemalloc untuk peak alokasi Python
+
+Exit 1 jika ada sheet atau cell yang berbeda.
+
+Usage:
+    python export_check.py --site arjasari --start-date 2026-09-01 --end-date 2026-09-30
+    python export_check.py --reuse-snapshot --memory --json export_check.json
+"""
+
+import io
+import sys
+import json
+import time
+import zipfile
+import argparse
+import tracemalloc
+import xml.etree.ElementTree as ElementTree
+from urllib.parse import urlencode
+from typing import Dict, Any, List, Optional, Tuple
+
+NS_MAIN = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+NS_REL = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}'
+NS_PACKAGE_REL = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+
+# Cell yang berbeda yang dicetak per sheet
+MAX_REPORTED_CELLS = 5
+
+# ---------- XLSX reader ----------
+
+def _column_index(reference: str) -> int:
+    """'AB12' -> 27"""
+    index = 0
+    for char in reference:
+        if not char.isalpha():
+            break
+        index = index * 26 + ord(char.upper()) - ord('A') + 1
+    return index - 1
+
+def _cell_value(cell, shared_strings: List[str]) -> Tuple[str, Any]:
+    cell_type = cell.get('t', 'n')
+    value = cell.find(f'{NS_MAIN}v')
+    if cell_type == 'inlineStr':
+        return 's', ''.join(text.text or '' for text in cell.iter(f'{NS_MAIN}t'))
+    if value is None:
+        return 'blank', None
+    if cell_type == 's':
+        return 's', shared_strings[int(value.text)]
+    if cell_type == 'str':
+        return 's', value.text or ''
+    if cell_type == 'b':
+        return 'b', value.text == '1'
+    if cell_type == 'e':
+        return 'e', value.text
+    return 'n', float(value.text)
+
+def read_workbook(data: bytes) -> Dict[str, Dict[Tuple[int, int], Tuple[str, Any]]]:
+    """Sheet -> {(row, col): (tipe, nilai)} dari file .xlsx (cell kosong tanpa nilai diabaikan)"""
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        names = set(archive.namelist())
+        shared_strings = []
+        if 'xl/sharedStrings.xml' in names:
+            root = ElementTree.fromstring(archive.read('xl/sharedStrings.xml'))
+            shared_strings = [''.join(text.text or '' for text in item.iter(f'{NS_MAIN}t'))
+                              for item in root.iter(f'{NS_MAIN}si')]
+
+        relations = {
+            relation.get('Id'): relation.get('Target')
+            for relation in ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+            .iter(f'{NS_PACKAGE_REL}Relationship')
+        }
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+
+        sheets = {}
+        for sheet in workbook.iter(f'{NS_MAIN}sheet'):
+            target = relations[sheet.get(f'{NS_REL}id')].lstrip('/')
+            path = target if target.startswith('xl/') else f'xl/{target}'
+            cells = {}
+            for row in ElementTree.fromstring(archive.read(path)).iter(f'{NS_MAIN}row'):
+                for cell in row.iter(f'{NS_MAIN}c'):
+                    cell_type, value = _cell_value(cell, shared_strings)
+                    if cell_type != 'blank':
+                        reference = cell.get('r')
+                        cells[(int(''.join(filter(str.isdigit, reference))) - 1,
+                               _column_index(reference))] = (cell_type, value)
+            sheets[sheet.get('name')] = cells
+        return sheets
+
+def compare_sheets(expected: Dict, actual: Dict) -> List[Dict[str, Any]]:
+    """Cell yang berbeda: [{'cell': 'R2C3', 'expected': ..., 'actual': ...}]"""
+    differences = []
+    for key in sorted(set(expected) | set(actual)):
+        if expected.get(key) != actual.get(key):
+            differences.append({
+                'cell': f'R{key[0] + 1}C{key[1] + 1}',
+                'expected': expected.get(key),
+                'actual': actual.get(key),
+            })
+    return differences
+
+# ---------- Check ----------
+
+def _request(client, path: str, params: Dict[str, str], memory: bool) -> Dict[str, Any]:
+    url = f'{path}?{urlencode(params)}'
+    started = time.perf_counter()
+    response = client.get(url)
+    result = {
+        'path': path,
+        'status': response.status_code,
+        'seconds': round(time.perf_counter() - started, 2),
+        'bytes': len(response.data),
+        'snapshot': response.headers.get('X-Data-Snapshot'),
+        'data': response.data,
+    }
+    if memory:
+        # Query string berbeda supaya tidak dilayani dari cache single-flight
+        tracemalloc.start()
+        try:
+            client.get(f'{url}&pass=memory')
+            result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        finally:
+            tracemalloc.stop()
+    return result
+
+def run_check(site: Optional[str] = None, start_date: Optional[str] = None,
+              end_date: Optional[str] = None, reuse_snapshot: bool = False,
+              memory: bool = False) -> Dict[str, Any]:
+    import web_api
+    from snapshots import create_snapshot, latest_snapshot
+
+    snapshot = latest_snapshot(site) if reuse_snapshot else None
+    snapshot = snapshot or create_snapshot(site)
+
+    params = {key: value for key, value in (('site', site), ('start_date', start_date),
+                                            ('end_date', end_date)) if value}
+    params['source'] = 'snapshot'
+    client = web_api.app.test_client()
+
+    combined = _request(client, '/api/export/report', params, memory)
+    if combined['status'] != 200:
+        raise RuntimeError(f"/api/export/report returned {combined['status']}: {combined['data'][:200]!r}")
+    separate = [_request(client, f'/api/export/{sensor_type}', params, memory)
+                for sensor_type in web_api.EXPORT_SENSORS]
+    separate.append(_request(client, '/api/roi/export', params, memory))
+
+    combined_sheets = read_workbook(combined['data'])
+    expected_sheets = {}
+    sheet_results = []
+    for result, sensor_type in zip(separate, list(web_api.EXPORT_SENSORS) + ['roi']):
+        if result['status'] == 404:
+            # Export terpisah menolak range kosong; di workbook gabungan sheet sensor hanya berisi header
+            if sensor_type != 'roi':
+                sheet = web_api.EXPORT_SENSORS[sensor_type]['sheet']
+                expected_sheets[sheet] = {(0, col): ('s', header) for col, header in
+                                          enumerate(web_api.EXPORT_SENSORS[sensor_type]['headers'])}
+            continue
+        if result['status'] != 200:
+            raise RuntimeError(f"{result['path']} returned {result['status']}: {result['data'][:200]!r}")
+        expected_sheets.update(read_workbook(result['data']))
+
+    for name in sorted(set(expected_sheets) | set(combined_sheets)):
+        if name not in combined_sheets or name not in expected_sheets:
+            sheet_results.append({'sheet': name, 'match': False, 'cells': 0,
+                                  'error': 'missing in ' + ('combined' if name not in combined_sheets else 'separate')})
+            continue
+        differences = compare_sheets(expected_sheets[name], combined_sheets[name])
+        sheet_results.append({
+            'sheet': name,
+            'match': not differences,
+            'cells': len(expected_sheets[name]),
+            'differences': len(differences),
+            'first_differences': differences[:MAX_REPORTED_CELLS],
+        })
+
+    snapshots_seen = {result['snapshot'] for result in [combined] + separate if result['status'] == 200}
+    requests = [{key: value for key, value in result.items() if key != 'data'} for result in [combined] + separate]
+    return {
+        'snapshot': snapshot,
+        'same_snapshot': len(snapshots_seen) == 1,
+        'match': len(snapshots_seen) == 1 and all(sheet['match'] for sheet in sheet_results),
+        'sheets': sheet_results,
+        'requests': requests,
+        'combined_seconds': combined['seconds'],
+        'separate_seconds': round(sum(result['seconds'] for result in separate), 2),
+    }
+
+def print_report(report: Dict[str, Any]):
+    print(f"Snapshot: {report['snapshot']}")
+    print(f"\n  {'request':<28} {'status':>6} {'seconds':>8} {'MB':>8} {'peak MB':>8}")
+    for result in report['requests']:
+        peak = result.get('peak_mb')
+        print(f"  {result['path']:<28} {result['status']:>6} {result['seconds']:>8.2f} "
+              f"{result['bytes'] / (1024 * 1024):>8.1f} {'-' if peak is None else peak:>8}")
+    print(f"\n  combined {report['combined_seconds']:.2f} s, separate total {report['separate_seconds']:.2f} s\n")
+
+    for sheet in report['sheets']:
+        mark = '✅' if sheet['match'] else '❌'
+        detail = sheet.get('error') or f"{sheet['cells']} cells, {sheet['differences']} different"
+        print(f"  {mark} {sheet['sheet']:<28} {detail}")
+        for difference in sheet.get('first_differences', []):
+            print(f"       {difference['cell']}: separate={difference['expected']} combined={difference['actual']}")
+    if not report['same_snapshot']:
+        print("  ❌ Requests read different snapshots (snapshot rotated during check), rerun")
+    print(f"\n{'✅ Combined workbook matches separate exports' if report['match'] else '❌ Mismatch'}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Bandingkan export gabungan dengan export terpisah')
+    parser.add_argument('--site', help='Site (default site jika kosong)')
+    parser.add_argument('--start-date', help='YYYY-MM-DD')
+    parser.add_argument('--end-date', help='YYYY-MM-DD')
+    parser.add_argument('--reuse-snapshot', action='store_true', help='Pakai snapshot terbaru, tidak membuat baru')
+    parser.add_argument('--memory', action='store_true', help='Ukur peak alokasi Python per request (tracemalloc)')
+    parser.add_argument('--json', help='Tulis laporan JSON ke file')
+    args = parser.parse_args()
+
+    report = run_check(args.site, args.start_date, args.end_date, args.reuse_snapshot, args.memory)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(report, handle, indent=2, default=str)
+    sys.exit(0 if report['match'] else 1)
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Gunicorn Config (Production Web API)
+gunicorn --config gunicorn.conf.py web_api:app
+
+- preload_app: web_api di-import sekali di master (migrasi schema via
+  ensure_schema berjalan satu kali), worker di-fork dari master
+- post_fork: setiap worker membuang state koneksi/thread pool warisan master
+  dan membuka reader pool shard sendiri (web_api.init_worker)
+- Worker gthread: query SQLite melepas GIL, sehingga beberapa thread per proses
+  cukup untuk request I/O; proses tambahan untuk request CPU (export, JSON besar)
+- Reload graceful: kill -HUP <master> (make reload-api) mem-fork worker baru
+  (config/env dibaca ulang), worker lama berhenti setelah request berjalan
+  selesai (graceful_timeout). Dengan preload, kode baru butuh restart container
+
+Default dipilih dari `python api_bench.py` (make benchmark-api, 8 client paralel):
+throughput dibatasi CPU (request downsampling paling berat), jadi proses
+tambahan hanya berguna sampai jumlah core; thread per proses mencegah request
+ringan antre di belakang request berat. Contoh (1 core, 20k row per sensor,
+--concurrency 8 --duration 15): p50 /api/roi/summary 310 ms dengan 1x1, 111 ms
+dengan 1x4, 9.5 ms dengan 2x4 (worker x thread), sedangkan p50 max_points=500
+naik dari 491 ms ke ~1.4 s. Angka bergantung hardware dan data, ukur ulang di
+target. Override dengan WEB_WORKERS, WEB_THREADS, dst.
+"""
+
+import os
+import multiprocessing
+
+bind = os.environ.get('WEB_BIND', '0.0.0.0:5000')
+
+# Default: satu proses per core (maks 4, Raspberry Pi), 4 thread per proses
+workers = int(os.environ.get('WEB_WORKERS', str(min(multiprocessing.cpu_count(), 4))))
+threads = int(os.environ.get('WEB_THREADS', '4'))
+worker_class = 'gthread'
+
+preload_app = True
+
+# Export Excel besar bisa lama; worker yang hang tetap di-restart
+timeout = int(os.environ.get('WEB_TIMEOUT', '120'))
+graceful_timeout = int(os.environ.get('WEB_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('WEB_KEEPALIVE', '5'))
+
+# Worker di-recycle berkala (jitter supaya tidak restart bersamaan)
+max_requests = int(os.environ.get('WEB_MAX_REQUESTS', '5000'))
+max_requests_jitter = int(os.environ.get('WEB_MAX_REQUESTS_JITTER', '500'))
+
+accesslog = os.environ.get('WEB_ACCESS_LOG', '-') or None
+errorlog = '-'
+loglevel = os.environ.get('WEB_LOG_LEVEL', 'info')
+
+def post_fork(server, worker):
+    """Reader pool per worker dibuat setelah fork"""
+    from web_api import init_worker
+    init_worker()
+    server.log.info(f"Worker {worker.pid} initialized ({threads} threads)")
+
+def on_reload(server):
+    server.log.info("Graceful reload: replacing workers")
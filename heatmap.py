@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Heatmap Hari x Jam
+Matrix hari x jam (0-23) satu metric, mis. generation PZEM-017 dan konsumsi
+PZEM-016, dihitung dari metric_rollup_hourly (tidak ikut di-tier ke cold storage,
+jadi history panjang tetap tersedia):
+
+- Satu query GROUP BY hour_ms untuk bulan yang belum ada di cache, lalu
+  di-scatter ke matrix per bulan dengan NumPy (tanpa loop per jam di Python)
+- Bulan yang sudah tertutup (akhir bulan + HEATMAP_CLOSE_DELAY) di-cache per
+  (site, sensor, metric, agg, bulan); range 12 bulan hanya query bulan berjalan
+- agg: avg / sum / min / max / count dari rollup, atau delta untuk counter energi:
+  kenaikan energy_kwh per jam = max jam ini - max jam sebelumnya (max - min jika
+  jam sebelumnya kosong), reset counter di-clip ke 0
+
+Jam mengikuti timestamp pembacaan (waktu lokal device, disimpan sebagai UTC naive).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Any, List, Optional, Hashable
+
+import numpy as np
+
+from epoch_time import to_epoch_ms, from_epoch_ms, site_now_ms, MS_PER_SECOND, MS_PER_HOUR, MS_PER_DAY
+from aggregation import SENSOR_METRICS
+
+# Jumlah matrix bulan yang disimpan di cache (LRU)
+HEATMAP_CACHE_MONTHS = int(os.environ.get('HEATMAP_CACHE_MONTHS', '240'))
+# Bulan dianggap tertutup setelah akhir bulan + delay (toleransi data terlambat)
+HEATMAP_CLOSE_DELAY = int(os.environ.get('HEATMAP_CLOSE_DELAY', '86400'))
+HEATMAP_MAX_DAYS = int(os.environ.get('HEATMAP_MAX_DAYS', '1830'))
+
+HEATMAP_AGGS = ('avg', 'sum', 'min', 'max', 'count', 'delta')
+# Agg yang bisa dijumlahkan per hari (day_totals)
+ADDITIVE_AGGS = ('sum', 'count', 'delta')
+# Metric counter kumulatif (agg delta)
+COUNTER_METRICS = ('energy_kwh',)
+
+HOURS_PER_DAY = MS_PER_DAY // MS_PER_HOUR
+
+# ---------- Bulan ----------
+
+def month_start_ms(ts_ms: int) -> int:
+    """Epoch ms awal bulan (UTC) dari timestamp"""
+    moment = datetime.fromtimestamp(ts_ms / MS_PER_SECOND, timezone.utc)
+    return to_epoch_ms(datetime(moment.year, moment.month, 1))
+
+def next_month_ms(month_ms: int) -> int:
+    return month_start_ms(month_ms + 32 * MS_PER_DAY)
+
+def month_starts(start_ms: int, end_ms: int) -> List[int]:
+    """Awal bulan yang overlap dengan [start_ms, end_ms)"""
+    months = []
+    month_ms = month_start_ms(start_ms)
+    while month_ms < end_ms:
+        months.append(month_ms)
+        month_ms = next_month_ms(month_ms)
+    return months
+
+# ---------- Cache ----------
+
+class MonthCache:
+    """LRU matrix per bulan tertutup, dibagi antar thread request"""
+
+    def __init__(self, max_months: int = HEATMAP_CACHE_MONTHS):
+        self.max_months = max_months
+        self._lock = threading.Lock()
+        self._matrices: 'OrderedDict[Hashable, np.ndarray]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional['np.ndarray']:
+        with self._lock:
+            matrix = self._matrices.get(key)
+            if matrix is None:
+                self.misses += 1
+                return None
+            self._matrices.move_to_end(key)
+            self.hits += 1
+            return matrix
+
+    def put(self, key: Hashable, matrix: 'np.ndarray'):
+        matrix.setflags(write=False)
+        with self._lock:
+            self._matrices[key] = matrix
+            self._matrices.move_to_end(key)
+            while len(self._matrices) > self.max_months:
+                self._matrices.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._matrices.clear()
+
+# ---------- Query ----------
+
+def hourly_values(conn, sensor: str, metric: str, agg: str, start_ms: int, end_ms: int):
+    """
+    (hour_ms, value) array untuk [start_ms, end_ms) dengan satu query rollup.
+    Untuk delta jam sebelum start_ms ikut dibaca sebagai titik awal counter.
+    """
+    query_start = start_ms - MS_PER_HOUR if agg == 'delta' else start_ms
+    rows = conn.execute('''
+        SELECT hour_ms, SUM(count), SUM(sum), MIN(min), MAX(max)
+        FROM metric_rollup_hourly
+        WHERE sensor = ? AND metric = ? AND hour_ms >= ? AND hour_ms < ?
+        GROUP BY hour_ms
+        ORDER BY hour_ms ASC
+    ''', (sensor, metric, query_start, end_ms)).fetchall()
+    if not rows:
+        return np.array([], dtype=np.int64), np.array([])
+
+    hour_ms = np.array([row[0] for row in rows], dtype=np.int64)
+    count, total, low, high = np.array([row[1:] for row in rows], dtype=np.float64).T
+
+    if agg == 'avg':
+        values = np.divide(total, count, out=np.full(len(rows), np.nan), where=count > 0)
+    elif agg == 'sum':
+        values = total
+    elif agg == 'min':
+        values = low
+    elif agg == 'max':
+        values = high
+    elif agg == 'count':
+        values = count
+    else:
+        previous_high = np.r_[np.nan, high[:-1]]
+        consecutive = np.r_[False, np.diff(hour_ms) == MS_PER_HOUR]
+        values = np.where(consecutive, high - previous_high, high - low)
+        values = np.clip(values, 0, None)
+
+    keep = hour_ms >= start_ms
+    return hour_ms[keep], values[keep]
+
+def month_matrix(hour_ms: 'np.ndarray', values: 'np.ndarray', month_ms: int) -> 'np.ndarray':
+    """Matrix hari x 24 satu bulan (NaN = jam tanpa data)"""
+    end_ms = next_month_ms(month_ms)
+    matrix = np.full(((end_ms - month_ms) // MS_PER_DAY, HOURS_PER_DAY), np.nan)
+    mask = (hour_ms >= month_ms) & (hour_ms < end_ms)
+    matrix.ravel()[(hour_ms[mask] - month_ms) // MS_PER_HOUR] = values[mask]
+    return matrix
+
+# ---------- Heatmap ----------
+
+def validate(sensor: str, metric: str, agg: str):
+    config = SENSOR_METRICS.get(sensor)
+    if config is None:
+        raise ValueError(f'Invalid sensor type: {sensor}')
+    if metric not in config['metrics']:
+        raise ValueError(f'Invalid metric for {sensor}: {metric}')
+    if agg not in HEATMAP_AGGS:
+        raise ValueError(f'Invalid agg: {agg} (use {", ".join(HEATMAP_AGGS)})')
+    if agg == 'delta' and metric not in COUNTER_METRICS:
+        raise ValueError(f'agg=delta is only available for counter metrics: {", ".join(COUNTER_METRICS)}')
+
+def _json_values(array: 'np.ndarray') -> list:
+    """Array float (NaN = null) ke list JSON, dibulatkan 4 desimal"""
+    rounded = np.round(array, 4)
+    return np.where(np.isnan(rounded), None, rounded).tolist()
+
+def heatmap(conn, sensor: str, metric: str, agg: str, start_ms: int, end_ms: int,
+            cache: Optional[MonthCache] = None, cache_key: tuple = (),
+            now_ms: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Matrix hari x jam untuk [start_ms, end_ms) (dibulatkan ke hari penuh).
+    Bulan tertutup diambil dari cache (key cache_key + (sensor, metric, agg, bulan)).
+    """
+    validate(sensor, metric, agg)
+    start_ms -= start_ms % MS_PER_DAY
+    if end_ms % MS_PER_DAY:
+        end_ms += MS_PER_DAY - end_ms % MS_PER_DAY
+    if end_ms <= start_ms:
+        raise ValueError('end must be after start')
+    if (end_ms - start_ms) // MS_PER_DAY > HEATMAP_MAX_DAYS:
+        raise ValueError(f'Range too large (max {HEATMAP_MAX_DAYS} days)')
+
+    if now_ms is None:
+        now_ms = site_now_ms()
+    months = month_starts(start_ms, end_ms)
+    closed_before = month_start_ms(now_ms - HEATMAP_CLOSE_DELAY * MS_PER_SECOND)
+
+    matrices, missing = {}, []
+    for month_ms in months:
+        cached = cache.get(cache_key + (sensor, metric, agg, month_ms)) if cache and month_ms < closed_before else None
+        if cached is None:
+            missing.append(month_ms)
+        else:
+            matrices[month_ms] = cached
+
+    if missing:
+        # Satu query untuk span bulan yang belum di-cache
+        hour_ms, values = hourly_values(conn, sensor, metric, agg, missing[0], next_month_ms(missing[-1]))
+        for month_ms in missing:
+            matrices[month_ms] = month_matrix(hour_ms, values, month_ms)
+            if cache and month_ms < closed_before:
+                cache.put(cache_key + (sensor, metric, agg, month_ms), matrices[month_ms])
+
+    first_day = (start_ms - months[0]) // MS_PER_DAY
+    days = (end_ms - start_ms) // MS_PER_DAY
+    matrix = np.concatenate([matrices[month_ms] for month_ms in months])[first_day:first_day + days]
+
+    present = ~np.isnan(matrix)
+    hour_counts = present.sum(axis=0)
+    hour_profile = np.divide(np.nansum(matrix, axis=0), hour_counts,
+                             out=np.full(HOURS_PER_DAY, np.nan), where=hour_counts > 0)
+    day_totals = None
+    if agg in ADDITIVE_AGGS:
+        day_totals = _json_values(np.where(present.any(axis=1), np.nansum(matrix, axis=1), np.nan))
+
+    return {
+        'sensor': sensor,
+        'metric': metric,
+        'agg': agg,
+        'days': [from_epoch_ms(start_ms + index * MS_PER_DAY)[:10] for index in range(days)],
+        'hours': list(range(HOURS_PER_DAY)),
+        'matrix': _json_values(matrix),
+        'hour_profile': _json_values(hour_profile),
+        'day_totals': day_totals,
+        'coverage': round(float(present.mean()), 4) if matrix.size else 0.0,
+        'cache': {
+            'months': len(months),
+            'cached_months': len(months) - len(missing),
+        },
+    }
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Multi-process Ingestion
+Mode ingest dengan parsing di N proses (INGEST_PARSERS > 0). Thread paho hanya
+menyalin payload mentah ke ring buffer shared memory; parser process melakukan
+decode UTF-8/JSON, routing per sensor, parse register PZEM, key series deadband /
+idempotensi dan nilai row (sensor_readings), lalu mengirim batch pesan siap tulis
+ke collector thread di proses receiver, yang menyerahkannya ke BatchWriter site
+(tetap satu writer per shard SQLite). Writer hanya menjalankan langkah database:
+cek duplikat, deadband, INSERT, summary, rollup, anomali dan device health.
+
+- Parser dipilih round-robin per pesan; collector menyerahkan hasil ke writer
+  urut seq (urutan dari broker), sehingga urutan per device tetap terjaga juga
+  untuk <site>/raspi/all yang membawa semua device dan paralelisme tidak
+  dibatasi jumlah topic
+- Ring SPSC per parser: record length-prefixed, index head/tail di header
+  shared memory, semaphore menghitung record yang siap dibaca
+- Ack QoS 1 tetap di proses receiver (seq -> ack) dan dipanggil writer setelah
+  commit / spill seperti mode single process
+- Parser yang mati di-restart, record yang belum sampai writer dikirim ulang
+
+INGEST_PARSERS=0 (default) = decode dan routing di writer thread seperti sebelumnya.
+
+Benchmark (messages/s per jumlah parser; stage parse saja dan end-to-end ke SQLite):
+    python ingest_pool.py --benchmark --parsers 0,1,2,4
+"""
+
+import os
+import sys
+import json
+import time
+import queue
+import struct
+import marshal
+import signal
+import logging
+import argparse
+import itertools
+import threading
+import collections
+import multiprocessing
+from multiprocessing import shared_memory
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, List, Tuple, Callable
+
+from epoch_time import site_now_ms, MS_PER_SECOND
+from sensor_readings import route_readings
+
+logger = logging.getLogger(__name__)
+
+INGEST_PARSERS = int(os.environ.get('INGEST_PARSERS', '0'))
+INGEST_RING_BYTES = int(os.environ.get('INGEST_RING_BYTES', str(4 * 1024 * 1024)))
+INGEST_BATCH_SIZE = int(os.environ.get('INGEST_BATCH_SIZE', '200'))
+INGEST_BATCH_LINGER = float(os.environ.get('INGEST_BATCH_LINGER', '0.01'))
+INGEST_START_METHOD = os.environ.get('INGEST_START_METHOD', 'spawn')
+
+# Kunci hasil prepare di pesan (tidak ikut spill, writer me-route ulang dari payload)
+PREPARED_KEYS = ('readings',)
+
+HEADER = struct.Struct('<QQ')       # head / tail: total byte yang sudah ditulis / dibaca
+INDEX = struct.Struct('<Q')
+HEAD_OFFSET, TAIL_OFFSET = 0, 8
+LENGTH = struct.Struct('<I')
+RECORD = struct.Struct('<QqH')      # seq, received_ms, panjang topic
+WRAP = 0xFFFFFFFF                   # sisa ujung buffer dilewati
+STOP = b''                          # record kosong = parser berhenti
+RING_FULL_SLEEP = 0.001
+
+# ---------- Pesan ----------
+
+def new_message(topic: str, payload: str, received_ms: Optional[int] = None) -> Dict[str, Any]:
+    """Record pesan untuk writer / spill queue, waktu terima default sekarang"""
+    if received_ms is None:
+        received_ms = site_now_ms()
+    now = datetime.fromtimestamp(received_ms / MS_PER_SECOND, timezone.utc)
+    return {
+        'topic': topic,
+        'payload': payload,
+        'received_at': now.strftime('%Y-%m-%d %H:%M:%S'),
+        'received_ms': received_ms
+    }
+
+def prepare_message(topic: str, payload: bytes, received_ms: int) -> Optional[Dict[str, Any]]:
+    """
+    Bagian CPU dari store_messages yang tidak butuh database: decode payload, JSON,
+    routing per sensor, parse PZEM, key series dan nilai row (sensor_readings).
+    None jika payload bukan UTF-8 (tidak akan pernah tersimpan).
+    """
+    try:
+        text = payload.decode('utf-8')
+    except UnicodeDecodeError as e:
+        logger.error(f"Error processing message from {topic}: {e}")
+        return None
+
+    message = new_message(topic, text, received_ms)
+    try:
+        message['readings'] = route_readings(topic, json.loads(text))
+    except Exception:
+        # Raw message tetap disimpan; writer me-route ulang dan me-log error seperti mode single process
+        pass
+    return message
+
+def encode_record(seq: int, received_ms: int, topic: str, payload: bytes) -> bytes:
+    topic_bytes = topic.encode('utf-8')
+    return RECORD.pack(seq, received_ms, len(topic_bytes)) + topic_bytes + payload
+
+def decode_record(record: bytes) -> Tuple[int, int, str, bytes]:
+    seq, received_ms, topic_length = RECORD.unpack_from(record)
+    start = RECORD.size
+    return seq, received_ms, record[start:start + topic_length].decode('utf-8'), record[start + topic_length:]
+
+# ---------- Ring buffer ----------
+
+class ShmRing:
+    """
+    Ring buffer single-producer / single-consumer di shared memory.
+    head hanya ditulis producer dan tail hanya ditulis consumer; keduanya terus
+    naik (modulo kapasitas saat diakses) dan disimpan lokal oleh pemiliknya,
+    header shared memory hanya untuk pihak lain. Record tidak pernah terpotong
+    di ujung buffer. Semaphore menghitung record siap dibaca (sem_post/sem_wait
+    juga menjadi memory barrier isi record), lock menjaga pembacaan tail.
+    """
+
+    def __init__(self, capacity: int = INGEST_RING_BYTES, context=None):
+        context = context or multiprocessing.get_context(INGEST_START_METHOD)
+        self.capacity = capacity
+        self.shm = shared_memory.SharedMemory(create=True, size=HEADER.size + capacity)
+        HEADER.pack_into(self.shm.buf, 0, 0, 0)
+        self.lock = context.Lock()
+        self.items = context.Semaphore(0)
+        self._head = 0          # producer
+        self._tail_seen = 0     # producer: tail terakhir yang dibaca
+        self._tail = 0          # consumer
+
+    def _read_tail(self) -> int:
+        with self.lock:
+            return INDEX.unpack_from(self.shm.buf, TAIL_OFFSET)[0]
+
+    def used(self) -> int:
+        with self.lock:
+            head, tail = HEADER.unpack_from(self.shm.buf, 0)
+        return head - tail
+
+    def put(self, record: bytes, timeout: Optional[float] = None) -> bool:
+        """Tulis satu record; False jika ring tetap penuh sampai timeout (parser tertinggal)"""
+        size = LENGTH.size + len(record)
+        if size > self.capacity:
+            raise ValueError(f"Record of {len(record)} bytes does not fit ring of {self.capacity} bytes")
+
+        head = self._head
+        position = head % self.capacity
+        pad = self.capacity - position if self.capacity - position < size else 0
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.capacity - (head - self._tail_seen) < pad + size:
+            self._tail_seen = self._read_tail()
+            if self.capacity - (head - self._tail_seen) >= pad + size:
+                break
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(RING_FULL_SLEEP)
+
+        buf = self.shm.buf
+        if pad >= LENGTH.size:
+            LENGTH.pack_into(buf, HEADER.size + position, WRAP)
+        offset = HEADER.size + (head + pad) % self.capacity
+        LENGTH.pack_into(buf, offset, len(record))
+        buf[offset + LENGTH.size:offset + size] = record
+        self._head = head + pad + size
+        INDEX.pack_into(buf, HEAD_OFFSET, self._head)
+        self.items.release()
+        return True
+
+    def get_many(self, max_records: int, timeout: Optional[float] = None) -> List[bytes]:
+        """Sampai max_records record (urut); list kosong jika tidak ada record sampai timeout"""
+        if not self.items.acquire(timeout=timeout):
+            return []
+        count = 1
+        while count < max_records and self.items.acquire(False):
+            count += 1
+
+        buf = self.shm.buf
+        tail = self._tail
+        records = []
+        while len(records) < count:
+            position = tail % self.capacity
+            remaining = self.capacity - position
+            if remaining < LENGTH.size:
+                tail += remaining
+                continue
+            (length,) = LENGTH.unpack_from(buf, HEADER.size + position)
+            if length == WRAP:
+                tail += remaining
+                continue
+            start = HEADER.size + position + LENGTH.size
+            records.append(bytes(buf[start:start + length]))
+            tail += LENGTH.size + length
+        self._tail = tail
+        with self.lock:
+            INDEX.pack_into(buf, TAIL_OFFSET, tail)
+        return records
+
+    def close(self, unlink: bool = False):
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+# ---------- Parser process ----------
+
+def parser_main(ring: ShmRing, results, shard: int):
+    """Loop parser process: record ring -> pesan siap tulis -> batch (seq, message) ke collector"""
+    # Ctrl+C ditangani receiver, parser berhenti lewat record STOP setelah ring habis
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logger.info(f"Ingest parser {shard} started (pid {os.getpid()})")
+
+    batch, deadline = [], None
+    running = True
+    while running:
+        timeout = 1.0 if deadline is None else max(deadline - time.monotonic(), 0)
+        for record in ring.get_many(INGEST_BATCH_SIZE - len(batch), timeout):
+            if record == STOP:
+                running = False
+                break
+            seq, received_ms, topic, payload = decode_record(record)
+            batch.append((seq, prepare_message(topic, payload, received_ms)))
+
+        if batch and deadline is None:
+            deadline = time.monotonic() + INGEST_BATCH_LINGER
+        if batch and (not running or len(batch) >= INGEST_BATCH_SIZE or time.monotonic() >= deadline):
+            # marshal: hasil JSON + parse hanya tipe dasar, decode di receiver ~2x lebih cepat dari pickle
+            results.put(marshal.dumps(batch))
+            batch, deadline = [], None
+
+    results.put(None)
+    ring.close()
+
+# ---------- Receiver ----------
+
+class IngestPool:
+    """
+    Sisi receiver: submit() dipanggil thread paho dan hanya menyalin payload ke
+    ring parser berikutnya (round-robin); collector thread menahan hasil parser
+    sampai semua seq sebelumnya selesai, lalu menyerahkannya ke router
+    (submit_message) bersama ack pesan tersebut.
+    Record disimpan sampai diserahkan ke writer: parser yang mati di-restart dan
+    record shard-nya dikirim ulang berurutan (hasil ganda dari parser lama dibuang per seq).
+    """
+
+    def __init__(self, router, parsers: int = INGEST_PARSERS, ring_bytes: int = INGEST_RING_BYTES):
+        self.router = router
+        self.parsers = parsers
+        self.ring_bytes = ring_bytes
+        self.context = multiprocessing.get_context(INGEST_START_METHOD)
+        self.rings: List[Optional[ShmRing]] = [None] * parsers
+        self.processes = [None] * parsers
+        self.results = None
+        # seq -> (shard, record, ack) yang belum diserahkan ke writer. OrderedDict: seq terkecil
+        # diambil O(1); dict biasa men-scan slot kosong bekas pop di depan pada setiap iter()
+        self._pending: Dict[int, Tuple[int, bytes, Optional[Callable[[bool], None]]]] = collections.OrderedDict()
+        # seq -> hasil parser yang menunggu seq lebih kecil (urutan insert _pending = urutan seq)
+        self._ready: Dict[int, Optional[Dict[str, Any]]] = {}
+        self._seq = itertools.count(1)
+        self._submit_lock = threading.Lock()
+        self._collector = None
+        self._closing = False
+        self.submitted_total = 0
+        self.delivered_total = 0
+        self.restarts_total = 0
+        self.fallback_total = 0
+
+    def _spawn(self, shard: int):
+        ring = ShmRing(self.ring_bytes, self.context)
+        process = self.context.Process(target=parser_main, args=(ring, self.results, shard),
+                                       name=f'ingest-parser-{shard}', daemon=True)
+        process.start()
+        self.rings[shard], self.processes[shard] = ring, process
+
+    def start(self):
+        self.results = self.context.Queue()
+        for shard in range(self.parsers):
+            self._spawn(shard)
+
+        self._collector = threading.Thread(target=self._collect, name='ingest-collector', daemon=True)
+        self._collector.start()
+        logger.info(f"Ingest pool started: {self.parsers} parser processes, "
+                    f"{self.ring_bytes // 1024} KiB ring each")
+
+    def _restart(self, shard: int):
+        """Parser mati: ring baru, lalu kirim ulang record shard yang belum diserahkan (urut seq)"""
+        replay = sorted((seq, record) for seq, (owner, record, _) in list(self._pending.items())
+                        if owner == shard)
+        logger.error(f"Ingest parser {shard} died (exit code {self.processes[shard].exitcode}), "
+                     f"restarting and replaying {len(replay)} messages")
+        self.rings[shard].close(unlink=True)
+        self._spawn(shard)
+        self.restarts_total += 1
+        for _, record in replay:
+            if not self._put(shard, record):
+                # Parser baru juga mati: restart berikutnya sudah mengirim ulang semuanya
+                return
+
+    def _put(self, shard: int, record: bytes) -> bool:
+        """
+        Tulis record ke ring parser, menunggu selama parser masih hidup.
+        False jika parser mati dan di-restart (record sudah pending, ikut dikirim ulang).
+        """
+        while not self.rings[shard].put(record, timeout=1.0):
+            if not self.processes[shard].is_alive():
+                self._restart(shard)
+                return False
+            logger.warning(f"Ingest parser {shard} ring full, waiting")
+        return True
+
+    def submit(self, topic: str, payload: bytes, ack: Optional[Callable[[bool], None]] = None):
+        """Dipanggil dari thread paho, menunggu hanya jika ring parser penuh (backpressure)"""
+        with self._submit_lock:
+            if not self._closing:
+                seq = next(self._seq)
+                shard = seq % self.parsers
+                if not self.processes[shard].is_alive():
+                    self._restart(shard)
+                record = encode_record(seq, site_now_ms(), topic, payload)
+                self._pending[seq] = (shard, record, ack)
+                try:
+                    self._put(shard, record)
+                except Exception:
+                    # Caller melepas slot ack; seq berikutnya tidak menunggu record ini
+                    self._pending.pop(seq, None)
+                    self._ready.pop(seq, None)
+                    raise
+                self.submitted_total += 1
+                return
+
+        # Pool sedang berhenti: parse di thread ini seperti mode single process
+        self.fallback_total += 1
+        self.router.submit(topic, payload.decode('utf-8'), ack)
+
+    def _deliver(self, batch: List[Tuple[int, Optional[Dict[str, Any]]]]):
+        with self._submit_lock:
+            for seq, message in batch:
+                # Seq yang sudah diserahkan: hasil parser lama untuk record yang dikirim ulang
+                if seq in self._pending:
+                    self._ready[seq] = message
+            ready = []
+            while self._pending:
+                seq = next(iter(self._pending))
+                if seq not in self._ready:
+                    break
+                ready.append((seq, self._pending.pop(seq)[2], self._ready.pop(seq)))
+
+        for seq, ack, message in ready:
+            try:
+                if message is None:
+                    # Payload bukan UTF-8 tidak akan pernah tersimpan, ack supaya tidak dikirim ulang
+                    if ack is not None:
+                        ack(True)
+                    continue
+                self.router.submit_message(message, ack)
+            except Exception as e:
+                # Slot window dilepas tanpa ack, broker mengirim ulang
+                logger.error(f"Error delivering message {seq}: {e}")
+                if ack is not None:
+                    ack(False)
+            self.delivered_total += 1
+
+    def _collect(self):
+        while True:
+            try:
+                batch = self.results.get(timeout=0.5)
+            except queue.Empty:
+                if self._closing and not any(process.is_alive() for process in self.processes):
+                    break
+                # Parser yang mati saat tidak ada pesan baru untuk shard-nya
+                with self._submit_lock:
+                    for shard, process in enumerate(self.processes):
+                        if not self._closing and not process.is_alive():
+                            self._restart(shard)
+                continue
+            if batch is not None:
+                self._deliver(marshal.loads(batch))
+
+    def stop(self, timeout: float = 30):
+        """Parser menghabiskan ring lalu berhenti; batch terakhir diserahkan ke writer"""
+        with self._submit_lock:
+            self._closing = True
+            for ring, process in zip(self.rings, self.processes):
+                if process.is_alive():
+                    ring.put(STOP, timeout=timeout)
+        for process in self.processes:
+            process.join(timeout)
+        if self._collector is not None:
+            self._collector.join(timeout)
+        for ring in self.rings:
+            ring.close(unlink=True)
+        if self._pending:
+            # Tidak di-ack, broker mengirim ulang setelah worker connect lagi
+            logger.warning(f"Ingest pool stopped with {len(self._pending)} undelivered messages")
+        logger.info(f"Ingest pool stopped ({self.delivered_total} messages delivered)")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'parsers': self.parsers,
+            'parsers_alive': sum(process.is_alive() for process in self.processes),
+            'submitted_total': self.submitted_total,
+            'delivered_total': self.delivered_total,
+            'restarts_total': self.restarts_total,
+            'fallback_total': self.fallback_total,
+            'in_pool': len(self._pending),
+            'reorder_buffered': len(self._ready),
+            'ring_used_bytes': [ring.used() for ring in self.rings]
+        }
+
+# ---------- Benchmark ----------
+
+BENCH_TOPICS = ('sensor/pzem016_ac', 'sensor/pzem017_dc', 'sensor/dht22', 'resource/system', 'all')
+
+def _bench_messages(count: int, sites: int) -> List[Tuple[str, bytes]]:
+    """Campuran topic per site seperti Pi di lapangan; timestamp naik per site"""
+    from parser_bench import build_corpus
+
+    corpus = build_corpus()
+    ac, dc = corpus['pzem016/day'], corpus['pzem017/day']
+    messages = []
+    for index in range(count):
+        site, step = index % sites, index // sites
+        topic = BENCH_TOPICS[step % len(BENCH_TOPICS)]
+        timestamp = datetime.fromtimestamp(1751328000 + step * 2, timezone.utc).replace(tzinfo=None).isoformat()
+        pzem016 = {'timestamp': timestamp, 'device_type': 'PZEM-016_AC', 'device_path': '/dev/ttyUSB0',
+                   'slave_id': 1, 'raw_registers': ac[step % len(ac)], 'register_count': 10,
+                   'status': 'success', 'error_message': None}
+        pzem017 = {'timestamp': timestamp, 'device_type': 'PZEM-017_DC', 'device_path': '/dev/ttyUSB1',
+                   'slave_id': 2, 'raw_registers': dc[step % len(dc)], 'register_count': 8,
+                   'status': 'success', 'error_message': None}
+        dht22 = {'timestamp': timestamp, 'temperature': 24 + step % 50 / 10, 'humidity': 60 + step % 30 / 10,
+                 'gpio_pin': 4, 'library': 'adafruit', 'status': 'success', 'error_message': None}
+        system = {'timestamp': timestamp, 'ram_usage_percent': 40 + step % 20, 'storage_usage_percent': 31.5,
+                  'cpu_usage_percent': 10 + step % 60, 'cpu_temperature': 50 + step % 15,
+                  'storage_total_gb': 29.1, 'storage_used_gb': 9.2, 'storage_free_gb': 19.9,
+                  'status': 'success', 'error_message': None}
+        data = {
+            'sensor/pzem016_ac': pzem016,
+            'sensor/pzem017_dc': pzem017,
+            'sensor/dht22': dht22,
+            'resource/system': system,
+            'all': {'timestamp': timestamp,
+                    'sensors': {'pzem016_ac': pzem016, 'pzem017_dc': pzem017, 'dht22': dht22, 'system': system}}
+        }[topic]
+        messages.append((f'site{site}/raspi/{topic}', json.dumps(data).encode('utf-8')))
+    return messages
+
+class _CountingRouter:
+    """Sink stage parse: hanya menghitung pesan yang keluar dari parser"""
+
+    def __init__(self, expected: int):
+        self.expected = expected
+        self.received = 0
+        self.done = threading.Event()
+
+    def submit_message(self, message: Dict[str, Any], ack=None):
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+
+    def submit(self, topic: str, payload: str, ack=None):
+        self.submit_message(new_message(topic, payload), ack)
+
+class _SQLiteRouter(_CountingRouter):
+    """Sink end-to-end: satu writer, store_messages per WRITER_BATCH_SIZE pesan"""
+
+    def __init__(self, expected: int, db_manager, batch_size: int):
+        super().__init__(expected)
+        self.db_manager = db_manager
+        self.batch_size = batch_size
+        self.batch = []
+
+    def submit_message(self, message: Dict[str, Any], ack=None):
+        self.batch.append(message)
+        if len(self.batch) >= self.batch_size or self.received + len(self.batch) >= self.expected:
+            self.db_manager.store_messages(self.batch)
+            self.received += len(self.batch)
+            self.batch = []
+            if self.received >= self.expected:
+                self.done.set()
+
+def _run_level(messages: List[Tuple[str, bytes]], parsers: int, router) -> Tuple[float, float]:
+    """
+    (messages/s, CPU proses receiver per pesan dalam us) untuk satu jumlah parser
+    (0 = parse inline). CPU receiver (paho + collector + writer, berbagi GIL) adalah
+    batas atas throughput jika core untuk parser cukup.
+    """
+    started, cpu_started = time.perf_counter(), time.process_time()
+    if parsers == 0:
+        for topic, payload in messages:
+            if isinstance(router, _SQLiteRouter):
+                router.submit(topic, payload.decode('utf-8'))
+            else:
+                router.submit_message(prepare_message(topic, payload, site_now_ms()))
+    else:
+        pool = IngestPool(router, parsers)
+        pool.start()
+        try:
+            started, cpu_started = time.perf_counter(), time.process_time()
+            for topic, payload in messages:
+                pool.submit(topic, payload)
+            router.done.wait()
+        finally:
+            elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+            pool.stop()
+        return len(messages) / elapsed, cpu / len(messages) * 1e6
+    elapsed, cpu = time.perf_counter() - started, time.process_time() - cpu_started
+    return len(messages) / elapsed, cpu / len(messages) * 1e6
+
+def run_benchmark(levels: List[int], count: int, e2e_count: int, sites: int) -> Dict[str, Any]:
+    import tempfile
+    import shutil
+    from mqtt_worker import DatabaseManager, WRITER_BATCH_SIZE
+
+    messages = _bench_messages(count, sites)
+    results = {
+        'cpu_count': os.cpu_count(),
+        'messages': count,
+        'e2e_messages': e2e_count,
+        'topics': sites * len(BENCH_TOPICS),
+        'levels': []
+    }
+    for parsers in levels:
+        parse_rate, parse_cpu = _run_level(messages, parsers, _CountingRouter(count))
+
+        directory = tempfile.mkdtemp(prefix='ingest-bench-')
+        try:
+            db_manager = DatabaseManager(os.path.join(directory, 'bench.db'))
+            e2e_rate, e2e_cpu = _run_level(messages[:e2e_count], parsers,
+                                           _SQLiteRouter(e2e_count, db_manager, WRITER_BATCH_SIZE))
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+        results['levels'].append({
+            'parsers': parsers,
+            'parse_msg_s': round(parse_rate),
+            'parse_receiver_us': round(parse_cpu, 1),
+            'e2e_msg_s': round(e2e_rate),
+            'e2e_receiver_us': round(e2e_cpu, 1)
+        })
+
+    base = results['levels'][0]
+    for level in results['levels']:
+        level['parse_speedup'] = round(level['parse_msg_s'] / base['parse_msg_s'], 2)
+        level['e2e_speedup'] = round(level['e2e_msg_s'] / base['e2e_msg_s'], 2)
+    return results
+
+def _print_report(results: Dict[str, Any]):
+    print(f"Ingest benchmark: {results['messages']} messages (end-to-end {results['e2e_messages']}), "
+          f"{results['topics']} topics, {results['cpu_count']} CPU")
+    print(f"{'parsers':>8} {'parse msg/s':>12} {'speedup':>8} {'recv us':>8} "
+          f"{'e2e msg/s':>10} {'speedup':>8} {'recv us':>8}")
+    for level in results['levels']:
+        label = str(level['parsers']) if level['parsers'] else '0 inline'
+        print(f"{label:>8} {level['parse_msg_s']:>12} {level['parse_speedup']:>7}x {level['parse_receiver_us']:>8} "
+              f"{level['e2e_msg_s']:>10} {level['e2e_speedup']:>7}x {level['e2e_receiver_us']:>8}")
+    print("recv us = CPU proses receiver per pesan; 1e6 / recv us = batas msg/s saat core parser cukup")
+    print(f"Parser dipilih round-robin dan hasil diserahkan urut seq: {results['topics']} topics tidak "
+          f"membatasi parser aktif (satu site = 5 topic, /all membawa semua device)")
+    if results['cpu_count'] and max(level['parsers'] for level in results['levels']) >= results['cpu_count']:
+        print(f"Note: parsers >= CPUs ({results['cpu_count']}), scaling is capped by the host")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Multi-process ingestion (parser pool) benchmark')
+    parser.add_argument('--benchmark', action='store_true', help='Ukur messages/s per jumlah parser')
+    parser.add_argument('--parsers', default='0,1,2,4', help='Jumlah parser process, dipisah koma (0 = inline)')
+    parser.add_argument('--messages', type=int, default=20000, help='Jumlah pesan stage parse')
+    parser.add_argument('--e2e-messages', type=int, default=5000, help='Jumlah pesan end-to-end ke SQLite')
+    parser.add_argument('--sites', type=int, default=8, help='Jumlah site (topic = site x 5)')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args()
+
+    if not args.benchmark:
+        parser.print_help()
+        sys.exit(0)
+
+    # Log per pesan dari writer tidak ikut diukur
+    logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
+    levels = [int(value) for value in args.parsers.split(',')]
+    results = run_benchmark(levels, args.messages, args.e2e_messages, args.sites)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        _print_report(results)
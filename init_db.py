@@ -9,87 +9,26 @@ import os
 import sys
 from datetime import datetime
 
+from migrations import ensure_schema, current_version
+
 DB_PATH = os.environ.get('DB_PATH', '/app/data/sensor_monitoring.db')
 
 def init_database():
-    """Initialize database with proper schema"""
-    
-    # Create data directory if not exists
-    os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
+    """Initialize database with proper schema (via migrations package)"""
     
     print(f"Initializing database at: {DB_PATH}")
     
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
     try:
-        # Table untuk PZEM data (AC & DC) with parsed values
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pzem_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                device_type TEXT NOT NULL,
-                device_path TEXT,
-                slave_id INTEGER,
-                raw_registers TEXT,
-                register_count INTEGER,
-                status TEXT,
-                error_message TEXT,
-                parsed_data TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        version_before = 0
+        if os.path.exists(DB_PATH):
+            conn = sqlite3.connect(DB_PATH)
+            version_before = current_version(conn)
+            conn.close()
         
-        # Table untuk DHT22 data
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dht22_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                temperature REAL,
-                humidity REAL,
-                gpio_pin INTEGER,
-                library TEXT,
-                status TEXT,
-                error_message TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table untuk System Resources
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                ram_usage_percent REAL,
-                storage_usage_percent REAL,
-                cpu_usage_percent REAL,
-                cpu_temperature REAL,
-                storage_total_gb REAL,
-                storage_used_gb REAL,
-                storage_free_gb REAL,
-                status TEXT,
-                error_message TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        version = ensure_schema(DB_PATH)
         
-        # Table untuk raw MQTT messages (backup)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mqtt_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                payload TEXT NOT NULL,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Indexes untuk performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pzem_timestamp ON pzem_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pzem_device_type ON pzem_data(device_type)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dht22_timestamp ON dht22_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_timestamp ON system_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mqtt_timestamp ON mqtt_messages(received_at)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mqtt_topic ON mqtt_messages(topic)')
+        conn = sqlite3.connect(DB_PATH)
+        cursor = conn.cursor()
         
         # Insert initial test data (optional)
         cursor.execute('''
@@ -102,8 +41,10 @@ def init_database():
         # Verify tables created
         cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
         tables = cursor.fetchall()
+        conn.close()
         
         print("✅ Database initialized successfully!")
+        print(f"🧬 Schema version: {version_before} -> {version}")
         print(f"📊 Created tables: {[table[0] for table in tables]}")
         
         # Set proper permissions
@@ -112,8 +53,6 @@ def init_database():
     except Exception as e:
         print(f"❌ Error initializing database: {e}")
         sys.exit(1)
-    finally:
-        conn.close()
 
 def verify_database():
     """Verify database is working properly"""
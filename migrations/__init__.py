@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Schema Migrations
+Satu sumber schema untuk init_db.py, MQTT worker dan web API.
+
+Setiap step adalah module m<NNN>_<name>.py dengan VERSION, NAME dan upgrade(conn).
+Worker, web API dan db-init menjalankan ensure_schema bersamaan saat startup:
+migrasi diserialkan dengan lock file di samping database (flock), proses yang
+menunggu membaca ulang versi setelah lock didapat. Step tetap idempotent (IF NOT
+EXISTS, WHERE kolom IS NULL, seed di dalam BEGIN IMMEDIATE) untuk platform
+tanpa fcntl. Versi yang sudah diterapkan
+dicatat di tabel schema_version; saat database sudah current, ensure_schema()
+hanya melakukan satu SELECT tanpa DDL apapun.
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import contextlib
+from datetime import datetime
+from typing import List, Optional
+
+from migrations import (
+    m001_base_schema,
+    m002_roi_tables,
+    m003_epoch_timestamps,
+    m004_cold_storage_state,
+    m005_metric_rollups,
+    m006_deadband_runs,
+    m007_series_blocks,
+    m008_dashboard_summary,
+    m009_row_filters,
+    m010_anomaly_events,
+    m011_device_health,
+)
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS = [
+    m001_base_schema,
+    m002_roi_tables,
+    m003_epoch_timestamps,
+    m004_cold_storage_state,
+    m005_metric_rollups,
+    m006_deadband_runs,
+    m007_series_blocks,
+    m008_dashboard_summary,
+    m009_row_filters,
+    m010_anomaly_events,
+    m011_device_health,
+]
+
+LATEST_VERSION = MIGRATIONS[-1].VERSION
+
+BACKFILL_CHUNK_SIZE = int(os.environ.get('MIGRATION_CHUNK_SIZE', '5000'))
+BACKFILL_CHUNK_PAUSE = float(os.environ.get('MIGRATION_CHUNK_PAUSE', '0.01'))
+
+def current_version(conn: sqlite3.Connection) -> int:
+    """Versi schema saat ini (0 jika database belum pernah dimigrasi)"""
+    try:
+        row = conn.execute('SELECT MAX(version) FROM schema_version').fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+@contextlib.contextmanager
+def migration_lock(db_path: str):
+    """Lock eksklusif antar proses selama migrasi (no-op tanpa fcntl)"""
+    if not FCNTL_AVAILABLE:
+        yield
+        return
+    with open(f'{db_path}.migrate-lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def ensure_schema(db_path: str, target_version: Optional[int] = None) -> int:
+    """Jalankan migrasi yang belum diterapkan, return versi akhir"""
+    target_version = target_version or LATEST_VERSION
+
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        version = current_version(conn)
+        if version >= target_version:
+            return version
+
+        with migration_lock(db_path):
+            return _migrate(conn, target_version)
+    finally:
+        conn.close()
+
+def _migrate(conn: sqlite3.Connection, target_version: int) -> int:
+    """Terapkan step yang belum ada (dipanggil dengan migration_lock)"""
+    # Proses lain mungkin sudah migrasi selama menunggu lock
+    version = current_version(conn)
+    if version >= target_version:
+        return version
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.commit()
+
+    for migration in MIGRATIONS:
+        if migration.VERSION <= version or migration.VERSION > target_version:
+            continue
+
+        started = time.time()
+        logger.info(f"Applying migration {migration.VERSION:03d}_{migration.NAME}")
+        migration.upgrade(conn)
+        conn.execute(
+            'INSERT OR IGNORE INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)',
+            (migration.VERSION, migration.NAME, datetime.now().isoformat())
+        )
+        conn.commit()
+        version = migration.VERSION
+        logger.info(f"Migration {migration.VERSION:03d} applied in {time.time() - started:.2f}s")
+
+    return version
+
+def backfill_in_chunks(conn: sqlite3.Connection, table: str, set_clause: str, where_clause: str,
+                       params: tuple = (), chunk_size: int = BACKFILL_CHUNK_SIZE) -> int:
+    """
+    Online data migration: UPDATE per range id dengan commit tiap chunk,
+    supaya writer lain (MQTT worker) tidak terkunci selama backfill tabel besar.
+    """
+    min_id, max_id = conn.execute(
+        f'SELECT MIN(id), MAX(id) FROM {table} WHERE {where_clause}', params
+    ).fetchone()
+    if min_id is None:
+        return 0
+
+    updated = 0
+    for chunk_start in range(min_id, max_id + 1, chunk_size):
+        cursor = conn.execute(f'''
+            UPDATE {table} SET {set_clause}
+            WHERE id >= ? AND id < ? AND {where_clause}
+        ''', (chunk_start, chunk_start + chunk_size) + tuple(params))
+        updated += cursor.rowcount
+        conn.commit()
+        if BACKFILL_CHUNK_PAUSE:
+            time.sleep(BACKFILL_CHUNK_PAUSE)
+
+    logger.info(f"Backfilled {updated} rows in {table}")
+    return updated
+
+def table_columns(conn: sqlite3.Connection, table: str) -> List[str]:
+    """Daftar kolom tabel"""
+    return [row[1] for row in conn.execute(f'PRAGMA table_info({table})').fetchall()]
@@ -0,0 +1,78 @@
+"""Tabel sensor, raw MQTT messages dan index dasar"""
+
+VERSION = 1
+NAME = 'base_schema'
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # WAL: reader API tidak memblokir writer MQTT worker (persisten di file database)
+    cursor.execute('PRAGMA journal_mode=WAL')
+
+    # Table untuk PZEM data (AC & DC) with parsed values
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pzem_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            device_type TEXT NOT NULL,
+            device_path TEXT,
+            slave_id INTEGER,
+            raw_registers TEXT,
+            register_count INTEGER,
+            status TEXT,
+            error_message TEXT,
+            parsed_data TEXT,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Table untuk DHT22 data
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS dht22_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            temperature REAL,
+            humidity REAL,
+            gpio_pin INTEGER,
+            library TEXT,
+            status TEXT,
+            error_message TEXT,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Table untuk System Resources
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            ram_usage_percent REAL,
+            storage_usage_percent REAL,
+            cpu_usage_percent REAL,
+            cpu_temperature REAL,
+            storage_total_gb REAL,
+            storage_used_gb REAL,
+            storage_free_gb REAL,
+            status TEXT,
+            error_message TEXT,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Table untuk raw MQTT messages (backup)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mqtt_messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            topic TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            received_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Indexes untuk performance
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pzem_timestamp ON pzem_data(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pzem_device_type ON pzem_data(device_type)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_dht22_timestamp ON dht22_data(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_timestamp ON system_data(timestamp)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_mqtt_timestamp ON mqtt_messages(received_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_mqtt_topic ON mqtt_messages(topic)')
@@ -0,0 +1,61 @@
+"""Tabel ROI settings dan tariff history (sebelumnya init_roi_tables di web_api.py)"""
+
+from epoch_time import site_now
+
+VERSION = 2
+NAME = 'roi_tables'
+
+def upgrade(conn):
+    cursor = conn.cursor()
+
+    # ROI Settings table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS roi_settings (
+            id INTEGER PRIMARY KEY,
+            pv_investment_cost REAL DEFAULT 20500000,
+            current_tariff_per_kwh REAL DEFAULT 1352,
+            system_start_date TEXT,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Tariff history for accurate historical calculations
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS tariff_history (
+            id INTEGER PRIMARY KEY,
+            tariff_per_kwh REAL NOT NULL,
+            effective_date TEXT NOT NULL,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    conn.commit()
+
+    # Insert default values if not exists. Cek + insert dalam satu write transaction:
+    # worker, web API dan db-init menjalankan ensure_schema bersamaan saat startup
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        cursor.execute('SELECT COUNT(*) FROM roi_settings')
+        if cursor.fetchone()[0] == 0:
+            # Auto-detect system start date from first successful PZEM-016 reading
+            cursor.execute('''
+                SELECT MIN(timestamp) FROM pzem_data
+                WHERE device_type = 'PZEM-016_AC'
+                AND status = 'success'
+                AND parsed_data IS NOT NULL
+            ''')
+            system_start = cursor.fetchone()[0] or site_now().isoformat()
+
+            cursor.execute('''
+                INSERT INTO roi_settings (system_start_date) VALUES (?)
+            ''', (system_start,))
+
+            # Insert initial tariff
+            cursor.execute('''
+                INSERT INTO tariff_history (tariff_per_kwh, effective_date)
+                VALUES (1352, ?)
+            ''', (system_start,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,26 @@
+"""Kolom INTEGER epoch ms (ts_ms) + index, backfill online per chunk"""
+
+from epoch_time import to_epoch_ms
+
+VERSION = 3
+NAME = 'epoch_timestamps'
+
+# Tabel sensor yang punya kolom ts_ms beserta index-nya
+EPOCH_TABLES = {
+    'pzem_data': ('idx_pzem_device_ts_ms', 'device_type, ts_ms'),
+    'dht22_data': ('idx_dht22_ts_ms', 'ts_ms'),
+    'system_data': ('idx_system_ts_ms', 'ts_ms'),
+}
+
+def upgrade(conn):
+    from migrations import backfill_in_chunks, table_columns
+
+    conn.create_function('to_epoch_ms', 1, to_epoch_ms, deterministic=True)
+
+    for table, (index_name, index_columns) in EPOCH_TABLES.items():
+        if 'ts_ms' not in table_columns(conn, table):
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN ts_ms INTEGER')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {index_name} ON {table}({index_columns})')
+        conn.commit()
+
+        backfill_in_chunks(conn, table, 'ts_ms = to_epoch_ms(timestamp)', 'ts_ms IS NULL')
@@ -0,0 +1,14 @@
+"""Watermark cold storage tier per sensor (data < watermark hanya ada di Parquet)"""
+
+VERSION = 4
+NAME = 'cold_storage_state'
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS cold_storage_state (
+            sensor TEXT PRIMARY KEY,
+            watermark_ms INTEGER NOT NULL,
+            archived_rows INTEGER DEFAULT 0,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
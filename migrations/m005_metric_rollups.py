@@ -0,0 +1,38 @@
+"""Rollup per jam (count/sum/min/max) untuk metric whitelist aggregation API"""
+
+from aggregation import SENSOR_METRICS, metric_expression
+from epoch_time import MS_PER_HOUR
+
+VERSION = 5
+NAME = 'metric_rollups'
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS metric_rollup_hourly (
+            sensor TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            hour_ms INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            PRIMARY KEY (sensor, metric, hour_ms)
+        ) WITHOUT ROWID
+    ''')
+
+    # Backfill dari row yang sudah ada; INSERT OR IGNORE supaya aman jika dua
+    # service menjalankan step ini bersamaan (worker sudah upsert jam yang sama)
+    for sensor, config in SENSOR_METRICS.items():
+        for metric in config['metrics']:
+            value_sql = metric_expression(sensor, metric)
+            conn.execute(f'''
+                INSERT OR IGNORE INTO metric_rollup_hourly (sensor, metric, hour_ms, count, sum, min, max)
+                SELECT ?, ?, hour_ms, COUNT(value), SUM(value), MIN(value), MAX(value)
+                FROM (
+                    SELECT (ts_ms / {MS_PER_HOUR}) * {MS_PER_HOUR} AS hour_ms, {value_sql} AS value
+                    FROM {config['table']}
+                    WHERE {config['where']} AND status = 'success' AND ts_ms IS NOT NULL
+                )
+                WHERE value IS NOT NULL
+                GROUP BY hour_ms
+            ''', (sensor, metric))
@@ -0,0 +1,18 @@
+"""Kolom run-length deadband: repeat_count pembacaan yang di-suppress dan valid_until_ms"""
+
+VERSION = 6
+NAME = 'deadband_runs'
+
+RUN_TABLES = ['pzem_data', 'dht22_data', 'system_data']
+
+def upgrade(conn):
+    from migrations import table_columns
+
+    for table in RUN_TABLES:
+        columns = table_columns(conn, table)
+        # ADD COLUMN dengan default konstan tidak menulis ulang tabel
+        if 'repeat_count' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN repeat_count INTEGER NOT NULL DEFAULT 0')
+        if 'valid_until_ms' not in columns:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN valid_until_ms INTEGER')
+        conn.commit()
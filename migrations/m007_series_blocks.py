@@ -0,0 +1,29 @@
+"""Block store: chunk per device fisik per jam (delta-of-delta timestamp, XOR float, bit flag)"""
+
+VERSION = 7
+NAME = 'series_blocks'
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS series_blocks (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            hour_ms INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            first_ms INTEGER NOT NULL,
+            last_ms INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (sensor, device, hour_ms)
+        ) WITHOUT ROWID
+    ''')
+
+    # Jam < watermark sudah dipadatkan ke series_blocks untuk (sensor, device)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS series_block_state (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            watermark_ms INTEGER NOT NULL,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (sensor, device)
+        )
+    ''')
@@ -0,0 +1,81 @@
+"""Materialized dashboard summary per hari/bulan/all-time, backfill dari row yang ada"""
+
+from aggregation import SENSOR_METRICS, metric_expression
+from dashboard_summary import SUMMARY_METRICS, period_keys, summary_samples
+
+VERSION = 8
+NAME = 'dashboard_summary'
+
+def _backfill(conn, sensor):
+    """Accumulate per key di Python (jumlah key kecil), run deadband diberi bobot"""
+    config = SENSOR_METRICS[sensor]
+    metrics = SUMMARY_METRICS[sensor]
+    value_sql = ', '.join(metric_expression(sensor, metric) for metric in metrics)
+    cursor = conn.execute(f'''
+        SELECT ts_ms, COALESCE(valid_until_ms, ts_ms), 1 + repeat_count, status = 'success', {value_sql}
+        FROM {config['table']}
+        WHERE {config['where']} AND ts_ms IS NOT NULL
+    ''')
+
+    totals = {}
+    for ts_ms, last_ms, weight, success, *values in cursor:
+        samples = summary_samples(sensor, dict(zip(metrics, values)), bool(success))
+        for period, period_start_ms in period_keys(ts_ms):
+            for metric, value in samples:
+                key = (period, period_start_ms, sensor, metric)
+                total = totals.get(key)
+                if total is None:
+                    totals[key] = [weight, value * weight, value, value, last_ms, value]
+                    continue
+                total[0] += weight
+                total[1] += value * weight
+                total[2] = min(total[2], value)
+                total[3] = max(total[3], value)
+                if last_ms >= total[4]:
+                    total[4], total[5] = last_ms, value
+
+    # OR IGNORE: worker yang sudah di versi ini meng-upsert key yang sama
+    conn.executemany('''
+        INSERT OR IGNORE INTO dashboard_summary (
+            period, period_start_ms, sensor, metric, count, sum, min, max, last_ts_ms, last_value
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', [key + tuple(total) for key, total in totals.items()])
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_summary (
+            period TEXT NOT NULL,
+            period_start_ms INTEGER NOT NULL,
+            sensor TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            sum REAL NOT NULL,
+            min REAL NOT NULL,
+            max REAL NOT NULL,
+            last_ts_ms INTEGER NOT NULL,
+            last_value REAL NOT NULL,
+            PRIMARY KEY (period, period_start_ms, sensor, metric)
+        ) WITHOUT ROWID
+    ''')
+
+    # Hari yang sudah di cold tier tidak ada di row, jadi tidak ikut backfill
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS dashboard_summary_state (
+            sensor TEXT PRIMARY KEY,
+            covered_from_ms INTEGER
+        )
+    ''')
+
+    for sensor in SUMMARY_METRICS:
+        if conn.execute('SELECT 1 FROM dashboard_summary_state WHERE sensor = ?', (sensor,)).fetchone():
+            continue
+        row = conn.execute(
+            'SELECT watermark_ms FROM cold_storage_state WHERE sensor = ?', (sensor,)
+        ).fetchone()
+        watermark = row[0] if row else None
+        _backfill(conn, sensor)
+        conn.execute(
+            'INSERT OR IGNORE INTO dashboard_summary_state (sensor, covered_from_ms) VALUES (?, ?)',
+            (sensor, watermark)
+        )
+        conn.commit()
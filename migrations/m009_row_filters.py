@@ -0,0 +1,78 @@
+"""Partial index row non-success / alarm dan FTS5 error_message untuk server-side filter"""
+
+import logging
+import sqlite3
+
+from row_filters import FAILED_SQL, ALARM_SQL, FTS_TABLES
+
+VERSION = 9
+NAME = 'row_filters'
+
+logger = logging.getLogger(__name__)
+
+# Row gagal hanya sebagian kecil tabel, jadi index parsial kecil dan murah di-maintain
+PARTIAL_INDEXES = [
+    ('idx_pzem_failed', 'pzem_data', 'device_type, ts_ms', FAILED_SQL),
+    ('idx_dht22_failed', 'dht22_data', 'ts_ms', FAILED_SQL),
+    ('idx_system_failed', 'system_data', 'ts_ms', FAILED_SQL),
+    ('idx_pzem_alarm', 'pzem_data', 'device_type, ts_ms', ALARM_SQL),
+]
+
+def _create_fts(conn, table, fts):
+    """
+    Tabel FTS5 contentless (rowid = id row) + trigger sinkronisasi. Hanya row
+    dengan error_message yang di-index; delete (termasuk tiering ke cold) dan
+    update error_message ikut menghapus entry lama.
+    """
+    conn.execute(f"CREATE VIRTUAL TABLE {fts} USING fts5(error_message, content='')")
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table}
+        WHEN NEW.error_message IS NOT NULL BEGIN
+            INSERT INTO {fts} (rowid, error_message) VALUES (NEW.id, NEW.error_message);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table}
+        WHEN OLD.error_message IS NOT NULL BEGIN
+            INSERT INTO {fts} ({fts}, rowid, error_message) VALUES ('delete', OLD.id, OLD.error_message);
+        END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF error_message ON {table} BEGIN
+            INSERT INTO {fts} ({fts}, rowid, error_message)
+            SELECT 'delete', OLD.id, OLD.error_message WHERE OLD.error_message IS NOT NULL;
+            INSERT INTO {fts} (rowid, error_message)
+            SELECT NEW.id, NEW.error_message WHERE NEW.error_message IS NOT NULL;
+        END
+    ''')
+    conn.execute(f'''
+        INSERT INTO {fts} (rowid, error_message)
+        SELECT id, error_message FROM {table} WHERE error_message IS NOT NULL
+    ''')
+
+def upgrade(conn):
+    for name, table, columns, where in PARTIAL_INDEXES:
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {table}({columns}) WHERE {where}')
+    conn.commit()
+
+    for table, fts in FTS_TABLES.items():
+        # Cek + create + backfill dalam satu write transaction supaya backfill
+        # tidak berjalan dua kali jika dua service migrasi bersamaan
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            exists = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (fts,)
+            ).fetchone()
+            if not exists:
+                _create_fts(conn, table, fts)
+            conn.commit()
+        except sqlite3.OperationalError as e:
+            # SQLite tanpa FTS5: filter q memakai LIKE (row_filters.fts_available)
+            conn.rollback()
+            logger.warning(f"FTS5 index for {table} skipped: {e}")
+
+    # Tanpa statistik planner memilih index device_type dan memfilter hasil FTS
+    # per row; analysis_limit membatasi sampling supaya cepat di tabel besar
+    conn.execute('PRAGMA analysis_limit = 1000')
+    conn.execute('ANALYZE')
+    conn.commit()
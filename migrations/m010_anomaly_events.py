@@ -0,0 +1,36 @@
+"""Event anomali streaming detector dan checkpoint state per metric"""
+
+VERSION = 10
+NAME = 'anomaly_events'
+
+def upgrade(conn):
+    # end_ms NULL = anomali masih aktif
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            sensor TEXT NOT NULL,
+            series TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            start_ms INTEGER NOT NULL,
+            end_ms INTEGER,
+            value REAL,
+            expected REAL,
+            score REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_anomaly_start ON anomaly_events(start_ms)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_anomaly_metric_start ON anomaly_events(sensor, metric, start_ms)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_anomaly_active ON anomaly_events(start_ms) WHERE end_ms IS NULL')
+
+    # State EWMA/stuck per (sensor, series, metric) sebagai JSON, ditulis tiap batch
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS anomaly_state (
+            sensor TEXT NOT NULL,
+            series TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            state TEXT NOT NULL,
+            updated_ms INTEGER,
+            PRIMARY KEY (sensor, series, metric)
+        ) WITHOUT ROWID
+    ''')
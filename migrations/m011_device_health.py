@@ -0,0 +1,124 @@
+"""Heartbeat per device fisik, gap index, pembacaan harian dan histogram lag ingest (backfill dari row)"""
+
+from epoch_time import to_epoch_ms, MS_PER_DAY
+from device_health import load_intervals, gap_threshold_ms
+from aggregation import device_id_sql
+
+VERSION = 11
+NAME = 'device_health'
+
+# Sensor -> (tabel, kondisi) untuk backfill
+SENSOR_SOURCES = {
+    'pzem016': ('pzem_data', "device_type = 'PZEM-016_AC'"),
+    'pzem017': ('pzem_data', "device_type = 'PZEM-017_DC'"),
+    'dht22': ('dht22_data', '1 = 1'),
+    'system': ('system_data', '1 = 1'),
+}
+
+def _backfill(conn, sensor, device, table, where, threshold):
+    """Satu pass urut ts_ms per device; run deadband dihitung 1 + repeat_count pembacaan hingga valid_until_ms"""
+    cursor = conn.execute(f'''
+        SELECT ts_ms, COALESCE(valid_until_ms, ts_ms), 1 + repeat_count, status = 'success', received_at
+        FROM {table}
+        WHERE {where} AND {device_id_sql(sensor)} = ? AND ts_ms IS NOT NULL
+        ORDER BY ts_ms ASC
+    ''', (device,))
+
+    gaps, daily = [], {}
+    first_ts = last_ts = last_received = None
+    readings = errors = 0
+    last_success = True
+    for ts_ms, until_ms, weight, success, received_at in cursor:
+        if last_ts is not None and ts_ms - last_ts > threshold:
+            gaps.append((sensor, device, last_ts, ts_ms, ts_ms - last_ts))
+        if first_ts is None:
+            first_ts = ts_ms
+        if last_ts is None or until_ms >= last_ts:
+            last_ts, last_success, last_received = until_ms, success, received_at
+        readings += weight
+        errors += 0 if success else weight
+        counts = daily.setdefault(ts_ms - ts_ms % MS_PER_DAY, [0, 0])
+        counts[0] += weight
+        counts[1] += 0 if success else weight
+
+    if first_ts is None:
+        return
+
+    conn.executemany('''
+        INSERT OR IGNORE INTO device_gaps (sensor, device, start_ms, end_ms, duration_ms) VALUES (?, ?, ?, ?, ?)
+    ''', gaps)
+    conn.executemany('''
+        INSERT OR IGNORE INTO device_daily (sensor, device, day_ms, readings, errors) VALUES (?, ?, ?, ?, ?)
+    ''', [(sensor, device, day_ms, count, error_count) for day_ms, (count, error_count) in daily.items()])
+    conn.execute('''
+        INSERT OR IGNORE INTO device_heartbeat (
+            sensor, device, first_ts_ms, last_ts_ms, last_received_ms, last_status, readings, errors
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (sensor, device, first_ts, last_ts, to_epoch_ms(last_received) if last_received else None,
+          'success' if last_success else 'error', readings, errors))
+
+def upgrade(conn):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS device_heartbeat (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            first_ts_ms INTEGER NOT NULL,
+            last_ts_ms INTEGER NOT NULL,
+            last_received_ms INTEGER,
+            last_status TEXT,
+            readings INTEGER NOT NULL DEFAULT 0,
+            errors INTEGER NOT NULL DEFAULT 0,
+            last_lag_ms INTEGER,
+            PRIMARY KEY (sensor, device)
+        )
+    ''')
+
+    # Gap tidak overlap per device; range query memakai (sensor, device, end_ms)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS device_gaps (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            start_ms INTEGER NOT NULL,
+            end_ms INTEGER NOT NULL,
+            duration_ms INTEGER NOT NULL,
+            PRIMARY KEY (sensor, device, start_ms)
+        ) WITHOUT ROWID
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_device_gaps_end ON device_gaps(sensor, device, end_ms)')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS device_daily (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            day_ms INTEGER NOT NULL,
+            readings INTEGER NOT NULL,
+            errors INTEGER NOT NULL,
+            PRIMARY KEY (sensor, device, day_ms)
+        ) WITHOUT ROWID
+    ''')
+
+    # le_ms = batas atas bucket (-1 = di atas bucket terbesar)
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS ingest_lag_hourly (
+            sensor TEXT NOT NULL,
+            device TEXT NOT NULL,
+            hour_ms INTEGER NOT NULL,
+            le_ms INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (sensor, device, hour_ms, le_ms)
+        ) WITHOUT ROWID
+    ''')
+
+    # Lag tidak bisa direkonstruksi untuk pembacaan yang di-suppress, histogram mulai kosong
+    intervals = load_intervals()
+    for sensor, (table, where) in SENSOR_SOURCES.items():
+        devices = [device for (device,) in conn.execute(f'''
+            SELECT DISTINCT {device_id_sql(sensor)} FROM {table}
+            WHERE {where} AND ts_ms IS NOT NULL ORDER BY 1
+        ''')]
+        for device in devices:
+            if conn.execute('SELECT 1 FROM device_heartbeat WHERE sensor = ? AND device = ?',
+                            (sensor, device)).fetchone():
+                continue
+            _backfill(conn, sensor, device, table, where, gap_threshold_ms(intervals[sensor]))
+            conn.commit()
@@ -2,7 +2,17 @@
 """
 MQTT Worker untuk Subscribe Data Sensor dan Simpan ke Database
 Subscribe dari: mqtt.gatevans.com:1883
-Topics: arjasari/raspi/sensor/*, arjasari/raspi/resource/*, arjasari/raspi/all
+Topics: <site>/raspi/sensor/*, <site>/raspi/resource/*, <site>/raspi/all
+(MQTT_SITE=arjasari secara default, MQTT_SITE=+ untuk semua site / multi-site)
+
+At-least-once: subscribe QoS 1 dengan persistent session (client id tetap,
+clean_session=False); PUBACK dikirim manual setelah batch berisi pesan
+di-commit atau di-spill ke disk, dengan window in-flight terbatas. Reconnect
+ditangani loop paho (event-driven, backoff), bukan polling. Pesan yang dikirim
+ulang broker dilewati per (series, ts_ms) supaya tidak terhitung dua kali.
+
+INGEST_PARSERS=N (> 0): decode JSON dan parse PZEM di N parser process
+(ingest_pool.py), thread paho hanya menyalin payload ke ring shared memory.
 
 Updated untuk Docker dengan PZEM parsing
 """
@@ -11,11 +21,28 @@ import time
 import json
 import logging
 import sqlite3
+import queue
 import threading
-from datetime import datetime, timedelta
-from typing import Dict, Any, Optional
+import itertools
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, Optional, List, Callable
 import os
 
+from epoch_time import to_epoch_ms, site_now_ms, MS_PER_SECOND
+from migrations import ensure_schema
+from spill_queue import SpillQueue
+from shards import shard_path, spill_dir, site_from_topic, validate_site, list_sites, DEFAULT_SITE
+from cold_storage import ColdStorage
+from aggregation import update_rollups
+from deadband import DeadbandFilter
+from dashboard_summary import update_summary, SUMMARY_METRICS
+from block_store import BlockStore
+from anomaly_detector import AnomalyDetector
+from device_health import DeviceHealth, prune_lag_histogram
+from sensor_readings import (route_readings, pzem_reading, dht22_reading, system_reading,
+                             INSERT_SQL, SERIES_WHERE)
+from ingest_pool import IngestPool, new_message, INGEST_PARSERS, PREPARED_KEYS
+
 # Import untuk MQTT
 try:
     import paho.mqtt.client as mqtt
@@ -37,252 +64,716 @@ MQTT_PORT = int(os.environ.get('MQTT_PORT', '1883'))
 MQTT_KEEPALIVE = int(os.environ.get('MQTT_KEEPALIVE', '60'))
 DB_PATH = os.environ.get('DB_PATH', '/app/data/sensor_monitoring.db')
 
+# Batched DB writer & spill queue
+DB_WRITE_TIMEOUT = float(os.environ.get('DB_WRITE_TIMEOUT', '2.0'))
+WRITER_BATCH_SIZE = int(os.environ.get('WRITER_BATCH_SIZE', '200'))
+WRITER_FLUSH_INTERVAL = float(os.environ.get('WRITER_FLUSH_INTERVAL', '1.0'))
+WRITER_QUEUE_SIZE = int(os.environ.get('WRITER_QUEUE_SIZE', '10000'))
+WRITER_RETRY_INTERVAL = float(os.environ.get('WRITER_RETRY_INTERVAL', '15'))
+SPILL_DRAIN_BATCH = int(os.environ.get('SPILL_DRAIN_BATCH', '2000'))
+STATUS_INTERVAL = int(os.environ.get('STATUS_INTERVAL', '10'))
+
+# Pemadatan jam tertutup ke block store (0 = nonaktif)
+BLOCK_COMPACT_INTERVAL = int(os.environ.get('BLOCK_COMPACT_INTERVAL', '600'))
+# Compaction berjalan di writer thread site di sela batch, paling lama sekian detik per giliran
+BLOCK_COMPACT_SLICE = float(os.environ.get('BLOCK_COMPACT_SLICE', '0.5'))
+
+# Site prefix topic; '+' = subscribe semua site, tiap site ke shard SQLite sendiri
+MQTT_SITE = os.environ.get('MQTT_SITE', DEFAULT_SITE)
+
+# Reliable mode: QoS 1 + persistent session (client id tetap), PUBACK dikirim
+# setelah batch berisi pesan di-commit atau di-spill ke disk (at-least-once)
+MQTT_QOS = int(os.environ.get('MQTT_QOS', '1'))
+MQTT_CLIENT_ID = os.environ.get('MQTT_CLIENT_ID', f"sensor-mqtt-worker-{'all' if MQTT_SITE == '+' else MQTT_SITE}")
+MQTT_CLEAN_SESSION = os.environ.get('MQTT_CLEAN_SESSION', 'false').lower() in ('1', 'true', 'yes')
+# Pesan QoS 1 yang boleh diterima tapi belum di-ack; penuh = paho loop menahan pembacaan socket
+MQTT_MAX_INFLIGHT = int(os.environ.get('MQTT_MAX_INFLIGHT', '1000'))
+# Interval warning selama window penuh (acquire tetap menunggu slot, window tidak pernah terlampaui)
+MQTT_INFLIGHT_WAIT = float(os.environ.get('MQTT_INFLIGHT_WAIT', '5'))
+MQTT_RECONNECT_MIN_DELAY = int(os.environ.get('MQTT_RECONNECT_MIN_DELAY', '1'))
+MQTT_RECONNECT_MAX_DELAY = int(os.environ.get('MQTT_RECONNECT_MAX_DELAY', '60'))
+# Batch berisi pesan yang menunggu ack di-flush setelah jeda ini tanpa pesan baru,
+# karena broker berhenti mengirim saat limit in-flight miliknya tercapai
+WRITER_ACK_LINGER = float(os.environ.get('WRITER_ACK_LINGER', '0.05'))
+
 MQTT_TOPICS = [
-    "arjasari/raspi/sensor/+",
-    "arjasari/raspi/resource/+", 
-    "arjasari/raspi/all"
+    f"{MQTT_SITE}/raspi/sensor/+",
+    f"{MQTT_SITE}/raspi/resource/+", 
+    f"{MQTT_SITE}/raspi/all"
 ]
 
 class DatabaseManager:
     """Manager untuk SQLite database operations"""
     
-    def __init__(self, db_path: str = DB_PATH):
+    def __init__(self, db_path: str = DB_PATH, site: Optional[str] = None):
         self.db_path = db_path
+        self.site = site
+        self.deadband = DeadbandFilter()
+        self.anomaly = AnomalyDetector()
+        self.health = DeviceHealth()
+        # series -> ts_ms pembacaan terbaru yang ditulis proses ini (idempotensi redelivery)
+        self._series_last_ms: Dict[tuple, int] = {}
+        self.duplicates = 0
         self.init_database()
     
     def init_database(self):
-        """Initialize database tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Table untuk PZEM data (AC & DC) with parsed values
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pzem_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                device_type TEXT NOT NULL,
-                device_path TEXT,
-                slave_id INTEGER,
-                raw_registers TEXT,
-                register_count INTEGER,
-                status TEXT,
-                error_message TEXT,
-                parsed_data TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Table untuk DHT22 data
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS dht22_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                temperature REAL,
-                humidity REAL,
-                gpio_pin INTEGER,
-                library TEXT,
-                status TEXT,
-                error_message TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        """Initialize database tables (no-op jika schema sudah current)"""
+        version = ensure_schema(self.db_path)
+        logger.info(f"Database initialized successfully (schema v{version})")
+    
+    def _is_duplicate(self, cursor: sqlite3.Cursor, series: tuple, ts_ms: int) -> bool:
+        """
+        Idempotensi redelivery QoS 1: pembacaan (series, ts_ms) yang sudah tersimpan,
+        sebagai row atau di dalam run deadband, dilewati seluruhnya (row, rollup,
+        dashboard_summary, savings, device health). Pembacaan yang lebih baru dari
+        pembacaan terakhir series tidak perlu query; setelah restart atau untuk data
+        terlambat dicek ke index ts_ms. Pembacaan terlambat yang jatuh di dalam span
+        run juga dianggap duplikat (nilainya sama dengan run dalam toleransi).
+        """
+        last_ms = self._series_last_ms.get(series)
+        if last_ms is None or ts_ms <= last_ms:
+            table = series[0]
+            found = cursor.execute(f'''
+                SELECT 1 FROM {table}
+                WHERE {SERIES_WHERE[table]} AND ts_ms BETWEEN ? AND ?
+                  AND (ts_ms = ? OR (repeat_count > 0 AND valid_until_ms >= ?))
+                LIMIT 1
+            ''', series[1:] + (ts_ms - self.deadband.max_interval_ms, ts_ms, ts_ms, ts_ms)).fetchone()
+            if found:
+                self.duplicates += 1
+                logger.debug(f"Skipping duplicate reading {series} at {ts_ms}")
+                return True
         
-        # Table untuk System Resources
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT NOT NULL,
-                ram_usage_percent REAL,
-                storage_usage_percent REAL,
-                cpu_usage_percent REAL,
-                cpu_temperature REAL,
-                storage_total_gb REAL,
-                storage_used_gb REAL,
-                storage_free_gb REAL,
-                status TEXT,
-                error_message TEXT,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        self._series_last_ms[series] = max(ts_ms, last_ms or ts_ms)
+        return False
+    
+    def _extend_run(self, cursor: sqlite3.Cursor, table: str, series: tuple, sensor: str,
+                    ts_ms: int, fields: Dict[str, Any]) -> bool:
+        """
+        Deadband: perpanjang run row terakhir series jika pembacaan masih dalam toleransi.
+        Return False jika pembacaan harus disimpan sebagai row baru.
+        """
+        row_id = self.deadband.match(series, sensor, ts_ms, fields)
+        if row_id is None:
+            return False
         
-        # Table untuk raw MQTT messages (backup)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mqtt_messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                topic TEXT NOT NULL,
-                payload TEXT NOT NULL,
-                received_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        cursor.execute(f'''
+            UPDATE {table} SET repeat_count = repeat_count + 1, valid_until_ms = ?
+            WHERE id = ?
+        ''', (ts_ms, row_id))
+        if not cursor.rowcount:
+            self.deadband.forget(series)
+            return False
         
-        # Indexes untuk performance
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pzem_timestamp ON pzem_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_dht22_timestamp ON dht22_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_system_timestamp ON system_data(timestamp)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_mqtt_timestamp ON mqtt_messages(received_at)')
+        self.deadband.extend(series, ts_ms)
+        return True
+    
+    def _write_reading(self, cursor: sqlite3.Cursor, reading: tuple,
+                       received_ms: Optional[int] = None):
+        """
+        Simpan satu reading sensor_readings (commit dilakukan oleh caller): row baru atau
+        perpanjangan run deadband, lalu dashboard_summary, rollup, anomali dan device health.
+        Routing, parse dan nilai row sudah disiapkan (di parser process jika INGEST_PARSERS > 0),
+        jadi di sini hanya langkah yang membaca / menulis database.
+        """
+        (table, sensor, series, device, ts_ms, success, values, fields,
+         metrics, rollup, anomaly_series) = reading
+        if self._is_duplicate(cursor, series, ts_ms):
+            return
+        if not self._extend_run(cursor, table, series, sensor or 'pzem', ts_ms, fields):
+            cursor.execute(INSERT_SQL[table], values)
+            self.deadband.remember(series, cursor.lastrowid, ts_ms, fields)
+        if sensor is None:
+            return
         
-        conn.commit()
-        conn.close()
-        logger.info("Database initialized successfully")
+        if sensor in SUMMARY_METRICS:
+            update_summary(cursor, sensor, ts_ms, metrics, success)
+        if rollup:
+            update_rollups(cursor, sensor, ts_ms, metrics)
+        if anomaly_series is not None:
+            self.anomaly.observe(cursor, sensor, anomaly_series, ts_ms, metrics)
+        self.health.observe(cursor, sensor, device, ts_ms, received_ms, success)
     
-    def insert_pzem_data(self, data: Dict[str, Any]):
-        """Insert PZEM data ke database with parsed values"""
+    def _write_data(self, cursor: sqlite3.Cursor, build: Callable[[Dict[str, Any]], tuple],
+                    data: Dict[str, Any]):
+        """Bangun reading dari satu payload sensor lalu simpan (commit dilakukan oleh caller)"""
+        self._write_reading(cursor, build(data))
+    
+    def _write_raw_message(self, cursor: sqlite3.Cursor, topic: str, payload: str,
+                           received_at: Optional[str] = None):
+        """INSERT raw MQTT message (commit dilakukan oleh caller)"""
+        if received_at:
+            cursor.execute('''
+                INSERT INTO mqtt_messages (topic, payload, received_at) VALUES (?, ?, ?)
+            ''', (topic, payload, received_at))
+        else:
+            cursor.execute('''
+                INSERT INTO mqtt_messages (topic, payload) VALUES (?, ?)
+            ''', (topic, payload))
+    
+    def _insert_single(self, label: str, writer, *args):
+        """Jalankan satu writer dalam koneksi & transaksi sendiri"""
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
-        # Parse raw data jika ada
-        parsed_data = None
-        if data.get('status') == 'success' and data.get('raw_registers'):
-            try:
-                from pzem_parser import PZEMParser
-                
-                if data.get('device_type') == 'PZEM-016_AC':
-                    parsed_data = PZEMParser.parse_pzem016_ac(data['raw_registers'])
-                elif data.get('device_type') == 'PZEM-017_DC':
-                    parsed_data = PZEMParser.parse_pzem017_dc(data['raw_registers'])
-            except Exception as e:
-                logger.error(f"Error parsing PZEM data: {e}")
-        
         try:
-            cursor.execute('''
-                INSERT INTO pzem_data (
-                    timestamp, device_type, device_path, slave_id,
-                    raw_registers, register_count, status, error_message,
-                    parsed_data
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('timestamp'),
-                data.get('device_type'),
-                data.get('device_path'),
-                data.get('slave_id'),
-                json.dumps(data.get('raw_registers', [])),
-                data.get('register_count', 0),
-                data.get('status'),
-                data.get('error_message'),
-                json.dumps(parsed_data) if parsed_data else None
-            ))
+            writer(cursor, *args)
+            self.anomaly.checkpoint(cursor)
+            self.health.checkpoint(cursor)
             conn.commit()
-            
-            if parsed_data and parsed_data.get('status') == 'success':
-                device_type = data.get('device_type', 'Unknown')
-                if device_type == 'PZEM-016_AC':
-                    voltage = parsed_data.get('voltage_v', 0)
-                    power = parsed_data.get('power_w', 0)
-                    logger.info(f"PZEM-016 AC: {voltage}V, {power}W (Inverter→Load)")
-                elif device_type == 'PZEM-017_DC':
-                    voltage = parsed_data.get('voltage_v', 0)
-                    power = parsed_data.get('power_w', 0)
-                    status = parsed_data.get('solar_status', 'Unknown')
-                    logger.info(f"PZEM-017 DC: {voltage}V, {power}W ({status})")
-            else:
-                logger.debug(f"Inserted PZEM data: {data.get('device_type')}")
-                
         except Exception as e:
-            logger.error(f"Error inserting PZEM data: {e}")
+            self.deadband.reset()
+            self._series_last_ms.clear()
+            self.anomaly.reset()
+            self.health.reset()
+            logger.error(f"Error inserting {label}: {e}")
         finally:
             conn.close()
     
+    def insert_pzem_data(self, data: Dict[str, Any]):
+        """Insert PZEM data ke database with parsed values"""
+        self._insert_single('PZEM data', self._write_data, pzem_reading, data)
+    
     def insert_dht22_data(self, data: Dict[str, Any]):
         """Insert DHT22 data ke database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO dht22_data (
-                    timestamp, temperature, humidity, gpio_pin,
-                    library, status, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('timestamp'),
-                data.get('temperature'),
-                data.get('humidity'),
-                data.get('gpio_pin'),
-                data.get('library'),
-                data.get('status'),
-                data.get('error_message')
-            ))
-            conn.commit()
-            logger.debug(f"Inserted DHT22 data: {data.get('temperature')}°C, {data.get('humidity')}%")
-        except Exception as e:
-            logger.error(f"Error inserting DHT22 data: {e}")
-        finally:
-            conn.close()
+        self._insert_single('DHT22 data', self._write_data, dht22_reading, data)
     
     def insert_system_data(self, data: Dict[str, Any]):
         """Insert System Resources data ke database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        try:
-            cursor.execute('''
-                INSERT INTO system_data (
-                    timestamp, ram_usage_percent, storage_usage_percent,
-                    cpu_usage_percent, cpu_temperature, storage_total_gb,
-                    storage_used_gb, storage_free_gb, status, error_message
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                data.get('timestamp'),
-                data.get('ram_usage_percent'),
-                data.get('storage_usage_percent'),
-                data.get('cpu_usage_percent'),
-                data.get('cpu_temperature'),
-                data.get('storage_total_gb'),
-                data.get('storage_used_gb'),
-                data.get('storage_free_gb'),
-                data.get('status'),
-                data.get('error_message')
-            ))
-            conn.commit()
-            logger.debug(f"Inserted System data: RAM {data.get('ram_usage_percent')}%")
-        except Exception as e:
-            logger.error(f"Error inserting System data: {e}")
-        finally:
-            conn.close()
+        self._insert_single('System data', self._write_data, system_reading, data)
     
     def insert_raw_message(self, topic: str, payload: str):
         """Insert raw MQTT message ke database (backup)"""
-        conn = sqlite3.connect(self.db_path)
+        self._insert_single('raw message', self._write_raw_message, topic, payload)
+    
+    def store_messages(self, messages: List[Dict[str, Any]]):
+        """
+        Simpan batch pesan MQTT ({topic, payload, received_at}) dalam satu transaksi.
+        Pesan dari parser process sudah membawa 'readings' (sensor_readings.route_readings);
+        pesan lain (mode single process, replay spill) di-decode dan di-route di sini.
+        sqlite3.OperationalError (database locked, disk I/O) di-raise supaya caller
+        bisa spill seluruh batch; error per pesan hanya di-log.
+        """
+        conn = sqlite3.connect(self.db_path, timeout=DB_WRITE_TIMEOUT)
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO mqtt_messages (topic, payload) VALUES (?, ?)
-            ''', (topic, payload))
+            for message in messages:
+                topic = message.get('topic', '')
+                try:
+                    payload = message['payload']
+                    self._write_raw_message(cursor, topic, payload, message.get('received_at'))
+                    
+                    readings = message.get('readings')
+                    if readings is None:
+                        try:
+                            data = json.loads(payload)
+                        except json.JSONDecodeError as e:
+                            logger.error(f"Invalid JSON from {topic}: {e}")
+                            continue
+                        readings = route_readings(topic, data)
+                    
+                    # Waktu terima untuk lag ingest (record spill lama hanya punya received_at)
+                    received_ms = message.get('received_ms') or to_epoch_ms(message.get('received_at'))
+                    for reading in readings:
+                        self._write_reading(cursor, reading, received_ms)
+                    logger.debug(f"Stored {len(readings)} reading(s) from {topic}")
+                except sqlite3.OperationalError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error processing message from {topic}: {e}")
+            
+            # State detector anomali & counter device health di-commit bersama row batch ini
+            self.anomaly.checkpoint(cursor)
+            self.health.checkpoint(cursor)
             conn.commit()
-        except Exception as e:
-            logger.error(f"Error inserting raw message: {e}")
+        except Exception:
+            conn.rollback()
+            # Row id run di batch ini ikut di-rollback
+            self.deadband.reset()
+            self._series_last_ms.clear()
+            self.anomaly.reset()
+            self.health.reset()
+            raise
         finally:
             conn.close()
     
-    def cleanup_old_data(self, days_to_keep: int = 30):
-        """Cleanup data yang lebih lama dari X hari"""
-        cutoff_date = (datetime.now() - timedelta(days=days_to_keep)).isoformat()
+    def cleanup_old_data(self, days_to_keep: int = 30, now_ms: Optional[int] = None):
+        """
+        Cleanup data yang lebih lama dari X hari.
+        Tabel sensor dipindahkan ke cold storage (Parquet) dulu, bukan langsung dihapus;
+        jika tiering gagal, data sensor tetap disimpan di SQLite.
+        now_ms menggantikan jam sekarang (soak test dengan waktu dipercepat).
+        """
+        now_ms = now_ms if now_ms is not None else site_now_ms()
+        cutoff_datetime = datetime.fromtimestamp(now_ms / MS_PER_SECOND, timezone.utc) - timedelta(days=days_to_keep)
+        cutoff_received_at = cutoff_datetime.strftime('%Y-%m-%d %H:%M:%S')
         
         conn = sqlite3.connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            # Cleanup old data
-            tables = ['pzem_data', 'dht22_data', 'system_data', 'mqtt_messages']
-            total_deleted = 0
-            
-            for table in tables:
-                if table == 'mqtt_messages':
-                    cursor.execute(f'DELETE FROM {table} WHERE received_at < ?', (cutoff_date,))
-                else:
-                    cursor.execute(f'DELETE FROM {table} WHERE timestamp < ?', (cutoff_date,))
-                deleted = cursor.rowcount
-                total_deleted += deleted
-                logger.info(f"Deleted {deleted} old records from {table}")
+            try:
+                archived = ColdStorage(self.site).tier_closed_days(conn, days_to_keep=days_to_keep, now_ms=now_ms)
+                logger.info(f"Tiered to cold storage: {archived}")
+            except Exception as e:
+                conn.rollback()
+                logger.error(f"Cold storage tiering failed, keeping sensor data in SQLite: {e}")
             
+            # Raw MQTT backup tidak di-archive
+            cursor.execute('DELETE FROM mqtt_messages WHERE received_at < ?', (cutoff_received_at,))
+            deleted = cursor.rowcount
+            prune_lag_histogram(conn, now_ms)
             conn.commit()
-            logger.info(f"Cleanup completed: {total_deleted} total records deleted")
+            logger.info(f"Cleanup completed: {deleted} old records deleted from mqtt_messages")
             
         except Exception as e:
             logger.error(f"Error during cleanup: {e}")
         finally:
             conn.close()
+    
+    def compact_blocks(self, now_ms: Optional[int] = None, deadline: Optional[float] = None) -> bool:
+        """
+        Padatkan jam yang sudah tertutup ke series_blocks (row tetap disimpan).
+        deadline (time.monotonic()): berhenti di antara jam; return False jika masih ada sisa.
+        Gagal di-log dan dianggap selesai (dicoba lagi di interval berikutnya).
+        """
+        conn = sqlite3.connect(self.db_path, timeout=DB_WRITE_TIMEOUT)
+        
+        try:
+            store = BlockStore(conn)
+            compacted = store.compact_all(now_ms, deadline)
+            hours = sum(sum(devices.values()) for devices in compacted.values())
+            if hours or store.finished:
+                logger.info(f"Block store compaction{'' if store.finished else ' (continuing)'}: {compacted}")
+            return store.finished
+        except Exception as e:
+            conn.rollback()
+            logger.error(f"Block store compaction failed: {e}")
+            return True
+        finally:
+            conn.close()
+
+def spill_record(message: Dict[str, Any]) -> Dict[str, Any]:
+    """Hasil parse tidak ikut di-spill, drain mem-parse ulang dari payload"""
+    return {key: value for key, value in message.items() if key not in PREPARED_KEYS}
+
+class BatchWriter(threading.Thread):
+    """
+    Thread penulis database: pesan dari paho di-batch per transaksi.
+    Saat writer tertinggal (queue penuh) atau database lock/error, pesan ditulis
+    ke SpillQueue dan di-drain dalam batch besar setelah database pulih.
+    Callback ack pesan dipanggil setelah pesan durable (commit atau spill + fsync).
+    """
+    
+    def __init__(self, db_manager: DatabaseManager, spill_queue: SpillQueue):
+        super().__init__(name='db-writer', daemon=True)
+        self.db_manager = db_manager
+        self.spill_queue = spill_queue
+        self.queue = queue.Queue(maxsize=WRITER_QUEUE_SIZE)
+        self.healthy = True
+        self.retry_at = 0.0
+        self.committed_total = 0
+        self.spilled_total = 0
+        # (now_ms,) compaction yang diminta dan belum selesai
+        self._compaction = None
+        self._stop_event = threading.Event()
+    
+    def submit(self, message: Dict[str, Any], ack: Optional[Callable[[bool], None]] = None):
+        """
+        Dipanggil dari thread paho / collector ingest pool, tidak pernah menunggu database.
+        ack(durable) dipanggil tepat sekali setelah pesan di-commit / di-spill.
+        """
+        try:
+            self.queue.put_nowait((message, ack))
+        except queue.Full:
+            # Writer tertinggal, simpan ke disk
+            self._ack([ack], self._spill([message]))
+    
+    def request_compaction(self, now_ms: Optional[int] = None):
+        """
+        Compaction block dijalankan writer thread ini di sela batch, per giliran
+        BLOCK_COMPACT_SLICE detik, jadi tidak berebut lock database dengan commit batch
+        """
+        self._compaction = (now_ms,)
+    
+    def stop(self, timeout: float = 30):
+        """Flush sisa queue lalu hentikan thread"""
+        self._stop_event.set()
+        self.join(timeout)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'writer_queue_size': self.queue.qsize(),
+            'writer_healthy': self.healthy,
+            'committed_total': self.committed_total,
+            'spilled_total': self.spilled_total,
+            'compaction_pending': self._compaction is not None,
+            'deadband': self.db_manager.deadband.stats(),
+            'duplicates_skipped': self.db_manager.duplicates,
+            'anomaly': self.db_manager.anomaly.stats(),
+            'device_health': self.db_manager.health.stats()
+        }
+    
+    def run(self):
+        while not self._stop_event.is_set() or not self.queue.empty():
+            batch = self._collect_batch()
+            if batch:
+                # Traffic tidak pernah idle selama WRITER_FLUSH_INTERVAL: spill di-drain
+                # sebagian setelah tiap commit sukses supaya tetap di-replay
+                if self._write_batch(batch) and self.spill_queue.depth:
+                    self._drain_spill(SPILL_DRAIN_BATCH)
+            elif self.spill_queue.depth and time.time() >= self.retry_at:
+                self._drain_spill(SPILL_DRAIN_BATCH * 5)
+            if self._compaction is not None and time.time() >= self.retry_at:
+                self._compact_slice()
+    
+    def _compact_slice(self):
+        request = self._compaction
+        if self.db_manager.compact_blocks(request[0], time.monotonic() + BLOCK_COMPACT_SLICE):
+            # Request baru yang masuk selama giliran ini tetap dijalankan
+            if self._compaction is request:
+                self._compaction = None
+    
+    def _collect_batch(self) -> List[tuple]:
+        """(message, ack) sampai WRITER_BATCH_SIZE / WRITER_FLUSH_INTERVAL"""
+        batch = []
+        waiting_ack = False
+        # Compaction tertunda: giliran berikutnya tidak menunggu flush interval penuh
+        flush_interval = WRITER_ACK_LINGER if self._compaction is not None else WRITER_FLUSH_INTERVAL
+        deadline = time.time() + flush_interval
+        while len(batch) < WRITER_BATCH_SIZE:
+            timeout = deadline - time.time()
+            if waiting_ack:
+                timeout = min(timeout, WRITER_ACK_LINGER)
+            if timeout <= 0:
+                break
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            waiting_ack = waiting_ack or item[1] is not None
+        return batch
+    
+    @staticmethod
+    def _ack(acks: List[Optional[Callable[[bool], None]]], durable: bool):
+        for ack in acks:
+            if ack is not None:
+                ack(durable)
+    
+    def _spill(self, messages: List[Dict[str, Any]]) -> bool:
+        """Tulis ke spill queue (fsync); False jika gagal (pesan tidak boleh di-ack)"""
+        try:
+            self.spill_queue.extend([spill_record(message) for message in messages])
+            self.spilled_total += len(messages)
+            return True
+        except OSError as e:
+            logger.error(f"Failed to spill {len(messages)} messages: {e}")
+            return False
+    
+    def _mark_unhealthy(self, error: Exception):
+        if self.healthy:
+            logger.warning(f"Database not writable ({error}), spilling to disk")
+        self.healthy = False
+        self.retry_at = time.time() + WRITER_RETRY_INTERVAL
+    
+    def _write_batch(self, batch: List[tuple]) -> bool:
+        """Commit batch; True jika sukses (False = di-spill / ditulis per pesan)"""
+        messages = [message for message, _ in batch]
+        acks = [ack for _, ack in batch]
+        if time.time() < self.retry_at:
+            self._ack(acks, self._spill(messages))
+            return False
+        
+        try:
+            self.db_manager.store_messages(messages)
+            self.committed_total += len(messages)
+            if not self.healthy:
+                logger.info("Database writable again, draining spill queue")
+                self.healthy = True
+        except sqlite3.DatabaseError as e:
+            # Lock, disk I/O, file rusak: seluruh batch di-spill dan dicoba lagi nanti
+            self._mark_unhealthy(e)
+            self._ack(acks, self._spill(messages))
+            return False
+        except Exception as e:
+            logger.error(f"Batch of {len(messages)} messages failed ({e}), retrying one by one")
+            self._write_each(batch)
+            return False
+        self._ack(acks, True)
+        return True
+    
+    def _write_each(self, batch: List[tuple]):
+        """
+        Isolasi pesan yang membuat batch gagal di luar error database. Pesan yang
+        tetap gagal sendirian di-log lalu di-ack (sama seperti error per pesan di
+        store_messages), supaya broker tidak mengirim ulang pesan rusak terus-menerus.
+        """
+        for message, ack in batch:
+            if time.time() < self.retry_at:
+                self._ack([ack], self._spill([message]))
+                continue
+            try:
+                self.db_manager.store_messages([message])
+                self.committed_total += 1
+            except sqlite3.DatabaseError as e:
+                self._mark_unhealthy(e)
+                self._ack([ack], self._spill([message]))
+                continue
+            except Exception as e:
+                logger.error(f"Dropping message from {message.get('topic')}: {e} "
+                             f"(payload {str(message.get('payload'))[:200]!r})")
+            self._ack([ack], True)
+    
+    def _drain_spill(self, max_records: int):
+        try:
+            drained = self.spill_queue.drain(
+                self.db_manager.store_messages,
+                batch_size=SPILL_DRAIN_BATCH,
+                max_records=max_records
+            )
+            self.committed_total += drained
+            self.healthy = True
+        except sqlite3.DatabaseError as e:
+            self._mark_unhealthy(e)
+        except Exception as e:
+            # Offset spill tidak maju, dicoba lagi setelah WRITER_RETRY_INTERVAL
+            logger.error(f"Spill drain failed: {e}")
+            self.retry_at = time.time() + WRITER_RETRY_INTERVAL
+
+class SiteRouter:
+    """
+    Route pesan per site (prefix topic) ke shard SQLite masing-masing.
+    Setiap site punya DatabaseManager, SpillQueue dan BatchWriter sendiri sehingga
+    write dan retention satu site tidak berebut lock dengan site lain.
+    
+    Thread paho / collector hanya me-lookup writer yang sudah siap. Shard yang
+    sudah ada dibuka saat start (open_sites); site baru dibuka & dimigrasi oleh
+    thread shard-opener, sementara pesannya ditulis ke spill queue site tersebut
+    (durable, di-ack) dan di-drain writer setelah shard siap.
+    """
+    
+    def __init__(self):
+        self._sites: Dict[str, BatchWriter] = {}
+        self._opening: Dict[str, SpillQueue] = {}
+        self._lock = threading.Lock()
+        self._open_queue: queue.Queue = queue.Queue()
+        self._opener = threading.Thread(target=self._open_loop, name='shard-opener', daemon=True)
+        self._opener.start()
+    
+    def get_writer(self, site: str) -> BatchWriter:
+        """BatchWriter untuk site, dibuka & dimigrasi sekarang jika belum ada (blocking)"""
+        writer = self._sites.get(site)
+        if writer is None:
+            with self._lock:
+                spill_queue = self._opening.get(site)
+            writer = self._open(site, spill_queue)
+        return writer
+    
+    def open_sites(self, sites: List[str]):
+        """Buka shard di depan (startup), sebelum pesan pertama datang"""
+        for site in sites:
+            try:
+                self.get_writer(site)
+            except Exception as e:
+                logger.error(f"Failed to open shard for site {site}: {e}")
+    
+    def _open(self, site: str, spill_queue: Optional[SpillQueue] = None) -> BatchWriter:
+        path = shard_path(site)
+        logger.info(f"Opening shard for site {site}: {path}")
+        db_manager = DatabaseManager(path, site)
+        spill_queue = spill_queue or SpillQueue(spill_dir(site))
+        if spill_queue.depth:
+            # Pesan yang masuk selama shard dibuka, sebelum writer menerima pesan baru
+            spill_queue.drain(db_manager.store_messages, batch_size=SPILL_DRAIN_BATCH)
+        with self._lock:
+            writer = self._sites.get(site)
+            if writer is None:
+                writer = BatchWriter(db_manager, spill_queue)
+                writer.start()
+                self._sites[site] = writer
+                self._opening.pop(site, None)
+        return writer
+    
+    def _open_loop(self):
+        while True:
+            site = self._open_queue.get()
+            if site is None:
+                return
+            try:
+                self._open(site, self._opening.get(site))
+            except Exception as e:
+                # Pesan site ini tetap di-spill; dicoba lagi setelah WRITER_RETRY_INTERVAL
+                logger.error(f"Failed to open shard for site {site}: {e}")
+                threading.Timer(WRITER_RETRY_INTERVAL, self._open_queue.put, args=(site,)).start()
+    
+    def _spill_pending(self, site: str, message: Dict[str, Any]) -> Optional[bool]:
+        """
+        Site yang shard-nya belum siap: spill + jadwalkan pembukaan shard.
+        Return durable (untuk ack), None jika writer ternyata sudah siap.
+        """
+        with self._lock:
+            writer = self._sites.get(site)
+            spill_queue = self._opening.get(site)
+            if writer is None and spill_queue is None:
+                validate_site(site)
+                spill_queue = self._opening[site] = SpillQueue(spill_dir(site))
+                self._open_queue.put(site)
+        if writer is not None:
+            return None
+        try:
+            spill_queue.extend([spill_record(message)])
+            return True
+        except OSError as e:
+            logger.error(f"Failed to spill message for site {site}: {e}")
+            return False
+    
+    def submit(self, topic: str, payload: str, ack: Optional[Callable[[bool], None]] = None):
+        """Dipanggil dari thread paho"""
+        self.submit_message(new_message(topic, payload), ack)
+    
+    def submit_message(self, message: Dict[str, Any], ack: Optional[Callable[[bool], None]] = None):
+        """Pesan yang sudah dibentuk (termasuk batch dari parser process) ke writer site-nya"""
+        topic = message['topic']
+        site = site_from_topic(topic) or DEFAULT_SITE
+        writer = self._sites.get(site)
+        if writer is None:
+            try:
+                durable = self._spill_pending(site, message)
+            except ValueError as e:
+                # Topic tidak valid tidak akan pernah bisa disimpan, ack supaya tidak dikirim ulang
+                logger.error(f"Dropping message from {topic}: {e}")
+                durable = True
+            if durable is not None:
+                if ack is not None:
+                    ack(durable)
+                return
+            writer = self._sites[site]
+        writer.submit(message, ack)
+    
+    def writers(self) -> Dict[str, BatchWriter]:
+        with self._lock:
+            return dict(self._sites)
+    
+    def cleanup_old_data(self, days_to_keep: int = 30, now_ms: Optional[int] = None):
+        for site, writer in self.writers().items():
+            logger.info(f"Cleanup for site {site}")
+            writer.db_manager.cleanup_old_data(days_to_keep=days_to_keep, now_ms=now_ms)
+    
+    def compact_blocks(self, now_ms: Optional[int] = None):
+        """Minta compaction ke writer tiap site (berjalan di writer thread, tidak ditunggu)"""
+        for writer in self.writers().values():
+            writer.request_compaction(now_ms)
+    
+    def write_stats(self, extra: Optional[Dict[str, Any]] = None):
+        for site, writer in self.writers().items():
+            try:
+                writer.spill_queue.write_stats(dict(writer.stats(), site=site, **(extra or {})))
+            except OSError as e:
+                logger.error(f"Error writing spill stats for site {site}: {e}")
+    
+    def stop(self):
+        self._open_queue.put(None)
+        self._opener.join(timeout=30)
+        for writer in self.writers().values():
+            writer.stop()
+            writer.spill_queue.close()
+        with self._lock:
+            for spill_queue in self._opening.values():
+                spill_queue.close()
+
+class AckWindow:
+    """
+    Window pesan QoS 1 yang sudah diterima tapi belum di-ack. acquire() dipanggil
+    di thread paho sebelum pesan diserahkan ke writer; saat window penuh paho
+    berhenti membaca socket sehingga broker menahan pesan di session (backpressure).
+    Window membatasi pesan yang ada di memory worker, termasuk pesan koneksi lama:
+    ack-nya dibuang setelah reconnect (broker mengirim ulang pesan yang belum
+    di-ack, at-least-once) tapi slot baru dilepas saat writer selesai dengannya.
+    """
+    
+    def __init__(self, client, size: int = MQTT_MAX_INFLIGHT, manual: bool = True):
+        self.client = client
+        self.size = size
+        self.manual = manual
+        self.pending = 0
+        self.acked_total = 0
+        self.unacked_total = 0
+        self.stale_total = 0
+        self.full_waits = 0
+        self.full_timeouts = 0
+        self._generation = 0
+        self._closed = False
+        # token slot -> generation koneksi saat pesan diterima
+        self._outstanding: Dict[int, int] = {}
+        self._tokens = itertools.count(1)
+        self._cond = threading.Condition()
+    
+    def acquire(self, mid: int, qos: int) -> Optional[Callable[[bool], None]]:
+        """
+        Slot untuk satu pesan; return callback ack(durable) untuk writer, None jika
+        window sudah ditutup (shutdown: pesan tidak diproses, dikirim ulang broker).
+        Window penuh ditunggu tanpa batas waktu. Selama menunggu paho tidak mengirim
+        PINGREQ; writer yang macet lebih lama dari keepalive membuat broker memutus
+        koneksi, pesan yang belum di-ack dikirim ulang setelah reconnect.
+        """
+        with self._cond:
+            if self.pending >= self.size:
+                self.full_waits += 1
+            while self.pending >= self.size and not self._closed:
+                if not self._cond.wait(MQTT_INFLIGHT_WAIT):
+                    self.full_timeouts += 1
+                    logger.warning(f"In-flight window full ({self.pending}/{self.size}) "
+                                   f"for {MQTT_INFLIGHT_WAIT}s, waiting for writers")
+            if self._closed:
+                return None
+            self.pending += 1
+            token = next(self._tokens)
+            self._outstanding[token] = self._generation
+        return lambda durable: self._release(token, mid, qos, durable)
+    
+    def _release(self, token: int, mid: int, qos: int, durable: bool):
+        with self._cond:
+            generation = self._outstanding.pop(token, None)
+            if generation is None:
+                # Slot sudah dilepas (misalnya submit gagal lalu record tetap diserahkan)
+                return
+            self.pending -= 1
+            self._cond.notify()
+            if generation != self._generation:
+                self.stale_total += 1
+                return
+            if durable:
+                self.acked_total += 1
+            else:
+                self.unacked_total += 1
+        
+        # Pesan yang tidak durable tidak di-ack: broker mengirim ulang setelah reconnect
+        if durable and self.manual:
+            self.client.ack(mid, qos)
+    
+    def reset(self):
+        """Koneksi putus: semua pesan in-flight akan dikirim ulang broker"""
+        with self._cond:
+            self._generation += 1
+    
+    def close(self):
+        """Shutdown: acquire() yang sedang menunggu window kembali tanpa slot"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'inflight': self.pending,
+            'inflight_max': self.size,
+            'acked_total': self.acked_total,
+            'unacked_total': self.unacked_total,
+            'stale_acks_total': self.stale_total,
+            'window_full_waits': self.full_waits,
+            'window_full_timeouts': self.full_timeouts
+        }
 
 class MQTTWorker:
     """MQTT Worker untuk subscribe sensor data"""
@@ -291,113 +782,117 @@ class MQTTWorker:
         self.broker = broker
         self.port = port
         self.client = None
+        self.window = None
         self.connected = False
-        self.db_manager = DatabaseManager()
+        self.reconnects = 0
+        self._connected_event = threading.Event()
+        self.router = SiteRouter()
+        self.pool = IngestPool(self.router) if INGEST_PARSERS > 0 else None
         
         if not MQTT_AVAILABLE:
             logger.error("MQTT library tidak tersedia")
             return
         
         try:
-            self.client = mqtt.Client()
+            self.client, manual_ack = self._create_client()
+            if MQTT_QOS > 0 and not manual_ack:
+                logger.warning("paho-mqtt < 2.0: manual ack not supported, PUBACK is sent on receipt")
+            self.window = AckWindow(self.client, manual=manual_ack)
             self.client.on_connect = self._on_connect
             self.client.on_disconnect = self._on_disconnect
             self.client.on_message = self._on_message
+            self.client.reconnect_delay_set(MQTT_RECONNECT_MIN_DELAY, MQTT_RECONNECT_MAX_DELAY)
         except Exception as e:
             logger.error(f"MQTT client initialization failed: {e}")
     
+    @staticmethod
+    def _create_client():
+        """
+        Client dengan client id tetap (persistent session). paho 2.x: callback API
+        versi 1 dan manual ack; paho 1.x tidak punya manual ack. Return (client, manual_ack).
+        """
+        options = {'client_id': MQTT_CLIENT_ID, 'clean_session': MQTT_CLEAN_SESSION}
+        callback_api = getattr(mqtt, 'CallbackAPIVersion', None)
+        if callback_api is not None:
+            return mqtt.Client(callback_api.VERSION1, manual_ack=True, **options), True
+        return mqtt.Client(**options), False
+    
     def _on_connect(self, client, userdata, flags, rc):
         if rc == 0:
             self.connected = True
-            logger.info(f"Connected to MQTT broker {self.broker}:{self.port}")
+            self._connected_event.set()
+            logger.info(f"Connected to MQTT broker {self.broker}:{self.port} "
+                        f"(client_id={MQTT_CLIENT_ID}, session present={flags.get('session present', 0)})")
             
-            # Subscribe to all topics
-            for topic in MQTT_TOPICS:
-                client.subscribe(topic)
-                logger.info(f"Subscribed to {topic}")
+            # Subscribe ulang tiap connect (no-op jika session masih menyimpan subscription)
+            client.subscribe([(topic, MQTT_QOS) for topic in MQTT_TOPICS])
+            logger.info(f"Subscribed to {MQTT_TOPICS} (QoS {MQTT_QOS})")
         else:
             self.connected = False
             logger.error(f"Failed to connect to MQTT broker, return code {rc}")
     
     def _on_disconnect(self, client, userdata, rc):
         self.connected = False
-        logger.info("Disconnected from MQTT broker")
+        self._connected_event.clear()
+        self.window.reset()
+        if rc != 0:
+            self.reconnects += 1
+            logger.warning(f"MQTT connection lost (rc={rc}), reconnecting in background")
+        else:
+            logger.info("Disconnected from MQTT broker")
     
     def _on_message(self, client, userdata, msg):
         """Handle incoming MQTT messages"""
+        topic = msg.topic
         try:
-            topic = msg.topic
-            payload = msg.payload.decode('utf-8')
-            
             logger.debug(f"Received message from {topic}")
             
-            # Save raw message first (backup)
-            self.db_manager.insert_raw_message(topic, payload)
-            
-            # Parse JSON payload
-            try:
-                data = json.loads(payload)
-            except json.JSONDecodeError as e:
-                logger.error(f"Invalid JSON from {topic}: {e}")
+            # Serahkan ke writer thread site (atau parser process), paho loop tidak
+            # menunggu database; ack QoS 1 dikirim writer setelah commit / spill
+            if self.pool:
+                ack = self.window.acquire(msg.mid, msg.qos) if msg.qos > 0 else None
+                if msg.qos > 0 and ack is None:
+                    return
+                self._submit(self.pool.submit, topic, msg.payload, ack)
                 return
             
-            # Route data berdasarkan topic
-            if 'sensor/pzem016_ac' in topic:
-                self.db_manager.insert_pzem_data(data)
-                logger.info(f"Stored PZEM-016 AC data: {data.get('status')}")
-                
-            elif 'sensor/pzem017_dc' in topic:
-                self.db_manager.insert_pzem_data(data)
-                logger.info(f"Stored PZEM-017 DC data: {data.get('status')}")
-                
-            elif 'sensor/dht22' in topic:
-                self.db_manager.insert_dht22_data(data)
-                temp = data.get('temperature', -1)
-                humidity = data.get('humidity', -1)
-                logger.info(f"Stored DHT22 data: {temp}°C, {humidity}%")
-                
-            elif 'resource/system' in topic:
-                self.db_manager.insert_system_data(data)
-                ram = data.get('ram_usage_percent', -1)
-                logger.info(f"Stored System data: RAM {ram}%")
-                
-            elif 'all' in topic:
-                # Handle complete sensor data dari /all topic
-                sensors = data.get('sensors', {})
-                
-                if 'pzem016_ac' in sensors and sensors['pzem016_ac']:
-                    self.db_manager.insert_pzem_data(sensors['pzem016_ac'])
-                
-                if 'pzem017_dc' in sensors and sensors['pzem017_dc']:
-                    self.db_manager.insert_pzem_data(sensors['pzem017_dc'])
-                
-                if 'dht22' in sensors and sensors['dht22']:
-                    self.db_manager.insert_dht22_data(sensors['dht22'])
-                
-                if 'system' in sensors and sensors['system']:
-                    self.db_manager.insert_system_data(sensors['system'])
-                
-                logger.info("Stored complete sensor data from /all topic")
+            payload = msg.payload.decode('utf-8')
+            ack = self.window.acquire(msg.mid, msg.qos) if msg.qos > 0 else None
+            if msg.qos > 0 and ack is None:
+                return
+            self._submit(self.router.submit, topic, payload, ack)
             
         except Exception as e:
+            # Payload rusak tidak akan pernah tersimpan, ack supaya tidak dikirim ulang terus
             logger.error(f"Error processing message from {topic}: {e}")
+            if msg.qos > 0 and self.window.manual:
+                client.ack(msg.mid, msg.qos)
     
-    def connect(self) -> bool:
-        """Connect to MQTT broker"""
+    @staticmethod
+    def _submit(submit, topic: str, payload, ack: Optional[Callable[[bool], None]]):
+        """Submit setelah acquire: jika gagal slot dilepas tanpa PUBACK (dikirim ulang broker)"""
+        try:
+            submit(topic, payload, ack)
+        except Exception as e:
+            logger.error(f"Error submitting message from {topic}: {e}")
+            if ack is not None:
+                ack(False)
+    
+    def connect(self, timeout: float = 10) -> bool:
+        """
+        Connect to MQTT broker. Reconnect (termasuk koneksi pertama yang gagal)
+        ditangani loop paho dengan backoff MQTT_RECONNECT_MIN/MAX_DELAY.
+        """
         if not self.client:
             return False
         
         try:
             logger.info(f"Connecting to MQTT broker {self.broker}:{self.port}")
-            self.client.connect(self.broker, self.port, MQTT_KEEPALIVE)
+            self.client.connect_async(self.broker, self.port, MQTT_KEEPALIVE)
             self.client.loop_start()
             
             # Wait for connection
-            timeout = time.time() + 10
-            while not self.connected and time.time() < timeout:
-                time.sleep(0.1)
-            
-            return self.connected
+            return self._connected_event.wait(timeout)
         except Exception as e:
             logger.error(f"MQTT connection error: {e}")
             return False
@@ -405,15 +900,42 @@ class MQTTWorker:
     def disconnect(self):
         """Disconnect from MQTT broker"""
         if self.client:
-            self.client.loop_stop()
+            # thread paho yang menunggu window penuh harus lepas sebelum loop_stop
+            self.window.close()
             self.client.disconnect()
+            self.client.loop_stop()
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'connected': self.connected,
+            'client_id': MQTT_CLIENT_ID,
+            'qos': MQTT_QOS,
+            'clean_session': MQTT_CLEAN_SESSION,
+            'manual_ack': bool(self.window and self.window.manual),
+            'reconnects': self.reconnects,
+            'ingest': self.pool.stats() if self.pool else {'parsers': 0},
+            **(self.window.stats() if self.window else {})
+        }
     
     def start_monitoring(self):
         """Start MQTT monitoring dengan periodic cleanup"""
-        if not self.connect():
+        # Shard dibuka & dimigrasi sebelum connect (bukan di thread paho): site yang
+        # di-subscribe, atau semua shard yang sudah ada di disk untuk wildcard
+        sites = [MQTT_SITE] if MQTT_SITE != '+' else [DEFAULT_SITE] + list_sites()
+        self.router.open_sites(list(dict.fromkeys(sites)))
+        
+        if not self.client:
             logger.error("Failed to connect to MQTT broker")
+            self.router.stop()
             return
         
+        # Parser process siap sebelum pesan pertama datang
+        if self.pool:
+            self.pool.start()
+        
+        if not self.connect():
+            logger.warning("MQTT broker not reachable yet, retrying in background")
+        
         logger.info("MQTT Worker started successfully")
         logger.info(f"Subscribed topics: {MQTT_TOPICS}")
         logger.info(f"Database: {DB_PATH}")
@@ -422,28 +944,33 @@ class MQTTWorker:
             # Cleanup old data setiap 1 jam
             last_cleanup = time.time()
             cleanup_interval = 3600  # 1 hour
+            last_compaction = 0
             
             while True:
-                # Check if still connected
-                if not self.connected:
-                    logger.warning("MQTT connection lost, attempting reconnect...")
-                    if not self.connect():
-                        logger.error("Reconnection failed, waiting 30s...")
-                        time.sleep(30)
-                        continue
-                
                 # Periodic cleanup
                 current_time = time.time()
                 if current_time - last_cleanup > cleanup_interval:
                     logger.info("Performing periodic database cleanup...")
-                    self.db_manager.cleanup_old_data(days_to_keep=30)
+                    self.router.cleanup_old_data(days_to_keep=30)
                     last_cleanup = current_time
                 
-                time.sleep(60)  # Check every minute
+                # Jam tertutup -> block store
+                if BLOCK_COMPACT_INTERVAL and current_time - last_compaction > BLOCK_COMPACT_INTERVAL:
+                    self.router.compact_blocks()
+                    last_compaction = current_time
+                
+                # Queue depth, drain rate & window ack untuk monitoring (dibaca web API)
+                self.router.write_stats({'mqtt': self.stats()})
+                
+                time.sleep(STATUS_INTERVAL)
                 
         except KeyboardInterrupt:
             logger.info("MQTT Worker stopped by user")
         finally:
+            # Flush parser & writer dulu supaya ack batch terakhir terkirim sebelum disconnect
+            if self.pool:
+                self.pool.stop()
+            self.router.stop()
             self.disconnect()
 
 def main():
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+"""
+Parser / Analyzer Micro-benchmark
+Biaya per pesan di hot path MQTT worker: PZEMParser.parse_pzem016_ac /
+parse_pzem017_dc, EnhancedPZEMAnalyzer dan JSON decode/encode di sekitar parse
+(sensor_readings.pzem_reading). Corpus register dibuat deterministik (seed tetap): siang,
+malam, register pendek (6), ragged (7-9), alarm aktif dan register kurang (<6).
+
+Per case dilaporkan:
+- ns/op         waktu tercepat dari --repeat pengulangan (GC dimatikan seperti timeit)
+- relative      median ns/op dibagi loop kalibrasi yang diukur di sebelahnya
+- blocks/op     alokasi yang tertahan hasil per call (tracemalloc, hasil disimpan)
+- peak B/op     puncak memori sementara selama satu call (hasil dibuang)
+
+Baseline disimpan sebagai JSON. --check membandingkan waktu relative, sehingga
+baseline dari mesin lain (mis. laptop vs Raspberry Pi) masih bisa dibandingkan;
+--check keluar dengan status 1 jika ada case yang lebih lambat / lebih banyak
+alokasi dari baseline di atas --threshold.
+
+Usage:
+    python parser_bench.py                      # report
+    python parser_bench.py --save               # tulis baseline
+    python parser_bench.py --check --threshold 0.25
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import random
+import statistics
+import platform
+import argparse
+import tracemalloc
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Tuple
+
+from pzem_parser import PZEMParser, EnhancedPZEMAnalyzer
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'parser_bench_baseline.json')
+DEFAULT_THRESHOLD = 0.25
+CORPUS_SIZE = 200
+CORPUS_SEED = 16017
+
+# ---------- Corpus ----------
+
+def _split_32bit(value: int) -> Tuple[int, int]:
+    """Kebalikan PZEMParser.combine_32bit: (low, high)"""
+    return value & 0xFFFF, value >> 16
+
+def _pzem016_registers(rng: random.Random, variant: str) -> List[int]:
+    """Register PZEM-016 AC: [V, I lo, I hi, P lo, P hi, E lo, E hi, Hz, PF, alarm]"""
+    night = variant == 'night'
+    power_dw = rng.randint(0, 150) if night else rng.randint(300, 9000)          # 0.1 W
+    voltage_dv = rng.randint(2150, 2320)
+    current_ma = int(power_dw * 100 / voltage_dv * 1.1)
+    registers = [voltage_dv, *_split_32bit(current_ma), *_split_32bit(power_dw),
+                 *_split_32bit(rng.randint(3000, 250000)), rng.randint(498, 502),
+                 rng.randint(40, 100), 0]
+    if variant == 'alarm':
+        registers[9] = 0xFFFF
+    elif variant == 'short':
+        registers = registers[:6]
+    elif variant == 'ragged':
+        registers = registers[:rng.randint(7, 9)]
+    elif variant == 'insufficient':
+        registers = registers[:rng.randint(0, 5)]
+    return registers
+
+def _pzem017_registers(rng: random.Random, variant: str) -> List[int]:
+    """Register PZEM-017 DC: [V, I, P lo, P hi, E lo, E hi, OV alarm, UV alarm]"""
+    night = variant == 'night'
+    voltage_cv = rng.randint(0, 40) if night else rng.randint(1200, 2200)
+    current_ca = 0 if night else rng.randint(10, 900)
+    power_dw = voltage_cv * current_ca // 1000
+    registers = [voltage_cv, current_ca, *_split_32bit(power_dw),
+                 *_split_32bit(rng.randint(1000, 120000)), 0, 65535 if night else 0]
+    if variant == 'alarm':
+        registers[6] = 0xFFFF
+    elif variant == 'short':
+        registers = registers[:6]
+    elif variant == 'ragged':
+        registers = registers[:7]
+    elif variant == 'insufficient':
+        registers = registers[:rng.randint(0, 5)]
+    return registers
+
+PZEM016_VARIANTS = ('day', 'night', 'short', 'ragged', 'alarm', 'insufficient')
+PZEM017_VARIANTS = ('day', 'night', 'short', 'ragged', 'alarm', 'insufficient')
+
+def build_corpus(size: int = CORPUS_SIZE, seed: int = CORPUS_SEED) -> Dict[str, List[List[int]]]:
+    """{'pzem016/day': [registers, ...], ...}"""
+    rng = random.Random(seed)
+    corpus = {}
+    for variant in PZEM016_VARIANTS:
+        corpus[f'pzem016/{variant}'] = [_pzem016_registers(rng, variant) for _ in range(size)]
+    for variant in PZEM017_VARIANTS:
+        corpus[f'pzem017/{variant}'] = [_pzem017_registers(rng, variant) for _ in range(size)]
+    return corpus
+
+def _payload(device_type: str, registers: List[int], index: int) -> str:
+    """Payload MQTT seperti yang dikirim pembaca Modbus"""
+    return json.dumps({
+        'timestamp': f'2025-07-01T{index // 3600 % 24:02d}:{index // 60 % 60:02d}:{index % 60:02d}',
+        'device_type': device_type,
+        'device_path': '/dev/ttyUSB0',
+        'slave_id': 1 if device_type == 'PZEM-016_AC' else 2,
+        'raw_registers': registers,
+        'register_count': len(registers),
+        'status': 'success',
+        'error_message': None
+    })
+
+# ---------- Cases ----------
+
+def _pzem_message(payload: str) -> Tuple[str, str]:
+    """Pekerjaan CPU per pesan PZEM di sensor_readings.pzem_reading: decode, parse, encode"""
+    data = json.loads(payload)
+    if data['device_type'] == 'PZEM-016_AC':
+        parsed_data = PZEMParser.parse_pzem016_ac(data['raw_registers'])
+    else:
+        parsed_data = PZEMParser.parse_pzem017_dc(data['raw_registers'])
+    return json.dumps(data.get('raw_registers', [])), json.dumps(parsed_data)
+
+def build_cases(corpus: Dict[str, List[List[int]]]) -> Dict[str, Tuple[Callable, List[Any]]]:
+    """
+    name -> (fn, inputs). fn dipanggil sekali per input; ns/op = waktu loop / len(inputs).
+    Input tuple di-unpack sebagai argumen.
+    """
+    cases = {}
+    for key, registers in corpus.items():
+        device, variant = key.split('/')
+        fn = PZEMParser.parse_pzem016_ac if device == 'pzem016' else PZEMParser.parse_pzem017_dc
+        cases[f'parse_{device}/{variant}'] = (fn, [(regs,) for regs in registers])
+
+    ac = [PZEMParser.parse_pzem016_ac(regs) for key in ('pzem016/day', 'pzem016/night')
+          for regs in corpus[key]]
+    dc = [PZEMParser.parse_pzem017_dc(regs) for key in ('pzem017/day', 'pzem017/night')
+          for regs in corpus[key]]
+    cases['analyze_ac_power_flow'] = (EnhancedPZEMAnalyzer.analyze_ac_power_flow, [(data,) for data in ac])
+    cases['analyze_solar_generation'] = (EnhancedPZEMAnalyzer.analyze_solar_generation, [(data,) for data in dc])
+
+    # Efficiency: scalar per pasangan vs batch (as-of join) per titik AC
+    cases['efficiency/scalar'] = (EnhancedPZEMAnalyzer.calculate_system_efficiency, list(zip(ac, dc)))
+    rows = []
+    for index, (ac_data, dc_data) in enumerate(zip(ac, dc)):
+        rows.append((index * 30.0, 'PZEM-017_DC', dc_data['power_w']))
+        rows.append((index * 30.0 + 5, 'PZEM-016_AC', ac_data['power_w']))
+    series = lambda: EnhancedPZEMAnalyzer.calculate_efficiency_series(rows, include_series=False)
+    cases['efficiency/batch'] = (series, [()], len(ac))
+
+    for device, device_type in (('pzem016', 'PZEM-016_AC'), ('pzem017', 'PZEM-017_DC')):
+        payloads = [_payload(device_type, regs, index)
+                    for variant in ('day', 'night', 'alarm')
+                    for index, regs in enumerate(corpus[f'{device}/{variant}'])]
+        cases[f'message/{device}'] = (_pzem_message, [(payload,) for payload in payloads])
+    return cases
+
+# ---------- Measurement ----------
+
+def _calibration_workload():
+    """Loop Python murni (dict, float, round) sebagai satuan kecepatan mesin"""
+    result = {}
+    for index in range(1000):
+        value = index / 10.0
+        result[index & 15] = round(value * 1.5, 1)
+    return result
+
+def _calibrate() -> float:
+    """ns per iterasi loop kalibrasi (tercepat dari 3 run pendek)"""
+    best = None
+    for _ in range(3):
+        started = time.perf_counter_ns()
+        for _ in range(10):
+            _calibration_workload()
+        elapsed = (time.perf_counter_ns() - started) / 10000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+def _time_case(fn: Callable, inputs: List[Any], ops: int, repeat: int,
+               min_time: float) -> Tuple[float, float, float]:
+    """
+    (ns/op tercepat, ns/op / kalibrasi, ns kalibrasi). Jumlah loop per pengulangan
+    dikalibrasi sampai >= min_time; kalibrasi diukur di sebelah setiap pengulangan
+    dan rasio diambil median, sehingga perubahan clock/beban mesin di tengah run
+    (CPU throttling Pi, VM bersama) ikut ternormalisasi.
+    """
+    def run(loops):
+        started = time.perf_counter_ns()
+        for _ in range(loops):
+            for args in inputs:
+                fn(*args)
+        return (time.perf_counter_ns() - started) / (loops * ops)
+
+    loops = 1
+    while True:
+        started = time.perf_counter_ns()
+        run(loops)
+        if time.perf_counter_ns() - started >= min_time * 1e9 or loops >= 1 << 20:
+            break
+        loops *= 2
+
+    samples, ratios, calibrations = [], [], []
+    for _ in range(repeat):
+        calibration_ns = _calibrate()
+        ns_op = run(loops)
+        samples.append(ns_op)
+        calibrations.append(calibration_ns)
+        ratios.append(ns_op / calibration_ns)
+    return min(samples), statistics.median(ratios), min(calibrations)
+
+def _allocations(fn: Callable, inputs: List[Any], ops: int) -> Tuple[float, float]:
+    """(block tertahan per op, puncak byte sementara per op)"""
+    tracemalloc.start()
+    try:
+        results = []
+        before = tracemalloc.take_snapshot()
+        for args in inputs:
+            results.append(fn(*args))
+        after = tracemalloc.take_snapshot()
+        retained = sum(stat.count_diff for stat in after.compare_to(before, 'filename'))
+        # Block list results sendiri bukan alokasi fungsi yang diukur
+        retained -= 1
+        del results
+
+        peak = 0
+        for args in inputs:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return max(retained, 0) / ops, peak
+
+def run_benchmark(repeat: int = 7, min_time: float = 0.1,
+                  case_filter: str = None) -> Dict[str, Any]:
+    cases = build_cases(build_corpus())
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        calibration_ns = None
+        results = {}
+        for name, case in cases.items():
+            if case_filter and case_filter not in name:
+                continue
+            fn, inputs = case[0], case[1]
+            ops = case[2] if len(case) > 2 else len(inputs)
+            ns_op, relative, case_calibration_ns = _time_case(fn, inputs, ops, repeat, min_time)
+            calibration_ns = min(calibration_ns or case_calibration_ns, case_calibration_ns)
+            alloc_blocks, peak_bytes = _allocations(fn, inputs, ops)
+            results[name] = {
+                'ns_op': round(ns_op, 1),
+                'relative': round(relative, 3),
+                'alloc_blocks': round(alloc_blocks, 2),
+                'peak_bytes': peak_bytes
+            }
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'calibration_ns': round(calibration_ns or 0, 2),
+        'cases': results
+    }
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], threshold: float,
+            normalize: bool = True) -> List[Dict[str, Any]]:
+    """Case yang regress (waktu relatif / alokasi) dibanding baseline"""
+    regressions = []
+    for name, result in report['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            continue
+        key = 'relative' if normalize else 'ns_op'
+        time_change = result[key] / base[key] - 1 if base[key] else 0.0
+        # +1 block supaya case dengan alokasi sangat kecil tidak flaky
+        alloc_limit = base['alloc_blocks'] * (1 + threshold) + 1
+        result['change'] = round(time_change, 3)
+        if time_change > threshold or result['alloc_blocks'] > alloc_limit:
+            regressions.append({
+                'case': name,
+                'time_change': round(time_change, 3),
+                'alloc_blocks': result['alloc_blocks'],
+                'baseline_alloc_blocks': base['alloc_blocks']
+            })
+    return regressions
+
+def print_report(report: Dict[str, Any]):
+    print(f"python {report['python']} ({report['machine']})  calibration={report['calibration_ns']} ns/iter")
+    print(f"  {'case':<32} {'ns/op':>10} {'relative':>9} {'blocks/op':>10} {'peak B/op':>10} {'vs base':>8}")
+    for name, result in report['cases'].items():
+        change = f"{result['change'] * 100:+.1f}%" if 'change' in result else ''
+        print(f"  {name:<32} {result['ns_op']:>10} {result['relative']:>9} "
+              f"{result['alloc_blocks']:>10} {result['peak_bytes']:>10} {change:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Micro-benchmark parser & analyzer PZEM')
+    parser.add_argument('--repeat', type=int, default=7, help='Pengulangan per case (ambil tercepat)')
+    parser.add_argument('--min-time', type=float, default=0.1, help='Durasi minimum satu pengulangan (detik)')
+    parser.add_argument('--filter', help='Hanya case yang namanya mengandung teks ini')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='File baseline JSON')
+    parser.add_argument('--save', action='store_true', help='Simpan hasil sebagai baseline')
+    parser.add_argument('--check', action='store_true', help='Exit 1 jika regress dibanding baseline')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Toleransi regress (0.25 = 25%% lebih lambat)')
+    parser.add_argument('--raw', action='store_true', help='Bandingkan ns/op mentah (mesin yang sama)')
+    parser.add_argument('--json', action='store_true', help='Output JSON')
+    args = parser.parse_args()
+
+    baseline = None
+    if args.check or os.path.exists(args.baseline):
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            print(f"Baseline not found: {args.baseline}", file=sys.stderr)
+            sys.exit(2)
+
+    report = run_benchmark(args.repeat, args.min_time, args.filter)
+    regressions = compare(report, baseline, args.threshold, normalize=not args.raw) if baseline else []
+
+    if args.json:
+        print(json.dumps(dict(report, regressions=regressions), indent=2))
+    else:
+        print_report(report)
+        for regression in regressions:
+            print(f"REGRESSION {regression['case']}: time {regression['time_change'] * 100:+.1f}%, "
+                  f"blocks/op {regression['alloc_blocks']} (baseline {regression['baseline_alloc_blocks']})")
+
+    if args.save:
+        for result in report['cases'].values():
+            result.pop('change', None)
+        if baseline and args.filter:
+            # Run parsial hanya mengganti case yang diukur
+            report['cases'] = dict(baseline['cases'], **report['cases'])
+        with open(args.baseline, 'w') as f:
+            json.dump(report, f, indent=2)
+            f.write('\n')
+        print(f"Baseline saved: {args.baseline}")
+
+    sys.exit(1 if args.check and regressions else 0)
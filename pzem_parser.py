@@ -23,7 +23,8 @@ PZEM-017 DC (Solar ke SCC):
 
 import json
 import logging
-from typing import Dict, Any, Optional, List
+from collections import deque
+from typing import Dict, Any, Optional, List, Iterable, Iterator, Tuple
 from datetime import datetime
 
 logger = logging.getLogger(__name__)
@@ -208,6 +209,23 @@ class PZEMParser:
                 'device_type': 'PZEM-017_DC',
                 'status': 'error'
             }
+    
+    @staticmethod
+    def parse_reading(data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Parse payload PZEM dari MQTT (status success + raw_registers) sesuai device_type.
+        None jika pembacaan gagal / device tidak dikenal.
+        """
+        if data.get('status') != 'success' or not data.get('raw_registers'):
+            return None
+        try:
+            if data.get('device_type') == 'PZEM-016_AC':
+                return PZEMParser.parse_pzem016_ac(data['raw_registers'])
+            if data.get('device_type') == 'PZEM-017_DC':
+                return PZEMParser.parse_pzem017_dc(data['raw_registers'])
+        except Exception as e:
+            logger.error(f"Error parsing PZEM data: {e}")
+        return None
 
 class EnhancedPZEMAnalyzer:
     """Enhanced analyzer untuk PZEM data dengan insights dan alerts"""
@@ -360,6 +378,174 @@ class EnhancedPZEMAnalyzer:
             result['recommendation'] = 'Check system components for issues'
         
         return result
+    
+    @staticmethod
+    def calculate_efficiency_series(rows: Iterable[Tuple[float, str, Optional[float]]],
+                                    tolerance_s: float = 60.0,
+                                    interpolate: bool = True,
+                                    include_series: bool = True) -> Dict[str, Any]:
+        """Efficiency time series dari stream AC & DC yang terurut berdasarkan waktu"""
+        joiner = AsOfEfficiencyJoiner(tolerance_s=tolerance_s, interpolate=interpolate)
+        
+        series = []
+        for point in joiner.join(rows):
+            if include_series:
+                series.append(point)
+        
+        return {
+            'series': series,
+            'hourly': joiner.rollup.summary('hourly'),
+            'daily': joiner.rollup.summary('daily'),
+            'stats': joiner.stats
+        }
+
+class EfficiencyRollup:
+    """Rollup efficiency per jam/hari yang di-update incremental tiap titik"""
+    
+    BUCKETS = {'hourly': 3600, 'daily': 86400}
+    
+    def __init__(self):
+        self.buckets: Dict[str, Dict[int, Dict[str, float]]] = {name: {} for name in self.BUCKETS}
+    
+    def add(self, ts: float, ac_power: float, dc_power: float):
+        """Tambahkan satu titik hasil join ke semua bucket"""
+        for name, size in self.BUCKETS.items():
+            bucket_start = int(ts // size) * size
+            bucket = self.buckets[name].get(bucket_start)
+            if bucket is None:
+                bucket = self.buckets[name][bucket_start] = {
+                    'samples': 0,
+                    'generating_samples': 0,
+                    'ac_power_sum': 0.0,
+                    'dc_power_sum': 0.0,
+                    'power_loss_sum': 0.0
+                }
+            
+            bucket['samples'] += 1
+            bucket['power_loss_sum'] += dc_power - ac_power
+            
+            # Efficiency hanya dihitung saat panel menghasilkan daya (energy-weighted)
+            if dc_power > 0:
+                bucket['generating_samples'] += 1
+                bucket['ac_power_sum'] += ac_power
+                bucket['dc_power_sum'] += dc_power
+    
+    def summary(self, name: str) -> List[Dict[str, Any]]:
+        """Ringkasan bucket (hourly/daily) terurut berdasarkan waktu"""
+        result = []
+        for bucket_start, bucket in sorted(self.buckets[name].items()):
+            efficiency = None
+            if bucket['dc_power_sum'] > 0:
+                efficiency = round(bucket['ac_power_sum'] / bucket['dc_power_sum'] * 100, 1)
+            
+            result.append({
+                'bucket_start': bucket_start,
+                'samples': bucket['samples'],
+                'generating_samples': bucket['generating_samples'],
+                'system_efficiency_percent': efficiency,
+                'avg_power_loss_w': round(bucket['power_loss_sum'] / bucket['samples'], 1)
+            })
+        return result
+
+class AsOfEfficiencyJoiner:
+    """
+    Streaming as-of join antara PZEM-016 (AC) dan PZEM-017 (DC)
+    
+    Input berupa rows (ts, device_type, power_w) yang sudah terurut berdasarkan ts,
+    misalnya hasil query pzem_data ORDER BY timestamp. Setiap titik AC dipasangkan
+    dengan daya DC pada waktu yang sama: interpolasi linear antara DC sebelum dan
+    sesudahnya, atau DC terdekat jika hanya satu sisi dalam tolerance window.
+    Memory hanya sebesar titik AC yang masih menunggu DC berikutnya.
+    """
+    
+    AC_DEVICE = 'PZEM-016_AC'
+    DC_DEVICE = 'PZEM-017_DC'
+    
+    def __init__(self, tolerance_s: float = 60.0, interpolate: bool = True,
+                 rollup: Optional[EfficiencyRollup] = None):
+        self.tolerance_s = tolerance_s
+        self.interpolate = interpolate
+        self.rollup = rollup if rollup is not None else EfficiencyRollup()
+        self.stats = {
+            'ac_samples': 0,
+            'dc_samples': 0,
+            'interpolated': 0,
+            'as_of': 0,
+            'unmatched': 0
+        }
+        self._last_dc: Optional[Tuple[float, float]] = None
+        self._pending_ac: deque = deque()
+    
+    def feed(self, ts: float, device_type: str, power_w: Optional[float]) -> List[Dict[str, Any]]:
+        """Proses satu row, return titik efficiency yang sudah bisa di-emit"""
+        output = []
+        if power_w is None:
+            return output
+        
+        if device_type == self.DC_DEVICE:
+            self.stats['dc_samples'] += 1
+            while self._pending_ac:
+                ac_ts, ac_power = self._pending_ac.popleft()
+                self._resolve(ac_ts, ac_power, (ts, power_w), output)
+            self._last_dc = (ts, power_w)
+            
+        elif device_type == self.AC_DEVICE:
+            self.stats['ac_samples'] += 1
+            # Titik AC yang DC berikutnya pasti di luar tolerance bisa langsung di-resolve
+            while self._pending_ac and self._pending_ac[0][0] + self.tolerance_s < ts:
+                ac_ts, ac_power = self._pending_ac.popleft()
+                self._resolve(ac_ts, ac_power, None, output)
+            self._pending_ac.append((ts, power_w))
+        
+        return output
+    
+    def finish(self) -> List[Dict[str, Any]]:
+        """Flush titik AC yang masih pending di akhir stream"""
+        output = []
+        while self._pending_ac:
+            ac_ts, ac_power = self._pending_ac.popleft()
+            self._resolve(ac_ts, ac_power, None, output)
+        return output
+    
+    def join(self, rows: Iterable[Tuple[float, str, Optional[float]]]) -> Iterator[Dict[str, Any]]:
+        """Join seluruh rows dalam satu pass"""
+        for ts, device_type, power_w in rows:
+            yield from self.feed(ts, device_type, power_w)
+        yield from self.finish()
+    
+    def _resolve(self, ac_ts: float, ac_power: float,
+                 next_dc: Optional[Tuple[float, float]], output: List[Dict[str, Any]]):
+        """Cari daya DC untuk satu titik AC dan tambahkan hasilnya ke output"""
+        left = self._last_dc
+        if left is not None and ac_ts - left[0] > self.tolerance_s:
+            left = None
+        right = next_dc
+        if right is not None and right[0] - ac_ts > self.tolerance_s:
+            right = None
+        
+        if left is None and right is None:
+            self.stats['unmatched'] += 1
+            return
+        
+        if left is not None and right is not None and self.interpolate and right[0] > left[0]:
+            fraction = (ac_ts - left[0]) / (right[0] - left[0])
+            dc_power = left[1] + fraction * (right[1] - left[1])
+            match = 'interpolated'
+        else:
+            candidates = [point for point in (left, right) if point is not None]
+            dc_power = min(candidates, key=lambda point: abs(point[0] - ac_ts))[1]
+            match = 'as_of'
+        self.stats[match] += 1
+        
+        self.rollup.add(ac_ts, ac_power, dc_power)
+        output.append({
+            'timestamp': ac_ts,
+            'ac_power_w': ac_power,
+            'dc_power_w': round(dc_power, 1),
+            'power_loss_w': round(dc_power - ac_power, 1),
+            'system_efficiency_percent': round(ac_power / dc_power * 100, 1) if dc_power > 0 else None,
+            'match': match
+        })
 
 # Test functions
 def test_parser():
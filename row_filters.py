@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Server-side Row Filters
+Filter untuk /api/data/<sensor_type> supaya troubleshooting (read Modbus gagal,
+alarm, nilai di luar range) cukup satu request tanpa scan di client:
+
+    ?status=failed               status != 'success' (partial index *_failed)
+    ?status=error,timeout        status tertentu (tetap lewat partial index)
+    ?alarm=any                   flag alarm PZEM = 'ON' (partial index idx_pzem_alarm)
+    ?alarm=over_voltage_alarm    flag tertentu
+    ?filter=power_w>100          range metric whitelist (berulang: filter=..&filter=..)
+    ?q=timeout ttyUSB0           full-text error_message (FTS5, token prefix: ttyUSB*)
+
+Kondisi SQL memakai term literal yang sama dengan WHERE partial index supaya
+planner SQLite bisa memakainya. Cold tier (Parquet) memakai predicate Python
+yang setara (status dan range kolom typed juga di-push ke pyarrow filters).
+Run deadband punya field identik, jadi filter per row berlaku untuk semua
+pembacaan dalam run.
+"""
+
+import re
+import json
+import sqlite3
+from typing import Any, Callable, Dict, List, Tuple
+
+from aggregation import SENSOR_METRICS, metric_expression
+
+# Flag alarm per sensor di parsed_data ('ON' / 'OFF')
+ALARM_FLAGS = {
+    'pzem016': ['alarm_status'],
+    'pzem017': ['over_voltage_alarm', 'under_voltage_alarm'],
+}
+
+# Term WHERE partial index (harus sama persis dengan migrasi 009)
+FAILED_SQL = "status != 'success'"
+ALARM_SQL = """parsed_data LIKE '%"ON"%'"""
+
+# Tabel FTS5 contentless per tabel data (rowid = id row)
+FTS_TABLES = {
+    'pzem_data': 'pzem_data_fts',
+    'dht22_data': 'dht22_data_fts',
+    'system_data': 'system_data_fts',
+}
+
+FAILED_STATUS = 'failed'
+MAX_RANGE_FILTERS = 10
+
+RANGE_PATTERN = re.compile(r'^\s*([a-z0-9_]+)\s*(>=|<=|!=|>|<|=)\s*(-?\d+(?:\.\d+)?)\s*$')
+TOKEN_PATTERN = re.compile(r'\w+\*?')
+
+_OPERATORS = {
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '=': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+}
+
+def fts_available(conn: sqlite3.Connection, table: str) -> bool:
+    """FTS5 tidak selalu ter-compile; migrasi 009 melewatinya jika tidak ada"""
+    try:
+        conn.execute(f'SELECT 1 FROM {FTS_TABLES[table]} LIMIT 0')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+def fts_query(tokens: List[str]) -> str:
+    """Token user -> query FTS5 (AND antar token, quoted supaya syntax FTS tidak bocor)"""
+    terms = []
+    for token in tokens:
+        prefix = token.endswith('*')
+        terms.append('"' + token.rstrip('*') + '"' + ('*' if prefix else ''))
+    return ' '.join(terms)
+
+class RowFilter:
+    """Filter yang sudah divalidasi untuk satu sensor"""
+
+    def __init__(self, sensor: str):
+        self.sensor = sensor
+        self.statuses = []       # status spesifik (kosong = semua)
+        self.failed_only = False
+        self.success_only = False
+        self.alarms = []
+        self.ranges = []         # (metric, operator, value)
+        self.tokens = []
+
+    @classmethod
+    def from_args(cls, sensor: str, args) -> 'RowFilter':
+        """Parse query args (ValueError untuk filter tidak valid)"""
+        row_filter = cls(sensor)
+
+        status = args.get('status')
+        if status:
+            values = [value.strip() for value in status.split(',') if value.strip()]
+            if 'success' in values and len(values) > 1:
+                raise ValueError('status=success cannot be combined with other statuses')
+            if values == ['success']:
+                row_filter.success_only = True
+            else:
+                row_filter.failed_only = True
+                row_filter.statuses = [value for value in values if value != FAILED_STATUS]
+
+        alarm = args.get('alarm')
+        if alarm:
+            flags = ALARM_FLAGS.get(sensor)
+            if not flags:
+                raise ValueError(f'Sensor has no alarm flags: {sensor}')
+            requested = flags if alarm in ('any', '1', 'true') else [flag.strip() for flag in alarm.split(',')]
+            invalid = [flag for flag in requested if flag not in flags]
+            if invalid:
+                raise ValueError(f'Invalid alarm flag for {sensor}: {", ".join(invalid)}')
+            row_filter.alarms = requested
+
+        expressions = args.getlist('filter') if hasattr(args, 'getlist') else [args.get('filter')]
+        expressions = [expression for expression in expressions if expression]
+        if len(expressions) > MAX_RANGE_FILTERS:
+            raise ValueError(f'Too many filters (max {MAX_RANGE_FILTERS})')
+        for expression in expressions:
+            match = RANGE_PATTERN.match(expression)
+            if not match:
+                raise ValueError(f'Invalid filter: {expression} (expected e.g. power_w>100)')
+            metric, operator, value = match.groups()
+            if metric not in SENSOR_METRICS[sensor]['metrics']:
+                raise ValueError(f'Invalid metric for {sensor}: {metric}')
+            row_filter.ranges.append((metric, operator, float(value)))
+
+        query = args.get('q')
+        if query:
+            row_filter.tokens = TOKEN_PATTERN.findall(query.lower())
+            if not row_filter.tokens:
+                raise ValueError('Search query has no searchable terms')
+
+        return row_filter
+
+    @property
+    def active(self) -> bool:
+        return bool(self.failed_only or self.success_only or self.alarms or self.ranges or self.tokens)
+
+    def describe(self) -> Dict[str, Any]:
+        """Filter aktif untuk response API"""
+        described = {}
+        if self.success_only:
+            described['status'] = ['success']
+        elif self.failed_only:
+            described['status'] = self.statuses or [FAILED_STATUS]
+        if self.alarms:
+            described['alarm'] = self.alarms
+        if self.ranges:
+            described['filter'] = [f'{metric}{operator}{value:g}' for metric, operator, value in self.ranges]
+        if self.tokens:
+            described['q'] = ' '.join(self.tokens)
+        return described
+
+    # ---------- SQL (hot tier) ----------
+
+    def sql(self, conn: sqlite3.Connection, table: str) -> Tuple[List[str], List[Any]]:
+        """Kondisi WHERE tambahan dan parameternya"""
+        conditions, params = [], []
+
+        if self.success_only:
+            conditions.append("status = 'success'")
+        elif self.failed_only:
+            conditions.append(FAILED_SQL)
+            if self.statuses:
+                conditions.append(f"status IN ({', '.join('?' for _ in self.statuses)})")
+                params.extend(self.statuses)
+
+        if self.alarms:
+            conditions.append(ALARM_SQL)
+            conditions.append('(' + ' OR '.join(
+                f"JSON_EXTRACT(parsed_data, '$.{flag}') = 'ON'" for flag in self.alarms
+            ) + ')')
+
+        for metric, operator, value in self.ranges:
+            conditions.append(f'{metric_expression(self.sensor, metric)} {operator} ?')
+            params.append(value)
+
+        if self.tokens:
+            if fts_available(conn, table):
+                conditions.append(f'id IN (SELECT rowid FROM {FTS_TABLES[table]} WHERE {FTS_TABLES[table]} MATCH ?)')
+                params.append(fts_query(self.tokens))
+            else:
+                for token in self.tokens:
+                    conditions.append('error_message LIKE ?')
+                    params.append('%' + token.rstrip('*') + '%')
+
+        return conditions, params
+
+    # ---------- Cold tier (Parquet) ----------
+
+    def pushdown(self, cold_columns: List[str]) -> List[tuple]:
+        """Filter pyarrow untuk kolom yang ada di schema Parquet (sisanya lewat predicate)"""
+        filters = []
+        if self.success_only:
+            filters.append(('status', '=', 'success'))
+        elif self.failed_only:
+            filters.append(('status', '!=', 'success'))
+            if self.statuses:
+                filters.append(('status', 'in', list(self.statuses)))
+        for metric, operator, value in self.ranges:
+            if metric in cold_columns:
+                filters.append((metric, '==' if operator == '=' else operator, value))
+        return filters
+
+    def predicate(self, names: List[str]) -> Callable[[tuple], bool]:
+        """Predicate Python atas row tuple dengan kolom names (setara kondisi SQL)"""
+        index = {name: position for position, name in enumerate(names)}
+
+        def value_of(row, parsed, metric):
+            if metric in index:
+                return row[index[metric]]
+            return parsed().get(metric)
+
+        def check(row) -> bool:
+            cache = {}
+
+            def parsed():
+                if 'parsed' not in cache:
+                    raw = row[index['parsed_data']] if 'parsed_data' in index else None
+                    cache['parsed'] = json.loads(raw) if raw else {}
+                return cache['parsed']
+
+            status = row[index['status']]
+            if self.success_only and status != 'success':
+                return False
+            if self.failed_only and (status == 'success' or (self.statuses and status not in self.statuses)):
+                return False
+            if self.alarms and not any(parsed().get(flag) == 'ON' for flag in self.alarms):
+                return False
+            for metric, operator, value in self.ranges:
+                actual = value_of(row, parsed, metric)
+                if actual is None or not _OPERATORS[operator](actual, value):
+                    return False
+            if self.tokens:
+                words = TOKEN_PATTERN.findall((row[index['error_message']] or '').lower())
+                for token in self.tokens:
+                    if token.endswith('*'):
+                        if not any(word.startswith(token[:-1]) for word in words):
+                            return False
+                    elif token not in words:
+                        return False
+            return True
+
+        return check
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Sensor Readings (Routing & Row Preparation)
+Bagian CPU penyimpanan pesan yang tidak butuh database: routing topic ke
+pembacaan per sensor (/all di-fan-out per device), parse PZEM, normalisasi
+timestamp payload, key series (deadband, idempotensi, device health) dan nilai
+INSERT. Dipakai parser process ingest_pool (INGEST_PARSERS > 0) dan writer
+(mode single process, replay spill), sehingga writer hanya menjalankan langkah
+yang membaca / menulis database.
+
+Reading adalah tuple tipe dasar (bisa di-marshal; series tetap tuple):
+    (table, sensor, series, device, ts_ms, success, values, fields, metrics, rollup, anomaly_series)
+
+- sensor          pzem016 / pzem017 / dht22 / system, None untuk device_type PZEM
+                  yang tidak dikenal (hanya row, tanpa summary / rollup / health)
+- series          (table, *kolom identitas device) = parameter SERIES_WHERE
+- values          parameter INSERT_SQL[table]
+- fields          kolom yang dibandingkan deadband
+- metrics         nilai untuk summary / rollup / anomaly (None = tidak ada metric)
+- rollup          metrics ikut rollup per jam
+- anomaly_series  series detector anomali, None = tidak diperiksa
+"""
+
+import json
+from typing import Dict, Any, List, Optional
+
+from epoch_time import payload_epoch_ms, from_epoch_ms, site_now_ms
+from aggregation import device_id, DEVICE_SENSORS
+from pzem_parser import PZEMParser
+
+# Kolom yang dibandingkan deadband (kolom lain di row ikut pembacaan pertama run)
+DHT22_RUN_FIELDS = ('temperature', 'humidity', 'library', 'status', 'error_message')
+SYSTEM_RUN_FIELDS = ('ram_usage_percent', 'storage_usage_percent', 'cpu_usage_percent',
+                     'cpu_temperature', 'storage_total_gb', 'storage_used_gb',
+                     'storage_free_gb', 'status', 'error_message')
+
+INSERT_SQL = {
+    'pzem_data': '''
+        INSERT INTO pzem_data (
+            timestamp, ts_ms, device_type, device_path, slave_id,
+            raw_registers, register_count, status, error_message,
+            parsed_data
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'dht22_data': '''
+        INSERT INTO dht22_data (
+            timestamp, ts_ms, temperature, humidity, gpio_pin,
+            library, status, error_message
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'system_data': '''
+        INSERT INTO system_data (
+            timestamp, ts_ms, ram_usage_percent, storage_usage_percent,
+            cpu_usage_percent, cpu_temperature, storage_total_gb,
+            storage_used_gb, storage_free_gb, status, error_message
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+}
+
+# Kondisi row satu series (parameter = series[1:]), untuk cek duplikat redelivery
+SERIES_WHERE = {
+    'pzem_data': 'device_type IS ? AND device_path IS ? AND slave_id IS ?',
+    'dht22_data': 'gpio_pin IS ?',
+    'system_data': '1 = 1',
+}
+
+def timestamp_ms(data: Dict[str, Any]) -> int:
+    """Normalisasi timestamp payload ke epoch ms (fallback: waktu sekarang)"""
+    ts_ms = payload_epoch_ms(data.get('timestamp'))
+    if ts_ms is None:
+        ts_ms = site_now_ms()
+    return ts_ms
+
+def timestamp_text(data: Dict[str, Any], ts_ms: int) -> Optional[str]:
+    """Kolom timestamp: string payload apa adanya, epoch numerik sebagai ISO jam dinding site"""
+    timestamp = data.get('timestamp')
+    if isinstance(timestamp, (int, float)) and not isinstance(timestamp, bool):
+        return from_epoch_ms(ts_ms)
+    return timestamp
+
+def pzem_reading(data: Dict[str, Any], parsed_data: Optional[Dict[str, Any]] = None) -> tuple:
+    """Reading PZEM (parse register jika parsed_data belum ada)"""
+    if parsed_data is None:
+        parsed_data = PZEMParser.parse_reading(data)
+
+    ts_ms = timestamp_ms(data)
+    device_type = data.get('device_type')
+    sensor = DEVICE_SENSORS.get(device_type)
+    success = data.get('status') == 'success'
+    parsed_ok = bool(parsed_data) and parsed_data.get('status') == 'success'
+    values = (
+        timestamp_text(data, ts_ms),
+        ts_ms,
+        device_type,
+        data.get('device_path'),
+        data.get('slave_id'),
+        json.dumps(data.get('raw_registers', [])),
+        data.get('register_count', 0),
+        data.get('status'),
+        data.get('error_message'),
+        json.dumps(parsed_data) if parsed_data else None
+    )
+    fields = dict(parsed_data or {}, status=data.get('status'), error_message=data.get('error_message'))
+    return ('pzem_data', sensor, ('pzem_data', device_type, data.get('device_path'), data.get('slave_id')),
+            device_id(sensor, data) if sensor else '', ts_ms, success, values, fields,
+            parsed_data if parsed_ok else None, parsed_ok and sensor is not None, None)
+
+def dht22_reading(data: Dict[str, Any]) -> tuple:
+    """Reading DHT22"""
+    ts_ms = timestamp_ms(data)
+    success = data.get('status') == 'success'
+    values = (
+        timestamp_text(data, ts_ms),
+        ts_ms,
+        data.get('temperature'),
+        data.get('humidity'),
+        data.get('gpio_pin'),
+        data.get('library'),
+        data.get('status'),
+        data.get('error_message')
+    )
+    fields = {key: data.get(key) for key in DHT22_RUN_FIELDS}
+    return ('dht22_data', 'dht22', ('dht22_data', data.get('gpio_pin')), device_id('dht22', data),
+            ts_ms, success, values, fields, fields, success,
+            str(data.get('gpio_pin') or '') if success else None)
+
+def system_reading(data: Dict[str, Any]) -> tuple:
+    """Reading System Resources"""
+    ts_ms = timestamp_ms(data)
+    success = data.get('status') == 'success'
+    values = (
+        timestamp_text(data, ts_ms),
+        ts_ms,
+        data.get('ram_usage_percent'),
+        data.get('storage_usage_percent'),
+        data.get('cpu_usage_percent'),
+        data.get('cpu_temperature'),
+        data.get('storage_total_gb'),
+        data.get('storage_used_gb'),
+        data.get('storage_free_gb'),
+        data.get('status'),
+        data.get('error_message')
+    )
+    fields = {key: data.get(key) for key in SYSTEM_RUN_FIELDS}
+    return ('system_data', 'system', ('system_data',), device_id('system', data),
+            ts_ms, success, values, fields, fields, success, '' if success else None)
+
+def route_readings(topic: str, data: Any) -> List[tuple]:
+    """Reading per sensor berdasarkan topic; /all menghasilkan satu reading per device di payload"""
+    if not isinstance(data, dict):
+        raise ValueError('payload is not a JSON object')
+
+    if 'sensor/pzem016_ac' in topic or 'sensor/pzem017_dc' in topic:
+        return [pzem_reading(data)]
+    if 'sensor/dht22' in topic:
+        return [dht22_reading(data)]
+    if 'resource/system' in topic:
+        return [system_reading(data)]
+    if topic.endswith('/all'):
+        sensors = data.get('sensors') or {}
+        readings = []
+        for key in ('pzem016_ac', 'pzem017_dc'):
+            if sensors.get(key):
+                readings.append(pzem_reading(sensors[key]))
+        if sensors.get('dht22'):
+            readings.append(dht22_reading(sensors['dht22']))
+        if sensors.get('system'):
+            readings.append(system_reading(sensors['system']))
+        return readings
+    return []
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Multi-site Sharding
+Setiap site (prefix topic <site>/raspi/...) punya file SQLite sendiri.
+Site default tetap memakai DB_PATH sehingga deployment single-site tidak berubah.
+
+- Worker: shard_path(site) untuk DatabaseManager per site
+- API: ShardPool membuka shard secara lazy dengan LRU koneksi per thread,
+  fan_out() menjalankan query yang sama di semua shard secara paralel
+"""
+
+import os
+import re
+import glob
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = os.environ.get('DB_PATH', '/app/data/sensor_monitoring.db')
+SHARD_DIR = os.environ.get('SHARD_DIR', '/app/data/sites')
+SPILL_DIR = os.environ.get('SPILL_DIR', '/app/data/spill')
+DEFAULT_SITE = os.environ.get('DEFAULT_SITE', 'arjasari')
+SHARD_POOL_SIZE = int(os.environ.get('SHARD_POOL_SIZE', '16'))
+SHARD_FANOUT_WORKERS = int(os.environ.get('SHARD_FANOUT_WORKERS', '8'))
+
+SITE_NAME_PATTERN = re.compile(r'^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$')
+
+def validate_site(site: Optional[str]) -> str:
+    """Nama site aman untuk dipakai sebagai nama file"""
+    if not site:
+        return DEFAULT_SITE
+    if not SITE_NAME_PATTERN.match(site):
+        raise ValueError(f'Invalid site name: {site}')
+    return site
+
+def site_from_topic(topic: str) -> Optional[str]:
+    """Ambil site dari topic <site>/raspi/..."""
+    parts = topic.split('/')
+    if len(parts) >= 3 and parts[1] == 'raspi':
+        return parts[0]
+    return None
+
+def shard_path(site: Optional[str] = None) -> str:
+    """Path file SQLite untuk site"""
+    site = validate_site(site)
+    if site == DEFAULT_SITE:
+        return DB_PATH
+    return os.path.join(SHARD_DIR, f'{site}.db')
+
+def spill_dir(site: Optional[str] = None) -> str:
+    """Direktori spill queue untuk site"""
+    site = validate_site(site)
+    if site == DEFAULT_SITE:
+        return SPILL_DIR
+    return os.path.join(SPILL_DIR, site)
+
+def list_sites() -> List[str]:
+    """Semua site yang punya shard di disk"""
+    sites = [DEFAULT_SITE] if os.path.exists(DB_PATH) else []
+    for path in sorted(glob.glob(os.path.join(SHARD_DIR, '*.db'))):
+        site = os.path.basename(path)[:-len('.db')]
+        if SITE_NAME_PATTERN.match(site) and site not in sites:
+            sites.append(site)
+    return sites
+
+class PooledConnection(sqlite3.Connection):
+    """Koneksi milik ShardPool: close() dari handler hanya rollback, bukan menutup"""
+
+    _snapshot_held = False
+
+    def close(self):
+        if self.in_transaction and not self._snapshot_held:
+            self.rollback()
+
+    @contextmanager
+    def read_snapshot(self):
+        """
+        Satu read transaction untuk beberapa handler: semua query di dalam blok
+        melihat snapshot WAL yang sama, close() dari handler tidak mengakhirinya.
+        """
+        if self.in_transaction:
+            self.rollback()
+        self.execute('BEGIN')
+        # Snapshot WAL diambil saat read pertama
+        self.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+        self._snapshot_held = True
+        try:
+            yield self
+        finally:
+            self._snapshot_held = False
+            if self.in_transaction:
+                self.rollback()
+
+    def really_close(self):
+        super().close()
+
+class ShardPool:
+    """LRU koneksi SQLite per shard, per thread (koneksi sqlite3 tidak dibagi antar thread)"""
+
+    def __init__(self, max_open: int = SHARD_POOL_SIZE):
+        self.max_open = max_open
+        self._local = threading.local()
+
+    def _lru(self) -> 'OrderedDict[str, PooledConnection]':
+        lru = getattr(self._local, 'lru', None)
+        if lru is None:
+            lru = self._local.lru = OrderedDict()
+        return lru
+
+    def connect(self, site: Optional[str] = None) -> sqlite3.Connection:
+        """Koneksi ke shard site (dibuka lazy, dipakai ulang)"""
+        path = shard_path(site)
+        lru = self._lru()
+
+        conn = lru.pop(path, None)
+        if conn is None:
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Unknown site: {validate_site(site)}')
+            conn = sqlite3.connect(path, factory=PooledConnection)
+            while len(lru) >= self.max_open:
+                _, evicted = lru.popitem(last=False)
+                evicted.really_close()
+
+        lru[path] = conn
+        return conn
+
+    def close_all(self):
+        """Tutup semua koneksi milik thread ini"""
+        lru = self._lru()
+        while lru:
+            _, conn = lru.popitem()
+            conn.really_close()
+
+    def reset(self):
+        """
+        Buang semua state koneksi (dipakai setelah fork). Koneksi warisan parent
+        tidak ditutup di child (close bisa checkpoint/menghapus WAL milik parent),
+        hanya disimpan supaya tidak di-garbage-collect.
+        """
+        self._inherited = getattr(self, '_inherited', []) + list(self._lru().values())
+        self._local = threading.local()
+
+_fanout_executor = None
+_fanout_lock = threading.Lock()
+
+def reset_fanout():
+    """Executor fan-out parent tidak punya thread di proses hasil fork"""
+    global _fanout_executor
+    _fanout_executor = None
+
+def fan_out(pool: ShardPool, query: Callable[[str, sqlite3.Connection], Any],
+            sites: Optional[List[str]] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Jalankan query(site, conn) di semua shard secara paralel.
+    Return {site: {'success': bool, 'data' | 'error': ...}}; satu shard gagal tidak
+    menggagalkan site lain.
+    """
+    global _fanout_executor
+    with _fanout_lock:
+        if _fanout_executor is None:
+            _fanout_executor = ThreadPoolExecutor(
+                max_workers=SHARD_FANOUT_WORKERS, thread_name_prefix='shard-fanout'
+            )
+
+    def run(site):
+        return query(site, pool.connect(site))
+
+    sites = sites if sites is not None else list_sites()
+    futures = {site: _fanout_executor.submit(run, site) for site in sites}
+
+    results = {}
+    for site, future in futures.items():
+        try:
+            results[site] = {'success': True, 'data': future.result()}
+        except Exception as e:
+            logger.error(f"Fan-out query failed for site {site}: {e}")
+            results[site] = {'success': False, 'error': str(e)}
+    return results
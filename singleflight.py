@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Single-flight Request Coalescing
+Request identik yang datang bersamaan menunggu satu komputasi yang sedang
+berjalan dan memakai hasil yang sama; setelah selesai hasilnya masih dibagi
+selama grace TTL singkat. Saat beberapa dashboard dibuka bersamaan, scan
+ROI / build workbook berjalan 1x, bukan Nx.
+
+- Per proses (worker gunicorn masing-masing punya tabel in-flight sendiri)
+- Exception dibagikan ke request yang sedang menunggu, tetapi tidak disimpan
+  selama grace TTL (request berikutnya mencoba lagi)
+- cacheable(result) = False: hasil hanya dibagi ke yang sedang menunggu
+"""
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+SINGLE_FLIGHT_TTL = float(os.environ.get('SINGLE_FLIGHT_TTL', '5'))
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'finished_at', 'cacheable', 'waiters', 'ttl')
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.finished_at = None
+        self.cacheable = False
+        self.waiters = 0
+
+class SingleFlight:
+    """Tabel komputasi in-flight + hasil grace TTL, per key"""
+
+    def __init__(self, ttl: float = SINGLE_FLIGHT_TTL):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def _expire(self, now: float):
+        expired = [key for key, call in self._calls.items()
+                   if call.finished_at is not None and now - call.finished_at >= call.ttl]
+        for key in expired:
+            del self._calls[key]
+
+    def do(self, key: Hashable, fn: Callable[[], Any],
+           cacheable: Optional[Callable[[Any], bool]] = None,
+           ttl: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Jalankan fn() sekali untuk semua pemanggil dengan key yang sama.
+        Return (result, shared); shared=True jika hasil dari komputasi pemanggil lain.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            call = self._calls.get(key)
+            if call is not None and (call.finished_at is None or now - call.finished_at < call.ttl):
+                call.waiters += 1
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call(ttl)
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn()
+            call.cacheable = cacheable(call.result) if cacheable else True
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                call.finished_at = time.monotonic()
+                if (call.error is not None or not call.cacheable or ttl <= 0) and self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def clear(self):
+        """Buang hasil grace TTL (komputasi yang sedang berjalan tetap dibagi)"""
+        with self._lock:
+            for key in [key for key, call in self._calls.items() if call.finished_at is not None]:
+                del self._calls[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = sum(1 for call in self._calls.values() if call.finished_at is None)
+            return {
+                'ttl': self.ttl,
+                'executed': self.executed,
+                'shared': self.shared,
+                'in_flight': in_flight,
+                'cached': len(self._calls) - in_flight
+            }
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Snapshot Service
+Point-in-time copy database per site memakai SQLite online backup API
+(sqlite3.Connection.backup) dalam langkah kecil dengan jeda, sehingga worker
+tetap bisa menulis selama backup berjalan.
+
+- Snapshot disimpan sebagai <SNAPSHOT_DIR>/<site>/snapshot-YYYYmmdd-HHMMSS.db,
+  disimpan N generasi terakhir
+- Snapshot di-set ke journal_mode=DELETE supaya bisa dibuka read-only oleh web API
+  (export Excel dan ROI report dengan ?source=snapshot)
+- Source dalam mode WAL: koneksi source memegang satu read transaction selama
+  backup, sehingga semua langkah membaca snapshot WAL yang sama (tidak restart
+  saat worker commit, dan writer tidak terblok)
+- Mode journal lain: jika backup per langkah restart berulang kali karena source
+  berubah, backup diulang dalam satu langkah
+
+Usage:
+    python snapshots.py                 # service: snapshot semua site tiap SNAPSHOT_INTERVAL
+    python snapshots.py --once          # satu generasi untuk semua site lalu keluar
+    python snapshots.py --output FILE   # satu copy konsisten ke FILE (make backup)
+"""
+
+import os
+import sys
+import glob
+import time
+import logging
+import sqlite3
+import argparse
+from datetime import datetime
+from typing import Optional, List
+
+from shards import shard_path, list_sites, validate_site
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_DIR = os.environ.get('SNAPSHOT_DIR', '/app/data/snapshots')
+SNAPSHOT_GENERATIONS = int(os.environ.get('SNAPSHOT_GENERATIONS', '3'))
+SNAPSHOT_INTERVAL = int(os.environ.get('SNAPSHOT_INTERVAL', '3600'))
+SNAPSHOT_PAGES_PER_STEP = int(os.environ.get('SNAPSHOT_PAGES_PER_STEP', '256'))
+SNAPSHOT_STEP_SLEEP = float(os.environ.get('SNAPSHOT_STEP_SLEEP', '0.05'))
+SNAPSHOT_MAX_RESTARTS = int(os.environ.get('SNAPSHOT_MAX_RESTARTS', '5'))
+
+SNAPSHOT_PREFIX = 'snapshot-'
+SNAPSHOT_SUFFIX = '.db'
+
+class BackupRestarted(Exception):
+    """Source berubah terlalu sering selama backup bertahap"""
+
+def snapshot_dir(site: Optional[str] = None) -> str:
+    """Direktori snapshot untuk site"""
+    return os.path.join(SNAPSHOT_DIR, validate_site(site))
+
+def list_snapshots(site: Optional[str] = None) -> List[str]:
+    """Snapshot yang sudah lengkap, terlama lebih dulu"""
+    pattern = os.path.join(snapshot_dir(site), f'{SNAPSHOT_PREFIX}*{SNAPSHOT_SUFFIX}')
+    return sorted(glob.glob(pattern))
+
+def latest_snapshot(site: Optional[str] = None) -> Optional[str]:
+    """Path snapshot terbaru (None jika belum ada)"""
+    snapshots = list_snapshots(site)
+    return snapshots[-1] if snapshots else None
+
+def backup_database(source_path: str, target_path: str,
+                    pages: int = SNAPSHOT_PAGES_PER_STEP,
+                    step_sleep: float = SNAPSHOT_STEP_SLEEP,
+                    max_restarts: int = SNAPSHOT_MAX_RESTARTS) -> float:
+    """
+    Online backup source -> target (ditulis ke .tmp lalu rename atomic).
+    Return durasi dalam detik.
+    """
+    started = time.time()
+    tmp_path = target_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    state = {'remaining': None, 'restarts': 0}
+
+    def progress(status, remaining, total):
+        # remaining naik lagi berarti SQLite me-restart backup karena source berubah
+        if state['remaining'] is not None and remaining > state['remaining']:
+            state['restarts'] += 1
+            if state['restarts'] > max_restarts:
+                raise BackupRestarted(f'backup restarted {state["restarts"]} times')
+        state['remaining'] = remaining
+        if step_sleep and remaining:
+            time.sleep(step_sleep)
+
+    source = sqlite3.connect(source_path)
+    try:
+        if source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal':
+            # Pin snapshot WAL: commit dari koneksi lain tidak me-restart backup
+            source.execute('BEGIN')
+            source.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+
+        target = sqlite3.connect(tmp_path)
+        try:
+            try:
+                source.backup(target, pages=pages, progress=progress)
+            except BackupRestarted as e:
+                logger.warning(f"Paged backup of {source_path} {e}, retrying in a single step")
+                source.backup(target, pages=-1)
+
+            # Snapshot dibaca read-only, tanpa file -wal/-shm
+            target.execute('PRAGMA journal_mode=DELETE')
+        finally:
+            target.close()
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    finally:
+        source.close()
+
+    os.replace(tmp_path, target_path)
+    return time.time() - started
+
+def create_snapshot(site: Optional[str] = None,
+                    generations: int = SNAPSHOT_GENERATIONS) -> str:
+    """Buat satu generasi snapshot untuk site dan hapus generasi lama"""
+    directory = snapshot_dir(site)
+    os.makedirs(directory, exist_ok=True)
+
+    name = f"{SNAPSHOT_PREFIX}{datetime.now().strftime('%Y%m%d-%H%M%S')}{SNAPSHOT_SUFFIX}"
+    target_path = os.path.join(directory, name)
+    elapsed = backup_database(shard_path(site), target_path)
+    size_mb = os.path.getsize(target_path) / (1024 * 1024)
+    logger.info(f"Snapshot {target_path} created in {elapsed:.1f}s ({size_mb:.1f} MB)")
+
+    for stale_path in list_snapshots(site)[:-generations]:
+        os.remove(stale_path)
+        logger.info(f"Removed old snapshot {stale_path}")
+
+    return target_path
+
+def open_snapshot(path: str) -> sqlite3.Connection:
+    """Koneksi read-only ke snapshot"""
+    return sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+
+def snapshot_all_sites():
+    for site in list_sites():
+        try:
+            create_snapshot(site)
+        except Exception as e:
+            logger.error(f"Snapshot failed for site {site}: {e}")
+
+def run_service(interval: int = SNAPSHOT_INTERVAL):
+    """Loop snapshot terjadwal"""
+    logger.info(f"Snapshot service started (every {interval}s, keep {SNAPSHOT_GENERATIONS} generations)")
+    while True:
+        started = time.time()
+        snapshot_all_sites()
+        time.sleep(max(interval - (time.time() - started), 1))
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s - %(message)s'
+    )
+    
+    parser = argparse.ArgumentParser(description='SQLite online snapshot service')
+    parser.add_argument('--once', action='store_true', help='Snapshot semua site sekali lalu keluar')
+    parser.add_argument('--output', help='Tulis satu copy konsisten ke file ini')
+    parser.add_argument('--site', help='Site untuk --output (default site jika kosong)')
+    args = parser.parse_args()
+
+    try:
+        if args.output:
+            elapsed = backup_database(shard_path(args.site), args.output)
+            print(f"✅ Backup written to {args.output} in {elapsed:.1f}s")
+        elif args.once:
+            snapshot_all_sites()
+        else:
+            run_service()
+    except KeyboardInterrupt:
+        sys.exit(0)
@@ -0,0 +1,603 @@
+#!/usr/bin/env python3
+"""
+Soak Test (Memory Growth / Latency Drift)
+Worker dan API berjalan berbulan-bulan tanpa restart; soak test menjalankan
+keduanya dalam satu proses untuk waktu lama dengan waktu dipercepat:
+
+- Traffic MQTT simulasi (PZEM-016/017, DHT22, system dengan profil harian)
+  masuk lewat MQTTWorker._on_message -> AckWindow -> SiteRouter / IngestPool ->
+  BatchWriter, persis seperti dari paho (tanpa broker; ack dihitung client palsu)
+- Jam simulasi berjalan --speed kali lebih cepat dan berakhir di "sekarang";
+  compaction block store, tiering cold storage dan stats worker dijalankan
+  dengan now_ms jam simulasi
+- Request API paralel (--api-clients thread) ke web_api.app lewat test client
+- Setiap --sample-interval: tracemalloc (traced), RSS, memori native (RSS -
+  traced - overhead tracemalloc), ukuran database (dan byte per pesan
+  tersimpan), p50/p99 latency API sejak sample sebelumnya
+
+Setelah warmup (default sampai jam simulasi melewati 7 hari, window query {week}
+terisi), trend setiap metric dihitung dengan regresi linear; test gagal
+(exit 1) jika pertumbuhan sepanjang run melebihi threshold dan median kuartal
+terakhir juga melebihi median kuartal pertama dengan threshold yang sama.
+Laporan berisi tabel sample, verdict trend dan allocation site teratas
+(snapshot akhir dibanding snapshot setelah warmup). Snapshot akhir diambil
+setelah producer, client API dan writer berhenti, sehingga request yang masih
+berjalan dan pesan di window in-flight tidak terbaca sebagai pertumbuhan.
+
+RSS naik sementara traced datar berarti memori native (page cache SQLite per
+koneksi, arena malloc per thread, memory pool pyarrow) yang naik bertahap ke
+high-water mark; run yang lebih pendek dari warmup (window {week} belum
+penuh) juga wajar naik. Laporan memberi catatan jika warmup tidak tercapai.
+
+Usage:
+    python soak_test.py --duration 3600 --speed 720 --api-clients 4
+    python soak_test.py --duration 120 --json soak_report.json       # smoke
+"""
+
+import os
+import gc
+import sys
+import json
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import tracemalloc
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Iterator, Tuple
+
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    PSUTIL_AVAILABLE = False
+
+logger = logging.getLogger('soak_test')
+
+MS_PER_SECOND = 1000
+MS_PER_DAY = 86400 * MS_PER_SECOND
+
+# Request API per putaran client: (method, path, headers, body); {date} = hari
+# simulasi, {week} = 6 hari sebelumnya, {month} = 29 hari sebelumnya
+DEFAULT_REQUESTS = [
+    ('GET', '/api/data/pzem016?limit=100', None, None),
+    ('GET', '/api/data/pzem017?max_points=500&start_date={week}&end_date={date}', None, None),
+    ('GET', '/api/data/dht22?start_date={date}&end_date={date}',
+     {'Accept': 'application/vnd.apache.arrow.stream'}, None),
+    ('GET', '/api/aggregate?sensor=pzem016&metric=power_w&bucket=1h&agg=avg,max&start={week}&end={date}', None, None),
+    ('GET', '/api/heatmap/pzem017?metric=energy_kwh&agg=delta&start_date={month}&end_date={date}', None, None),
+    ('GET', '/api/roi/summary', None, None),
+    ('GET', '/api/dashboard/summary', None, None),
+    ('GET', '/api/anomalies?limit=50', None, None),
+    ('GET', '/api/health/devices', None, None),
+    ('GET', '/api/ingest/status', None, None),
+    ('POST', '/api/batch', None, {'panels': [
+        {'id': 'summary', 'path': '/api/dashboard/summary'},
+        {'id': 'power', 'path': '/api/aggregate',
+         'params': {'sensor': 'pzem017', 'metric': 'power_w', 'bucket': '1h', 'agg': 'avg'}},
+    ]}),
+]
+
+# Hari simulasi sebelum trend dihitung: window {week} (7 hari) sudah penuh
+WARMUP_SIM_DAYS = 7
+
+# Metric yang di-gate: (key sample, label, argumen threshold)
+CHECKED_METRICS = [
+    ('traced_mb', 'tracemalloc traced', 'threshold'),
+    ('rss_mb', 'RSS', 'threshold'),
+    ('db_bytes_per_message', 'DB bytes / stored message', 'db_threshold'),
+    ('p99_ms', 'API p99 latency', 'latency_threshold'),
+]
+
+# Frame yang tidak menarik di laporan allocation site
+SNAPSHOT_FILTERS = [
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+    tracemalloc.Filter(False, '*/linecache.py'),
+    # Latency yang dicatat harness sendiri
+    tracemalloc.Filter(False, os.path.abspath(__file__)),
+]
+
+def _percentile(sorted_values: List[float], percentile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * percentile / 100), len(sorted_values) - 1)
+    return sorted_values[index]
+
+def rss_bytes() -> int:
+    if PSUTIL_AVAILABLE:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def dir_bytes(path: str, suffixes: Tuple[str, ...]) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            if name.endswith(suffixes):
+                try:
+                    total += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return total
+
+# ---------- Traffic ----------
+
+class SoakMessage:
+    """Pengganti paho MQTTMessage untuk MQTTWorker._on_message"""
+
+    __slots__ = ('topic', 'payload', 'qos', 'mid')
+
+    def __init__(self, topic: str, payload: bytes, qos: int, mid: int):
+        self.topic = topic
+        self.payload = payload
+        self.qos = qos
+        self.mid = mid
+
+class SoakClient:
+    """Pengganti client paho untuk AckWindow: hanya menghitung ack"""
+
+    def __init__(self):
+        self.acked = 0
+        self._lock = threading.Lock()
+
+    def ack(self, mid: int, qos: int):
+        with self._lock:
+            self.acked += 1
+
+def _split_32bit(value: int) -> List[int]:
+    """Register (low, high) seperti dibaca dari PZEM"""
+    return [value & 0xFFFF, value >> 16]
+
+def traffic(site: str, start_ms: int, interval_ms: int, seed: int = 1) -> Iterator[Tuple[int, str, str]]:
+    """
+    (ts_ms, topic, payload) urut waktu tanpa akhir: panel surya (PZEM-017) mengikuti
+    matahari (0 W di malam hari -> run deadband), beban (PZEM-016) dengan puncak
+    malam, DHT22 dan system resource; sesekali pembacaan gagal.
+    """
+    rng = random.Random(seed)
+    solar_wh = load_wh = 0.0
+    ts_ms = start_ms
+    while True:
+        moment = datetime.utcfromtimestamp(ts_ms / MS_PER_SECOND)
+        timestamp = moment.isoformat()
+        hour = moment.hour + moment.minute / 60
+        hours = interval_ms / 3600000
+
+        sun = max(0.0, math.sin(math.pi * (hour - 6) / 12))
+        solar_w = round(sun * 850 * rng.uniform(0.85, 1.0), 1) if sun else 0.0
+        solar_wh += solar_w * hours
+        dc_volts = 1850 if sun else 1260
+        dc = [dc_volts, int(solar_w * 100 / (dc_volts / 100)) if sun else 0,
+              *_split_32bit(int(solar_w * 10)), *_split_32bit(int(solar_wh)), 0, 0]
+
+        load_w = 250 + 400 * max(0.0, math.sin(math.pi * (hour - 16) / 8)) + rng.gauss(0, 20)
+        load_w = max(load_w, 50)
+        load_wh += load_w * hours
+        current_ma = int(load_w / 220 * 1000)
+        ac = [2200 + rng.randint(-20, 20), *_split_32bit(current_ma), *_split_32bit(int(load_w * 10)),
+              *_split_32bit(int(load_wh)), 500, 95, 0]
+
+        for device_type, registers, sensor in (('PZEM-016_AC', ac, 'pzem016_ac'), ('PZEM-017_DC', dc, 'pzem017_dc')):
+            failed = rng.random() < 0.01
+            yield ts_ms, f'{site}/raspi/sensor/{sensor}', json.dumps({
+                'timestamp': timestamp,
+                'device_type': device_type,
+                'device_path': '/dev/ttyUSB0',
+                'slave_id': 1 if device_type == 'PZEM-016_AC' else 2,
+                'raw_registers': [] if failed else registers,
+                'register_count': 0 if failed else len(registers),
+                'status': 'error' if failed else 'success',
+                'error_message': 'No response from slave' if failed else None
+            })
+
+        yield ts_ms, f'{site}/raspi/sensor/dht22', json.dumps({
+            'timestamp': timestamp,
+            'temperature': round(26 + 4 * math.sin(math.pi * (hour - 9) / 12) + rng.gauss(0, 0.2), 1),
+            'humidity': round(65 - 10 * sun + rng.gauss(0, 1), 1),
+            'gpio_pin': 4,
+            'library': 'adafruit_dht',
+            'status': 'success',
+            'error_message': None
+        })
+        yield ts_ms, f'{site}/raspi/resource/system', json.dumps({
+            'timestamp': timestamp,
+            'ram_usage_percent': round(40 + rng.random() * 5, 1),
+            'storage_usage_percent': 52.0,
+            'cpu_usage_percent': round(10 + rng.random() * 20, 1),
+            'cpu_temperature': round(48 + 6 * sun + rng.gauss(0, 0.5), 1),
+            'storage_total_gb': 29.0,
+            'storage_used_gb': 15.1,
+            'storage_free_gb': 13.9,
+            'status': 'success',
+            'error_message': None
+        })
+        ts_ms += interval_ms
+
+# ---------- Trend ----------
+
+def trend(times: List[float], values: List[float]) -> Dict[str, Any]:
+    """
+    Regresi linear values terhadap waktu: growth = kenaikan garis fit sepanjang
+    run relatif terhadap nilai fit di awal; quartile_growth = median kuartal
+    terakhir vs kuartal pertama.
+    """
+    count = len(values)
+    if count < 4:
+        return {'samples': count, 'growth': None, 'quartile_growth': None}
+    mean_t, mean_v = sum(times) / count, sum(values) / count
+    variance = sum((t - mean_t) ** 2 for t in times)
+    slope = sum((t - mean_t) * (v - mean_v) for t, v in zip(times, values)) / variance if variance else 0.0
+    start_fit = mean_v + slope * (times[0] - mean_t)
+    end_fit = mean_v + slope * (times[-1] - mean_t)
+
+    quarter = max(count // 4, 1)
+    first = sorted(values[:quarter])[quarter // 2]
+    last = sorted(values[-quarter:])[quarter // 2]
+    return {
+        'samples': count,
+        'start': round(start_fit, 4),
+        'end': round(end_fit, 4),
+        'slope_per_hour': round(slope * 3600, 4),
+        'growth': round((end_fit - start_fit) / abs(start_fit), 4) if start_fit else None,
+        'quartile_growth': round((last - first) / abs(first), 4) if first else None,
+    }
+
+def allocation_sites(baseline, final, top: int, key_type: str = 'lineno') -> Dict[str, List[Dict[str, Any]]]:
+    """Allocation site dengan pertumbuhan terbesar sejak baseline, dan terbesar di snapshot akhir"""
+    baseline = baseline.filter_traces(SNAPSHOT_FILTERS)
+    final = final.filter_traces(SNAPSHOT_FILTERS)
+
+    def site(stat):
+        frames = stat.traceback.format(limit=4)
+        return ' <- '.join(line.strip() for line in frames if line.strip().startswith('File'))
+
+    growth = [
+        {'site': site(stat), 'size_diff_kb': round(stat.size_diff / 1024, 1), 'size_kb': round(stat.size / 1024, 1),
+         'count_diff': stat.count_diff, 'count': stat.count}
+        for stat in final.compare_to(baseline, key_type)[:top] if stat.size_diff > 0
+    ]
+    largest = [
+        {'site': site(stat), 'size_kb': round(stat.size / 1024, 1), 'count': stat.count}
+        for stat in final.statistics(key_type)[:top]
+    ]
+    return {'growth': growth, 'largest': largest}
+
+# ---------- Soak ----------
+
+class SoakTest:
+    def __init__(self, args):
+        self.args = args
+        self.stop_event = threading.Event()
+        self.latencies: List[float] = []
+        self.endpoint_latencies: Dict[str, List[float]] = {}
+        self.errors = 0
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.sim_ms = 0
+        self.samples: List[Dict[str, Any]] = []
+        self.warmup_complete = False
+
+    # ---------- Setup ----------
+
+    def setup(self):
+        """Environment data dir sementara, lalu import worker & API (membaca env saat import)"""
+        args = self.args
+        for name, path in (('DB_PATH', os.path.join(args.data_dir, 'sensor_monitoring.db')),
+                           ('SHARD_DIR', os.path.join(args.data_dir, 'sites')),
+                           ('SPILL_DIR', os.path.join(args.data_dir, 'spill')),
+                           ('COLD_STORAGE_DIR', os.path.join(args.data_dir, 'cold')),
+                           ('SNAPSHOT_DIR', os.path.join(args.data_dir, 'snapshots'))):
+            os.environ[name] = path
+        os.makedirs(args.data_dir, exist_ok=True)
+
+        import mqtt_worker
+        import web_api
+        from migrations import ensure_schema
+        ensure_schema(os.environ['DB_PATH'])
+
+        self.mqtt_worker = mqtt_worker
+        self.web_api = web_api
+        self.site = mqtt_worker.DEFAULT_SITE if mqtt_worker.MQTT_SITE == '+' else mqtt_worker.MQTT_SITE
+
+        self.client = SoakClient()
+        self.worker = mqtt_worker.MQTTWorker(mqtt_worker.MQTT_BROKER, mqtt_worker.MQTT_PORT)
+        self.worker.window = mqtt_worker.AckWindow(self.client, manual=True)
+        self.worker.router.get_writer(self.site)
+        if self.worker.pool:
+            self.worker.pool.start()
+
+        # Jam simulasi berakhir di sekarang: [now - duration * speed, now]
+        self.now_ms = int(time.time() * MS_PER_SECOND)
+        self.sim_start_ms = self.now_ms - int(args.duration * args.speed * MS_PER_SECOND)
+        self.sim_ms = self.sim_start_ms
+
+    # ---------- Threads ----------
+
+    def produce(self):
+        """Pesan dikirim sesuai jadwal jam simulasi; jika tertinggal dikirim secepatnya (backpressure window)"""
+        qos = self.mqtt_worker.MQTT_QOS
+        mid = 0
+        for ts_ms, topic, payload in traffic(self.site, self.sim_start_ms, self.args.interval * MS_PER_SECOND):
+            delay = self.started + (ts_ms - self.sim_start_ms) / MS_PER_SECOND / self.args.speed - time.perf_counter()
+            if delay > 0 and self.stop_event.wait(delay):
+                return
+            if self.stop_event.is_set():
+                return
+            mid = mid % 65535 + 1
+            self.worker._on_message(self.client, None, SoakMessage(topic, payload.encode('utf-8'), qos, mid))
+            self.messages += 1
+            self.sim_ms = ts_ms
+
+    def maintain(self):
+        """Loop start_monitoring dengan jam simulasi: compaction, tiering/cleanup, stats"""
+        router = self.worker.router
+        compact_ms = self.mqtt_worker.BLOCK_COMPACT_INTERVAL * MS_PER_SECOND
+        cleanup_ms = 3600 * MS_PER_SECOND
+        last_compaction = last_cleanup = self.sim_start_ms
+        while not self.stop_event.wait(0.5):
+            sim_ms = self.sim_ms
+            if compact_ms and sim_ms - last_compaction > compact_ms:
+                router.compact_blocks(now_ms=sim_ms)
+                last_compaction = sim_ms
+            if sim_ms - last_cleanup > cleanup_ms:
+                router.cleanup_old_data(days_to_keep=self.args.retention_days, now_ms=sim_ms)
+                last_cleanup = sim_ms
+            router.write_stats({'mqtt': self.worker.stats()})
+
+    def api_client(self, offset: int):
+        client = self.web_api.app.test_client()
+        position = offset
+        while not self.stop_event.is_set():
+            method, template, headers, body = DEFAULT_REQUESTS[position % len(DEFAULT_REQUESTS)]
+            position += 1
+            day_ms = self.sim_ms - self.sim_ms % MS_PER_DAY
+            path = template.format(
+                date=datetime.utcfromtimestamp(day_ms / MS_PER_SECOND).strftime('%Y-%m-%d'),
+                week=datetime.utcfromtimestamp((day_ms - 6 * MS_PER_DAY) / MS_PER_SECOND).strftime('%Y-%m-%d'),
+                month=datetime.utcfromtimestamp((day_ms - 29 * MS_PER_DAY) / MS_PER_SECOND).strftime('%Y-%m-%d'),
+            )
+
+            started = time.perf_counter()
+            try:
+                response = client.open(path, method=method, headers=headers, json=body)
+                response.get_data()
+                ok = response.status_code == 200
+                response.close()
+            except Exception as e:
+                logger.error(f"Request {method} {path} failed: {e}")
+                ok = False
+            elapsed = time.perf_counter() - started
+
+            endpoint = template.split('?')[0]
+            with self.lock:
+                self.requests += 1
+                if ok:
+                    self.latencies.append(elapsed)
+                    self.endpoint_latencies.setdefault(endpoint, []).append(elapsed)
+                else:
+                    self.errors += 1
+            if self.args.api_pause:
+                self.stop_event.wait(self.args.api_pause)
+
+    # ---------- Sampling ----------
+
+    def sample(self, elapsed: float) -> Dict[str, Any]:
+        with self.lock:
+            latencies, self.latencies = sorted(self.latencies), []
+            errors, self.errors = self.errors, 0
+        gc.collect()
+        traced, _ = tracemalloc.get_traced_memory()
+        rss = rss_bytes()
+        # File database utama; WAL dilaporkan terpisah (ukurannya naik-turun
+        # mengikuti checkpoint, bukan pertumbuhan data)
+        db_bytes = dir_bytes(self.args.data_dir, ('.db',))
+        stored = self.client.acked
+        sample = {
+            'elapsed_s': round(elapsed, 1),
+            'sim_day': round((self.sim_ms - self.sim_start_ms) / MS_PER_DAY, 2),
+            'sim_lag_s': round(max(0.0, elapsed - (self.sim_ms - self.sim_start_ms) / MS_PER_SECOND / self.args.speed), 1),
+            'messages': stored,
+            'traced_mb': round(traced / 1048576, 3),
+            'rss_mb': round(rss / 1048576, 2),
+            'native_mb': round((rss - traced - tracemalloc.get_tracemalloc_memory()) / 1048576, 2),
+            'db_mb': round(db_bytes / 1048576, 3),
+            'wal_mb': round(dir_bytes(self.args.data_dir, ('.db-wal',)) / 1048576, 3),
+            'cold_mb': round(dir_bytes(self.args.data_dir, ('.parquet',)) / 1048576, 3),
+            'db_bytes_per_message': round(db_bytes / stored, 1) if stored else None,
+            'requests': len(latencies) + errors,
+            'errors': errors,
+            'p50_ms': round(_percentile(latencies, 50) * 1000, 2) if latencies else None,
+            'p99_ms': round(_percentile(latencies, 99) * 1000, 2) if latencies else None,
+        }
+        self.samples.append(sample)
+        return sample
+
+    def run(self) -> Dict[str, Any]:
+        args = self.args
+        tracemalloc.start(args.frames)
+        self.setup()
+
+        threads = [threading.Thread(target=self.produce, name='soak-producer', daemon=True),
+                   threading.Thread(target=self.maintain, name='soak-maintenance', daemon=True)]
+        threads += [threading.Thread(target=self.api_client, args=(index,), name=f'soak-api-{index}', daemon=True)
+                    for index in range(args.api_clients)]
+        self.started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+
+        # Default: sampai window query terpanjang ({week}) terisi, supaya latency yang
+        # naik karena window masih bertambah data tidak terbaca sebagai drift. Diukur
+        # dari jam simulasi (producer bisa tertinggal dari --speed), maks 50% durasi.
+        warmup_ms = self.sim_start_ms + WARMUP_SIM_DAYS * MS_PER_DAY
+        baseline = None
+        print(f"{'elapsed':>8} {'sim day':>8} {'lag s':>6} {'msgs':>8} {'traced MB':>10} {'RSS MB':>8} {'native':>8} "
+              f"{'DB MB':>8} {'WAL MB':>7} {'B/msg':>7} {'req':>5} {'err':>4} {'p50 ms':>8} {'p99 ms':>8}")
+        try:
+            while True:
+                elapsed = time.perf_counter() - self.started
+                if elapsed >= args.duration:
+                    break
+                time.sleep(min(args.sample_interval, args.duration - elapsed))
+                elapsed = time.perf_counter() - self.started
+                sample = self.sample(elapsed)
+                if args.warmup is not None:
+                    sample['warmup'] = elapsed <= args.warmup
+                else:
+                    sample['warmup'] = (elapsed <= args.duration * 0.5 and
+                                        (elapsed <= args.duration * 0.1 or self.sim_ms < warmup_ms))
+                if baseline is None and not sample['warmup']:
+                    baseline = tracemalloc.take_snapshot()
+                    self.warmup_complete = args.warmup is not None or self.sim_ms >= warmup_ms
+                print(f"{sample['elapsed_s']:>8} {sample['sim_day']:>8} {sample['sim_lag_s']:>6} "
+                      f"{sample['messages']:>8} {sample['traced_mb']:>10} {sample['rss_mb']:>8} {sample['native_mb']:>8} "
+                      f"{sample['db_mb']:>8} {sample['wal_mb']:>7} {sample['db_bytes_per_message'] or '-':>7} {sample['requests']:>5} "
+                      f"{sample['errors']:>4} {sample['p50_ms'] or '-':>8} {sample['p99_ms'] or '-':>8}"
+                      f"{'  (warmup)' if sample['warmup'] else ''}", flush=True)
+        except KeyboardInterrupt:
+            print("Interrupted, reporting samples so far")
+
+        self.stop_event.set()
+        for thread in threads:
+            thread.join(timeout=30)
+        if self.worker.pool:
+            self.worker.pool.stop()
+        self.worker.router.stop()
+        gc.collect()
+        final = tracemalloc.take_snapshot()
+        tracemalloc.stop()
+
+        return self.report(baseline or final, final)
+
+    def report(self, baseline, final) -> Dict[str, Any]:
+        args = self.args
+        measured = [sample for sample in self.samples if not sample.get('warmup')]
+        checks = []
+        for key, label, threshold_arg in CHECKED_METRICS:
+            points = [(sample['elapsed_s'], sample[key]) for sample in measured if sample[key] is not None]
+            result = trend([t for t, _ in points], [v for _, v in points])
+            threshold = getattr(args, threshold_arg)
+            result.update({
+                'metric': key,
+                'label': label,
+                'threshold': threshold,
+                'failed': (result['growth'] is not None and result['quartile_growth'] is not None and
+                           result['growth'] > threshold and result['quartile_growth'] > threshold),
+            })
+            checks.append(result)
+
+        endpoints = {}
+        for endpoint, values in sorted(self.endpoint_latencies.items()):
+            values = sorted(values)
+            endpoints[endpoint] = {
+                'requests': len(values),
+                'p50_ms': round(_percentile(values, 50) * 1000, 2),
+                'p99_ms': round(_percentile(values, 99) * 1000, 2),
+            }
+
+        return {
+            'config': {
+                'duration_s': args.duration,
+                'speed': args.speed,
+                'interval_s': args.interval,
+                'api_clients': args.api_clients,
+                'simulated_days': round(args.duration * args.speed / 86400, 2),
+                'ingest_parsers': self.mqtt_worker.INGEST_PARSERS,
+            },
+            'messages': {'sent': self.messages, 'stored': self.client.acked},
+            'requests': self.requests,
+            'endpoints': endpoints,
+            'samples': self.samples,
+            'checks': checks,
+            'warmup_complete': self.warmup_complete,
+            'allocations': allocation_sites(baseline, final, args.top, 'traceback' if args.frames > 1 else 'lineno'),
+            'passed': not any(check['failed'] for check in checks),
+        }
+
+def print_report(report: Dict[str, Any]):
+    config = report['config']
+    print()
+    print(f"Soak: {config['duration_s']} s real, {config['simulated_days']} simulated days "
+          f"(speed {config['speed']}x, {report['messages']['stored']}/{report['messages']['sent']} messages stored, "
+          f"{report['requests']} API requests)")
+
+    print()
+    print(f"{'endpoint':<28} {'req':>7} {'p50 ms':>9} {'p99 ms':>9}")
+    for endpoint, stats in report['endpoints'].items():
+        print(f"{endpoint:<28} {stats['requests']:>7} {stats['p50_ms']:>9} {stats['p99_ms']:>9}")
+
+    print()
+    print(f"{'trend':<28} {'start':>10} {'end':>10} {'/hour':>10} {'growth':>8} {'q4/q1':>8} {'limit':>6}")
+    for check in report['checks']:
+        growth = f"{check['growth']:+.1%}" if check['growth'] is not None else '-'
+        quartile = f"{check['quartile_growth']:+.1%}" if check['quartile_growth'] is not None else '-'
+        print(f"{check['label']:<28} {check.get('start', '-'):>10} {check.get('end', '-'):>10} "
+              f"{check.get('slope_per_hour', '-'):>10} {growth:>8} {quartile:>8} {check['threshold']:>6.0%}"
+              f"{'  FAIL' if check['failed'] else ''}")
+
+    if not report['warmup_complete']:
+        print(f"Note: trend measured before {WARMUP_SIM_DAYS} simulated days, query windows were still filling "
+              f"(growth partly expected); run longer or with higher --speed")
+
+    print()
+    print("Top allocation growth since warmup (final snapshot after traffic stopped):")
+    for stat in report['allocations']['growth']:
+        print(f"  +{stat['size_diff_kb']:>9} KiB  +{stat['count_diff']:>7} blocks  {stat['site']}")
+    print("Largest allocation sites at end:")
+    for stat in report['allocations']['largest']:
+        print(f"   {stat['size_kb']:>9} KiB   {stat['count']:>7} blocks  {stat['site']}")
+
+    print()
+    print('PASSED' if report['passed'] else 'FAILED: growth trend above threshold')
+
+def main():
+    parser = argparse.ArgumentParser(description='Soak test worker + web API (memory growth / latency drift)')
+    parser.add_argument('--duration', type=float, default=3600, help='Durasi run (detik nyata)')
+    parser.add_argument('--speed', type=float, default=720, help='Kelipatan kecepatan jam simulasi')
+    parser.add_argument('--interval', type=int, default=30, help='Interval pembacaan per device (detik simulasi)')
+    parser.add_argument('--api-clients', type=int, default=4)
+    parser.add_argument('--api-pause', type=float, default=0.05, help='Jeda antar request per client (detik)')
+    parser.add_argument('--sample-interval', type=float, default=30)
+    parser.add_argument('--warmup', type=float, default=None, help='Detik awal tanpa trend (default sampai 7 hari simulasi, min 10%%, maks 50%% durasi)')
+    parser.add_argument('--threshold', type=float, default=0.2, help='Batas pertumbuhan memori (tracemalloc, RSS)')
+    parser.add_argument('--db-threshold', type=float, default=0.2, help='Batas pertumbuhan byte DB per pesan')
+    parser.add_argument('--latency-threshold', type=float, default=0.5, help='Batas pertumbuhan p99 latency')
+    parser.add_argument('--retention-days', type=int, default=30, help='days_to_keep cleanup (tiering cold storage)')
+    parser.add_argument('--frames', type=int, default=1, help='Kedalaman traceback tracemalloc')
+    parser.add_argument('--top', type=int, default=15, help='Jumlah allocation site di laporan')
+    parser.add_argument('--data-dir', help='Direktori data (default direktori sementara, dihapus setelah run)')
+    parser.add_argument('--json', help='Tulis laporan lengkap ke file JSON')
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=getattr(logging, args.log_level.upper()),
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', force=True)
+    temporary = args.data_dir is None
+    if temporary:
+        args.data_dir = tempfile.mkdtemp(prefix='soak-')
+
+    try:
+        report = SoakTest(args).run()
+    finally:
+        if temporary:
+            shutil.rmtree(args.data_dir, ignore_errors=True)
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+    sys.exit(0 if report['passed'] else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Disk-backed Spill Queue
+Append-only segment log untuk pesan MQTT yang belum bisa ditulis ke database
+(misalnya saat SQLite terkunci oleh export besar atau cleanup_old_data).
+
+- Record ditulis sebagai JSON lines ke segment-<seq>.log
+- fsync di-batch (per N record atau per interval detik)
+- Drain membaca segment tertua per chunk; offset yang sudah commit disimpan di
+  file .ack sehingga drain bisa dilanjutkan setelah restart (at-least-once)
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from typing import Dict, Any, List, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+SPILL_DIR = os.environ.get('SPILL_DIR', '/app/data/spill')
+SPILL_SEGMENT_BYTES = int(os.environ.get('SPILL_SEGMENT_BYTES', str(8 * 1024 * 1024)))
+SPILL_FSYNC_BATCH = int(os.environ.get('SPILL_FSYNC_BATCH', '100'))
+SPILL_FSYNC_INTERVAL = float(os.environ.get('SPILL_FSYNC_INTERVAL', '1.0'))
+
+SEGMENT_PREFIX = 'segment-'
+SEGMENT_SUFFIX = '.log'
+ACK_SUFFIX = '.ack'
+STATS_FILE = 'spill_stats.json'
+
+class SpillQueue:
+    """Append-only segment log dengan fsync batching dan drain per chunk"""
+
+    def __init__(self, directory: str = SPILL_DIR,
+                 segment_bytes: int = SPILL_SEGMENT_BYTES,
+                 fsync_batch: int = SPILL_FSYNC_BATCH,
+                 fsync_interval: float = SPILL_FSYNC_INTERVAL):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_batch = fsync_batch
+        self.fsync_interval = fsync_interval
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._drain_lock = threading.Lock()
+        self._active = None
+        self._active_path = None
+        self._unsynced = 0
+        self._last_sync = time.time()
+
+        self.appended_total = 0
+        self.drained_total = 0
+        self.drain_rate = 0.0
+        self.last_drain_at = None
+
+        self._segments = self._list_segments()
+        self._next_seq = self._segment_seq(self._segments[-1]) + 1 if self._segments else 1
+        self.depth = sum(self._count_pending(path) for path in self._segments)
+
+        if self.depth:
+            logger.warning(f"Spill queue has {self.depth} pending records from previous run")
+
+    # ---------- Segment helpers ----------
+
+    def _list_segments(self) -> List[str]:
+        names = [
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        ]
+        return [os.path.join(self.directory, name) for name in sorted(names)]
+
+    @staticmethod
+    def _segment_seq(path: str) -> int:
+        name = os.path.basename(path)
+        return int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+
+    @staticmethod
+    def _read_ack(path: str) -> int:
+        try:
+            with open(path + ACK_SUFFIX, 'r') as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    @staticmethod
+    def _write_ack(path: str, offset: int):
+        tmp_path = path + ACK_SUFFIX + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(str(offset))
+        os.replace(tmp_path, path + ACK_SUFFIX)
+
+    def _count_pending(self, path: str) -> int:
+        with open(path, 'rb') as f:
+            f.seek(self._read_ack(path))
+            return sum(1 for line in f if line.endswith(b'\n'))
+
+    def _sync(self):
+        if self._active and self._unsynced:
+            self._active.flush()
+            os.fsync(self._active.fileno())
+            self._unsynced = 0
+        self._last_sync = time.time()
+
+    def _rotate(self):
+        if self._active:
+            self._sync()
+            self._active.close()
+            self._active = None
+            self._active_path = None
+
+    # ---------- Public API ----------
+
+    def append(self, record: Dict[str, Any]):
+        """Tambahkan satu record ke segment aktif"""
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode('utf-8')
+
+        with self._lock:
+            if self._active is None:
+                self._active_path = os.path.join(
+                    self.directory, f'{SEGMENT_PREFIX}{self._next_seq:012d}{SEGMENT_SUFFIX}'
+                )
+                self._next_seq += 1
+                self._active = open(self._active_path, 'ab')
+                self._segments.append(self._active_path)
+
+            self._active.write(line)
+            self.depth += 1
+            self.appended_total += 1
+            self._unsynced += 1
+
+            if (self._unsynced >= self.fsync_batch or
+                    time.time() - self._last_sync >= self.fsync_interval):
+                self._sync()
+
+            if self._active.tell() >= self.segment_bytes:
+                self._rotate()
+
+    def extend(self, records: List[Dict[str, Any]]):
+        """Tambahkan banyak record lalu fsync sekali"""
+        for record in records:
+            self.append(record)
+        self.sync()
+
+    def sync(self):
+        """Paksa fsync segment aktif"""
+        with self._lock:
+            self._sync()
+
+    def drain(self, handler: Callable[[List[Dict[str, Any]]], None],
+              batch_size: int = 1000, max_records: Optional[int] = None) -> int:
+        """
+        Drain record dari segment tertua. handler(batch) harus commit ke database
+        dan raise exception jika gagal; offset hanya maju setelah handler sukses.
+        """
+        drained = 0
+        started = time.time()
+
+        with self._drain_lock:
+            while max_records is None or drained < max_records:
+                with self._lock:
+                    if not self._segments:
+                        break
+                    path = self._segments[0]
+                    if path == self._active_path:
+                        self._rotate()
+
+                offset = self._read_ack(path)
+                exhausted = False
+                with open(path, 'rb') as f:
+                    f.seek(offset)
+                    while not exhausted and (max_records is None or drained < max_records):
+                        batch = []
+                        consumed = 0
+                        batch_end = offset
+                        exhausted = True
+                        for line in f:
+                            if not line.endswith(b'\n'):
+                                # Record terpotong (crash saat write), abaikan
+                                logger.warning(f"Skipping truncated spill record in {path}")
+                                break
+                            batch_end += len(line)
+                            consumed += 1
+                            try:
+                                batch.append(json.loads(line))
+                            except json.JSONDecodeError:
+                                logger.error(f"Skipping corrupt spill record in {path}")
+                            if consumed >= batch_size:
+                                exhausted = False
+                                break
+
+                        if batch:
+                            handler(batch)
+                        if consumed:
+                            self._write_ack(path, batch_end)
+                            offset = batch_end
+                            drained += len(batch)
+                            with self._lock:
+                                self.depth -= consumed
+                                self.drained_total += len(batch)
+
+                if not exhausted:
+                    # Berhenti karena max_records, segment dilanjutkan di drain berikutnya
+                    break
+
+                with self._lock:
+                    self._segments.remove(path)
+                for stale_path in (path, path + ACK_SUFFIX):
+                    if os.path.exists(stale_path):
+                        os.remove(stale_path)
+
+        if drained:
+            elapsed = max(time.time() - started, 1e-6)
+            self.drain_rate = drained / elapsed
+            self.last_drain_at = time.time()
+            logger.info(f"Drained {drained} spilled records ({self.drain_rate:.0f} rec/s), {self.depth} remaining")
+
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depth dan drain rate untuk monitoring"""
+        with self._lock:
+            segment_bytes = sum(
+                os.path.getsize(path) for path in self._segments if os.path.exists(path)
+            )
+            return {
+                'depth': self.depth,
+                'segments': len(self._segments),
+                'bytes': segment_bytes,
+                'appended_total': self.appended_total,
+                'drained_total': self.drained_total,
+                'drain_rate_per_s': round(self.drain_rate, 1),
+                'last_drain_at': self.last_drain_at,
+                'updated_at': time.time()
+            }
+
+    def write_stats(self, extra: Optional[Dict[str, Any]] = None):
+        """Tulis stats ke spill_stats.json (dibaca oleh web API)"""
+        stats = self.stats()
+        if extra:
+            stats.update(extra)
+        path = os.path.join(self.directory, STATS_FILE)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp_path, path)
+
+    def close(self):
+        with self._lock:
+            self._rotate()
+
+def read_stats(directory: str = SPILL_DIR) -> Optional[Dict[str, Any]]:
+    """Baca stats terakhir yang ditulis worker"""
+    try:
+        with open(os.path.join(directory, STATS_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
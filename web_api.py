@@ -1,80 +1,329 @@
-# Backend API Additions for web_api.py
-# Add these endpoints to your existing web_api.py file
+#!/usr/bin/env python3
+"""
+Web API (Flask)
+REST API untuk dashboard: data historis per sensor, agregasi, export Excel, ROI,
+health device dan summary multi-site. Database per site (shard) dibaca lewat
+ShardPool; di production dijalankan dengan gunicorn (lihat gunicorn.conf.py):
+
+    gunicorn --config gunicorn.conf.py web_api:app
+"""
 
 import io
+import os
+import json
+import time
+import logging
+import sqlite3
+import heapq
+import bisect
+import functools
+import itertools
+import queue
+import threading
+import contextlib
 import xlsxwriter
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, jsonify, send_file
+from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 
-# ============ NEW DATABASE SCHEMA FOR ROI ============
+from pzem_parser import EnhancedPZEMAnalyzer
+from spill_queue import read_stats as read_spill_stats
+from epoch_time import to_epoch_ms, from_epoch_ms, day_start_ms, date_range_ms, site_now, site_now_ms, MS_PER_DAY
+from migrations import ensure_schema
+from shards import ShardPool, PooledConnection, fan_out, reset_fanout, list_sites, spill_dir, DB_PATH
+from cold_storage import ColdStorage, cold_range
+from aggregation import aggregate, parse_bucket, parse_aggs, parse_range, metric_expression, DEFAULT_METRICS
+from cold_storage import COLD_SENSORS
+from downsampling import downsample, lttb_indices, NUMPY_AVAILABLE
+from snapshots import latest_snapshot, open_snapshot
+from deadband import expand_rows, RUN_COLUMNS, RUN_WEIGHT_SQL
+from block_store import BlockStore, BLOCK_SERIES, aggregate_blocks
+from singleflight import SingleFlight
+from dashboard_summary import read_summary, summary_value, covered_from, daily_sums as summary_daily_sums
+from row_filters import RowFilter
+from anomaly_detector import ANOMALY_KINDS, read_baselines
+from device_health import DEVICES, device_report
+from heatmap import heatmap, MonthCache
+from wire_formats import (negotiate, encode_stream, MIME_TYPES, source_columns, sensor_schema,
+                          row_chunks, sensor_batches, expanded_batch, block_batch, aggregate_schema,
+                          aggregate_batch)
 
-def init_roi_tables():
-    """Initialize ROI-related database tables"""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    
-    try:
-        # ROI Settings table
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS roi_settings (
-                id INTEGER PRIMARY KEY,
-                pv_investment_cost REAL DEFAULT 20500000,
-                current_tariff_per_kwh REAL DEFAULT 1352,
-                system_start_date TEXT,
-                updated_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tariff history for accurate historical calculations
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tariff_history (
-                id INTEGER PRIMARY KEY,
-                tariff_per_kwh REAL NOT NULL,
-                effective_date TEXT NOT NULL,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Insert default values if not exists
-        cursor.execute('SELECT COUNT(*) FROM roi_settings')
-        if cursor.fetchone()[0] == 0:
-            # Auto-detect system start date from first successful PZEM-016 reading
-            cursor.execute('''
-                SELECT MIN(timestamp) FROM pzem_data 
-                WHERE device_type = 'PZEM-016_AC' 
-                AND status = 'success'
-                AND parsed_data IS NOT NULL
-            ''')
-            system_start = cursor.fetchone()[0] or datetime.now().isoformat()
+if NUMPY_AVAILABLE:
+    import numpy as np
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+# Dashboard di-serve dari origin lain
+CORS(app)
+
+# ============ DATABASE CONNECTIONS (MULTI-SITE) ============
+
+# Shard dibuka lazy dan disimpan di LRU koneksi per thread
+shard_pool = ShardPool()
+
+def connect_db():
+    """Koneksi ke shard site dari query param ?site= (default site jika kosong)"""
+    return shard_pool.connect(request.args.get('site'))
+
+def cold_storage():
+    """Cold tier (Parquet) untuk site dari query param ?site="""
+    return ColdStorage(request.args.get('site'))
+
+# Sumber data default untuk export berat: 'live' atau 'snapshot'
+EXPORT_SOURCE = os.environ.get('EXPORT_SOURCE', 'live')
+
+def export_db():
+    """
+    Koneksi untuk export: snapshot terbaru jika ?source=snapshot (atau EXPORT_SOURCE),
+    fallback ke database live jika belum ada snapshot. Return (conn, snapshot_path).
+    """
+    if request.args.get('source', EXPORT_SOURCE) == 'snapshot':
+        snapshot = latest_snapshot(request.args.get('site'))
+        if snapshot:
+            return open_snapshot(snapshot), snapshot
+        logger.warning("No snapshot available, exporting from live database")
+    return connect_db(), None
+
+def export_response(output, filename, snapshot):
+    """send_file Excel, dengan header X-Data-Snapshot jika dibaca dari snapshot"""
+    response = send_file(
+        output,
+        mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+        as_attachment=True,
+        download_name=filename
+    )
+    if snapshot:
+        response.headers['X-Data-Snapshot'] = os.path.basename(snapshot)
+    return response
+
+# ============ SINGLE-FLIGHT (REQUEST COALESCING) ============
+
+_single_flight = SingleFlight()
+
+def single_flight(ttl=None):
+    """
+    Decorator untuk handler GET yang mahal: request identik (path + query string)
+    yang datang bersamaan berbagi satu komputasi. Response di-materialize menjadi
+    (body, status, headers) dan setiap request mendapat Response baru; response
+    5xx tidak dibagi setelah selesai (grace TTL).
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(*args, **kwargs):
+            key = (request.path, tuple(sorted(request.args.items(multi=True))),
+                   negotiate(None, request.headers.get('Accept')))
             
-            cursor.execute('''
-                INSERT INTO roi_settings (system_start_date) VALUES (?)
-            ''', (system_start,))
+            def compute():
+                response = app.make_response(handler(*args, **kwargs))
+                response.direct_passthrough = False
+                return response.get_data(), response.status_code, list(response.headers.items())
             
-            # Insert initial tariff
-            cursor.execute('''
-                INSERT INTO tariff_history (tariff_per_kwh, effective_date) 
-                VALUES (1352, ?)
-            ''', (system_start,))
-        
-        conn.commit()
-        logger.info("ROI tables initialized successfully")
-        
-    except Exception as e:
-        logger.error(f"Error initializing ROI tables: {e}")
+            (body, status, headers), shared = _single_flight.do(
+                key, compute, cacheable=lambda result: result[1] < 500, ttl=ttl
+            )
+            response = app.response_class(body, status=status, headers=headers)
+            response.headers['X-Single-Flight'] = 'shared' if shared else 'leader'
+            return response
+        return wrapper
+    return decorator
+
+# Backend time-series: 'rows' (satu row per pembacaan) atau 'blocks' (series_blocks)
+TIMESERIES_BACKEND = os.environ.get('TIMESERIES_BACKEND', 'rows')
+TIMESERIES_BACKENDS = ('rows', 'blocks')
+
+def timeseries_backend(sensor_type):
+    """
+    Backend dari ?backend= (default TIMESERIES_BACKEND). Sensor yang tidak ada di
+    block store memakai rows, kecuali jika blocks diminta eksplisit (ValueError).
+    """
+    backend = request.args.get('backend')
+    if backend is None:
+        supported = NUMPY_AVAILABLE and sensor_type in BLOCK_SERIES
+        return 'blocks' if TIMESERIES_BACKEND == 'blocks' and supported else 'rows'
+    if backend not in TIMESERIES_BACKENDS:
+        raise ValueError(f'Invalid backend: {backend}')
+    if backend == 'blocks' and sensor_type not in BLOCK_SERIES:
+        raise ValueError(f'Sensor not available in block store: {sensor_type}')
+    if backend == 'blocks' and not NUMPY_AVAILABLE:
+        raise ValueError('Block store requires numpy')
+    return backend
+
+# ============ WIRE FORMATS (ARROW / MESSAGEPACK) ============
+
+def request_format():
+    """Format response dari ?format= atau header Accept (ValueError jika tidak valid)"""
+    return negotiate(request.args.get('format'), request.headers.get('Accept'))
+
+def wire_response(wire_format, schema, batches, meta):
+    """Response Arrow IPC / MessagePack di-stream per record batch"""
+    response = app.response_class(encode_stream(wire_format, schema, batches, meta),
+                                  mimetype=MIME_TYPES[wire_format])
+    response.headers['Vary'] = 'Accept'
+    if meta.get('total_records') is not None:
+        response.headers['X-Total-Records'] = str(meta['total_records'])
+    return response
+
+def _wire_batches(conn, sensor_type, table, where_clause, params, cold_rows, skip, limit):
+    """
+    Record batch /api/data binary: hot dari cursor (fetchmany WIRE_BATCH_ROWS) lalu
+    cold tier, dalam satu read snapshot. Koneksi ditutup saat stream selesai / putus.
+    """
+    names = source_columns(sensor_type)
+    try:
+        with export_snapshot(conn):
+            cursor = conn.execute(f'''
+                SELECT {', '.join(names)} FROM {table} {where_clause}
+                ORDER BY ts_ms DESC
+            ''', params)
+            chunks = row_chunks(cursor, names)
+            if cold_rows is not None:
+                chunks = itertools.chain(chunks, row_chunks(cold_rows, names))
+            yield from sensor_batches(sensor_type, chunks, skip, limit)
     finally:
         conn.close()
 
 # ============ HISTORICAL DATA API ENDPOINTS ============
 
+def _block_rows(conn, sensor_type, columns, start_ms, end_ms, offset, limit,
+                max_points, metric, method):
+    """
+    Backend blocks untuk /api/data: (rows DESC dengan kolom columns, total, downsampling).
+    Kolom yang tidak disimpan di block (raw_registers, received_at, ...) bernilai None.
+    """
+    config = BLOCK_SERIES[sensor_type]
+    series = BlockStore(conn).read(sensor_type, start_ms, end_ms)
+    total_records = len(series['ts_ms'])
+    order = np.arange(total_records - 1, -1, -1)
+    
+    downsampling = None
+    if max_points:
+        if metric not in config['metrics']:
+            raise ValueError(f'Invalid metric for {sensor_type}: {metric}')
+        values = series[metric][order]
+        order = order[~np.isnan(values)]
+        x, y = series['ts_ms'][order], series[metric][order]
+        if method == 'lttb' and max_points >= 3:
+            order = order[lttb_indices(x, y, max_points)]
+        else:
+            order = np.array(list(downsample(zip(x.tolist(), y.tolist(), order.tolist()),
+                                             len(order), max_points, method)), dtype=np.int64)
+        downsampling = {
+            'method': method,
+            'metric': metric,
+            'max_points': max_points,
+            'returned_points': len(order)
+        }
+    else:
+        order = order[offset:offset + limit]
+    
+    rows = []
+    for index in order.tolist():
+        success = bool(series['success'][index])
+        reading = {
+            'timestamp': from_epoch_ms(int(series['ts_ms'][index])),
+            'device_type': config['device_type'],
+            'status': 'success' if success else 'error'
+        }
+        values = {name: None if np.isnan(series[name][index]) else float(series[name][index])
+                  for name in config['metrics']}
+        if config['json_column']:
+            if success:
+                parsed_data = dict(values, status='success')
+                for name in config['flags']:
+                    parsed_data[name] = 'ON' if series[name][index] else 'OFF'
+                reading[config['json_column']] = json.dumps(parsed_data)
+        else:
+            reading.update(values)
+        rows.append(tuple(reading.get(column) for column in columns))
+    return rows, total_records, downsampling
+
+def _wire_block_batch(conn, sensor_type, start_ms, end_ms, offset, limit):
+    """
+    Backend blocks untuk /api/data binary: record batch langsung dari array series
+    (DESC, limit None = semua), return (batch, total). Kolom yang tidak disimpan di block bernilai null.
+    """
+    series = BlockStore(conn).read(sensor_type, start_ms, end_ms)
+    total_records = len(series['ts_ms'])
+    order = np.arange(total_records - 1, -1, -1)[offset:None if limit is None else offset + limit]
+    return block_batch(sensor_type, BLOCK_SERIES[sensor_type], series, order), total_records
+
+def _cold_rows(sensor_type, names, cold, row_filter=None):
+    """
+    Row cold tier (ts_ms DESC) dengan kolom names; filter status/range di-push ke
+    pyarrow, sisanya (alarm, q, metric JSON) lewat predicate Python
+    """
+    if row_filter is None or not row_filter.active:
+        return cold_storage().iter_rows(sensor_type, names, *cold, descending=True)
+    cold_columns = [name for name, _ in COLD_SENSORS[sensor_type]['columns'] + COLD_SENSORS[sensor_type]['metrics']]
+    rows = cold_storage().iter_rows(sensor_type, names, *cold, descending=True,
+                                    filters=row_filter.pushdown(cold_columns))
+    return filter(row_filter.predicate(names), rows)
+
+def _cold_count(sensor_type, columns, cold, row_filter):
+    """Jumlah pembacaan cold tier; dengan filter dihitung dari row yang lolos predicate"""
+    if not row_filter.active:
+        return cold_storage().count(sensor_type, *cold)
+    names = columns + RUN_COLUMNS
+    repeat_index = names.index('repeat_count')
+    return sum(1 + (row[repeat_index] or 0) for row in _cold_rows(sensor_type, names, cold, row_filter))
+
+def _cold_chart_points(sensor_type, columns, metric, cold, row_filter=None):
+    """Point (ts_ms, y, row) dari cold tier; metric di luar schema Parquet diambil dari parsed_data"""
+    cold_columns = [name for name, _ in COLD_SENSORS[sensor_type]['columns'] + COLD_SENSORS[sensor_type]['metrics']]
+    if metric in cold_columns and metric not in columns:
+        rows = _cold_rows(sensor_type, columns + [metric] + RUN_COLUMNS, cold, row_filter)
+        for ts_ms, row in expand_rows(rows):
+            yield ts_ms, row[-1], row[:-1]
+        return
+    
+    parsed_index = columns.index('parsed_data') if 'parsed_data' in columns else None
+    rows = _cold_rows(sensor_type, columns + RUN_COLUMNS, cold, row_filter)
+    for ts_ms, row in expand_rows(rows):
+        if metric in columns:
+            value = row[columns.index(metric)]
+        elif parsed_index is not None and row[parsed_index]:
+            value = json.loads(row[parsed_index]).get(metric)
+        else:
+            value = None
+        yield ts_ms, value, row
+
+def _downsampled_rows(cursor, sensor_type, table, columns, where_clause, params,
+                      cold, total_records, max_points, metric, method, row_filter=None):
+    """Satu pass atas cursor hot lalu cold tier (urut ts_ms DESC), di-downsample streaming"""
+    cursor.execute(f'''
+        SELECT {', '.join(columns)}, {metric_expression(sensor_type, metric)}, {', '.join(RUN_COLUMNS)}
+        FROM {table} {where_clause}
+        ORDER BY ts_ms DESC
+    ''', params)
+    
+    # Run deadband di-expand supaya bucket LTTB sama seperti tanpa deadband
+    points = ((ts_ms, row[-1], row[:-1]) for ts_ms, row in expand_rows(cursor))
+    if cold:
+        points = itertools.chain(points, _cold_chart_points(sensor_type, columns, metric, cold, row_filter))
+    return list(downsample(points, total_records, max_points, method))
+
 @app.route('/api/data/<sensor_type>', methods=['GET'])
 def get_sensor_historical_data(sensor_type):
-    """Get historical sensor data with pagination and date filtering"""
+    """
+    Get historical sensor data with pagination and date filtering.
+    Server-side filter: status, alarm, filter=<metric><op><value>, q (lihat row_filters)
+    Format: JSON, atau Arrow / MessagePack via ?format= / Accept (lihat wire_formats);
+    binary tanpa page/limit berisi seluruh range, di-stream per record batch.
+    """
     try:
         # Parse parameters
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 50))
+        max_points = request.args.get('max_points', type=int)
+        downsample_method = request.args.get('downsample', 'lttb')
         
         # Validate sensor type
         valid_sensors = {
@@ -90,8 +339,20 @@ def get_sensor_historical_data(sensor_type):
                 'error': f'Invalid sensor type: {sensor_type}'
             }), 400
         
+        try:
+            backend = timeseries_backend(sensor_type)
+            row_filter = RowFilter.from_args(sensor_type, request.args)
+            if backend == 'blocks' and row_filter.active:
+                raise ValueError('Filters are not supported by the blocks backend (use backend=rows)')
+            wire_format = request_format()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
         # Build query based on sensor type
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect_db()
         cursor = conn.cursor()
         
         offset = (page - 1) * limit
@@ -105,58 +366,139 @@ def get_sensor_historical_data(sensor_type):
             where_conditions.append('device_type = ?')
             params.append(device_type)
             
-            base_query = '''
-                SELECT timestamp, device_type, raw_registers, register_count, 
-                       status, error_message, parsed_data, received_at
-                FROM pzem_data
-            '''
+            columns = ['timestamp', 'device_type', 'raw_registers', 'register_count',
+                       'status', 'error_message', 'parsed_data', 'received_at']
         elif sensor_type == 'dht22':
             # DHT22 sensor
             table = 'dht22_data'
-            base_query = '''
-                SELECT timestamp, temperature, humidity, gpio_pin, library,
-                       status, error_message, received_at
-                FROM dht22_data
-            '''
+            columns = ['timestamp', 'temperature', 'humidity', 'gpio_pin', 'library',
+                       'status', 'error_message', 'received_at']
         elif sensor_type == 'system':
             # System resources
             table = 'system_data'
-            base_query = '''
-                SELECT timestamp, ram_usage_percent, storage_usage_percent,
-                       cpu_usage_percent, cpu_temperature, storage_total_gb,
-                       storage_used_gb, storage_free_gb, status, error_message, received_at
-                FROM system_data
-            '''
-        
-        # Add date filters
-        if start_date:
-            where_conditions.append('timestamp >= ?')
-            params.append(start_date)
-        
-        if end_date:
-            # Add one day to end_date to include the full day
-            end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
-            where_conditions.append('timestamp < ?')
-            params.append(end_datetime.isoformat())
+            columns = ['timestamp', 'ram_usage_percent', 'storage_usage_percent',
+                       'cpu_usage_percent', 'cpu_temperature', 'storage_total_gb',
+                       'storage_used_gb', 'storage_free_gb', 'status', 'error_message', 'received_at']
+        
+        # Kolom yang sama dipakai untuk hot (SQLite) dan cold tier (Parquet),
+        # diakhiri kolom run deadband untuk expand_rows()
+        base_query = f"SELECT {', '.join(columns + RUN_COLUMNS)} FROM {table}"
+        
+        # Add date filters (end_date termasuk satu hari penuh)
+        start_ms, end_ms = date_range_ms(start_date, end_date)
+        if start_ms is not None:
+            where_conditions.append('ts_ms >= ?')
+            params.append(start_ms)
+        
+        if end_ms is not None:
+            where_conditions.append('ts_ms < ?')
+            params.append(end_ms)
+        
+        # Filter status/alarm/range/q (kondisi sama dengan partial index & FTS5)
+        filter_conditions, filter_params = row_filter.sql(conn, table)
+        where_conditions.extend(filter_conditions)
+        params.extend(filter_params)
         
         # Build WHERE clause
         where_clause = ''
         if where_conditions:
             where_clause = 'WHERE ' + ' AND '.join(where_conditions)
         
-        # Get total count
-        count_query = f'SELECT COUNT(*) FROM {table} {where_clause}'
-        cursor.execute(count_query, params)
-        total_records = cursor.fetchone()[0]
+        # Binary: kolom dibangun langsung dari cursor / array (tanpa dict per row),
+        # seluruh range jika page/limit tidak diberikan
+        paginate = 'page' in request.args or 'limit' in request.args
+        wire_meta = {
+            'sensor_type': sensor_type,
+            'backend': backend,
+            'pagination': {'current_page': page, 'per_page': limit} if paginate else None,
+            'filters': dict({'start_date': start_date, 'end_date': end_date}, **row_filter.describe())
+        }
         
-        # Get paginated data
-        data_query = f'{base_query} {where_clause} ORDER BY timestamp DESC LIMIT ? OFFSET ?'
-        params.extend([limit, offset])
-        cursor.execute(data_query, params)
+        if backend == 'blocks' and wire_format != 'json' and not max_points:
+            batch, total_records = _wire_block_batch(conn, sensor_type, start_ms, end_ms,
+                                                     offset if paginate else 0, limit if paginate else None)
+            conn.close()
+            return wire_response(wire_format, sensor_schema(sensor_type), [batch],
+                                 dict(wire_meta, total_records=total_records))
+        elif backend == 'blocks':
+            # Series dari block store (NumPy), dibentuk menjadi row dengan kolom yang sama
+            try:
+                rows, total_records, downsampling = _block_rows(
+                    conn, sensor_type, columns, start_ms, end_ms, offset, limit, max_points,
+                    request.args.get('metric', DEFAULT_METRICS[sensor_type]), downsample_method
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+            if downsampling:
+                page, limit = 1, max(len(rows), 1)
+        else:
+            # Get total count (jumlah pembacaan, termasuk yang di-suppress deadband)
+            count_query = f'SELECT COALESCE(SUM({RUN_WEIGHT_SQL}), 0) FROM {table} {where_clause}'
+            cursor.execute(count_query, params)
+            hot_records = cursor.fetchone()[0]
+            
+            # Hari yang sudah di-tier ke Parquet
+            cold = cold_range(conn, sensor_type, start_ms, end_ms)
+            cold_records = _cold_count(sensor_type, columns, cold, row_filter) if cold else 0
+            total_records = hot_records + cold_records
+            
+            if wire_format != 'json' and not max_points:
+                # Hot lalu cold di-stream per record batch (cold iterator dibuat di request context)
+                cold_rows = _cold_rows(sensor_type, source_columns(sensor_type), cold, row_filter) if cold else None
+                batches = _wire_batches(conn, sensor_type, table, where_clause, params, cold_rows,
+                                        offset if paginate else 0, limit if paginate else None)
+                return wire_response(wire_format, sensor_schema(sensor_type), batches,
+                                     dict(wire_meta, total_records=total_records))
+            
+            downsampling = None
+            if max_points:
+                # Chart mode: seluruh range di-downsample ke max_points, tanpa pagination
+                metric = request.args.get('metric', DEFAULT_METRICS[sensor_type])
+                try:
+                    rows = _downsampled_rows(
+                        cursor, sensor_type, table, columns, where_clause, params,
+                        cold, total_records,
+                        max_points, metric, downsample_method, row_filter
+                    )
+                except ValueError as e:
+                    return jsonify({
+                        'success': False,
+                        'error': str(e)
+                    }), 400
+                downsampling = {
+                    'method': downsample_method,
+                    'metric': metric,
+                    'max_points': max_points,
+                    'returned_points': len(rows)
+                }
+                page, limit = 1, max(len(rows), 1)
+            else:
+                # Get paginated data (hot lebih baru, cold menyambung setelahnya);
+                # offset/limit dihitung per pembacaan, run deadband di-expand
+                data_query = f'{base_query} {where_clause} ORDER BY ts_ms DESC'
+                cursor.execute(data_query, params)
+                rows = [row for _, row in itertools.islice(expand_rows(cursor, skip=offset), limit)]
+            
+            if not max_points and cold and len(rows) < limit:
+                cold_rows = _cold_rows(sensor_type, columns + RUN_COLUMNS, cold, row_filter)
+                rows.extend(row for _, row in itertools.islice(
+                    expand_rows(cold_rows, skip=max(0, offset - hot_records)), limit - len(rows)
+                ))
+        
+        if wire_format != 'json':
+            # Chart mode: row hasil downsampling (max_points) dalam satu record batch
+            conn.close()
+            return wire_response(wire_format, sensor_schema(sensor_type),
+                                 [expanded_batch(sensor_type, columns, rows)],
+                                 dict(wire_meta, total_records=total_records, pagination=None,
+                                      downsampling=downsampling))
         
         # Format results
         records = []
-        for row in cursor.fetchall():
+        for row in rows:
             if sensor_type in ['pzem016', 'pzem017']:
                 record = {
                     'timestamp': row[0],
@@ -195,7 +537,7 @@ def get_sensor_historical_data(sensor_type):
                 }
             records.append(record)
         
-        total_pages = (total_records + limit - 1) // limit
+        total_pages = 1 if downsampling else (total_records + limit - 1) // limit
         
         conn.close()
         
@@ -209,11 +551,13 @@ def get_sensor_historical_data(sensor_type):
                     'total_records': total_records,
                     'per_page': limit
                 },
-                'filters': {
+                'downsampling': downsampling,
+                'backend': backend,
+                'filters': dict({
                     'start_date': start_date,
                     'end_date': end_date,
                     'sensor_type': sensor_type
-                }
+                }, **row_filter.describe())
             }
         })
         
@@ -224,220 +568,507 @@ def get_sensor_historical_data(sensor_type):
             'error': str(e)
         }), 500
 
+# ============ EXCEL EXPORT HELPERS ============
+
+# Export di-stream per chunk (hot lalu cold) supaya tidak seluruh tabel di memori
+EXPORT_CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', '5000'))
+# Chunk yang boleh antri antara reader dan penulis sheet pada export gabungan
+EXPORT_QUEUE_CHUNKS = int(os.environ.get('EXPORT_QUEUE_CHUNKS', '8'))
+
+PZEM_EXPORT_HEADERS = ['Timestamp', 'Voltage (V)', 'Current (A)', 'Power (W)',
+                       'Energy (kWh)', 'Status', 'Error Message']
+
+EXPORT_SENSORS = {
+    'pzem016': {
+        'table': 'pzem_data',
+        'device_type': 'PZEM-016_AC',
+        'columns': ['timestamp', 'parsed_data', 'status', 'error_message'],
+        'sheet': 'PZEM-016 AC Power',
+        'headers': PZEM_EXPORT_HEADERS + ['Frequency (Hz)', 'Power Factor', 'Alarm Status']
+    },
+    'pzem017': {
+        'table': 'pzem_data',
+        'device_type': 'PZEM-017_DC',
+        'columns': ['timestamp', 'parsed_data', 'status', 'error_message'],
+        'sheet': 'PZEM-017 DC Solar',
+        'headers': PZEM_EXPORT_HEADERS + ['Solar Status', 'Over Voltage Alarm', 'Under Voltage Alarm']
+    },
+    'dht22': {
+        'table': 'dht22_data',
+        'columns': ['timestamp', 'temperature', 'humidity', 'gpio_pin', 'library',
+                    'status', 'error_message'],
+        'sheet': 'DHT22 Environment',
+        'headers': ['Timestamp', 'Temperature (°C)', 'Humidity (%)', 'GPIO Pin',
+                    'Library', 'Status', 'Error Message']
+    },
+    'system': {
+        'table': 'system_data',
+        'columns': ['timestamp', 'ram_usage_percent', 'storage_usage_percent',
+                    'cpu_usage_percent', 'cpu_temperature', 'storage_total_gb',
+                    'storage_used_gb', 'storage_free_gb', 'status', 'error_message'],
+        'sheet': 'System Resources',
+        'headers': ['Timestamp', 'RAM Usage (%)', 'Storage Usage (%)', 'CPU Usage (%)',
+                    'CPU Temperature (°C)', 'Storage Total (GB)', 'Storage Used (GB)',
+                    'Storage Free (GB)', 'Status', 'Error Message']
+    }
+}
+
+def export_filename(prefix, start_date, end_date):
+    """Nama file export dari rentang tanggal request"""
+    filename = prefix
+    if start_date and end_date:
+        filename += f"_{start_date}_to_{end_date}"
+    elif start_date:
+        filename += f"_from_{start_date}"
+    elif end_date:
+        filename += f"_until_{end_date}"
+    else:
+        filename += f"_{site_now().strftime('%Y-%m-%d')}"
+    return filename + ".xlsx"
+
+def export_snapshot(conn):
+    """Satu read transaction untuk seluruh export (file snapshot sudah statis)"""
+    if isinstance(conn, PooledConnection):
+        return conn.read_snapshot()
+    return contextlib.nullcontext(conn)
+
+def export_chunks(conn, cold, sensor_type, start_ms, end_ms):
+    """
+    Row export sensor (DESC, run deadband di-expand) per chunk EXPORT_CHUNK_SIZE:
+    hot dari SQLite via fetchmany, lalu hari lama dari cold tier. parsed_data PZEM
+    sudah di-decode di sini supaya decode berjalan di sisi reader.
+    """
+    spec = EXPORT_SENSORS[sensor_type]
+    columns = spec['columns']
+    where_conditions = []
+    params = []
+    if 'device_type' in spec:
+        where_conditions.append('device_type = ?')
+        params.append(spec['device_type'])
+    if start_ms is not None:
+        where_conditions.append('ts_ms >= ?')
+        params.append(start_ms)
+    if end_ms is not None:
+        where_conditions.append('ts_ms < ?')
+        params.append(end_ms)
+    
+    query = f"SELECT {', '.join(columns + RUN_COLUMNS)} FROM {spec['table']}"
+    if where_conditions:
+        query += ' WHERE ' + ' AND '.join(where_conditions)
+    query += ' ORDER BY ts_ms DESC'
+    
+    cursor = conn.execute(query, params)
+    rows = itertools.chain.from_iterable(iter(lambda: cursor.fetchmany(EXPORT_CHUNK_SIZE), []))
+    
+    # Hari lama dari cold tier menyambung setelah data hot (tetap DESC)
+    cold_days = cold_range(conn, sensor_type, start_ms, end_ms)
+    if cold_days:
+        rows = itertools.chain(rows, cold.iter_rows(sensor_type, columns + RUN_COLUMNS, *cold_days,
+                                                    descending=True))
+    
+    records = (row for _, row in expand_rows(rows))
+    if 'device_type' in spec:
+        records = ((timestamp, json.loads(parsed_data) if parsed_data else {}, status, error_message)
+                   for timestamp, parsed_data, status, error_message in records)
+    
+    while True:
+        chunk = list(itertools.islice(records, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield chunk
+
+def _write_value(worksheet, row, col, value, cell_format=None):
+    """write() dengan jalur cepat untuk angka/string (tanpa deteksi tipe xlsxwriter)"""
+    if value.__class__ is str:
+        if value:
+            worksheet.write_string(row, col, value, cell_format)
+        elif cell_format is not None:
+            worksheet.write_blank(row, col, None, cell_format)
+    elif value.__class__ is float or value.__class__ is int:
+        worksheet.write_number(row, col, value, cell_format)
+    else:
+        worksheet.write(row, col, value, cell_format)
+
+def sensor_formats(workbook):
+    return {
+        'header': workbook.add_format({
+            'bold': True,
+            'bg_color': '#4472C4',
+            'font_color': 'white',
+            'border': 1
+        }),
+        'date': workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'}),
+        'number': workbook.add_format({'num_format': '0.000'})
+    }
+
+class SensorSheet:
+    """Worksheet satu sensor, diisi per chunk dengan urutan row naik (aman untuk constant_memory)"""
+
+    def __init__(self, workbook, formats, sensor_type):
+        spec = EXPORT_SENSORS[sensor_type]
+        self.sensor_type = sensor_type
+        self.formats = formats
+        self.worksheet = workbook.add_worksheet(spec['sheet'])
+        self.rows = 0
+        
+        # Write headers
+        for col, header in enumerate(spec['headers']):
+            self.worksheet.write_string(0, col, header, formats['header'])
+        
+        # Auto-adjust column widths
+        for col in range(len(spec['headers'])):
+            self.worksheet.set_column(col, col, 18)
+        
+        if sensor_type in ('pzem016', 'pzem017'):
+            self._write_record = self._write_pzem
+        else:
+            self._write_record = getattr(self, f'_write_{sensor_type}')
+
+    def write(self, records):
+        for row, record in enumerate(records, self.rows + 1):
+            self._write_record(row, record)
+        self.rows += len(records)
+
+    def _write_pzem(self, row, record):
+        worksheet = self.worksheet
+        number_format = self.formats['number']
+        timestamp, parsed_data, status, error_message = record
+        
+        _write_value(worksheet, row, 0, timestamp, self.formats['date'])
+        
+        if status == 'success' and parsed_data.get('status') == 'success':
+            _write_value(worksheet, row, 1, parsed_data.get('voltage_v', 0), number_format)
+            _write_value(worksheet, row, 2, parsed_data.get('current_a', 0), number_format)
+            _write_value(worksheet, row, 3, parsed_data.get('power_w', 0), number_format)
+            _write_value(worksheet, row, 4, parsed_data.get('energy_kwh', 0), number_format)
+            worksheet.write_string(row, 5, 'Success')
+            
+            if self.sensor_type == 'pzem016':
+                _write_value(worksheet, row, 7, parsed_data.get('frequency_hz', 0), number_format)
+                _write_value(worksheet, row, 8, parsed_data.get('power_factor', 0), number_format)
+                _write_value(worksheet, row, 9, parsed_data.get('alarm_status', 'OFF'))
+            else:
+                _write_value(worksheet, row, 7, parsed_data.get('solar_status', 'Unknown'))
+                _write_value(worksheet, row, 8, parsed_data.get('over_voltage_alarm', 'OFF'))
+                _write_value(worksheet, row, 9, parsed_data.get('under_voltage_alarm', 'OFF'))
+        else:
+            # Error case
+            for col in range(1, 5):
+                worksheet.write_number(row, col, 0)
+            _write_value(worksheet, row, 5, status or 'Error')
+            _write_value(worksheet, row, 6, error_message or 'Unknown error')
+
+    def _write_dht22(self, row, record):
+        worksheet = self.worksheet
+        number_format = self.formats['number']
+        timestamp, temperature, humidity, gpio_pin, library, status, error_message = record
+        
+        _write_value(worksheet, row, 0, timestamp, self.formats['date'])
+        _write_value(worksheet, row, 1, temperature or 0, number_format)
+        _write_value(worksheet, row, 2, humidity or 0, number_format)
+        _write_value(worksheet, row, 3, gpio_pin or 0)
+        _write_value(worksheet, row, 4, library or '')
+        _write_value(worksheet, row, 5, status or 'Error')
+        _write_value(worksheet, row, 6, error_message or '')
+
+    def _write_system(self, row, record):
+        worksheet = self.worksheet
+        number_format = self.formats['number']
+        timestamp = record[0]
+        status, error_message = record[8], record[9]
+        
+        _write_value(worksheet, row, 0, timestamp, self.formats['date'])
+        for col in range(1, 8):
+            _write_value(worksheet, row, col, record[col] or 0, number_format)
+        _write_value(worksheet, row, 8, status or 'Error')
+        _write_value(worksheet, row, 9, error_message or '')
+
+def roi_report_data(conn, cold, site):
+    """Data report ROI (settings, savings, energi harian, riwayat tarif); None jika belum dikonfigurasi"""
+    cursor = conn.cursor()
+    
+    # Get ROI settings
+    cursor.execute('SELECT * FROM roi_settings ORDER BY id DESC LIMIT 1')
+    settings = cursor.fetchone()
+    if not settings:
+        return None
+    
+    investment_cost = settings[1]
+    system_start_date = settings[3]
+    
+    # Get detailed energy data
+    cursor.execute(f'''
+        SELECT ts_ms / ? as day_index,
+               SUM(CASE WHEN status = 'success' AND parsed_data IS NOT NULL 
+                   THEN JSON_EXTRACT(parsed_data, '$.energy_kwh') * {RUN_WEIGHT_SQL} ELSE 0 END) as daily_energy
+        FROM pzem_data
+        WHERE device_type = 'PZEM-016_AC'
+        AND ts_ms >= ?
+        GROUP BY day_index
+        ORDER BY day_index DESC
+    ''', (MS_PER_DAY, to_epoch_ms(system_start_date)))
+    
+    daily_data = cursor.fetchall()
+    
+    # Gabungkan hari dari cold tier (data terlambat bisa ada di kedua tier)
+    cold_days = cold_range(conn, 'pzem016', to_epoch_ms(system_start_date), None)
+    if cold_days:
+        daily_energy_by_day = dict(daily_data)
+        for day_ms, energy_kwh in cold.daily_sums('pzem016', 'energy_kwh', *cold_days,
+                                                  filters=COLD_ENERGY_FILTERS):
+            day_index = day_ms // MS_PER_DAY
+            daily_energy_by_day[day_index] = daily_energy_by_day.get(day_index, 0) + energy_kwh
+        daily_data = sorted(daily_energy_by_day.items(), reverse=True)
+    
+    # Get tariff history
+    cursor.execute('SELECT tariff_per_kwh, effective_date, created_at FROM tariff_history ORDER BY effective_date DESC')
+    
+    return {
+        'investment_cost': investment_cost,
+        'system_start_date': system_start_date,
+        'total_savings': calculate_total_savings(cursor, system_start_date, site),
+        'daily_data': daily_data,
+        'tariff_history': cursor.fetchall()
+    }
+
+def write_roi_sheets(workbook, data):
+    """Sheet ROI Summary, Daily Savings Detail dan Tariff History"""
+    header_format = workbook.add_format({
+        'bold': True,
+        'bg_color': '#4472C4',
+        'font_color': 'white',
+        'border': 1
+    })
+    
+    title_format = workbook.add_format({
+        'bold': True,
+        'font_size': 16,
+        'bg_color': '#D9E2F3'
+    })
+    
+    currency_format = workbook.add_format({'num_format': '"Rp "#,##0'})
+    date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+    datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    
+    investment_cost = data['investment_cost']
+    total_savings = data['total_savings']
+    
+    # Sheet 1: ROI Summary
+    summary_sheet = workbook.add_worksheet('ROI Summary')
+    
+    # System Information
+    summary_sheet.write('A1', 'Solar PV System ROI Report', title_format)
+    summary_sheet.write('A3', 'System Information')
+    summary_sheet.write('A4', 'System Start Date:')
+    summary_sheet.write('B4', data['system_start_date'], date_format)
+    summary_sheet.write('A5', 'Investment Cost:')
+    summary_sheet.write('B5', investment_cost, currency_format)
+    
+    # Calculate current metrics
+    roi_percentage = (total_savings / investment_cost) * 100
+    
+    summary_sheet.write('A7', 'Current Status')
+    summary_sheet.write('A8', 'Total Savings:')
+    summary_sheet.write('B8', total_savings, currency_format)
+    summary_sheet.write('A9', 'ROI Percentage:')
+    summary_sheet.write('B9', f'{roi_percentage:.1f}%')
+    summary_sheet.write('A10', 'Investment Recovered:')
+    summary_sheet.write('B10', min(total_savings, investment_cost), currency_format)
+    
+    # Set column widths
+    summary_sheet.set_column('A:A', 25)
+    summary_sheet.set_column('B:B', 20)
+    
+    # Sheet 2: Daily Savings Detail
+    detail_sheet = workbook.add_worksheet('Daily Savings Detail')
+    
+    # Headers
+    headers = ['Date', 'Energy Consumed (kWh)', 'Applicable Tariff (Rp/kWh)', 'Daily Savings (Rp)']
+    for col, header in enumerate(headers):
+        detail_sheet.write(0, col, header, header_format)
+    
+    # Write daily data
+    row = 1
+    for day_index, daily_energy in data['daily_data']:
+        if daily_energy > 0:
+            date_str = from_epoch_ms(day_index * MS_PER_DAY)[:10]
+            tariff = 1352  # You might want to get historical tariff here
+            daily_savings = daily_energy * tariff
+            
+            detail_sheet.write(row, 0, date_str, date_format)
+            detail_sheet.write(row, 1, daily_energy)
+            detail_sheet.write(row, 2, tariff)
+            detail_sheet.write(row, 3, daily_savings, currency_format)
+            row += 1
+    
+    # Set column widths
+    for col in range(4):
+        detail_sheet.set_column(col, col, 18)
+    
+    # Sheet 3: Tariff History
+    tariff_sheet = workbook.add_worksheet('Tariff History')
+    
+    # Headers
+    tariff_headers = ['Effective Date', 'Tariff (Rp/kWh)', 'Created Date']
+    for col, header in enumerate(tariff_headers):
+        tariff_sheet.write(0, col, header, header_format)
+    
+    # Write tariff data
+    for row, (tariff_rate, effective_date, created_at) in enumerate(data['tariff_history'], 1):
+        tariff_sheet.write(row, 0, effective_date, date_format)
+        tariff_sheet.write(row, 1, tariff_rate)
+        tariff_sheet.write(row, 2, created_at, datetime_format)
+    
+    # Set column widths
+    for col in range(3):
+        tariff_sheet.set_column(col, col, 18)
+
+# ============ EXPORT API ENDPOINTS ============
+
+@app.route('/api/export/report', methods=['GET'])
+@single_flight()
+def export_site_report():
+    """
+    Export gabungan satu workbook: sheet PZEM-016, PZEM-017, DHT22, System dan ROI
+    dalam satu pass. Semua tabel dibaca dari satu read snapshot oleh thread reader
+    (query SQLite dan Parquet melepas GIL) sementara thread request menulis sheet;
+    xlsxwriter tidak thread-safe sehingga penulisan sheet tetap berurutan.
+    Workbook memakai constant_memory: row di-flush per sheet, memori dibatasi
+    antrian chunk.
+    """
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        site = request.args.get('site')
+        start_ms, end_ms = date_range_ms(start_date, end_date)
+        snapshot = None
+        if request.args.get('source', EXPORT_SOURCE) == 'snapshot':
+            snapshot = latest_snapshot(site)
+            if not snapshot:
+                logger.warning("No snapshot available, exporting from live database")
+        
+        chunks = queue.Queue(maxsize=EXPORT_QUEUE_CHUNKS)
+        cancelled = threading.Event()
+        
+        def emit(item):
+            """put ke antrian; False jika penulis sudah berhenti (error/404)"""
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=1)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def read_all():
+            conn = None
+            try:
+                conn = open_snapshot(snapshot) if snapshot else shard_pool.connect(site)
+                cold = ColdStorage(site)
+                with export_snapshot(conn):
+                    for sensor_type in EXPORT_SENSORS:
+                        for chunk in export_chunks(conn, cold, sensor_type, start_ms, end_ms):
+                            if not emit((sensor_type, chunk)):
+                                return
+                    roi_data = roi_report_data(conn, cold, site)
+                if emit(('roi', roi_data)):
+                    emit(('done', None))
+            except Exception as e:
+                emit(('error', e))
+            finally:
+                if snapshot and conn is not None:
+                    conn.close()
+                elif not snapshot:
+                    shard_pool.close_all()
+        
+        reader = threading.Thread(target=read_all, name='export-reader', daemon=True)
+        reader.start()
+        
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        try:
+            formats = sensor_formats(workbook)
+            sheets = {sensor_type: SensorSheet(workbook, formats, sensor_type)
+                      for sensor_type in EXPORT_SENSORS}
+            roi_data = None
+            
+            while True:
+                kind, item = chunks.get()
+                if kind == 'error':
+                    raise item
+                if kind == 'done':
+                    break
+                if kind == 'roi':
+                    roi_data = item
+                else:
+                    sheets[kind].write(item)
+            
+            if roi_data:
+                write_roi_sheets(workbook, roi_data)
+            elif not any(sheet.rows for sheet in sheets.values()):
+                return jsonify({
+                    'success': False,
+                    'error': 'No data found for the specified criteria'
+                }), 404
+        finally:
+            cancelled.set()
+            workbook.close()
+            reader.join()
+        
+        output.seek(0)
+        
+        prefix = f"Site-Report_{site}" if site else "Site-Report"
+        response = export_response(output, export_filename(prefix, start_date, end_date), snapshot)
+        response.headers['X-Export-Rows'] = ','.join(
+            f'{sensor_type}={sheet.rows}' for sensor_type, sheet in sheets.items()
+        )
+        return response
+        
+    except Exception as e:
+        logger.error(f"Error exporting site report: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/export/<sensor_type>', methods=['GET'])
+@single_flight()
 def export_sensor_data(sensor_type):
     """Export sensor data to Excel format"""
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        # Get data (no pagination for export)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Build query similar to historical data endpoint but without pagination
-        where_conditions = []
-        params = []
-        
-        if sensor_type == 'pzem016':
-            where_conditions.append('device_type = ?')
-            params.append('PZEM-016_AC')
-            query = '''
-                SELECT timestamp, parsed_data, status, error_message
-                FROM pzem_data
-            '''
-        elif sensor_type == 'pzem017':
-            where_conditions.append('device_type = ?')
-            params.append('PZEM-017_DC')
-            query = '''
-                SELECT timestamp, parsed_data, status, error_message
-                FROM pzem_data
-            '''
-        elif sensor_type == 'dht22':
-            query = '''
-                SELECT timestamp, temperature, humidity, gpio_pin, library, status, error_message
-                FROM dht22_data
-            '''
-        elif sensor_type == 'system':
-            query = '''
-                SELECT timestamp, ram_usage_percent, storage_usage_percent,
-                       cpu_usage_percent, cpu_temperature, storage_total_gb,
-                       storage_used_gb, storage_free_gb, status, error_message
-                FROM system_data
-            '''
-        else:
+        if sensor_type not in EXPORT_SENSORS:
             return jsonify({
                 'success': False,
                 'error': f'Invalid sensor type: {sensor_type}'
             }), 400
         
-        # Add date filters
-        if start_date:
-            where_conditions.append('timestamp >= ?')
-            params.append(start_date)
-        
-        if end_date:
-            end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
-            where_conditions.append('timestamp < ?')
-            params.append(end_datetime.isoformat())
+        # Get data (no pagination for export), di-stream per chunk ke worksheet
+        conn, snapshot = export_db()
+        start_ms, end_ms = date_range_ms(start_date, end_date)
         
-        # Build final query
-        if where_conditions:
-            query += ' WHERE ' + ' AND '.join(where_conditions)
-        query += ' ORDER BY timestamp DESC'
+        # Create Excel file in memory
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        sheet = SensorSheet(workbook, sensor_formats(workbook), sensor_type)
         
-        cursor.execute(query, params)
-        data = cursor.fetchall()
+        with export_snapshot(conn):
+            for chunk in export_chunks(conn, cold_storage(), sensor_type, start_ms, end_ms):
+                sheet.write(chunk)
         conn.close()
         
-        if not data:
+        if not sheet.rows:
             return jsonify({
                 'success': False,
                 'error': 'No data found for the specified criteria'
             }), 404
         
-        # Create Excel file in memory
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        
-        # Add formats
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#4472C4',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
-        number_format = workbook.add_format({'num_format': '0.000'})
-        
-        # Create worksheet
-        sensor_names = {
-            'pzem016': 'PZEM-016 AC Power',
-            'pzem017': 'PZEM-017 DC Solar',
-            'dht22': 'DHT22 Environment',
-            'system': 'System Resources'
-        }
-        
-        worksheet = workbook.add_worksheet(sensor_names.get(sensor_type, sensor_type.upper()))
-        
-        # Write headers and data based on sensor type
-        if sensor_type in ['pzem016', 'pzem017']:
-            headers = ['Timestamp', 'Voltage (V)', 'Current (A)', 'Power (W)', 
-                      'Energy (kWh)', 'Status', 'Error Message']
-            if sensor_type == 'pzem016':
-                headers.extend(['Frequency (Hz)', 'Power Factor', 'Alarm Status'])
-            else:
-                headers.extend(['Solar Status', 'Over Voltage Alarm', 'Under Voltage Alarm'])
-            
-            # Write headers
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header, header_format)
-            
-            # Write data
-            for row, record in enumerate(data, 1):
-                timestamp, parsed_data_json, status, error_message = record
-                
-                # Parse JSON data
-                parsed_data = json.loads(parsed_data_json) if parsed_data_json else {}
-                
-                worksheet.write(row, 0, timestamp, date_format)
-                
-                if status == 'success' and parsed_data.get('status') == 'success':
-                    worksheet.write(row, 1, parsed_data.get('voltage_v', 0), number_format)
-                    worksheet.write(row, 2, parsed_data.get('current_a', 0), number_format)
-                    worksheet.write(row, 3, parsed_data.get('power_w', 0), number_format)
-                    worksheet.write(row, 4, parsed_data.get('energy_kwh', 0), number_format)
-                    worksheet.write(row, 5, 'Success')
-                    worksheet.write(row, 6, '')
-                    
-                    if sensor_type == 'pzem016':
-                        worksheet.write(row, 7, parsed_data.get('frequency_hz', 0), number_format)
-                        worksheet.write(row, 8, parsed_data.get('power_factor', 0), number_format)
-                        worksheet.write(row, 9, parsed_data.get('alarm_status', 'OFF'))
-                    else:
-                        worksheet.write(row, 7, parsed_data.get('solar_status', 'Unknown'))
-                        worksheet.write(row, 8, parsed_data.get('over_voltage_alarm', 'OFF'))
-                        worksheet.write(row, 9, parsed_data.get('under_voltage_alarm', 'OFF'))
-                else:
-                    # Error case
-                    for col in range(1, 5):
-                        worksheet.write(row, col, 0)
-                    worksheet.write(row, 5, status or 'Error')
-                    worksheet.write(row, 6, error_message or 'Unknown error')
-                    for col in range(7, len(headers)):
-                        worksheet.write(row, col, '')
-        
-        elif sensor_type == 'dht22':
-            headers = ['Timestamp', 'Temperature (°C)', 'Humidity (%)', 'GPIO Pin', 
-                      'Library', 'Status', 'Error Message']
-            
-            # Write headers
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header, header_format)
-            
-            # Write data
-            for row, record in enumerate(data, 1):
-                timestamp, temperature, humidity, gpio_pin, library, status, error_message = record
-                
-                worksheet.write(row, 0, timestamp, date_format)
-                worksheet.write(row, 1, temperature or 0, number_format)
-                worksheet.write(row, 2, humidity or 0, number_format)
-                worksheet.write(row, 3, gpio_pin or 0)
-                worksheet.write(row, 4, library or '')
-                worksheet.write(row, 5, status or 'Error')
-                worksheet.write(row, 6, error_message or '')
-        
-        elif sensor_type == 'system':
-            headers = ['Timestamp', 'RAM Usage (%)', 'Storage Usage (%)', 'CPU Usage (%)', 
-                      'CPU Temperature (°C)', 'Storage Total (GB)', 'Storage Used (GB)', 
-                      'Storage Free (GB)', 'Status', 'Error Message']
-            
-            # Write headers
-            for col, header in enumerate(headers):
-                worksheet.write(0, col, header, header_format)
-            
-            # Write data
-            for row, record in enumerate(data, 1):
-                (timestamp, ram_usage, storage_usage, cpu_usage, cpu_temp, 
-                 storage_total, storage_used, storage_free, status, error_message) = record
-                
-                worksheet.write(row, 0, timestamp, date_format)
-                worksheet.write(row, 1, ram_usage or 0, number_format)
-                worksheet.write(row, 2, storage_usage or 0, number_format)
-                worksheet.write(row, 3, cpu_usage or 0, number_format)
-                worksheet.write(row, 4, cpu_temp or 0, number_format)
-                worksheet.write(row, 5, storage_total or 0, number_format)
-                worksheet.write(row, 6, storage_used or 0, number_format)
-                worksheet.write(row, 7, storage_free or 0, number_format)
-                worksheet.write(row, 8, status or 'Error')
-                worksheet.write(row, 9, error_message or '')
-        
-        # Auto-adjust column widths
-        for col in range(len(headers)):
-            worksheet.set_column(col, col, 18)
-        
         workbook.close()
         output.seek(0)
         
-        # Generate filename
-        filename = f"{sensor_type.upper()}"
-        if start_date and end_date:
-            filename += f"_{start_date}_to_{end_date}"
-        elif start_date:
-            filename += f"_from_{start_date}"
-        elif end_date:
-            filename += f"_until_{end_date}"
-        else:
-            filename += f"_{datetime.now().strftime('%Y-%m-%d')}"
-        filename += ".xlsx"
-        
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        return export_response(output, export_filename(sensor_type.upper(), start_date, end_date), snapshot)
         
     except Exception as e:
         logger.error(f"Error exporting {sensor_type} data: {e}")
@@ -449,10 +1080,11 @@ def export_sensor_data(sensor_type):
 # ============ ROI API ENDPOINTS ============
 
 @app.route('/api/roi/summary', methods=['GET'])
+@single_flight()
 def get_roi_summary():
     """Get ROI summary for dashboard card"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect_db()
         cursor = conn.cursor()
         
         # Get ROI settings
@@ -469,14 +1101,20 @@ def get_roi_summary():
         system_start_date = settings_row[3]  # system_start_date
         
         # Calculate total savings using historical tariffs
-        total_savings = calculate_total_savings(cursor, system_start_date)
+        site = request.args.get('site')
+        total_savings = calculate_total_savings(cursor, system_start_date, site)
         
-        # Calculate today's and monthly savings
-        today = datetime.now().date()
+        # Calculate today's and monthly savings (materialized summary, satu lookup PK)
+        today = site_now().date()
         month_start = today.replace(day=1)
         
-        today_savings = calculate_savings_for_period(cursor, today.isoformat(), today.isoformat())
-        monthly_savings = calculate_savings_for_period(cursor, month_start.isoformat(), today.isoformat())
+        summary = read_summary(conn, to_epoch_ms(today))
+        if summary is not None:
+            today_savings = summary_savings(summary, 'day')
+            monthly_savings = summary_savings(summary, 'month')
+        else:
+            today_savings = calculate_savings_for_period(cursor, today.isoformat(), today.isoformat(), site)
+            monthly_savings = calculate_savings_for_period(cursor, month_start.isoformat(), today.isoformat(), site)
         
         # Calculate ROI metrics
         roi_percentage = (total_savings / investment_cost) * 100
@@ -502,7 +1140,7 @@ def get_roi_summary():
                 'monthly_savings': monthly_savings,
                 'payback_months_remaining': int(payback_months) if payback_months != float('inf') else 0,
                 'system_start_date': system_start_date,
-                'last_updated': datetime.now().isoformat()
+                'last_updated': site_now().isoformat()
             }
         })
         
@@ -517,7 +1155,7 @@ def get_roi_summary():
 def roi_settings():
     """Get or update ROI settings"""
     try:
-        conn = sqlite3.connect(DB_PATH)
+        conn = connect_db()
         cursor = conn.cursor()
         
         if request.method == 'GET':
@@ -556,7 +1194,7 @@ def roi_settings():
             data = request.get_json()
             
             new_tariff = data.get('current_tariff_per_kwh')
-            effective_date = data.get('effective_date', datetime.now().date().isoformat())
+            effective_date = data.get('effective_date', site_now().date().isoformat())
             
             # Get current tariff to check if changed
             cursor.execute('SELECT current_tariff_per_kwh FROM roi_settings ORDER BY id DESC LIMIT 1')
@@ -568,7 +1206,7 @@ def roi_settings():
                 UPDATE roi_settings 
                 SET current_tariff_per_kwh = ?, updated_at = ?
                 WHERE id = (SELECT id FROM roi_settings ORDER BY id DESC LIMIT 1)
-            ''', (new_tariff, datetime.now().isoformat()))
+            ''', (new_tariff, site_now().isoformat()))
             
             # Add new tariff to history if changed
             if abs(new_tariff - current_tariff) > 0.01:  # Only if significantly different
@@ -580,6 +1218,9 @@ def roi_settings():
             conn.commit()
             conn.close()
             
+            # Hasil ROI dalam grace TTL memakai setting lama
+            _single_flight.clear()
+            
             return jsonify({
                 'success': True,
                 'message': 'ROI settings updated successfully'
@@ -592,56 +1233,79 @@ def roi_settings():
             'error': str(e)
         }), 500
 
-def calculate_total_savings(cursor, system_start_date):
+# Filter cold tier yang setara dengan kondisi SQL savings
+COLD_ENERGY_FILTERS = [('status', '=', 'success'), ('energy_kwh', '>', 0)]
+
+def _energy_rows(cursor, start_ms, end_ms):
+    """(ts_ms, energi x bobot run) PZEM-016 sukses dari row dalam [start_ms, end_ms)"""
+    cursor.execute(f'''
+        SELECT ts_ms, JSON_EXTRACT(parsed_data, '$.energy_kwh') * {RUN_WEIGHT_SQL}
+        FROM pzem_data
+        WHERE device_type = 'PZEM-016_AC'
+        AND status = 'success'
+        AND ts_ms >= ?
+        AND ts_ms < ?
+        AND parsed_data IS NOT NULL
+        ORDER BY ts_ms ASC
+    ''', (start_ms if start_ms is not None else 0, end_ms if end_ms is not None else 2 ** 62))
+    return cursor.fetchall()
+
+def calculate_total_savings(cursor, system_start_date, site=None):
     """Calculate total savings using historical tariffs"""
     try:
-        # Get all energy consumption data since system start
-        cursor.execute('''
-            SELECT timestamp, parsed_data
-            FROM pzem_data
-            WHERE device_type = 'PZEM-016_AC'
-            AND status = 'success'
-            AND timestamp >= ?
-            AND parsed_data IS NOT NULL
-            ORDER BY timestamp ASC
-        ''', (system_start_date,))
-        
-        consumption_data = cursor.fetchall()
+        start_ms = to_epoch_ms(system_start_date)
+        
+        # Hari pertama parsial (system_start di tengah hari) dihitung dari row
+        # ts_ms >= start_ms; SUM harian summary baru dipakai mulai hari berikutnya
+        summary_start = start_ms
+        if start_ms is not None and start_ms % MS_PER_DAY:
+            summary_start = day_start_ms(start_ms) + MS_PER_DAY
+        
+        # SUM energi per hari dari dashboard_summary (tarif berlaku per awal hari)
+        consumption_data = summary_daily_sums(cursor.connection, 'pzem016', 'energy_kwh', summary_start)
+        if consumption_data is not None:
+            # Hari yang sudah di-tier sebelum summary dibuat hanya ada di Parquet
+            exact_end = summary_start
+            covered_ms = covered_from(cursor.connection, 'pzem016')
+            if covered_ms is not None and (exact_end is None or covered_ms > exact_end):
+                exact_end = covered_ms
+            cold = None
+            if exact_end is not None and (start_ms is None or start_ms < exact_end):
+                consumption_data = [row for row in consumption_data if row[0] >= exact_end]
+                consumption_data.extend(_energy_rows(cursor, start_ms, exact_end))
+                cold = cold_range(cursor.connection, 'pzem016', start_ms, exact_end)
+        else:
+            # Get all energy consumption data since system start
+            consumption_data = _energy_rows(cursor, start_ms, None)
+            cold = cold_range(cursor.connection, 'pzem016', start_ms, None)
+        
+        # Hari yang sudah di-tier: SUM per hari cukup karena tarif berlaku per awal hari
+        if cold:
+            consumption_data.extend(
+                ColdStorage(site).daily_sums('pzem016', 'energy_kwh', *cold, filters=COLD_ENERGY_FILTERS)
+            )
         
         if not consumption_data:
             return 0
         
-        # Get tariff history
+        # Get tariff history, batas berlaku tarif = awal hari effective_date (epoch ms)
         cursor.execute('SELECT tariff_per_kwh, effective_date FROM tariff_history ORDER BY effective_date ASC')
         tariff_history = cursor.fetchall()
+        tariff_starts = [day_start_ms(effective_date) for _, effective_date in tariff_history]
+        tariff_rates = [tariff_rate for tariff_rate, _ in tariff_history]
         
         total_savings = 0
         
-        for timestamp, parsed_data_json in consumption_data:
-            try:
-                parsed_data = json.loads(parsed_data_json)
-                energy_kwh = parsed_data.get('energy_kwh', 0)
-                
-                if energy_kwh <= 0:
-                    continue
-                
-                # Find applicable tariff for this timestamp
-                applicable_tariff = 1352  # default
-                record_date = datetime.fromisoformat(timestamp).date()
-                
-                for tariff_rate, effective_date in tariff_history:
-                    tariff_date = datetime.fromisoformat(effective_date).date()
-                    if record_date >= tariff_date:
-                        applicable_tariff = tariff_rate
-                    else:
-                        break
-                
-                # Calculate savings for this record
-                savings = energy_kwh * applicable_tariff
-                total_savings += savings
-                
-            except (json.JSONDecodeError, ValueError) as e:
+        for ts_ms, energy_kwh in consumption_data:
+            if not energy_kwh or energy_kwh <= 0:
                 continue
+            
+            # Find applicable tariff for this timestamp (default 1352)
+            tariff_index = bisect.bisect_right(tariff_starts, ts_ms) - 1
+            applicable_tariff = tariff_rates[tariff_index] if tariff_index >= 0 else 1352
+            
+            # Calculate savings for this record
+            total_savings += energy_kwh * applicable_tariff
         
         return total_savings
         
@@ -649,200 +1313,828 @@ def calculate_total_savings(cursor, system_start_date):
         logger.error(f"Error calculating total savings: {e}")
         return 0
 
-def calculate_savings_for_period(cursor, start_date, end_date):
+def calculate_savings_for_period(cursor, start_date, end_date, site=None):
     """Calculate savings for a specific period"""
     try:
-        end_datetime = datetime.fromisoformat(end_date) + timedelta(days=1)
+        start_ms, end_ms = date_range_ms(start_date, end_date)
         
-        cursor.execute('''
+        cursor.execute(f'''
             SELECT SUM(
                 CASE 
                     WHEN status = 'success' AND parsed_data IS NOT NULL 
-                    THEN JSON_EXTRACT(parsed_data, '$.energy_kwh') * 1352
+                    THEN JSON_EXTRACT(parsed_data, '$.energy_kwh') * {RUN_WEIGHT_SQL} * 1352
                     ELSE 0 
                 END
             ) as total_savings
             FROM pzem_data
             WHERE device_type = 'PZEM-016_AC'
-            AND timestamp >= ?
-            AND timestamp < ?
-        ''', (start_date, end_datetime.isoformat()))
+            AND ts_ms >= ?
+            AND ts_ms < ?
+        ''', (start_ms, end_ms))
         
         result = cursor.fetchone()
-        return result[0] if result and result[0] else 0
+        savings = result[0] if result and result[0] else 0
+        
+        cold = cold_range(cursor.connection, 'pzem016', start_ms, end_ms)
+        if cold:
+            savings += sum(
+                energy_kwh for _, energy_kwh in
+                ColdStorage(site).daily_sums('pzem016', 'energy_kwh', *cold, filters=COLD_ENERGY_FILTERS)
+            ) * 1352
+        return savings
         
     except Exception as e:
         logger.error(f"Error calculating period savings: {e}")
         return 0
 
+def summary_savings(summary, period):
+    """Savings hari ini / bulan ini dari dashboard_summary (tarif flat seperti calculate_savings_for_period)"""
+    return summary_value(summary, period, 'pzem016', 'energy_kwh', 'sum', 0) * 1352
+
 @app.route('/api/roi/export', methods=['GET'])
+@single_flight()
 def export_roi_report():
     """Export comprehensive ROI report to Excel"""
     try:
         start_date = request.args.get('start_date')
         end_date = request.args.get('end_date')
         
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        # Get ROI settings
-        cursor.execute('SELECT * FROM roi_settings ORDER BY id DESC LIMIT 1')
-        settings = cursor.fetchone()
+        conn, snapshot = export_db()
+        with export_snapshot(conn):
+            data = roi_report_data(conn, cold_storage(), request.args.get('site'))
+        conn.close()
         
-        if not settings:
+        if not data:
             return jsonify({
                 'success': False,
                 'error': 'ROI settings not configured'
             }), 404
         
-        investment_cost = settings[1]
-        system_start_date = settings[3]
-        
         # Create Excel file
         output = io.BytesIO()
         workbook = xlsxwriter.Workbook(output, {'in_memory': True})
+        write_roi_sheets(workbook, data)
+        workbook.close()
+        output.seek(0)
         
-        # Formats
-        header_format = workbook.add_format({
-            'bold': True,
-            'bg_color': '#4472C4',
-            'font_color': 'white',
-            'border': 1
+        # Generate filename
+        filename = "ROI-Report"
+        if start_date and end_date:
+            filename += f"_{start_date}_to_{end_date}"
+        else:
+            filename += f"_{site_now().strftime('%Y-%m-%d')}"
+        filename += ".xlsx"
+        
+        return export_response(output, filename, snapshot)
+        
+    except Exception as e:
+        logger.error(f"Error exporting ROI report: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ SYSTEM EFFICIENCY API ENDPOINTS ============
+
+EFFICIENCY_CHART_METRICS = ('ac_power_w', 'dc_power_w', 'power_loss_w', 'system_efficiency_percent')
+
+def _downsample_series(series, metric, max_points, method):
+    """Downsample series in-memory; NumPy fast path untuk LTTB jika semua nilai numerik"""
+    values = [point[metric] for point in series]
+    if NUMPY_AVAILABLE and method == 'lttb' and max_points >= 3 and None not in values:
+        timestamps = [point['timestamp'] for point in series]
+        return [series[index] for index in lttb_indices(timestamps, values, max_points)]
+    
+    return list(downsample(
+        ((point['timestamp'], point[metric], point) for point in series),
+        len(series), max_points, method
+    ))
+
+def _efficiency_rows(cursor, device_type, where_conditions, params):
+    """(ts detik, device_type, power_w) urut ASC untuk satu device, run deadband di-expand"""
+    cursor.execute(f'''
+        SELECT ts_ms, JSON_EXTRACT(parsed_data, '$.power_w'), {', '.join(RUN_COLUMNS)}
+        FROM pzem_data
+        WHERE device_type = ? AND {' AND '.join(where_conditions)}
+        ORDER BY ts_ms ASC
+    ''', [device_type] + params)
+    for ts_ms, row in expand_rows(cursor, descending=False):
+        yield ts_ms / 1000.0, device_type, row[1]
+
+@app.route('/api/efficiency', methods=['GET'])
+def get_efficiency_series():
+    """System efficiency & power loss time series dari as-of join AC dan DC"""
+    try:
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
+        tolerance_s = float(request.args.get('tolerance_s', 60))
+        interpolate = request.args.get('interpolate', 'true').lower() != 'false'
+        include_series = request.args.get('include_series', 'true').lower() != 'false'
+        max_points = request.args.get('max_points', type=int)
+        downsample_method = request.args.get('downsample', 'lttb')
+        chart_metric = request.args.get('metric', 'ac_power_w')
+        
+        if chart_metric not in EFFICIENCY_CHART_METRICS:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid metric: {chart_metric}'
+            }), 400
+        
+        if tolerance_s <= 0:
+            return jsonify({
+                'success': False,
+                'error': 'tolerance_s must be positive'
+            }), 400
+        
+        where_conditions = [
+            "status = 'success'",
+            'parsed_data IS NOT NULL'
+        ]
+        params = []
+        
+        start_ms, end_ms = date_range_ms(start_date, end_date)
+        if start_ms is not None:
+            where_conditions.append('ts_ms >= ?')
+            params.append(start_ms)
+        
+        if end_ms is not None:
+            where_conditions.append('ts_ms < ?')
+            params.append(end_ms)
+        
+        conn = connect_db()
+        
+        # Satu pass atas kedua device, di-merge berdasarkan ts_ms (run deadband satu
+        # device bisa mengapit row device lain, jadi expand dilakukan per device)
+        rows = heapq.merge(
+            _efficiency_rows(conn.cursor(), 'PZEM-016_AC', where_conditions, params),
+            _efficiency_rows(conn.cursor(), 'PZEM-017_DC', where_conditions, params),
+            key=lambda row: row[0]
+        )
+        result = EnhancedPZEMAnalyzer.calculate_efficiency_series(
+            rows,
+            tolerance_s=tolerance_s,
+            interpolate=interpolate,
+            include_series=include_series
+        )
+        conn.close()
+        
+        if max_points and len(result['series']) > max_points:
+            try:
+                result['series'] = _downsample_series(
+                    result['series'], chart_metric, max_points, downsample_method
+                )
+            except ValueError as e:
+                return jsonify({
+                    'success': False,
+                    'error': str(e)
+                }), 400
+        
+        for point in result['series']:
+            point['timestamp'] = from_epoch_ms(round(point['timestamp'] * 1000))
+        for rollup_name in ('hourly', 'daily'):
+            for bucket in result[rollup_name]:
+                bucket['bucket_start'] = from_epoch_ms(bucket['bucket_start'] * 1000)
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                **result,
+                'filters': {
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'tolerance_s': tolerance_s,
+                    'interpolate': interpolate,
+                    'max_points': max_points
+                }
+            }
         })
         
-        title_format = workbook.add_format({
-            'bold': True,
-            'font_size': 16,
-            'bg_color': '#D9E2F3'
+    except Exception as e:
+        logger.error(f"Error calculating efficiency series: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ AGGREGATION API ENDPOINTS ============
+
+@app.route('/api/aggregate', methods=['GET'])
+def get_aggregate():
+    """
+    Aggregate metric per bucket waktu (satu query SQL, rollup per jam jika bisa).
+    Arrow / MessagePack via ?format= / Accept: kolom bucket_start + aggregate.
+    """
+    try:
+        sensor = request.args.get('sensor')
+        metric = request.args.get('metric')
+        bucket = request.args.get('bucket', '15m')
+        
+        try:
+            bucket_ms = parse_bucket(bucket)
+            aggs = parse_aggs(request.args.get('agg', 'avg'))
+            start_ms, end_ms = parse_range(request.args.get('start'), request.args.get('end'))
+            backend = timeseries_backend(sensor)
+            wire_format = request_format()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        
+        conn = connect_db()
+        columnar = wire_format != 'json'
+        try:
+            if backend == 'blocks':
+                result = aggregate_blocks(conn, sensor, metric, bucket_ms, aggs, start_ms, end_ms, columnar)
+            else:
+                result = aggregate(conn, sensor, metric, bucket_ms, aggs, start_ms, end_ms, columnar)
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        finally:
+            conn.close()
+        
+        result['bucket'] = bucket
+        result['filters'] = {
+            'start': request.args.get('start'),
+            'end': request.args.get('end')
+        }
+        if columnar:
+            batch = aggregate_batch(result)
+            meta = {key: value for key, value in result.items() if key != 'columns'}
+            return wire_response(wire_format, aggregate_schema(aggs), [batch], meta)
+        return jsonify({
+            'success': True,
+            'data': result
         })
         
-        currency_format = workbook.add_format({'num_format': '"Rp "#,##0'})
-        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
-        datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+    except Exception as e:
+        logger.error(f"Error aggregating {request.args.get('sensor')}/{request.args.get('metric')}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ HEATMAP API ENDPOINTS ============
+
+# Matrix bulan tertutup per site/sensor/metric/agg (lihat heatmap.py)
+_heatmap_cache = MonthCache()
+
+@app.route('/api/heatmap/<sensor_type>', methods=['GET'])
+def get_heatmap(sensor_type):
+    """
+    Matrix hari x jam satu metric dari rollup per jam (default 30 hari terakhir):
+    ?metric=power_w&agg=avg|sum|min|max|count|delta&start_date=...&end_date=...
+    agg=delta (energy_kwh) = energi per jam dari kenaikan counter.
+    """
+    try:
+        metric = request.args.get('metric', DEFAULT_METRICS.get(sensor_type))
+        agg = request.args.get('agg', 'avg')
+        start_date = request.args.get('start_date')
+        end_date = request.args.get('end_date')
         
-        # Sheet 1: ROI Summary
-        summary_sheet = workbook.add_worksheet('ROI Summary')
+        try:
+            start_ms, end_ms = date_range_ms(start_date, end_date)
+            if end_ms is None:
+                end_ms = day_start_ms(site_now_ms()) + MS_PER_DAY
+            if start_ms is None:
+                start_ms = end_ms - 30 * MS_PER_DAY
+            
+            conn = connect_db()
+            try:
+                result = heatmap(conn, sensor_type, metric, agg, start_ms, end_ms,
+                                 cache=_heatmap_cache, cache_key=(request.args.get('site'),))
+            finally:
+                conn.close()
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
-        # System Information
-        summary_sheet.write('A1', 'Solar PV System ROI Report', title_format)
-        summary_sheet.write('A3', 'System Information')
-        summary_sheet.write('A4', 'System Start Date:')
-        summary_sheet.write('B4', system_start_date, date_format)
-        summary_sheet.write('A5', 'Investment Cost:')
-        summary_sheet.write('B5', investment_cost, currency_format)
+        result['filters'] = {
+            'start_date': start_date,
+            'end_date': end_date
+        }
+        return jsonify({
+            'success': True,
+            'data': result
+        })
         
-        # Calculate current metrics
-        total_savings = calculate_total_savings(cursor, system_start_date)
-        roi_percentage = (total_savings / investment_cost) * 100
+    except Exception as e:
+        logger.error(f"Error building heatmap for {sensor_type}: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ BATCH DASHBOARD API ENDPOINTS ============
+
+BATCH_MAX_PANELS = int(os.environ.get('BATCH_MAX_PANELS', '20'))
+BATCH_WORKERS = int(os.environ.get('BATCH_WORKERS', '4'))
+
+# Endpoint read-only (JSON) yang boleh dipanggil sebagai panel /api/batch
+BATCH_PANELS = {
+    'get_sensor_historical_data',
+    'get_aggregate',
+    'get_heatmap',
+    'get_efficiency_series',
+    'get_roi_summary',
+    'get_ingest_status',
+    'get_dashboard_summary',
+    'get_anomalies',
+    'get_device_health',
+}
+
+_batch_executor = None
+_batch_lock = threading.Lock()
+
+def _run_panel(panel, site, snapshot=False):
+    """
+    Jalankan satu panel sebagai sub-request GET di thread ini, return (status, body).
+    snapshot=True (read transaction batch): handler @single_flight dipanggil tanpa
+    coalescing, karena hasil bersama dihitung request lain dengan snapshot lain.
+    """
+    path = panel.get('path', '')
+    params = dict(panel.get('params') or {})
+    # Panel selalu JSON (body digabung ke response batch)
+    params.pop('format', None)
+    if site:
+        params['site'] = site
+    
+    try:
+        endpoint, view_args = app.url_map.bind('localhost').match(path, method='GET')
+    except HTTPException:
+        return 404, {'success': False, 'error': f'Unknown panel path: {path}'}
+    if endpoint not in BATCH_PANELS:
+        return 400, {'success': False, 'error': f'Panel not allowed in batch: {path}'}
+    
+    try:
+        view = app.view_functions[endpoint]
+        if snapshot:
+            view = getattr(view, '__wrapped__', view)
+        with app.test_request_context(path, method='GET', query_string=params):
+            response = app.make_response(view(**view_args))
+        return response.status_code, response.get_json()
+    except Exception as e:
+        logger.error(f"Error running batch panel {path}: {e}")
+        return 500, {'success': False, 'error': str(e)}
+
+@app.route('/api/batch', methods=['POST'])
+def get_batch_panels():
+    """
+    Beberapa panel dashboard dalam satu request:
+    {"site": ..., "parallel": false, "panels": [{"id": ..., "path": "/api/...", "params": {...}}]}
+    Default semua panel berjalan di satu koneksi dalam satu read transaction (snapshot
+    konsisten). parallel=true memakai thread pool terbatas; tiap panel lalu membaca
+    snapshot-nya sendiri.
+    """
+    try:
+        body = request.get_json(silent=True) or {}
+        panels = body.get('panels')
+        site = body.get('site') or request.args.get('site')
+        parallel = bool(body.get('parallel', False))
         
-        summary_sheet.write('A7', 'Current Status')
-        summary_sheet.write('A8', 'Total Savings:')
-        summary_sheet.write('B8', total_savings, currency_format)
-        summary_sheet.write('A9', 'ROI Percentage:')
-        summary_sheet.write('B9', f'{roi_percentage:.1f}%')
-        summary_sheet.write('A10', 'Investment Recovered:')
-        summary_sheet.write('B10', min(total_savings, investment_cost), currency_format)
+        if not isinstance(panels, list) or not panels:
+            return jsonify({
+                'success': False,
+                'error': 'panels must be a non-empty list'
+            }), 400
         
-        # Set column widths
-        summary_sheet.set_column('A:A', 25)
-        summary_sheet.set_column('B:B', 20)
+        if len(panels) > BATCH_MAX_PANELS:
+            return jsonify({
+                'success': False,
+                'error': f'Too many panels (max {BATCH_MAX_PANELS})'
+            }), 400
         
-        # Sheet 2: Daily Savings Detail
-        detail_sheet = workbook.add_worksheet('Daily Savings Detail')
+        panel_ids = [str(panel.get('id', index)) for index, panel in enumerate(panels)]
+        started = time.time()
+        
+        if parallel and len(panels) > 1:
+            global _batch_executor
+            with _batch_lock:
+                if _batch_executor is None:
+                    _batch_executor = ThreadPoolExecutor(
+                        max_workers=BATCH_WORKERS, thread_name_prefix='batch-panel'
+                    )
+            futures = [_batch_executor.submit(_run_panel, panel, site) for panel in panels]
+            results = [future.result() for future in futures]
+        else:
+            with shard_pool.connect(site).read_snapshot():
+                results = [_run_panel(panel, site, snapshot=True) for panel in panels]
         
-        # Headers
-        headers = ['Date', 'Energy Consumed (kWh)', 'Applicable Tariff (Rp/kWh)', 'Daily Savings (Rp)']
-        for col, header in enumerate(headers):
-            detail_sheet.write(0, col, header, header_format)
+        return jsonify({
+            'success': True,
+            'data': {
+                'panels': {
+                    panel_id: {'status': status, 'response': response}
+                    for panel_id, (status, response) in zip(panel_ids, results)
+                },
+                'consistent_snapshot': not (parallel and len(panels) > 1),
+                'elapsed_ms': round((time.time() - started) * 1000, 1)
+            }
+        })
         
-        # Get detailed energy data
-        cursor.execute('''
-            SELECT DATE(timestamp) as date,
-                   SUM(CASE WHEN status = 'success' AND parsed_data IS NOT NULL 
-                       THEN JSON_EXTRACT(parsed_data, '$.energy_kwh') ELSE 0 END) as daily_energy
-            FROM pzem_data
-            WHERE device_type = 'PZEM-016_AC'
-            AND timestamp >= ?
-            GROUP BY DATE(timestamp)
-            ORDER BY date DESC
-        ''', (system_start_date,))
-        
-        daily_data = cursor.fetchall()
-        
-        # Write daily data
-        row = 1
-        for date_str, daily_energy in daily_data:
-            if daily_energy > 0:
-                tariff = 1352  # You might want to get historical tariff here
-                daily_savings = daily_energy * tariff
-                
-                detail_sheet.write(row, 0, date_str, date_format)
-                detail_sheet.write(row, 1, daily_energy)
-                detail_sheet.write(row, 2, tariff)
-                detail_sheet.write(row, 3, daily_savings, currency_format)
-                row += 1
-        
-        # Set column widths
-        for col in range(4):
-            detail_sheet.set_column(col, col, 18)
-        
-        # Sheet 3: Tariff History
-        tariff_sheet = workbook.add_worksheet('Tariff History')
-        
-        # Headers
-        tariff_headers = ['Effective Date', 'Tariff (Rp/kWh)', 'Created Date']
-        for col, header in enumerate(tariff_headers):
-            tariff_sheet.write(0, col, header, header_format)
-        
-        # Get tariff history
-        cursor.execute('SELECT tariff_per_kwh, effective_date, created_at FROM tariff_history ORDER BY effective_date DESC')
-        tariff_history = cursor.fetchall()
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    except Exception as e:
+        logger.error(f"Error running batch request: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ INGESTION STATUS API ENDPOINTS ============
+
+@app.route('/api/ingest/status', methods=['GET'])
+def get_ingest_status():
+    """Spill queue depth, drain rate dan status writer dari MQTT worker"""
+    stats = read_spill_stats(spill_dir(request.args.get('site')))
+    if stats is None:
+        return jsonify({
+            'success': False,
+            'error': 'Ingest status not available'
+        }), 404
+    
+    stats['stats_age_seconds'] = round(time.time() - stats.get('updated_at', 0), 1)
+    return jsonify({
+        'success': True,
+        'data': stats
+    })
+
+# ============ DASHBOARD SUMMARY API ENDPOINTS ============
+
+def _latest_from_summary(summary, sensor, metrics):
+    """Pembacaan terakhir sensor dari dashboard_summary period 'all'"""
+    status = summary['all'].get(sensor, {}).get('success')
+    if not status:
+        return None
+    latest = {
+        'timestamp': from_epoch_ms(status['last_ts_ms']),
+        'status': 'success' if status['last_value'] else 'error'
+    }
+    for metric in metrics:
+        latest[metric] = summary_value(summary, 'all', sensor, metric, 'last_value')
+    return latest
+
+def _summary_period(summary, period):
+    """Entry summary per sensor/metric dengan last_ts_ms sebagai ISO timestamp"""
+    result = {}
+    for sensor, metrics in summary[period].items():
+        result[sensor] = {}
+        for metric, entry in metrics.items():
+            entry = dict(entry)
+            entry['last_timestamp'] = from_epoch_ms(entry.pop('last_ts_ms'))
+            result[sensor][metric] = entry
+    return result
+
+@app.route('/api/dashboard/summary', methods=['GET'])
+def get_dashboard_summary():
+    """
+    Ringkasan dashboard dari dashboard_summary (di-maintain MQTT worker):
+    savings & statistik hari ini dan bulan ini, pembacaan terakhir per sensor
+    """
+    try:
+        conn = connect_db()
+        today = site_now().date()
+        summary = read_summary(conn, to_epoch_ms(today))
+        conn.close()
         
-        # Write tariff data
-        for row, (tariff_rate, effective_date, created_at) in enumerate(tariff_history, 1):
-            tariff_sheet.write(row, 0, effective_date, date_format)
-            tariff_sheet.write(row, 1, tariff_rate)
-            tariff_sheet.write(row, 2, created_at, datetime_format)
+        if summary is None:
+            return jsonify({
+                'success': False,
+                'error': 'Dashboard summary not available'
+            }), 404
         
-        # Set column widths
-        for col in range(3):
-            tariff_sheet.set_column(col, col, 18)
+        return jsonify({
+            'success': True,
+            'data': {
+                'date': today.isoformat(),
+                'today_savings': summary_savings(summary, 'day'),
+                'monthly_savings': summary_savings(summary, 'month'),
+                'today': _summary_period(summary, 'day'),
+                'month': _summary_period(summary, 'month'),
+                'latest': {
+                    'pzem016': _latest_from_summary(summary, 'pzem016', ['power_w', 'voltage_v', 'current_a', 'energy_kwh']),
+                    'pzem017': _latest_from_summary(summary, 'pzem017', ['power_w', 'voltage_v', 'current_a', 'energy_kwh']),
+                    'dht22': _latest_from_summary(summary, 'dht22', ['temperature', 'humidity']),
+                },
+                'last_updated': site_now().isoformat()
+            }
+        })
         
-        workbook.close()
-        output.seek(0)
+    except Exception as e:
+        logger.error(f"Error getting dashboard summary: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ ANOMALY API ENDPOINTS ============
+
+ANOMALY_MAX_LIMIT = 1000
+
+@app.route('/api/anomalies', methods=['GET'])
+def get_anomalies():
+    """
+    Event anomali terbaru dari streaming detector MQTT worker (anomaly_events,
+    urut start_ms DESC), tanpa scan tabel sensor. Filter: sensor, metric, kind,
+    active=true (belum selesai), start_date/end_date (waktu mulai), limit.
+    include_baselines=true menambahkan baseline EWMA per metric.
+    """
+    try:
+        sensor = request.args.get('sensor')
+        metric = request.args.get('metric')
+        kind = request.args.get('kind')
+        active = request.args.get('active', 'false').lower() == 'true'
+        limit = min(request.args.get('limit', 100, type=int), ANOMALY_MAX_LIMIT)
+        
+        if kind and kind not in ANOMALY_KINDS:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid anomaly kind: {kind}'
+            }), 400
         
+        where_conditions = []
+        params = []
+        if sensor:
+            where_conditions.append('sensor = ?')
+            params.append(sensor)
+        if metric:
+            where_conditions.append('metric = ?')
+            params.append(metric)
+        if kind:
+            where_conditions.append('kind = ?')
+            params.append(kind)
+        if active:
+            where_conditions.append('end_ms IS NULL')
+        
+        start_ms, end_ms = date_range_ms(request.args.get('start_date'), request.args.get('end_date'))
+        if start_ms is not None:
+            where_conditions.append('start_ms >= ?')
+            params.append(start_ms)
+        if end_ms is not None:
+            where_conditions.append('start_ms < ?')
+            params.append(end_ms)
+        
+        where_clause = 'WHERE ' + ' AND '.join(where_conditions) if where_conditions else ''
+        
+        conn = connect_db()
+        try:
+            rows = conn.execute(f'''
+                SELECT id, sensor, series, metric, kind, start_ms, end_ms, value, expected, score
+                FROM anomaly_events {where_clause}
+                ORDER BY start_ms DESC
+                LIMIT ?
+            ''', params + [max(limit, 0)]).fetchall()
+            baselines = read_baselines(conn) if request.args.get('include_baselines') == 'true' else None
+        except sqlite3.OperationalError:
+            return jsonify({
+                'success': False,
+                'error': 'Anomaly events not available'
+            }), 404
+        finally:
+            conn.close()
+        
+        events = []
+        for event_id, sensor_name, series, metric_name, kind_name, start, end, value, expected, score in rows:
+            events.append({
+                'id': event_id,
+                'sensor': sensor_name,
+                'series': series,
+                'metric': metric_name,
+                'kind': kind_name,
+                'start': from_epoch_ms(start),
+                'end': from_epoch_ms(end) if end is not None else None,
+                'active': end is None,
+                'duration_seconds': (end - start) / 1000 if end is not None else None,
+                'value': value,
+                'expected': expected,
+                'score': score
+            })
+        
+        data = {
+            'events': events,
+            'count': len(events),
+            'filters': {
+                'sensor': sensor,
+                'metric': metric,
+                'kind': kind,
+                'active': active
+            }
+        }
+        if baselines is not None:
+            data['baselines'] = baselines
+        
+        return jsonify({
+            'success': True,
+            'data': data
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting anomalies: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ DEVICE HEALTH API ENDPOINTS ============
+
+@app.route('/api/health', methods=['GET'])
+def get_health():
+    """Liveness untuk HEALTHCHECK container: shard default bisa dibaca"""
+    try:
+        conn = connect_db()
+        conn.execute('SELECT 1').fetchone()
         conn.close()
         
-        # Generate filename
-        filename = "ROI-Report"
-        if start_date and end_date:
-            filename += f"_{start_date}_to_{end_date}"
-        else:
-            filename += f"_{datetime.now().strftime('%Y-%m-%d')}"
-        filename += ".xlsx"
+        return jsonify({
+            'success': True,
+            'status': 'healthy',
+            'timestamp': site_now().isoformat()
+        })
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+    except Exception as e:
+        logger.error(f"Health check failed: {e}")
+        return jsonify({
+            'success': False,
+            'status': 'unhealthy',
+            'error': str(e)
+        }), 503
+
+@app.route('/api/health/devices', methods=['GET'])
+def get_device_health():
+    """
+    Freshness, uptime, completeness, gap terbaru dan histogram lag ingest per device
+    fisik dari tabel device health (di-maintain MQTT worker), tanpa scan tabel sensor.
+    Filter: sensor (pzem016, ...) dan device (device_id, mis. /dev/ttyUSB0#1);
+    device berisi nama sensor tetap diterima sebagai filter sensor.
+    Range: start_date/end_date atau days (default 30 hari terakhir); lag_hours
+    untuk histogram lag (default 24).
+    """
+    try:
+        sensor = request.args.get('sensor')
+        device = request.args.get('device')
+        if device in DEVICES and not sensor:
+            sensor, device = device, None
+        days = request.args.get('days', 30, type=int)
+        gaps_limit = request.args.get('gaps_limit', 10, type=int)
+        lag_hours = request.args.get('lag_hours', 24, type=int)
+        
+        if sensor and sensor not in DEVICES:
+            return jsonify({
+                'success': False,
+                'error': f'Invalid sensor: {sensor}'
+            }), 400
+        
+        now_ms = site_now_ms()
+        start_ms, end_ms = date_range_ms(request.args.get('start_date'), request.args.get('end_date'))
+        if start_ms is None:
+            start_ms = day_start_ms(now_ms) - (max(days, 1) - 1) * MS_PER_DAY
+        if end_ms is None:
+            end_ms = now_ms
+        
+        conn = connect_db()
+        try:
+            devices = device_report(conn, start_ms, end_ms, now_ms, sensor=sensor, device=device,
+                                    gaps_limit=gaps_limit, lag_since_ms=now_ms - lag_hours * 3600 * 1000)
+        except sqlite3.OperationalError:
+            return jsonify({
+                'success': False,
+                'error': 'Device health not available'
+            }), 404
+        finally:
+            conn.close()
+        
+        return jsonify({
+            'success': True,
+            'data': {
+                'devices': devices,
+                'range': {
+                    'start': from_epoch_ms(start_ms),
+                    'end': from_epoch_ms(min(end_ms, now_ms))
+                },
+                'lag_hours': lag_hours,
+                'last_updated': site_now().isoformat()
+            }
+        })
         
     except Exception as e:
-        logger.error(f"Error exporting ROI report: {e}")
+        logger.error(f"Error getting device health: {e}")
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
 
-# ============ INITIALIZATION CALL ============
-# Add this call to your main app initialization
+# ============ MULTI-SITE API ENDPOINTS ============
+
+def _site_summary(site, conn):
+    """Ringkasan satu site (dijalankan per shard oleh fan_out)"""
+    today = site_now().date()
+    summary = read_summary(conn, to_epoch_ms(today))
+    if summary is not None:
+        latest = {
+            'PZEM-016_AC': _latest_from_summary(summary, 'pzem016', ['power_w']),
+            'PZEM-017_DC': _latest_from_summary(summary, 'pzem017', ['power_w']),
+            'DHT22': _latest_from_summary(summary, 'dht22', ['temperature', 'humidity']),
+        }
+        last_seen = [entry['timestamp'] for entry in latest.values() if entry]
+        return {
+            'site': site,
+            'latest': latest,
+            'last_seen': max(last_seen) if last_seen else None,
+            'today_savings': summary_savings(summary, 'day')
+        }
+    
+    # Database tanpa dashboard_summary: query row terakhir per device
+    cursor = conn.cursor()
+    summary = {'site': site, 'latest': {}}
+    
+    for device_type in ('PZEM-016_AC', 'PZEM-017_DC'):
+        cursor.execute('''
+            SELECT COALESCE(valid_until_ms, ts_ms), status, JSON_EXTRACT(parsed_data, '$.power_w')
+            FROM pzem_data
+            WHERE device_type = ?
+            ORDER BY ts_ms DESC LIMIT 1
+        ''', (device_type,))
+        row = cursor.fetchone()
+        summary['latest'][device_type] = {
+            'timestamp': from_epoch_ms(row[0]),
+            'status': row[1],
+            'power_w': row[2]
+        } if row else None
+    
+    cursor.execute('''
+        SELECT COALESCE(valid_until_ms, ts_ms), temperature, humidity, status
+        FROM dht22_data ORDER BY ts_ms DESC LIMIT 1
+    ''')
+    row = cursor.fetchone()
+    summary['latest']['DHT22'] = {
+        'timestamp': from_epoch_ms(row[0]),
+        'temperature': row[1],
+        'humidity': row[2],
+        'status': row[3]
+    } if row else None
+    
+    last_seen = [entry['timestamp'] for entry in summary['latest'].values() if entry]
+    summary['last_seen'] = max(last_seen) if last_seen else None
+    
+    summary['today_savings'] = calculate_savings_for_period(cursor, today.isoformat(), today.isoformat(), site)
+    return summary
+
+@app.route('/api/sites', methods=['GET'])
+def get_sites():
+    """Daftar site yang punya shard database"""
+    return jsonify({
+        'success': True,
+        'data': list_sites()
+    })
+
+@app.route('/api/sites/summary', methods=['GET'])
+def get_sites_summary():
+    """Cross-site summary: query yang sama di semua shard secara paralel"""
+    try:
+        sites = request.args.get('sites')
+        sites = sites.split(',') if sites else None
+        results = fan_out(shard_pool, _site_summary, sites)
+        
+        return jsonify({
+            'success': True,
+            'data': results
+        })
+        
+    except Exception as e:
+        logger.error(f"Error getting sites summary: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# ============ INITIALIZATION ============
+# Schema (termasuk tabel ROI) dikelola oleh migrations package; jika database
+# sudah current ini hanya satu SELECT ke schema_version tanpa DDL.
+# Di production (gunicorn --preload, lihat gunicorn.conf.py) modul ini di-import
+# sekali di master, sehingga migrasi hanya berjalan sekali sebelum worker di-fork.
 try:
-    init_roi_tables()
+    ensure_schema(DB_PATH)
 except Exception as e:
-    logger.error(f"Failed to initialize ROI tables: {e}")
+    logger.error(f"Failed to initialize database schema: {e}")
+
+def init_worker():
+    """
+    Per worker setelah fork (gunicorn post_fork): koneksi shard dan thread pool
+    milik master tidak dipakai, worker membuka reader pool sendiri secara lazy.
+    """
+    global _batch_executor
+    shard_pool.reset()
+    reset_fanout()
+    _batch_executor = None
 
-# ============ IMPORT ADDITIONS ============
-# Add these imports to the top of your web_api.py file:
-# from flask import send_file
-# import xlsxwriter
\ No newline at end of file
+if __name__ == '__main__':
+    # Development server; production memakai gunicorn (gunicorn.conf.py)
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', '5000')))
\ No newline at end of file
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Binary Wire Formats
+Content negotiation untuk endpoint data (/api/data, /api/aggregate): selain JSON,
+response bisa berupa Apache Arrow IPC stream (zero-copy ke pandas / polars) atau
+MessagePack. Data dibangun per kolom dari cursor SQLite dalam record batch
+(transpose chunk fetchmany, run deadband di-expand vectorized, metric PZEM diambil
+dari parsed_data dengan regex pyarrow) dan di-stream, tanpa dict per row.
+
+    ?format=arrow | msgpack | json                     (menang atas Accept)
+    Accept: application/vnd.apache.arrow.stream
+    Accept: application/x-msgpack (atau application/msgpack, application/vnd.msgpack)
+
+Arrow: schema (metadata JSON di key 'meta') lalu record batch; timestamp[ms] tanpa
+timezone. MessagePack: urutan object dalam satu stream (msgpack.Unpacker), timestamp
+sebagai integer epoch ms:
+    {'schema': [[name, type], ...], 'meta': {...}}
+    {'columns': {name: [value, ...]}, 'rows': n}       satu object per batch
+
+Kolom timestamp (ts_ms, bucket_start) adalah jam dinding site (konvensi storage
+epoch_time, sama dengan string naive di JSON), bukan UTC: jangan dibaca sebagai
+instant UTC; meta['timestamp_timezone'] berisi SITE_TIMEZONE untuk lokalisasi.
+received_at adalah string UTC (CURRENT_TIMESTAMP SQLite).
+
+Client:
+    pyarrow.ipc.open_stream(response.content).read_pandas()
+    for obj in msgpack.Unpacker(io.BytesIO(response.content)): ...
+"""
+
+import io
+import os
+import re
+import json
+import itertools
+from typing import Dict, Any, List, Optional, Iterable, Iterator, Tuple
+
+try:
+    import numpy as np
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+from epoch_time import to_epoch_ms, SITE_TIMEZONE
+from aggregation import SENSOR_METRICS
+from row_filters import ALARM_FLAGS
+
+WIRE_BATCH_ROWS = int(os.environ.get('WIRE_BATCH_ROWS', '8192'))
+
+FORMATS = ('json', 'arrow', 'msgpack')
+
+MIME_TYPES = {
+    'json': 'application/json',
+    'arrow': 'application/vnd.apache.arrow.stream',
+    'msgpack': 'application/x-msgpack',
+}
+
+ACCEPT_TYPES = {
+    'application/json': 'json',
+    'application/vnd.apache.arrow.stream': 'arrow',
+    'application/x-msgpack': 'msgpack',
+    'application/msgpack': 'msgpack',
+    'application/vnd.msgpack': 'msgpack',
+}
+
+# Kolom tabel yang dikirim apa adanya per sensor (setelah ts_ms); PZEM ditambah
+# metric whitelist aggregation (float) dan flag alarm (bool) dari parsed_data
+WIRE_COLUMNS = {
+    'pzem016': [('device_type', 'string'), ('status', 'string'), ('error_message', 'string'),
+                ('received_at', 'string')],
+    'pzem017': [('device_type', 'string'), ('status', 'string'), ('error_message', 'string'),
+                ('received_at', 'string')],
+    'dht22': [('temperature', 'float64'), ('humidity', 'float64'), ('gpio_pin', 'int64'),
+              ('library', 'string'), ('status', 'string'), ('error_message', 'string'),
+              ('received_at', 'string')],
+    'system': [('ram_usage_percent', 'float64'), ('storage_usage_percent', 'float64'),
+               ('cpu_usage_percent', 'float64'), ('cpu_temperature', 'float64'),
+               ('storage_total_gb', 'float64'), ('storage_used_gb', 'float64'),
+               ('storage_free_gb', 'float64'), ('status', 'string'), ('error_message', 'string'),
+               ('received_at', 'string')],
+}
+
+# Kolom run deadband di akhir row sumber (sama dengan deadband.RUN_COLUMNS)
+RUN_NAMES = ['ts_ms', 'valid_until_ms', 'repeat_count']
+
+# ---------- Negotiation ----------
+
+def available_formats() -> List[str]:
+    formats = ['json']
+    if PYARROW_AVAILABLE:
+        formats.append('arrow')
+        if MSGPACK_AVAILABLE:
+            formats.append('msgpack')
+    return formats
+
+def negotiate(format_arg: Optional[str], accept: Optional[str]) -> str:
+    """
+    Format response: ?format= eksplisit (ValueError jika tidak dikenal / library
+    tidak terpasang), lalu media type Accept dengan q tertinggi yang tersedia, default json.
+    """
+    available = available_formats()
+    if format_arg:
+        if format_arg not in FORMATS:
+            raise ValueError(f'Invalid format: {format_arg} (use {", ".join(FORMATS)})')
+        if format_arg not in available:
+            raise ValueError(f'Format not available on this server: {format_arg}')
+        return format_arg
+
+    best, best_q = 'json', 0.0
+    for part in (accept or '').split(','):
+        media_type, _, params = part.strip().partition(';')
+        wire_format = ACCEPT_TYPES.get(media_type.strip().lower())
+        if wire_format not in available:
+            continue
+        match = re.search(r'q=([0-9.]+)', params)
+        q = float(match.group(1)) if match else 1.0
+        if q > best_q:
+            best, best_q = wire_format, q
+    return best
+
+# ---------- Columns ----------
+
+def arrow_type(type_name: str):
+    return {
+        'int64': pa.int64(),
+        'float64': pa.float64(),
+        'string': pa.string(),
+        'bool': pa.bool_(),
+        'timestamp': pa.timestamp('ms'),
+    }[type_name]
+
+def sensor_schema(sensor: str) -> List[Tuple[str, str]]:
+    """Schema output binary satu sensor: [(nama, tipe)]"""
+    schema = [('ts_ms', 'timestamp')] + WIRE_COLUMNS[sensor]
+    if SENSOR_METRICS[sensor]['json_column']:
+        schema += [(metric, 'float64') for metric in SENSOR_METRICS[sensor]['metrics']]
+        schema += [(flag, 'bool') for flag in ALARM_FLAGS.get(sensor, [])]
+    return schema
+
+def source_columns(sensor: str) -> List[str]:
+    """Kolom SELECT / cold tier untuk sensor_batch(), diakhiri kolom run deadband"""
+    names = [name for name, _ in WIRE_COLUMNS[sensor]]
+    if SENSOR_METRICS[sensor]['json_column']:
+        names.append(SENSOR_METRICS[sensor]['json_column'])
+    return names + RUN_NAMES
+
+def row_chunks(rows: Iterable[tuple], names: List[str],
+               batch_rows: int = WIRE_BATCH_ROWS) -> Iterator[Dict[str, tuple]]:
+    """Row tuple (cursor / iterator) per chunk menjadi kolom {nama: nilai}, transpose lewat zip di C"""
+    fetchmany = getattr(rows, 'fetchmany', None)
+    iterator = None if fetchmany else iter(rows)
+    while True:
+        chunk = fetchmany(batch_rows) if fetchmany else list(itertools.islice(iterator, batch_rows))
+        if not chunk:
+            return
+        yield dict(zip(names, zip(*chunk)))
+
+def expand_runs(columns: Dict[str, Any], descending: bool = True) -> Tuple['np.ndarray', 'np.ndarray']:
+    """
+    Versi kolom dari deadband.expand_rows: setiap row diulang 1 + repeat_count kali
+    dengan timestamp rekonstruksi yang sama dengan expand_run(). Return
+    (ts_ms per pembacaan, index row sumber).
+    """
+    ts_ms = np.asarray(columns['ts_ms'], dtype=np.int64)
+    until = pa.array(columns['valid_until_ms'], pa.int64())
+    repeat = pa.array(columns['repeat_count'], pa.int64()).fill_null(0).to_numpy()
+    repeat = np.where(until.is_valid().to_numpy(zero_copy_only=False), repeat, 0)
+    if not repeat.any():
+        return ts_ms, np.arange(len(ts_ms))
+
+    until = until.fill_null(0).to_numpy()
+    weights = repeat + 1
+    index = np.repeat(np.arange(len(ts_ms)), weights)
+    position = np.arange(len(index)) - np.repeat(np.cumsum(weights) - weights, weights)
+    run_repeat = repeat[index]
+    reading = run_repeat - position if descending else position
+    step = (until - ts_ms) / np.maximum(repeat, 1)
+    expanded = ts_ms[index] + np.round(reading * step[index]).astype(np.int64)
+    expanded = np.where((reading == run_repeat) & (run_repeat > 0), until[index], expanded)
+    return expanded, index
+
+def json_number(strings: 'pa.Array', key: str) -> 'pa.Array':
+    """Nilai numerik key dari kolom JSON (json.dumps worker) tanpa json.loads per row; null jika tidak ada"""
+    pattern = f'"{re.escape(key)}": (?P<value>-?[0-9][0-9.eE+-]*)'
+    return pc.cast(pc.struct_field(pc.extract_regex(strings, pattern), [0]), pa.float64())
+
+def json_flag(strings: 'pa.Array', key: str) -> 'pa.Array':
+    """Flag alarm 'ON' / 'OFF' dari kolom JSON sebagai bool; null jika tidak ada"""
+    pattern = f'"{re.escape(key)}": "(?P<value>ON|OFF)"'
+    return pc.equal(pc.struct_field(pc.extract_regex(strings, pattern), [0]), 'ON')
+
+def sensor_batch(sensor: str, columns: Dict[str, Any], ts_ms: 'np.ndarray',
+                 index: 'np.ndarray') -> 'pa.RecordBatch':
+    """
+    Record batch sensor_schema() dari chunk kolom source_columns(): pembacaan ke-i
+    memakai row sumber index[i] dengan timestamp ts_ms[i]. Metric PZEM dari parsed_data.
+    """
+    take = pa.array(index, pa.int64())
+    schema = sensor_schema(sensor)
+    arrays = [pa.array(ts_ms, pa.int64()).cast(arrow_type('timestamp'))]
+    for name, type_name in WIRE_COLUMNS[sensor]:
+        arrays.append(pa.array(columns[name], arrow_type(type_name)).take(take))
+    json_column = SENSOR_METRICS[sensor]['json_column']
+    if json_column:
+        strings = pa.array(columns[json_column], pa.string()).take(take)
+        for name, type_name in schema[len(arrays):]:
+            arrays.append(json_flag(strings, name) if type_name == 'bool' else json_number(strings, name))
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema(schema))
+
+def sensor_batches(sensor: str, chunks: Iterable[Dict[str, Any]], skip: int = 0,
+                   limit: Optional[int] = None) -> Iterator['pa.RecordBatch']:
+    """
+    Record batch per chunk (urut ts_ms DESC), run deadband di-expand. skip/limit
+    dihitung per pembacaan seperti pagination JSON; chunk sisa tidak dibaca.
+    """
+    for columns in chunks:
+        if limit is not None and limit <= 0:
+            return
+        ts_ms, index = expand_runs(columns)
+        if skip >= len(ts_ms):
+            skip -= len(ts_ms)
+            continue
+        stop = len(ts_ms) if limit is None else skip + limit
+        batch = sensor_batch(sensor, columns, ts_ms[skip:stop], index[skip:stop])
+        skip = 0
+        if limit is not None:
+            limit -= batch.num_rows
+        yield batch
+
+def expanded_batch(sensor: str, names: List[str], rows: List[tuple]) -> 'pa.RecordBatch':
+    """Record batch dari row yang sudah di-expand (blocks / downsampling), timestamp di kolom pertama"""
+    columns = dict(zip(names, zip(*rows))) if rows else {name: () for name in names}
+    ts_ms = np.array([to_epoch_ms(row[0]) for row in rows], dtype=np.int64)
+    return sensor_batch(sensor, columns, ts_ms, np.arange(len(rows)))
+
+def arrow_schema(schema: List[Tuple[str, str]], meta: Optional[Dict[str, Any]] = None) -> 'pa.Schema':
+    metadata = {'meta': json.dumps(meta, default=str)} if meta else None
+    return pa.schema([(name, arrow_type(type_name)) for name, type_name in schema], metadata=metadata)
+
+def columns_batch(schema: List[Tuple[str, str]], columns: Dict[str, Any]) -> 'pa.RecordBatch':
+    """Record batch dari kolom list / ndarray / pa.Array (NaN float dari NumPy menjadi null)"""
+    arrays = [
+        columns[name] if isinstance(columns[name], pa.Array)
+        else pa.array(columns[name], arrow_type(type_name), from_pandas=True)
+        for name, type_name in schema
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=arrow_schema(schema))
+
+def block_batch(sensor: str, config: Dict[str, Any], series: Dict[str, 'np.ndarray'],
+                order: 'np.ndarray') -> 'pa.RecordBatch':
+    """
+    Record batch sensor_schema() dari series block store (config BLOCK_SERIES) pada
+    posisi order. Kolom yang tidak disimpan di block bernilai null, flag null jika gagal.
+    """
+    success = series['success'][order].astype(bool)
+    columns = {name: pa.nulls(len(order), arrow_type(type_name)) for name, type_name in sensor_schema(sensor)}
+    columns['ts_ms'] = series['ts_ms'][order]
+    columns['status'] = np.where(success, 'success', 'error')
+    if config['device_type']:
+        columns['device_type'] = pa.array([config['device_type']] * len(order), pa.string())
+    for name in config['metrics']:
+        columns[name] = series[name][order]
+    for name in config['flags']:
+        columns[name] = pa.array(series[name][order].astype(bool), mask=~success)
+    return columns_batch(sensor_schema(sensor), columns)
+
+def aggregate_schema(aggs: List[str]) -> List[Tuple[str, str]]:
+    return [('bucket_start', 'timestamp')] + [(name, 'int64' if name == 'count' else 'float64') for name in aggs]
+
+def aggregate_batch(result: Dict[str, Any]) -> 'pa.RecordBatch':
+    """Record batch dari aggregate() / aggregate_blocks() dengan columnar=True"""
+    columns = dict(result['columns'], bucket_start=result['columns']['bucket_ms'])
+    return columns_batch(aggregate_schema(result['aggs']), columns)
+
+# ---------- Encoding ----------
+
+def encode_stream(wire_format: str, schema: List[Tuple[str, str]],
+                  batches: Iterable['pa.RecordBatch'], meta: Dict[str, Any]) -> Iterator[bytes]:
+    """Chunk bytes response (satu chunk per record batch) untuk format arrow / msgpack"""
+    meta = dict(meta or {}, timestamp_timezone=SITE_TIMEZONE)
+    if wire_format == 'arrow':
+        sink = io.BytesIO()
+        writer = pa.ipc.new_stream(sink, arrow_schema(schema, meta))
+
+        def flush():
+            data = sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+            return data
+
+        yield flush()
+        for batch in batches:
+            if batch.num_rows:
+                writer.write_batch(batch)
+                yield flush()
+        writer.close()
+        yield flush()
+        return
+
+    packer = msgpack.Packer()
+    yield packer.pack({'schema': [list(column) for column in schema], 'meta': meta})
+    for batch in batches:
+        if not batch.num_rows:
+            continue
+        columns = {}
+        for name, column in zip(batch.schema.names, batch.columns):
+            if pa.types.is_timestamp(column.type):
+                column = column.cast(pa.int64())
+            columns[name] = column.to_pylist()
+        yield packer.pack({'columns': columns, 'rows': batch.num_rows})